@@ -98,16 +98,22 @@ GR_SWIG_BLOCK_MAGIC(op25, pcap_source_b);
 /*
  * Publicly-accesible constuctor function for op25_pcap_source.
  */
-op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay);
+op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay, bool repeat = true, float rate = 0.0, int udp_port = 0);
 
 /*
- * The op25_pcap_source block. Reads symbols from a tcpdump-formatted
- * file and produces a stream of symbols of the appropriate size.
+ * The op25_pcap_source block. Reads symbols from the UDP payloads of a
+ * tcpdump-formatted file, a packet at a time, and produces a stream of
+ * symbols of the appropriate size.
  */
 class op25_pcap_source_b : public gr_sync_block
 {
 private:
-   op25_pcap_source_b(const char *path, float delay);
+   op25_pcap_source_b(const char *path, float delay, bool repeat, float rate, int udp_port);
+public:
+   bool seek(double t);
+   double time() const;
+   size_t nof_packets() const;
+   double duration() const;
 };
 
 // ----------------------------------------------------------------
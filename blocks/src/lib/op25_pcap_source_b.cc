@@ -2,19 +2,19 @@
 
 /*
  * Copyright 2010,2011 Steve Glass
- * 
+ *
  * This file is part of OP25.
- * 
+ *
  * OP25 is free software; you can redistribute it and/or modify it
  * under the terms of the GNU General Public License as published by
  * the Free Software Foundation; either version 3, or (at your option)
  * any later version.
- * 
+ *
  * OP25 is distributed in the hope that it will be useful, but WITHOUT
  * ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
  * or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
  * License for more details.
- * 
+ *
  * You should have received a copy of the GNU General Public License
  * along with OP25; see the file COPYING. If not, write to the Free
  * Software Foundation, Inc., 51 Franklin Street, Boston, MA
@@ -34,37 +34,82 @@
 #include <math.h>
 #include <op25_pcap_source_b.h>
 #include <stdint.h>
+#include <stdio.h>
 #include <stdlib.h>
 #include <stdexcept>
+#include <string.h>
 #include <strings.h>
-
-#define PCAP_DONT_INCLUDE_PCAP_BPF_H
-#include <pcap/pcap.h>
+#include <sys/time.h>
+#include <unistd.h>
 
 using namespace std;
 
+/*
+ * Longest sleep in one call to work(), so that seek() and the
+ * scheduler are never kept waiting.
+ */
+static const double MAX_SLEEP = 0.01;
+
 op25_pcap_source_b_sptr
-op25_make_pcap_source_b(const char *path, float delay)
+op25_make_pcap_source_b(const char *path, float delay, bool repeat, float rate, int udp_port)
 {
-   return op25_pcap_source_b_sptr(new op25_pcap_source_b(path, delay));
+   return op25_pcap_source_b_sptr(new op25_pcap_source_b(path, delay, repeat, rate, udp_port));
 }
 
 op25_pcap_source_b::~op25_pcap_source_b()
 {
+   pcap_close(pcap_);
 }
 
 int
 op25_pcap_source_b::work(int nof_output_items, gr_vector_const_void_star& input_items, gr_vector_void_star& output_items)
 {
    try {
-      const size_t OCTETS_AVAIL = octets_.size();
+      boost::mutex::scoped_lock lock(mutex_);
       uint8_t *out = reinterpret_cast<uint8_t*>(output_items[0]);
-      const int OCTETS_REQD = static_cast<size_t>(nof_output_items);
-      for(int i = 0; i < OCTETS_REQD; ++i) {
-         out[i] = octets_[loc_++];
-         loc_ %= OCTETS_AVAIL;
+      const size_t OCTETS_REQD = static_cast<size_t>(nof_output_items);
+      size_t n = 0;
+      while(n < OCTETS_REQD) {
+         if(loc_ == octets_.size()) {
+            if(done_) {
+               break;
+            } else if(next_packet()) {
+               if(clock_start_ < 0) {
+                  reset_clock();
+                  clock_start_ += delay_;
+               }
+            } else if(repeat_ && nof_packets_) {
+               fseeko(pcap_file(pcap_), index_[0].offset, SEEK_SET);
+               next_packet();
+               reset_clock();
+            } else {
+               done_ = true;
+               break;
+            }
+         }
+         if(0 == loc_) {
+            // hold each packet until it is due
+            double due = clock_start_;
+            if(rate_ > 0) {
+               due += (time_ - time_start_) / rate_;
+            }
+            const double WAIT = due - now();
+            if(WAIT > 0) {
+               if(0 == n) {
+                  usleep(static_cast<useconds_t>(min(WAIT, MAX_SLEEP) * 1e6));
+               }
+               break;
+            }
+         }
+         const size_t COUNT = min(OCTETS_REQD - n, octets_.size() - loc_);
+         memcpy(out + n, &octets_[loc_], COUNT);
+         loc_ += COUNT;
+         n += COUNT;
       }
-      return OCTETS_REQD;
+      if(done_ && 0 == n) {
+         return -1; // WORK_DONE
+      }
+      return n;
    } catch(const std::exception& x) {
       cerr << x.what() << endl;
       exit(EXIT_FAILURE);
@@ -75,40 +120,215 @@ op25_pcap_source_b::work(int nof_output_items, gr_vector_const_void_star& input_
 
 }
 
-op25_pcap_source_b::op25_pcap_source_b(const char *path, float delay) :
+bool
+op25_pcap_source_b::seek(double t)
+{
+   boost::mutex::scoped_lock lock(mutex_);
+   if(!nof_packets_) {
+      return false;
+   }
+   // last indexed packet before t, then forward to t
+   size_t i = index_.size();
+   while(0 < i && first_time_ + t < index_[i - 1].time) {
+      --i;
+   }
+   fseeko(pcap_file(pcap_), index_[i ? i - 1 : 0].offset, SEEK_SET);
+   octets_.clear();
+   loc_ = 0;
+   done_ = false;
+   while(next_packet()) {
+      if(t <= time_) {
+         reset_clock();
+         return true;
+      }
+   }
+   octets_.clear();
+   loc_ = 0;
+   return false;
+}
+
+double
+op25_pcap_source_b::time() const
+{
+   boost::mutex::scoped_lock lock(mutex_);
+   return time_;
+}
+
+size_t
+op25_pcap_source_b::nof_packets() const
+{
+   return nof_packets_;
+}
+
+double
+op25_pcap_source_b::duration() const
+{
+   return last_time_ - first_time_;
+}
+
+op25_pcap_source_b::op25_pcap_source_b(const char *path, float delay, bool repeat, float rate, int udp_port) :
    gr_sync_block ("pcap_source_b",
                   gr_make_io_signature (0, 0, 0),
                   gr_make_io_signature (1, 1, sizeof(uint8_t))),
+   pcap_(NULL),
+   link_type_(DLT_EN10MB),
+   link_sz_(0),
+   index_(),
+   nof_packets_(0),
+   first_time_(0.0),
+   last_time_(0.0),
+   delay_(delay),
+   repeat_(repeat),
+   rate_(rate),
+   udp_port_(udp_port),
+   octets_(),
    loc_(0),
-   octets_(/* delay * 1200, 0 */)
+   time_(0.0),
+   clock_start_(-1.0),
+   time_start_(0.0),
+   done_(false)
 {
    char err[PCAP_ERRBUF_SIZE];
-   pcap_t *pcap = pcap_open_offline(path, err);
-   if(pcap) {
-      struct pcap_pkthdr hdr;
-      for(const uint8_t *octets; octets = pcap_next(pcap, &hdr);) {
-         const size_t ETHERNET_SZ = 14;
-         const size_t IP_SZ = 20;
-         const size_t UDP_SZ = 8;
-         const size_t P25CAI_OFS = ETHERNET_SZ + IP_SZ + UDP_SZ;
-         if(P25CAI_OFS < hdr.caplen) {
-            const size_t FRAME_SZ = hdr.caplen - P25CAI_OFS;
-#if 0
-            // push some zero octets to separate frames
-            const size_t SILENCE_OCTETS = 48;
-            octets_.resize(octets_.size() + SILENCE_OCTETS, 0);
-#endif
-            // push octets from frame payload into local buffer
-            octets_.reserve(octets_.size() + hdr.caplen - P25CAI_OFS);
-            for(size_t i = 0; i < FRAME_SZ; ++i) {
-               octets_.push_back(octets[P25CAI_OFS + i]);
-            }
-         }
-      }
-      pcap_close(pcap);
-   } else {
+   pcap_ = pcap_open_offline(path, err);
+   if(!pcap_) {
       cerr << "error: failed to open " << path;
       cerr << " (" << err << ")" << endl;
       exit(EXIT_FAILURE);
    }
+   link_type_ = pcap_datalink(pcap_);
+   switch(link_type_) {
+   case DLT_EN10MB:
+      link_sz_ = 14;
+      break;
+   case DLT_LINUX_SLL:
+      link_sz_ = 16;
+      break;
+   case DLT_NULL:
+   case DLT_LOOP:
+      link_sz_ = 4;
+      break;
+   case DLT_RAW:
+      link_sz_ = 0;
+      break;
+   default:
+      cerr << "error: " << path << " has unsupported link type " << link_type_ << endl;
+      exit(EXIT_FAILURE);
+   }
+   index();
+   if(nof_packets_) {
+      fseeko(pcap_file(pcap_), index_[0].offset, SEEK_SET);
+   }
+}
+
+void
+op25_pcap_source_b::index()
+{
+   FILE *file = pcap_file(pcap_);
+   struct pcap_pkthdr hdr;
+   for(;;) {
+      const off_t OFFSET = ftello(file);
+      const uint8_t *octets = pcap_next(pcap_, &hdr);
+      if(!octets) {
+         break;
+      }
+      size_t ofs, len;
+      if(payload(hdr, octets, ofs, len)) {
+         const double TIME = hdr.ts.tv_sec + hdr.ts.tv_usec * 1e-6;
+         if(0 == nof_packets_ % INDEX_INTERVAL) {
+            index_entry e = { OFFSET, TIME };
+            index_.push_back(e);
+         }
+         if(0 == nof_packets_) {
+            first_time_ = TIME;
+         }
+         last_time_ = TIME;
+         ++nof_packets_;
+      }
+   }
+}
+
+bool
+op25_pcap_source_b::next_packet()
+{
+   struct pcap_pkthdr hdr;
+   for(const uint8_t *octets; (octets = pcap_next(pcap_, &hdr));) {
+      size_t ofs, len;
+      if(payload(hdr, octets, ofs, len)) {
+         octets_.assign(octets + ofs, octets + ofs + len);
+         loc_ = 0;
+         time_ = hdr.ts.tv_sec + hdr.ts.tv_usec * 1e-6 - first_time_;
+         return true;
+      }
+   }
+   return false;
+}
+
+bool
+op25_pcap_source_b::payload(const struct pcap_pkthdr& hdr, const uint8_t *octets, size_t& ofs, size_t& len) const
+{
+   const size_t IP_SZ = 20;
+   const size_t UDP_SZ = 8;
+   const size_t CAPLEN = hdr.caplen;
+   ofs = link_sz_;
+   if(CAPLEN < ofs + IP_SZ) {
+      return false;
+   }
+   if(DLT_EN10MB == link_type_) {
+      uint16_t type = octets[12] << 8 | octets[13];
+      if(0x8100 == type) {
+         // 802.1Q tag
+         ofs += 4;
+         type = octets[16] << 8 | octets[17];
+      }
+      if(0x0800 != type) {
+         return false;
+      }
+   } else if(DLT_LINUX_SLL == link_type_) {
+      if(0x0800 != (octets[14] << 8 | octets[15])) {
+         return false;
+      }
+   } else if(DLT_NULL == link_type_ || DLT_LOOP == link_type_) {
+      // AF_INET in either byte order
+      if(!(2 == octets[0] || 2 == octets[3])) {
+         return false;
+      }
+   }
+   if(CAPLEN < ofs + IP_SZ) {
+      return false;
+   }
+   const uint8_t *ip = octets + ofs;
+   const size_t IHL = (ip[0] & 0xf) * 4;
+   const uint16_t FRAG_OFS = (ip[6] << 8 | ip[7]) & 0x1fff;
+   if(4 != ip[0] >> 4 || 17 != ip[9] || FRAG_OFS || IHL < IP_SZ) {
+      return false;
+   }
+   ofs += IHL;
+   if(CAPLEN < ofs + UDP_SZ) {
+      return false;
+   }
+   const uint8_t *udp = octets + ofs;
+   const int SRC_PORT = udp[0] << 8 | udp[1];
+   const int DST_PORT = udp[2] << 8 | udp[3];
+   const size_t UDP_LEN = udp[4] << 8 | udp[5];
+   if(udp_port_ && SRC_PORT != udp_port_ && DST_PORT != udp_port_) {
+      return false;
+   }
+   ofs += UDP_SZ;
+   len = min(CAPLEN - ofs, UDP_LEN < UDP_SZ ? 0 : UDP_LEN - UDP_SZ);
+   return 0 < len;
+}
+
+void
+op25_pcap_source_b::reset_clock()
+{
+   clock_start_ = now();
+   time_start_ = time_;
+}
+
+double
+op25_pcap_source_b::now()
+{
+   struct timeval tv;
+   gettimeofday(&tv, NULL);
+   return tv.tv_sec + tv.tv_usec * 1e-6;
 }
@@ -2,19 +2,19 @@
 
 /*
  * Copyright 2010-2011 Steve Glass
- * 
+ *
  * This file is part of OP25.
- * 
+ *
  * OP25 is free software; you can redistribute it and/or modify it
  * under the terms of the GNU General Public License as published by
  * the Free Software Foundation; either version 3, or (at your option)
  * any later version.
- * 
+ *
  * OP25 is distributed in the hope that it will be useful, but WITHOUT
  * ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
  * or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
  * License for more details.
- * 
+ *
  * You should have received a copy of the GNU General Public License
  * along with OP25; see the file COPYING.  If not, write to the Free
  * Software Foundation, Inc., 51 Franklin Street, Boston, MA
@@ -25,18 +25,29 @@
 #define INCLUDED_OP25_PCAP_SOURCE_B_H
 
 #include <boost/shared_ptr.hpp>
+#include <boost/thread/mutex.hpp>
 #include <gr_sync_block.h>
 #include <stdint.h>
 #include <string>
+#include <sys/types.h>
 #include <vector>
 
+#define PCAP_DONT_INCLUDE_PCAP_BPF_H
+#include <pcap/pcap.h>
+
 typedef boost::shared_ptr<class op25_pcap_source_b> op25_pcap_source_b_sptr;
 
-op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay);
+op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay, bool repeat = true, float rate = 0.0, int udp_port = 0);
 
 /**
  * op25_pcap_source_b is a GNU Radio block for reading from a
- * tcpdump-formatted capture file and producing a stream of octets.
+ * tcpdump-formatted capture file and producing a stream of octets
+ * from the payloads of the UDP packets it contains.
+ *
+ * The file is read one packet at a time so captures of any size can
+ * be replayed. At the end of the file the block either starts again
+ * from the first packet or, when repeat is false, reports that it is
+ * done.
  */
 class op25_pcap_source_b : public gr_sync_block
 {
@@ -52,6 +63,33 @@ public:
     */
    virtual int work(int nof_output_items, gr_vector_const_void_star& input_items, gr_vector_void_star& output_items);
 
+   /**
+    * Continue from the first packet captured at or after time t.
+    *
+    * \param t Seconds since the first packet of the capture.
+    * \return true if there is such a packet.
+    */
+   bool seek(double t);
+
+   /**
+    * Capture time of the packet now being sent.
+    *
+    * \return Seconds since the first packet of the capture.
+    */
+   double time() const;
+
+   /**
+    * Number of packets that pass the UDP port filter.
+    */
+   size_t nof_packets() const;
+
+   /**
+    * Duration of the capture.
+    *
+    * \return Seconds from the first packet to the last.
+    */
+   double duration() const;
+
 private:
 
    /**
@@ -61,28 +99,128 @@ private:
     *
     * \param path The path to the tcpdump-formatted input file.
     * \param delay The number of seconds to delay before sending the first frame.
+    * \param repeat Start again at the end of the file.
+    * \param rate Send packets at rate times the speed they were captured (0 for no pacing).
+    * \param udp_port Only use UDP packets to or from this port (0 for any).
     */
-   friend op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay);
+   friend op25_pcap_source_b_sptr op25_make_pcap_source_b(const char *path, float delay, bool repeat, float rate, int udp_port);
 
    /**
     * op25_pcap_source_b protected constructor.
     *
     * \param path The path to the tcpdump-formatted input file.
     * \param delay The number of seconds to delay before sending the first frame.
+    * \param repeat Start again at the end of the file.
+    * \param rate Send packets at rate times the speed they were captured (0 for no pacing).
+    * \param udp_port Only use UDP packets to or from this port (0 for any).
+    */
+   op25_pcap_source_b(const char *path, float delay, bool repeat, float rate, int udp_port);
+
+   /**
+    * Build the offset index and find the extent of the capture.
+    */
+   void index();
+
+   /**
+    * Read packets until one passes the filter and copy its payload.
+    *
+    * \return false at the end of the file.
+    */
+   bool next_packet();
+
+   /**
+    * Find the UDP payload of a captured packet.
+    *
+    * \param hdr The pcap header of the packet.
+    * \param octets The captured packet.
+    * \param ofs Set to the offset of the payload.
+    * \param len Set to the length of the payload.
+    * \return true if the packet is a UDP datagram passing the port filter.
+    */
+   bool payload(const struct pcap_pkthdr& hdr, const uint8_t *octets, size_t& ofs, size_t& len) const;
+
+   /**
+    * Restart pacing so that the current packet is due now.
+    */
+   void reset_clock();
+
+   /**
+    * Seconds since the epoch by the wall clock.
     */
-   op25_pcap_source_b(const char *path, float delay);
+   static double now();
 
 private:
 
    /**
-    * The next octet to be read from the input file.
+    * One entry of the offset index.
     */
-   size_t loc_;
+   struct index_entry {
+      off_t offset;
+      double time;
+   };
+
+   /**
+    * Record the offset of every INDEX_INTERVAL'th packet.
+    */
+   static const size_t INDEX_INTERVAL = 256;
+
+   /**
+    * The open capture file.
+    */
+   pcap_t *pcap_;
+
+   /**
+    * The capture's link type and the size of its link layer header.
+    */
+   int link_type_;
+   size_t link_sz_;
+
+   /**
+    * Offsets and times of every INDEX_INTERVAL'th filtered packet.
+    */
+   std::vector<index_entry> index_;
+
+   /**
+    * Number of filtered packets and the times of the first and last.
+    */
+   size_t nof_packets_;
+   double first_time_;
+   double last_time_;
 
    /**
-    * Symbols from the input file.
+    * Options given to the constructor.
+    */
+   float delay_;
+   bool repeat_;
+   float rate_;
+   int udp_port_;
+
+   /**
+    * Payload of the current packet and the next octet to be sent from it.
     */
    std::vector<uint8_t> octets_;
+   size_t loc_;
+
+   /**
+    * Capture time of the current packet.
+    */
+   double time_;
+
+   /**
+    * Wall clock and capture times at which pacing was last restarted.
+    */
+   double clock_start_;
+   double time_start_;
+
+   /**
+    * True at the end of the file in one-shot mode.
+    */
+   bool done_;
+
+   /**
+    * Guards the file position against seek() from another thread.
+    */
+   mutable boost::mutex mutex_;
 
 };
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Steve Glass
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING.  If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+#
+
+import os
+import time
+import struct
+import shutil
+import tempfile
+from gnuradio import gr, gr_unittest
+import op25
+
+CAI_PORT = 23456
+
+def udp_packet(sport, dport, payload, proto=17):
+    """
+    an Ethernet frame carrying an IPv4 datagram (UDP unless proto says
+    otherwise)
+    """
+    udp = struct.pack('>HHHH', sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack('>BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, proto, 0,
+                     '\x0a\x00\x00\x01', '\x0a\x00\x00\x02')
+    eth = '\xff' * 6 + '\x02\x00\x00\x00\x00\x01' + struct.pack('>H', 0x0800)
+    return eth + ip + udp
+
+def write_pcap(filename, packets):
+    """
+    write a tcpdump capture of (time, frame) packets
+    """
+    f = open(filename, 'wb')
+    f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+    for t, frame in packets:
+        sec = int(t)
+        usec = int(round((t - sec) * 1e6))
+        f.write(struct.pack('<IIII', sec, usec, len(frame), len(frame)))
+        f.write(frame)
+    f.close()
+
+class qa_pcap_source(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'cai.pcap')
+
+    def tearDown(self):
+        self.tb = None
+        shutil.rmtree(self.dir)
+
+    def mk_capture(self, npackets, interval):
+        """
+        npackets CAI packets, each holding its number, interleaved with
+        traffic that must be filtered out
+        """
+        packets = []
+        payloads = []
+        t0 = 1300000000.0
+        for i in range(npackets):
+            payload = struct.pack('>H', i) + chr(i & 0xff) * 10
+            payloads.append(payload)
+            packets.append((t0 + i * interval, udp_packet(40000, CAI_PORT, payload)))
+            if i % 3 == 0:
+                packets.append((t0 + i * interval, udp_packet(40000, 9999, 'other')))
+                packets.append((t0 + i * interval, udp_packet(40000, CAI_PORT, 'tcp', proto=6)))
+        write_pcap(self.filename, packets)
+        return payloads
+
+    def run_source(self, src, limit=None):
+        sink = gr.vector_sink_b()
+        if limit is None:
+            self.tb.connect(src, sink)
+        else:
+            self.tb.connect(src, gr.head(gr.sizeof_char, limit), sink)
+        self.tb.run()
+        return ''.join([chr(b) for b in sink.data()])
+
+    def test_001_one_shot(self):
+        payloads = self.mk_capture(50, 0.02)
+        src = op25.pcap_source_b(self.filename, 0.0, False, 0.0, CAI_PORT)
+        self.assertEqual(src.nof_packets(), 50)
+        self.assertAlmostEqual(src.duration(), 49 * 0.02, 4)
+        # the flow graph stops by itself at the end of the file
+        self.assertEqual(self.run_source(src), ''.join(payloads))
+
+    def test_002_any_port(self):
+        self.mk_capture(50, 0.02)
+        src = op25.pcap_source_b(self.filename, 0.0, False, 0.0, 0)
+        self.assertEqual(src.nof_packets(), 50 + 17)
+
+    def test_003_repeat(self):
+        payloads = ''.join(self.mk_capture(20, 0.02))
+        src = op25.pcap_source_b(self.filename, 0.0, True, 0.0, CAI_PORT)
+        self.assertEqual(self.run_source(src, 3 * len(payloads)), payloads * 3)
+
+    def test_004_pacing(self):
+        payloads = ''.join(self.mk_capture(41, 0.025))
+        for rate, lo, hi in ((0.0, 0.0, 0.2), (4.0, 0.24, 0.6), (1.0, 0.98, 1.5)):
+            self.tb = gr.top_block()
+            src = op25.pcap_source_b(self.filename, 0.0, False, rate, CAI_PORT)
+            t0 = time.time()
+            self.assertEqual(self.run_source(src), payloads)
+            elapsed = time.time() - t0
+            self.assertTrue(lo <= elapsed < hi, (rate, elapsed))
+
+    def test_005_seek(self):
+        payloads = self.mk_capture(2000, 0.01)
+        src = op25.pcap_source_b(self.filename, 0.0, False, 0.0, CAI_PORT)
+        self.assertTrue(src.seek(12.345))
+        self.assertAlmostEqual(src.time(), 12.35, 4)
+        self.assertEqual(self.run_source(src), ''.join(payloads[1235:]))
+        self.assertFalse(src.seek(25.0))
+        self.assertTrue(src.seek(0.0))
+        self.assertEqual(src.time(), 0.0)
+
+if __name__ == '__main__':
+    gr_unittest.main ()
@@ -21,34 +21,49 @@
 # Software Foundation, Inc., 51 Franklin Street, Boston, MA
 # 02110-1301, USA.
 
-import cPickle
+import itertools
+import json
 import math
+import multiprocessing
+import numpy
 import os
 import sys
 import threading
+import time
 
-from gnuradio import audio, gr, gru, op25, usrp
+from gnuradio import audio, gr, gru, op25, repeater, usrp
 from gnuradio.eng_option import eng_option
 from math import pi
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'repeater', 'src', 'python'))
+import capture
+import dispatch
+
+import p25calls
+
+QUEUE_LEN = 100		# messages held between the flow graph and the call splitter
+
 # The P25 receiver
 #
 class file_c4fm_rx (gr.top_block):
 
-    # Initialize the P25 receiver
+    # Initialize the P25 receiver.  Throttled, the file plays in real
+    # time, over and over; otherwise it is read once, as fast as the flow
+    # graph goes, and the squelch passes silence rather than dropping
+    # samples, so that times in the output are times in the recording.
     #
-    def __init__(self, filename, offset_freq, squelch):
+    def __init__(self, filename, offset_freq, squelch, throttle=True):
 
         gr.top_block.__init__(self)
 
         # open file and info
-        f = open(filename + ".info", "r")
-        info = cPickle.load(f)
-        capture_rate = info["capture-rate"]
-        f.close()
-        file = gr.file_source(gr.sizeof_gr_complex, filename, True)
-        throttle = gr.throttle(gr.sizeof_gr_complex, capture_rate)
-        self.connect(file, throttle)
+        file = self.open_file(filename, throttle)
+        capture_rate = self.capture_rate
+        if throttle:
+            source = gr.throttle(gr.sizeof_gr_complex, capture_rate)
+            self.connect(file, source)
+        else:
+            source = file
                 
         # setup receiver attributes
         channel_rate = 125000
@@ -56,16 +71,16 @@ class file_c4fm_rx (gr.top_block):
         
         # channel filter
         self.channel_offset = offset_freq
-        channel_decim = capture_rate // channel_rate
+        channel_decim = max(1, capture_rate // channel_rate)
         channel_rate = capture_rate // channel_decim
         trans_width = 12.5e3 / 2;
         trans_centre = trans_width + (trans_width / 2)
         coeffs = gr.firdes.low_pass(1.0, capture_rate, trans_centre, trans_width, gr.firdes.WIN_HANN)
         self.channel_filter = gr.freq_xlating_fir_filter_ccf(channel_decim, coeffs, self.channel_offset, capture_rate)
-        self.connect(throttle, self.channel_filter)
+        self.connect(source, self.channel_filter)
 
         # power squelch
-        power_squelch = gr.pwr_squelch_cc(squelch, 1e-3, 0, True)
+        power_squelch = gr.pwr_squelch_cc(squelch, 1e-3, 0, throttle)
         self.connect(self.channel_filter, power_squelch)
 
         # FM demodulator
@@ -91,8 +106,36 @@ class file_c4fm_rx (gr.top_block):
         levels = [ -2.0, 0.0, 2.0, 4.0 ]
         slicer = op25.fsk4_slicer_fb(levels)
         self.connect(demod_fsk4, slicer)
+        self.connect_decoder(slicer)
 
-        # frame decoder
+    # Open a capture file (see capture.py), or a raw capture with its
+    # .info file.  The start time of a raw capture is guessed from the
+    # time the file was last written, as capture.convert() does.
+    #
+    def open_file(self, filename, repeat):
+        if capture.is_capture(filename):
+            capfile = capture.capture_file(filename)
+            if capfile.sample_type != 'fc32':
+                raise ValueError("cannot play %s samples" % capfile.sample_type)
+            file = gr.file_source(gr.sizeof_gr_complex, filename, False)
+            rc = file.seek(capfile.item_offset(0), gr.SEEK_SET)
+            assert rc == True
+            # the index is never played
+            head = gr.head(gr.sizeof_gr_complex, capfile.nsamples)
+            self.connect(file, head)
+            self.capture_rate = int(capfile.sample_rate)
+            self.nsamples = capfile.nsamples
+            self.start_time = capfile.start_time
+            return head
+        info = capture.read_info(filename + ".info")
+        self.capture_rate = info["capture-rate"]
+        self.nsamples = os.path.getsize(filename) // gr.sizeof_gr_complex
+        self.start_time = os.path.getmtime(filename) - float(self.nsamples) / self.capture_rate
+        return gr.file_source(gr.sizeof_gr_complex, filename, repeat)
+
+    # Decode the symbols to audio
+    #
+    def connect_decoder(self, slicer):
         decoder = op25.decoder_bf()
         self.connect(slicer, decoder)
 
@@ -134,6 +177,121 @@ class demod_watcher(threading.Thread):
             self.callback(frequency_correction)
 
 
+# The P25 receiver for batch decoding: the file is read once, with no
+# throttle or audio device, and each call is written to a WAV file and
+# logged by p25calls.py.  The frame assembler's voice frames, the vocoder
+# audio and the symbols are taken out of the flow graph through message
+# sinks that block when their queues are full.  Their handlers subscribe
+# lossless, so a handler that falls behind holds the dispatcher's readers
+# back until the queues, and then the flow graph, wait for it: nothing is
+# lost however far the decoding runs ahead of real time.
+#
+class batch_c4fm_rx (file_c4fm_rx):
+
+    def __init__(self, filename, offset_freq, squelch, outdir, log):
+        file_c4fm_rx.__init__(self, filename, offset_freq, squelch, False)
+        self.splitter = p25calls.call_splitter(p25calls.call_recorder(outdir, filename, log), self.start_time)
+
+    def connect_decoder(self, slicer):
+        format = repeater.VOCODER_FORMAT_BINARY
+        assembler = repeater.p25_frame_assembler('', 0, 0, True, True, False, gr.msg_queue(2), format)
+        vocoder = repeater.vocoder(0, 0, 0, '', 0, 0, format)
+        self.connect(slicer, assembler, vocoder)
+        self.dispatcher = dispatch.dispatcher()
+        for block, itemsize, event_type, handler in ((assembler, gr.sizeof_char, 'frames', self.frames_in),
+                                                      (vocoder, gr.sizeof_short, 'audio', self.audio_in),
+                                                      (slicer, gr.sizeof_char, 'symbols', self.symbols_in)):
+            msgq = gr.msg_queue(QUEUE_LEN)
+            self.connect(block, gr.message_sink(itemsize, msgq, False))
+            self.dispatcher.add_queue(msgq, event_type)
+            self.dispatcher.subscribe(event_type, handler, depth=QUEUE_LEN, batch=True, lossless=True)
+
+    def frames_in(self, msgs):
+        self.splitter.add_frames(''.join(msgs))
+
+    def audio_in(self, msgs):
+        self.splitter.add_audio(numpy.fromstring(''.join(msgs), dtype=numpy.int16))
+
+    def symbols_in(self, msgs):
+        self.splitter.add_dibits(numpy.fromstring(''.join(msgs), dtype=numpy.uint8))
+
+    # Run the flow graph to the end of the file, with the dispatcher
+    # handing on its messages, then finish the last call
+    #
+    def run(self):
+        self.dispatcher.start()
+        self.start()
+        self.wait()
+        # everything was queued before the flow graph finished
+        self.dispatcher.flush()
+        self.dispatcher.stop()
+        self.dispatcher.join()
+        self.splitter.close()
+
+
+# Decode one recording in batch, for a worker process.
+# argument is (filename, output directory, offset, squelch)
+# returns the list of events: one for each call, then one for the
+# recording with its duration, how long it took to decode and the
+# messages the dispatcher dropped, which should be none
+#
+def decode_recording(args):
+    filename, outdir, offset_freq, squelch = args
+    events = []
+    t0 = time.time()
+    try:
+        rx = batch_c4fm_rx(filename, offset_freq, squelch, outdir, events.append)
+        rx.run()
+    except Exception, e:
+        events.append(dict(event='error', recording=filename, error=str(e)))
+        return events
+    elapsed = time.time() - t0
+    duration = rx.nsamples / float(rx.capture_rate)
+    dropped = sum([h['dropped'] for handlers in rx.dispatcher.stats().values() for h in handlers])
+    events.append(dict(event='recording', recording=filename, start=rx.start_time, duration=duration,
+                       seconds=elapsed, realtime=duration / max(elapsed, 1e-6), calls=rx.splitter.calls,
+                       dropped=dropped))
+    return events
+
+# The recordings named, those in a directory being its capture files and
+# raw captures with an .info file
+#
+def find_recordings(paths):
+    recordings = []
+    for path in paths:
+        if not os.path.isdir(path):
+            recordings.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            filename = os.path.join(path, name)
+            if name.endswith('.info') or not os.path.isfile(filename):
+                continue
+            if os.path.exists(filename + '.info') or capture.is_capture(filename):
+                recordings.append(filename)
+    return recordings
+
+# Decode recordings in jobs worker processes, each call to a WAV file under
+# outdir, writing the events to log as JSON, one object per line, as each
+# recording is finished
+#
+def batch_decode(recordings, outdir, log, jobs=1, offset_freq=0.0, squelch=15.0):
+    work = [(filename, outdir, offset_freq, squelch) for filename in recordings]
+    pool = None
+    if jobs > 1 and len(work) > 1:
+        # a fresh process for each recording, so no flow graph outlives its file
+        pool = multiprocessing.Pool(min(jobs, len(work)), maxtasksperchild=1)
+        results = pool.imap_unordered(decode_recording, work)
+    else:
+        results = itertools.imap(decode_recording, work)
+    for events in results:
+        for event in events:
+            log.write(json.dumps(event, sort_keys=True) + '\n')
+        log.flush()
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
 # Run the receiver
 #
 if '__main__' == __name__:
@@ -143,7 +301,22 @@ if '__main__' == __name__:
     parser.add_option("-i", "--input-file", type="string", default=None, help="path to input file [=%default]")
     parser.add_option("-c", "--calibration", type="eng_float", default=0.0, help="channel frequency offset [=%default]", metavar="Hz")
     parser.add_option("-s", "--squelch", type="eng_float", default=15.0, help="squelch threshold [=%default]", metavar="dB")
+    parser.add_option("-b", "--batch", action="store_true", default=False, help="decode the input file and the recordings or directories of them given as arguments, as fast as possible, to WAV files")
+    parser.add_option("-d", "--output-dir", type="string", default="calls", help="directory for the WAV files of each talkgroup [=%default]")
+    parser.add_option("-l", "--log", type="string", default="-", help="JSON lines event log, - for stdout [=%default]")
+    parser.add_option("-j", "--jobs", type="int", default=multiprocessing.cpu_count(), help="recordings decoded at once [=%default]")
     (options, args) = parser.parse_args()
+    if options.batch:
+        recordings = find_recordings(([options.input_file] if options.input_file else []) + args)
+        if not recordings:
+            parser.print_help()
+            sys.exit(1)
+        log = sys.stdout if options.log == "-" else open(options.log, "a")
+        try:
+            batch_decode(recordings, options.output_dir, log, options.jobs, options.calibration, options.squelch)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
     if len(args) != 0 or options.input_file is None:
         parser.print_help()
         sys.exit(1)
@@ -1,12 +1,18 @@
 #!/usr/bin/env python
+import os
 import sys
 import math
+import numpy
+import threading
 from gnuradio import gr, gru, audio, eng_notation, blks2, optfir, repeater
 from gnuradio.eng_option import eng_option
 from optparse import OptionParser
 # import cqpsk
 from math import pi 
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'repeater', 'src', 'python'))
+import symbol_stream
+
 class my_top_block(gr.top_block):
     def __init__(self):
         gr.top_block.__init__(self)
@@ -16,6 +22,7 @@ class my_top_block(gr.top_block):
         parser.add_option("-g", "--gain", type="eng_float", default=1.0)
         parser.add_option("-L", "--low-pass", type="eng_float", default=15e3, help="low pass cut-off", metavar="Hz")
         parser.add_option("-o", "--output-file", type="string", default="out.dat", help="specify the output file")
+        parser.add_option("-r", "--raw-symbols", type="string", default=None, help="write the sliced symbols to a symbol stream file")
         parser.add_option("-s", "--sample-rate", type="int", default=48000, help="input sample rate")
         parser.add_option("-v", "--verbose", action="store_true", default=False, help="dump demodulation data")
         (options, args) = parser.parse_args()
@@ -59,6 +66,35 @@ class my_top_block(gr.top_block):
 
         self.connect(IN, CVT, AMP, SYMBOL_FILTER, FSK4, SLICER, DECODER, OUT)
 
+        self.symbol_file = None
+        if options.raw_symbols:
+            self.symbol_file = symbol_stream.writer(open(options.raw_symbols, 'wb'), symbol_rate=symbol_rate, modulation='c4fm')
+            self.symbol_msgq = gr.msg_queue(100)
+            self.connect(SLICER, gr.message_sink(gr.sizeof_char, self.symbol_msgq, False))
+
+    def write_symbols(self):
+        """
+        copy the sliced symbols to the symbol stream file until the flow
+        graph is done
+        """
+        def wait():
+            self.wait()
+            self.symbol_msgq.insert_tail(gr.message(1))	# end of file
+        threading.Thread(target=wait).start()
+        while True:
+            msg = self.symbol_msgq.delete_head()
+            if msg.type() == 1:
+                break
+            self.symbol_file.write(numpy.fromstring(msg.to_string(), dtype=numpy.uint8))
+        self.symbol_file.close()
+
+    def run(self):
+        if self.symbol_file is None:
+            gr.top_block.run(self)
+            return
+        self.start()
+        self.write_symbols()
+
 if __name__ == "__main__":
     try:
         my_top_block().run()
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+#
+# p25bulk-bench.py - compare superframe generation by p25craft.py and p25bulk.py
+#
+# Both generators are given the same per-frame link control, low speed data,
+# message indicator and voice fields; their binary output is checked to be
+# identical before the rates are reported.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import sys, time, random, StringIO
+from optparse import OptionParser
+
+import p25craft
+import p25bulk
+
+SUPERFRAME_SECONDS = 0.36
+
+def mk_fields(count, seed):
+	r = random.Random(seed)
+	return dict(
+		imbe = [r.getrandbits(144) for i in range(count)],
+		lsd = [r.getrandbits(32) for i in range(count)],
+		tgid = [r.getrandbits(16) for i in range(count)],
+		src = [r.getrandbits(24) for i in range(count)],
+		mi = [r.getrandbits(72) for i in range(count)])
+
+def craft(count, f):
+	out = StringIO.StringIO()
+	p25craft.quiet = True
+	p25craft.outfile = out
+	for i in range(count):
+		p25craft.construct_ldu1(0x293, 1, f['imbe'][i], f['lsd'][i], 0, 0x90,
+				0x40, 0, f['tgid'][i], 1, f['src'][i])
+		p25craft.construct_ldu2(0x293, 1, f['imbe'][i], f['lsd'][i],
+				f['mi'][i], 0x80, 0x1234)
+	return out.getvalue()
+
+def bulk(count, f):
+	out = StringIO.StringIO()
+	p25bulk.write_superframes(out, count, 0x293, 1, f['imbe'], f['lsd'], 0,
+			0x90, 0x40, 0, f['tgid'], 1, f['src'], f['mi'], 0x80, 0x1234)
+	return out.getvalue()
+
+def rate(fn, count, f):
+	t0 = time.time()
+	data = fn(count, f)
+	return data, count / (time.time() - t0)
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-n", "--superframes", type="int", default=20000,
+		help="superframes generated by p25bulk (Default: 20000)")
+	parser.add_option("-r", "--reference", type="int", default=200,
+		help="superframes generated by p25craft (Default: 200)")
+	(options, args) = parser.parse_args()
+
+	f = mk_fields(options.superframes, 1)
+	ref, ref_rate = rate(craft, options.reference, f)
+	data, bulk_rate = rate(bulk, options.superframes, f)
+	assert data[:len(ref)] == ref
+
+	print 'p25craft %8.0f superframes/s (%.1fx real time)' % (ref_rate, ref_rate * SUPERFRAME_SECONDS)
+	print 'p25bulk  %8.0f superframes/s (%.1fx real time)' % (bulk_rate, bulk_rate * SUPERFRAME_SECONDS)
+	print 'speedup  %8.1fx, output identical over %d superframes' % (bulk_rate / ref_rate, options.reference)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,385 @@
+#!/usr/bin/python
+#
+# p25bulk.py - bulk generation of APCO P25 voice superframes
+#
+# The encoders in p25craft.py work on one codeword at a time and build every
+# packet as a list of dibits, which is fine for a handful of test vectors but
+# far too slow for minutes or hours of test traffic.  This module implements
+# the same error control codes over NumPy arrays, each encoder taking one row
+# per codeword, and uses them to build any number of LDU1/LDU2 pairs at once.
+# The link control, encryption sync, low speed data and voice fields may be
+# given per frame.  Binary output is byte-identical to what construct_ldu1()
+# and construct_ldu2() in p25craft.py write for the same arguments.
+#
+# example:
+# $ python
+# >>> import p25bulk
+# >>> f = open('traffic.bin', 'w')
+# >>> p25bulk.write_superframes(f, 10000, 0x293, 0, 0x6c42e85de2e8269363d981f9be23b18ae004,
+# ...	0, 0, 0, 0, 0, range(10000), 1, 1, 0, 0x80, 0)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import numpy as np
+
+import p25craft
+
+LDU_DIBITS = 864	# including 24 status symbols
+BLOCK = 1024		# superframes generated per write in write_superframes()
+
+
+#####################
+# utility functions #
+#####################
+
+# Split integers into columns of fixed width fields, most significant first.
+# argument is an array of integers
+# returns an array with one more dimension of length count
+def split_fields(data, count, width):
+	data = np.asarray(data, dtype=np.uint64)
+	shifts = np.arange((count - 1) * width, -width, -width, dtype=np.uint64)
+	mask = np.uint64((1 << width) - 1)
+	return ((data[..., np.newaxis] >> shifts) & mask).astype(np.uint8)
+
+def split_dibits(data, count):
+	return split_fields(data, count, 2)
+
+def split_hexbits(data, count):
+	return split_fields(data, count, 6)
+
+# Split bytes into dibits.
+# argument is an array of bytes
+# returns an array with the last dimension four times as long
+def byte_dibits(data):
+	d = (data[..., np.newaxis] >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3
+	return d.reshape(data.shape[:-1] + (data.shape[-1] * 4,))
+
+# Broadcast a scalar or per-frame argument to one value per frame.
+def per_frame(value, count):
+	return np.broadcast_to(np.asarray(value, dtype=np.uint64), (count,))
+
+# Convert large integers (one, or one per frame) to rows of big-endian bytes.
+# Arrays of bytes are passed through.
+# returns an array of shape (count, nbytes) or (count, ..., nbytes)
+def long_bytes(value, count, nbytes):
+	if isinstance(value, np.ndarray) and value.dtype == np.uint8:
+		a = value
+	else:
+		if isinstance(value, (int, long)):
+			value = [value]
+		s = ''.join([('%0*x' % (nbytes * 2, v)).decode('hex') for v in value])
+		a = np.frombuffer(s, dtype=np.uint8).reshape(-1, nbytes)
+		assert a.shape[0] in (1, count)
+	if a.ndim == 1:
+		a = a[np.newaxis]
+	return np.broadcast_to(a, (count,) + a.shape[1:])
+
+# Split large integers (one, or one per frame) into two words of at most 64
+# bits each, the low word holding low_bits bits.
+def long_words(value, count, low_bits):
+	if isinstance(value, (int, long)):
+		value = [value]
+	mask = (1 << low_bits) - 1
+	hi = np.array([v >> low_bits for v in value], dtype=np.uint64)
+	lo = np.array([v & mask for v in value], dtype=np.uint64)
+	return np.broadcast_to(hi, (count,)), np.broadcast_to(lo, (count,))
+
+# Insert status symbols, one after every 35 dibits.
+# arguments are an array of shape (count, 35 * n) and one status symbol
+# (or one per frame)
+# returns an array of shape (count, 36 * n)
+def insert_status(data, ss):
+	count = data.shape[0]
+	out = np.empty((count, data.shape[1] / 35, 36), dtype=np.uint8)
+	out[:, :, :35] = data.reshape(count, -1, 35)
+	out[:, :, 35] = per_frame(ss, count)[:, np.newaxis]
+	return out.reshape(count, -1)
+
+# Pack dibits four to a byte as print_spec() does for binary output.
+# argument is an array of dibits
+# returns a string
+def pack_dibits(data, flip=0):
+	d = np.asarray(data, dtype=np.uint8).reshape(-1, 4)
+	b = (d[:, 0] << 6) | (d[:, 1] << 4) | (d[:, 2] << 2) | d[:, 3]
+	return (b ^ (flip & 0xff)).astype(np.uint8).tostring()
+
+
+########################
+# error control coding #
+########################
+
+# GF(2^6) multiplication table built from the antilog and log tables
+def mk_gf6_mult_table():
+	exp = np.array(p25craft.gf6_exp, dtype=np.uint8)
+	log = np.array(p25craft.gf6_log, dtype=np.int32)
+	table = exp[log[:, np.newaxis] + log[np.newaxis, :]]
+	table[0, :] = 0
+	table[:, 0] = 0
+	return table
+
+gf6_mult_table = mk_gf6_mult_table()
+
+# Reed-Solomon encoding tables: for data hexbit position j and value v,
+# the contribution v * G[j] to every codeword hexbit.
+# argument is a generator matrix from p25craft.py
+# returns an array of shape (k, 64, n)
+def mk_rs_table(matrix):
+	g = np.array(matrix, dtype=np.uint8)
+	return gf6_mult_table[:, g].transpose(1, 0, 2).copy()
+
+rs_36_20_17_table = mk_rs_table(p25craft.rs_36_20_17_matrix)
+rs_24_12_13_table = mk_rs_table(p25craft.rs_24_12_13_matrix)
+rs_24_16_9_table = mk_rs_table(p25craft.rs_24_16_9_matrix)
+
+# argument is an array of shape (count, k) of hexbits
+# returns an array of shape (count, n) of hexbits
+def rs_encode_array(data, table):
+	k = table.shape[0]
+	assert data.shape[-1] == k
+	terms = table[np.arange(k), data]
+	return np.bitwise_xor.reduce(terms, axis=-2)
+
+def rs_36_20_17_encode_array(data):
+	return rs_encode_array(data, rs_36_20_17_table)
+
+def rs_24_12_13_encode_array(data):
+	return rs_encode_array(data, rs_24_12_13_table)
+
+def rs_24_16_9_encode_array(data):
+	return rs_encode_array(data, rs_24_16_9_table)
+
+# Codewords of all 2**bits inputs of a binary linear code.
+# arguments are the generator rows (as integers, most significant data bit
+# first) and the number of data bits
+# returns an array of 2**bits codewords
+def mk_linear_table(matrix, bits):
+	data = np.arange(1 << bits)
+	table = np.zeros(1 << bits, dtype=np.uint64)
+	for i in range(bits):
+		row = np.uint64(matrix[i])
+		table[(data >> (bits - 1 - i)) & 1 == 1] ^= row
+	return table
+
+bch_64_16_23_table_hi = mk_linear_table(p25craft.bch_64_16_23_matrix[:8], 8)
+bch_64_16_23_table_lo = mk_linear_table(p25craft.bch_64_16_23_matrix[8:], 8)
+golay_24_12_8_table = mk_linear_table(p25craft.golay_24_12_8_matrix, 12)
+cyclic_16_8_5_table = mk_linear_table(p25craft.cyclic_16_8_5_matrix, 8)
+hamming_10_6_3_table = mk_linear_table(p25craft.hamming_10_6_3_matrix, 6)
+hamming_15_11_3_table = mk_linear_table(p25craft.hamming_15_11_3_matrix, 11)
+
+# The encoders below take and return arrays of integers, one per codeword.
+def bch_64_16_23_encode_array(data):
+	data = np.asarray(data)
+	return bch_64_16_23_table_hi[data >> 8] ^ bch_64_16_23_table_lo[data & 0xff]
+
+def golay_24_12_8_encode_array(data):
+	return golay_24_12_8_table[data]
+
+def golay_23_12_8_encode_array(data):
+	return golay_24_12_8_table[data] >> np.uint64(1)
+
+def golay_18_6_8_encode_array(data):
+	return golay_24_12_8_table[data]
+
+def cyclic_16_8_5_encode_array(data):
+	return cyclic_16_8_5_table[data]
+
+def hamming_10_6_3_encode_array(data):
+	return hamming_10_6_3_table[data]
+
+def hamming_15_11_3_encode_array(data):
+	return hamming_15_11_3_table[data]
+
+# sequence of golay encodings for HDU
+# argument is an array of shape (count, 36) of hexbits
+# returns an array of shape (count, 324) of dibits
+def header_golay_array(rs_codeword):
+	cw = golay_18_6_8_encode_array(rs_codeword)
+	return split_dibits(cw, 9).reshape(rs_codeword.shape[0], 324)
+
+# sequence of hamming encodings for LDU1 and LDU2
+# argument is an array of shape (count, 24) of hexbits
+# returns an array of shape (count, 120) of dibits
+def ldu_hamming_array(rs_codeword):
+	cw = hamming_10_6_3_encode_array(rs_codeword)
+	return split_dibits(cw, 5).reshape(rs_codeword.shape[0], 120)
+
+# sequence of golay encodings for xTDU
+# argument is an array of shape (count, 24) of hexbits
+# returns an array of shape (count, 144) of dibits
+def xtdu_golay_array(rs_codeword):
+	data = (rs_codeword[:, 0::2].astype(np.int32) << 6) | rs_codeword[:, 1::2]
+	cw = golay_24_12_8_encode_array(data)
+	return split_dibits(cw, 12).reshape(rs_codeword.shape[0], 144)
+
+# interleave sequences of 98 symbols (for trellis encoded data)
+data_interleave_index = np.array(p25craft.data_interleave(range(98)))
+
+def data_interleave_array(data):
+	return data[..., data_interleave_index]
+
+# state transition tables, including constellation to dibit pair mapping
+trellis_1_2_table = np.array([
+	[p25craft.trellis_1_2_encode([s, i])[2:4] for i in range(4)]
+	for s in range(4)], dtype=np.uint8)
+trellis_3_4_table = np.array([
+	[p25craft.trellis_3_4_encode([s, i])[2:4] for i in range(8)]
+	for s in range(8)], dtype=np.uint8)
+
+# Trellis encode rows of symbols.  The state is the previous input symbol,
+# so every output pair can be looked up at once.
+# argument is an array of shape (count, n) of dibits or tribits
+# returns an array of shape (count, 2 * n + 2) of dibits
+def trellis_encode_array(data, table):
+	data = np.asarray(data, dtype=np.uint8)
+	count = data.shape[0]
+	state = np.zeros((count, data.shape[1] + 1), dtype=np.uint8)
+	state[:, 1:] = data
+	input = np.zeros_like(state)
+	input[:, :-1] = data
+	return table[state, input].reshape(count, -1)
+
+def trellis_1_2_encode_array(data):
+	return trellis_encode_array(data, trellis_1_2_table)
+
+def trellis_3_4_encode_array(data):
+	return trellis_encode_array(data, trellis_3_4_table)
+
+
+##############################
+# construct complete packets #
+##############################
+
+frame_sync = np.array(p25craft.split_dibits(0x5575f5ff77ff, 24), dtype=np.uint8)
+
+# frame sync and NID for each frame
+# returns an array of shape (count, 56) of dibits
+def start_packets(count, nac, duid):
+	nac = per_frame(nac, count)
+	assert (nac <= 0xfff).all()
+	symbols = np.empty((count, 56), dtype=np.uint8)
+	symbols[:, :24] = frame_sync
+	nid = bch_64_16_23_encode_array((nac << np.uint64(4)) | np.uint64(duid))
+	symbols[:, 24:] = split_dibits(nid, 32)
+	return symbols
+
+# voice codewords, one (or one per frame, or nine per frame) 144 bit integer
+# or an array of 18 byte rows
+# returns an array of shape (count, 9, 72) of dibits
+def imbe_dibits(imbe, count):
+	a = long_bytes(imbe, count, 18)
+	if a.ndim == 2:
+		a = a[:, np.newaxis, :]
+	return np.array(byte_dibits(np.broadcast_to(a, (count, 9, 18))))
+
+# Assemble the data dibits of an LDU, flipping the sync bit of alternate
+# voice codewords as construct_ldu1() and construct_ldu2() do.
+def ldu_symbols(start, imbe, word_syms, lsd_syms, flipped):
+	count = start.shape[0]
+	imbe[:, flipped::2, 71] ^= 2
+	symbols = np.empty((count, 840), dtype=np.uint8)
+	symbols[:, :56] = start
+	pos = 56
+	for i in range(9):
+		symbols[:, pos:pos + 72] = imbe[:, i]
+		pos += 72
+		if 1 <= i <= 6:
+			symbols[:, pos:pos + 20] = word_syms[:, (i - 1) * 20:i * 20]
+			pos += 20
+		elif i == 7:
+			symbols[:, pos:pos + 16] = lsd_syms
+			pos += 16
+	return symbols
+
+# Logical Link Data Unit 1, for count frames
+# arguments are as for p25craft.construct_ldu1(), each either a single value
+# or a sequence of one value per frame
+# returns an array of shape (count, 864) of dibits
+def construct_ldu1_array(count, nac, ss, imbe, lsd, lco, mfid, svcopt, s, tgid, dst, src):
+	lsd = per_frame(lsd, count)
+	lco = per_frame(lco, count)
+	assert ((lco == 0) | (lco == 3)).all()
+
+	# Link Control Word
+	hi = (lco << np.uint64(16)) | (per_frame(mfid, count) << np.uint64(8)) | per_frame(svcopt, count)
+	lo = np.where(lco == 0,
+		(per_frame(s, count) << np.uint64(32)) | (per_frame(tgid, count) << np.uint64(24)),
+		per_frame(dst, count) << np.uint64(24))
+	lo |= per_frame(src, count)
+	lc = np.concatenate((split_hexbits(hi, 4), split_hexbits(lo, 8)), axis=1)
+	lcw_syms = ldu_hamming_array(rs_24_12_13_encode_array(lc))
+
+	# Low Speed Data
+	lsd_cw = (cyclic_16_8_5_encode_array((lsd >> np.uint64(24)) & np.uint64(0xff)) << np.uint64(16)) | \
+		cyclic_16_8_5_encode_array((lsd >> np.uint64(16)) & np.uint64(0xff))
+	lsd_syms = split_dibits(lsd_cw, 16)
+
+	symbols = ldu_symbols(start_packets(count, nac, 0x5), imbe_dibits(imbe, count), lcw_syms, lsd_syms, 1)
+	return insert_status(symbols, ss)
+
+# Logical Link Data Unit 2, for count frames
+# arguments are as for p25craft.construct_ldu2(), each either a single value
+# or a sequence of one value per frame
+# returns an array of shape (count, 864) of dibits
+def construct_ldu2_array(count, nac, ss, imbe, lsd, mi, algid, kid):
+	lsd = per_frame(lsd, count)
+
+	# Encryption Sync Word
+	mi_hi, mi_lo = long_words(mi, count, 24)
+	lo = (mi_lo << np.uint64(24)) | (per_frame(algid, count) << np.uint64(16)) | per_frame(kid, count)
+	es = np.concatenate((split_hexbits(mi_hi, 8), split_hexbits(lo, 8)), axis=1)
+	es_syms = ldu_hamming_array(rs_24_16_9_encode_array(es))
+
+	# Low Speed Data
+	lsd_cw = (cyclic_16_8_5_encode_array((lsd >> np.uint64(8)) & np.uint64(0xff)) << np.uint64(16)) | \
+		cyclic_16_8_5_encode_array(lsd & np.uint64(0xff))
+	lsd_syms = split_dibits(lsd_cw, 16)
+
+	symbols = ldu_symbols(start_packets(count, nac, 0xa), imbe_dibits(imbe, count), es_syms, lsd_syms, 0)
+	return insert_status(symbols, ss)
+
+# count superframes, each an LDU1 followed by an LDU2
+# imbe2 gives the LDU2 voice codewords if they differ from those of the LDU1
+# returns an array of shape (count, 2 * 864) of dibits
+def construct_superframes_array(count, nac, ss, imbe, lsd, lco, mfid, svcopt, s,
+		tgid, dst, src, mi, algid, kid, imbe2=None):
+	if imbe2 is None:
+		imbe2 = imbe
+	symbols = np.empty((count, 2, LDU_DIBITS), dtype=np.uint8)
+	symbols[:, 0] = construct_ldu1_array(count, nac, ss, imbe, lsd, lco,
+			mfid, svcopt, s, tgid, dst, src)
+	symbols[:, 1] = construct_ldu2_array(count, nac, ss, imbe2, lsd, mi, algid, kid)
+	return symbols.reshape(count, -1)
+
+# Write count superframes in the binary format of p25craft.py, BLOCK
+# superframes at a time.  Per-frame arguments must have count entries.
+def write_superframes(f, count, nac, ss, imbe, lsd, lco, mfid, svcopt, s,
+		tgid, dst, src, mi, algid, kid, imbe2=None, flip=0):
+	args = (nac, ss, imbe, lsd, lco, mfid, svcopt, s, tgid, dst, src, mi, algid, kid, imbe2)
+	for i in range(0, count, BLOCK):
+		n = min(BLOCK, count - i)
+		block = [block_arg(a, i, n) for a in args]
+		f.write(pack_dibits(construct_superframes_array(n, *block[:-1], imbe2=block[-1]), flip))
+
+# the part of a per-frame argument covering frames i to i + n
+def block_arg(value, i, n):
+	if value is None or isinstance(value, (int, long, np.integer)):
+		return value
+	if isinstance(value, np.ndarray) and value.dtype == np.uint8 and value.ndim == 1:
+		return value
+	if len(value) == 1:
+		return value
+	return value[i:i + n]
@@ -0,0 +1,279 @@
+#!/usr/bin/python
+#
+# p25calls.py - split decoded voice into calls for the batch decoder
+#
+# file_c4fm_rx_nogui.py --batch taps three streams out of its flow graph:
+# the binary voice codeword frames of p25_frame_assembler (read with
+# repeater/src/python/vocoder_frames.py), the audio the vocoder makes of them,
+# and the sliced dibits.  This module puts them back together.  The frames
+# carry the call start and end flags and a timestamp in 8 kHz ticks,
+# counted from the first symbol; every voice frame becomes FRAME_SAMPLES
+# samples of audio, in order, so a call's audio is the next run of
+# samples.  The dibits are searched for LDU1s, whose link control gives
+# the talkgroup and source of the call around them.
+#
+# Everything here works on NumPy arrays, a block of input at a time; the
+# flow graph is in file_c4fm_rx_nogui.py.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import os
+import sys
+import time
+import wave
+import collections
+import numpy as np
+
+import p25bulk
+import p25fec
+import p25sim
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'repeater', 'src', 'python'))
+from vocoder_frames import FRAME_SAMPLES, VOICE, START, END, frame_reader
+
+AUDIO_RATE = 8000
+TICKS_PER_SYMBOL = 5 / 3.0	# 8 kHz ticks per symbol, as the frame assembler counts
+HANG_TIME = 2.0			# seconds without voice that end a call missing its terminator
+NID_ERRORS = 8			# most NID bits in error for an LDU1 to be taken
+LDU1_DUID = 0x5
+
+##################
+# link control   #
+##################
+
+# index of the link control dibits in an LDU1 without its status symbols,
+# as laid out by p25bulk.ldu_symbols()
+ldu1_lc_index = np.concatenate([np.arange(20) + 56 + 72 * (k + 2) + 20 * k for k in range(6)])
+
+# Decode the NID and link control of frames that start with frame sync.
+# argument is an array of shape (count, 864) of dibits
+# returns a list of (row, nac, lco, tgid, src) for the LDU1s whose link
+# control could be decoded, tgid None unless it is a group voice call
+def decode_ldu1(frames):
+	nid = frames[:, p25sim.NID_DIBITS].astype(np.uint64)
+	value = np.zeros(len(frames), dtype=np.uint64)
+	for i in range(32):
+		value = (value << np.uint64(2)) | nid[:, i]
+	data = value >> np.uint64(48)
+	diff = (p25bulk.bch_64_16_23_encode_array(data) ^ value).view(np.uint8)
+	errors = np.unpackbits(diff).reshape(len(frames), 64).sum(axis=1)
+	rows = np.flatnonzero(((data & np.uint64(0xf)) == LDU1_DUID) & (errors <= NID_ERRORS))
+	if not len(rows):
+		return []
+	body = frames[rows].reshape(len(rows), 24, 36)[:, :, :35].reshape(len(rows), 840)
+	d = body[:, ldu1_lc_index].reshape(len(rows), 24, 5).astype(np.int64)
+	words = (d[:, :, 0] << 8) | (d[:, :, 1] << 6) | (d[:, :, 2] << 4) | (d[:, :, 3] << 2) | d[:, :, 4]
+	hexbits, nerrors = p25fec.ldu1_lc_decode_array(words)
+	found = []
+	for row, h, e, nac in zip(rows, hexbits, nerrors, data[rows] >> np.uint64(4)):
+		if e < 0:
+			continue
+		lc = 0
+		for x in h:
+			lc = (lc << 6) | int(x)
+		lco = (lc >> 64) & 0xff
+		tgid = (lc >> 24) & 0xffff if lco == 0 else None
+		found.append((int(row), int(nac), int(lco), tgid, int(lc & 0xffffff)))
+	return found
+
+# Find the LDU1s in a dibit stream, a block at a time.  The last frame's
+# worth of dibits is held over, so a frame across two blocks is found.
+class ldu1_scanner(object):
+	def __init__(self):
+		self.tail = np.zeros(0, dtype=np.uint8)
+		self.start = 0		# symbol index of tail[0]
+		self.found = []		# (symbol index, nac, lco, tgid, src)
+
+	# argument is an array of dibits
+	# returns the number of LDU1s found in it
+	def add(self, dibits):
+		buf = np.concatenate((self.tail, np.asarray(dibits, dtype=np.uint8)))
+		limit = len(buf) - (p25sim.FRAME_DIBITS - 1)
+		n = 0
+		if limit > 0:
+			pos = p25sim.sync_positions(buf[:limit + p25sim.SYNC_DIBITS - 1])
+			if len(pos):
+				frames = buf[pos[:, np.newaxis] + np.arange(p25sim.FRAME_DIBITS)]
+				for row, nac, lco, tgid, src in decode_ldu1(frames):
+					self.found.append((self.start + int(pos[row]), nac, lco, tgid, src))
+					n += 1
+			self.tail = buf[limit:]
+			self.start += limit
+		else:
+			self.tail = buf
+		return n
+
+	# the symbol index up to which the stream has been searched
+	def searched(self):
+		return self.start
+
+
+##################
+# calls          #
+##################
+
+# Split the frame assembler's output into calls and hand each finished call to done(),
+# as a dict:
+#
+#	start, end	seconds since the epoch (from start_time)
+#	offset		seconds into the recording
+#	duration	seconds of audio
+#	frames		voice codewords
+#	nac, tgid, src	from the link control seen most during the call, or None
+#	audio		int16 samples at AUDIO_RATE
+#
+# A call is finished by its terminator, by the next call starting, or by
+# HANG_TIME without voice; done() is called once its audio has come out
+# of the vocoder and the dibits have been searched past its end.
+class call_splitter(object):
+	def __init__(self, done, start_time=0.0, hang_time=HANG_TIME):
+		self.done = done
+		self.start_time = start_time
+		self.hang_ticks = hang_time * AUDIO_RATE
+		self.scanner = ldu1_scanner()
+		self.reader = frame_reader()
+		self.call = None		# the call in progress
+		self.finished = collections.deque()
+		self.audio = []			# sample arrays not yet given to a call
+		self.naudio = 0
+		self.last_timestamp = None
+		self.wraps = 0
+		self.calls = 0
+
+	# argument is a string of the frame assembler's binary output, which
+	# need not end on a frame boundary
+	def add_frames(self, data):
+		for u, seq, timestamp, flags in self.reader.feed(data):
+			# the timestamp is 32 bits, wrapping after six days
+			if self.last_timestamp is not None and timestamp < self.last_timestamp - (1 << 31):
+				self.wraps += 1
+			self.last_timestamp = timestamp
+			t = int(timestamp) + (self.wraps << 32)
+			if self.call is not None and (flags & START or t - self.call['last'] > self.hang_ticks):
+				self.finish()
+			if flags & VOICE:
+				if self.call is None:
+					self.call = dict(first=t, last=t, frames=0)
+				self.call['last'] = t
+				self.call['frames'] += 1
+			if flags & END and self.call is not None:
+				self.call['last'] = t
+				self.finish()
+		self.deliver()
+
+	def add_audio(self, samples):
+		samples = np.asarray(samples, dtype=np.int16)
+		self.audio.append(samples)
+		self.naudio += len(samples)
+		self.deliver()
+
+	def add_dibits(self, dibits):
+		self.scanner.add(dibits)
+		self.deliver()
+
+	def finish(self):
+		self.finished.append(self.call)
+		self.call = None
+
+	# the end of the input: the call in progress is finished, and what
+	# audio there is goes out with the calls
+	def close(self):
+		if self.call is not None:
+			self.finish()
+		self.deliver(True)
+
+	def deliver(self, closing=False):
+		while self.finished:
+			call = self.finished[0]
+			nsamples = call['frames'] * FRAME_SAMPLES
+			if not closing and (self.naudio < nsamples or
+					self.scanner.searched() * TICKS_PER_SYMBOL < call['last'] + FRAME_SAMPLES):
+				return
+			self.finished.popleft()
+			self.done(self.make_call(call, self.take_audio(nsamples)))
+
+	def take_audio(self, n):
+		audio = np.concatenate(self.audio) if self.audio else np.zeros(0, dtype=np.int16)
+		self.audio = [audio[n:]]
+		self.naudio = len(audio) - min(n, len(audio))
+		return audio[:n]
+
+	# the link control of the LDU1s from a frame before the call's first
+	# codeword to its last
+	def link_control(self, call):
+		first = call['first'] / TICKS_PER_SYMBOL - 2 * p25sim.FRAME_DIBITS
+		last = call['last'] / TICKS_PER_SYMBOL
+		found = self.scanner.found
+		while found and found[0][0] < first:
+			found.pop(0)
+		votes = collections.Counter([lc[1:] for lc in found if lc[0] <= last])
+		if not votes:
+			return None, None, None
+		nac, lco, tgid, src = votes.most_common(1)[0][0]
+		return nac, tgid, src
+
+	def make_call(self, call, audio):
+		nac, tgid, src = self.link_control(call)
+		offset = call['first'] / float(AUDIO_RATE)
+		duration = len(audio) / float(AUDIO_RATE)
+		self.calls += 1
+		return dict(start=self.start_time + offset, end=self.start_time + offset + duration,
+			offset=offset, duration=duration, frames=call['frames'],
+			nac=nac, tgid=tgid, src=src, audio=audio)
+
+
+##################
+# output         #
+##################
+
+# write int16 samples to a mono WAV file
+def write_wav(filename, samples, rate=AUDIO_RATE):
+	w = wave.open(filename, 'wb')
+	w.setnchannels(1)
+	w.setsampwidth(2)
+	w.setframerate(rate)
+	w.writeframes(np.asarray(samples, dtype='<i2').tostring())
+	w.close()
+
+# where a call's audio goes: a directory for each talkgroup, and a file
+# named by the call's start time (UTC) and the recording it came from
+def call_filename(outdir, call, recording):
+	tg = 'tg%d' % call['tgid'] if call['tgid'] is not None else 'tg-unknown'
+	t = time.strftime('%Y%m%d-%H%M%S', time.gmtime(call['start'])) + ('%.3f' % (call['start'] % 1))[1:]
+	name = os.path.splitext(os.path.basename(recording))[0]
+	return os.path.join(outdir, tg, '%s-%s.wav' % (t, name))
+
+# Write each call from a call_splitter to its WAV file and report it as an
+# event to log(), a dict without the audio.
+class call_recorder(object):
+	def __init__(self, outdir, recording, log):
+		self.outdir = outdir
+		self.recording = recording
+		self.log = log
+
+	def __call__(self, call):
+		filename = call_filename(self.outdir, call, self.recording)
+		dirname = os.path.dirname(filename)
+		if not os.path.isdir(dirname):
+			try:
+				os.makedirs(dirname)
+			except OSError:
+				if not os.path.isdir(dirname):	# made by another worker
+					raise
+		write_wav(filename, call['audio'])
+		event = dict((k, v) for k, v in call.items() if k != 'audio')
+		event.update(event='call', recording=self.recording, wav=filename)
+		self.log(event)
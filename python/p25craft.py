@@ -152,139 +152,154 @@ def insert_status(data, ssyms):
 # error control coding #
 ########################
 
+bch_64_16_23_matrix = (
+	0x8000cd930bdd3b2a, 0x4000ab5a8e33a6be,
+	0x2000983e4cc4e874, 0x10004c1f2662743a,
+	0x0800eb9c98ec0136, 0x0400b85d47ab3bb0,
+	0x02005c2ea3d59dd8, 0x01002e1751eaceec,
+	0x0080170ba8f56776, 0x0040c616dfa78890,
+	0x0020630b6fd3c448, 0x00103185b7e9e224,
+	0x000818c2dbf4f112, 0x0004c1f2662743a2,
+	0x0002ad6a38ce9afb, 0x00019b2617ba7657)
+
 # (64,16,23) BCH encoder
 # spec sometimes refers to this as (63,16,23) plus a parity bit
 # argument is an integer
 # returns an integer
 def bch_64_16_23_encode(data):
-	matrix = (
-		0x8000cd930bdd3b2a, 0x4000ab5a8e33a6be,
-		0x2000983e4cc4e874, 0x10004c1f2662743a,
-		0x0800eb9c98ec0136, 0x0400b85d47ab3bb0,
-		0x02005c2ea3d59dd8, 0x01002e1751eaceec,
-		0x0080170ba8f56776, 0x0040c616dfa78890,
-		0x0020630b6fd3c448, 0x00103185b7e9e224,
-		0x000818c2dbf4f112, 0x0004c1f2662743a2,
-		0x0002ad6a38ce9afb, 0x00019b2617ba7657)
 	assert data < 2**16
 	codeword = 0
 	for i in range(16):
 		if data & (0x8000 >> i):
-			codeword ^= matrix[i]
+			codeword ^= bch_64_16_23_matrix[i]
 	return codeword
 
+# GF(2^6) antilog and log tables (for Reed-Solomon encoder)
+# gf6_exp is doubled in length so that log sums need no reduction
+def mk_gf6_tables():
+	exp = [0] * 126
+	log = [0] * 64
+	a = 1
+	for i in range(63):
+		exp[i] = exp[i + 63] = a
+		log[a] = i
+		a <<= 1
+		if a & 0x40:
+			a ^= 0x43 # primitive polynomial: x^6 + x + 1
+	return exp, log
+
+gf6_exp, gf6_log = mk_gf6_tables()
+
 # GF(2^6) multiply (for Reed-Solomon encoder)
 def gf6mult(a, b):
 	assert a < 2**6
 	assert b < 2**6
-	p = 0
-	for i in range(6):
-		if b & 1:
-			p ^= a
-		a <<= 1
-		if a & 0x40:
-			a ^= 0x43 # primitive polynomial: x^6 + x + 1
-		b >>= 1
-	return p
+	if a == 0 or b == 0:
+		return 0
+	return gf6_exp[gf6_log[a] + gf6_log[b]]
+
+rs_36_20_17_matrix = (
+	(1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,074,037,034,006,002,007,044,064,026,014,026,044,054,013,077,005),
+	(0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,004,017,050,024,011,005,030,057,033,003,002,002,015,016,025,026),
+	(0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,007,023,037,046,056,075,043,045,055,021,050,031,045,027,071,062),
+	(0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,026,005,007,063,063,027,063,040,006,004,040,045,047,030,075,007),
+	(0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,023,073,073,041,072,034,021,051,067,016,031,074,011,021,012,021),
+	(0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,024,051,025,023,022,041,074,066,074,065,070,036,067,045,064,001),
+	(0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,052,033,014,002,020,006,014,025,052,023,035,074,075,075,043,027),
+	(0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,055,062,056,025,073,060,015,030,013,017,020,002,070,055,014,047),
+	(0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,054,051,032,065,077,012,054,013,035,032,056,012,075,001,072,063),
+	(0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,074,041,030,041,043,022,051,006,064,033,003,047,027,012,055,047),
+	(0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,054,070,011,003,013,022,016,057,003,045,072,031,030,056,035,022),
+	(0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,051,007,072,030,065,054,006,021,036,063,050,061,064,052,001,060),
+	(0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,001,065,032,070,013,044,073,024,012,052,021,055,012,035,014,072),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,011,070,005,010,065,024,015,077,022,024,024,074,007,044,007,046),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,006,002,065,011,041,020,045,042,046,054,035,012,040,064,065,033),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,034,031,001,015,044,064,016,024,052,016,006,062,020,013,055,057),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,063,043,025,044,077,063,017,017,064,014,040,074,031,072,054,006),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,071,021,070,044,056,004,030,074,004,023,071,070,063,045,056,043),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,002,001,053,074,002,014,052,074,012,057,024,063,015,042,052,033),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,034,035,002,023,021,027,022,033,064,042,005,073,051,046,073,060))
 
 # (36,20,17) shortened Reed-Solomon encoder
 # argument is an integer
 # returns an integer
 def rs_36_20_17_encode(data):
-	matrix = (
-		(1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,074,037,034,006,002,007,044,064,026,014,026,044,054,013,077,005),
-		(0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,004,017,050,024,011,005,030,057,033,003,002,002,015,016,025,026),
-		(0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,007,023,037,046,056,075,043,045,055,021,050,031,045,027,071,062),
-		(0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,026,005,007,063,063,027,063,040,006,004,040,045,047,030,075,007),
-		(0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,023,073,073,041,072,034,021,051,067,016,031,074,011,021,012,021),
-		(0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,024,051,025,023,022,041,074,066,074,065,070,036,067,045,064,001),
-		(0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,052,033,014,002,020,006,014,025,052,023,035,074,075,075,043,027),
-		(0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,055,062,056,025,073,060,015,030,013,017,020,002,070,055,014,047),
-		(0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,054,051,032,065,077,012,054,013,035,032,056,012,075,001,072,063),
-		(0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,074,041,030,041,043,022,051,006,064,033,003,047,027,012,055,047),
-		(0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,054,070,011,003,013,022,016,057,003,045,072,031,030,056,035,022),
-		(0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,051,007,072,030,065,054,006,021,036,063,050,061,064,052,001,060),
-		(0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,001,065,032,070,013,044,073,024,012,052,021,055,012,035,014,072),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,011,070,005,010,065,024,015,077,022,024,024,074,007,044,007,046),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,006,002,065,011,041,020,045,042,046,054,035,012,040,064,065,033),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,034,031,001,015,044,064,016,024,052,016,006,062,020,013,055,057),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,063,043,025,044,077,063,017,017,064,014,040,074,031,072,054,006),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,071,021,070,044,056,004,030,074,004,023,071,070,063,045,056,043),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,002,001,053,074,002,014,052,074,012,057,024,063,015,042,052,033),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,034,035,002,023,021,027,022,033,064,042,005,073,051,046,073,060))
 	assert data < 2**120
 	codeword = [0,] * 36
 	for i in range(36):
 		for j in range(20):
 			hexbit = (data >> ((19 - j) * 6)) & 0x3f
-			codeword[i] ^= gf6mult(hexbit, matrix[j][i])
+			codeword[i] ^= gf6mult(hexbit, rs_36_20_17_matrix[j][i])
 	return codeword
 
+rs_24_12_13_matrix = (
+	(1,0,0,0,0,0,0,0,0,0,0,0,062,044,003,025,014,016,027,003,053,004,036,047),
+	(0,1,0,0,0,0,0,0,0,0,0,0,011,012,011,011,016,064,067,055,001,076,026,073),
+	(0,0,1,0,0,0,0,0,0,0,0,0,003,001,005,075,014,006,020,044,066,006,070,066),
+	(0,0,0,1,0,0,0,0,0,0,0,0,021,070,027,045,016,067,023,064,073,033,044,021),
+	(0,0,0,0,1,0,0,0,0,0,0,0,030,022,003,075,015,015,033,015,051,003,053,050),
+	(0,0,0,0,0,1,0,0,0,0,0,0,001,041,027,056,076,064,021,053,004,025,001,012),
+	(0,0,0,0,0,0,1,0,0,0,0,0,061,076,021,055,076,001,063,035,030,013,064,070),
+	(0,0,0,0,0,0,0,1,0,0,0,0,024,022,071,056,021,035,073,042,057,074,043,076),
+	(0,0,0,0,0,0,0,0,1,0,0,0,072,042,005,020,043,047,033,056,001,016,013,076),
+	(0,0,0,0,0,0,0,0,0,1,0,0,072,014,065,054,035,025,041,016,015,040,071,026),
+	(0,0,0,0,0,0,0,0,0,0,1,0,073,065,036,061,042,022,017,004,044,020,025,005),
+	(0,0,0,0,0,0,0,0,0,0,0,1,071,005,055,003,071,034,060,011,074,002,041,050))
+
 # (24,12,13) shortened Reed-Solomon encoder
 # argument is an integer
 # returns an integer
 def rs_24_12_13_encode(data):
-	matrix = (
-		(1,0,0,0,0,0,0,0,0,0,0,0,062,044,003,025,014,016,027,003,053,004,036,047),
-		(0,1,0,0,0,0,0,0,0,0,0,0,011,012,011,011,016,064,067,055,001,076,026,073),
-		(0,0,1,0,0,0,0,0,0,0,0,0,003,001,005,075,014,006,020,044,066,006,070,066),
-		(0,0,0,1,0,0,0,0,0,0,0,0,021,070,027,045,016,067,023,064,073,033,044,021),
-		(0,0,0,0,1,0,0,0,0,0,0,0,030,022,003,075,015,015,033,015,051,003,053,050),
-		(0,0,0,0,0,1,0,0,0,0,0,0,001,041,027,056,076,064,021,053,004,025,001,012),
-		(0,0,0,0,0,0,1,0,0,0,0,0,061,076,021,055,076,001,063,035,030,013,064,070),
-		(0,0,0,0,0,0,0,1,0,0,0,0,024,022,071,056,021,035,073,042,057,074,043,076),
-		(0,0,0,0,0,0,0,0,1,0,0,0,072,042,005,020,043,047,033,056,001,016,013,076),
-		(0,0,0,0,0,0,0,0,0,1,0,0,072,014,065,054,035,025,041,016,015,040,071,026),
-		(0,0,0,0,0,0,0,0,0,0,1,0,073,065,036,061,042,022,017,004,044,020,025,005),
-		(0,0,0,0,0,0,0,0,0,0,0,1,071,005,055,003,071,034,060,011,074,002,041,050))
 	assert data < 2**72
 	codeword = [0,] * 24
 	for i in range(24):
 		for j in range(12):
 			hexbit = (data >> ((11 - j) * 6)) & 0x3f
-			codeword[i] ^= gf6mult(hexbit, matrix[j][i])
+			codeword[i] ^= gf6mult(hexbit, rs_24_12_13_matrix[j][i])
 	return codeword
 
+rs_24_16_9_matrix = (
+	(1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,051,045,067,015,064,067,052,012),
+	(0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,057,025,063,073,071,022,040,015),
+	(0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,005,001,031,004,016,054,025,076),
+	(0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,073,007,047,014,041,077,047,011),
+	(0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,075,015,051,051,017,067,017,057),
+	(0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,020,032,014,042,075,042,070,054),
+	(0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,002,075,043,005,001,040,012,064),
+	(0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,024,074,015,072,024,026,074,061),
+	(0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,042,064,007,022,061,020,040,065),
+	(0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,032,032,055,041,057,066,021,077),
+	(0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,065,036,025,007,050,016,040,051),
+	(0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,064,006,054,032,076,046,014,036),
+	(0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,062,063,074,070,005,027,037,046),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,055,043,034,071,057,076,050,064),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,024,023,023,005,050,070,042,023),
+	(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,067,075,045,060,057,024,006,026))
+
 # (24,16,9) shortened Reed-Solomon encoder
 # argument is an integer
 # returns an integer
 def rs_24_16_9_encode(data):
-	matrix = (
-		(1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,051,045,067,015,064,067,052,012),
-		(0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,057,025,063,073,071,022,040,015),
-		(0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,005,001,031,004,016,054,025,076),
-		(0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,073,007,047,014,041,077,047,011),
-		(0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,075,015,051,051,017,067,017,057),
-		(0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,020,032,014,042,075,042,070,054),
-		(0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,002,075,043,005,001,040,012,064),
-		(0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,024,074,015,072,024,026,074,061),
-		(0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,042,064,007,022,061,020,040,065),
-		(0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,032,032,055,041,057,066,021,077),
-		(0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,065,036,025,007,050,016,040,051),
-		(0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,0,064,006,054,032,076,046,014,036),
-		(0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,0,062,063,074,070,005,027,037,046),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,0,055,043,034,071,057,076,050,064),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,0,024,023,023,005,050,070,042,023),
-		(0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1,067,075,045,060,057,024,006,026))
 	assert data < 2**96
 	codeword = [0,] * 24
 	for i in range(24):
 		for j in range(16):
 			hexbit = (data >> ((15 - j) * 6)) & 0x3f
-			codeword[i] ^= gf6mult(hexbit, matrix[j][i])
+			codeword[i] ^= gf6mult(hexbit, rs_24_16_9_matrix[j][i])
 	return codeword
 
+golay_24_12_8_matrix = (040006165, 020003073, 010007550, 04003664, 02001732,
+	01006631, 0403315, 0201547, 0106706, 045227, 024476, 014353)
+
 # (24,12,8) extended Golay encoder
 # argument is an integer
 # returns an integer
 def golay_24_12_8_encode(data):
-	matrix = (040006165, 020003073, 010007550, 04003664, 02001732,
-		01006631, 0403315, 0201547, 0106706, 045227, 024476, 014353)
 	assert data < 2**12
 	codeword = 0
 	for i in range(12):
 		if data & (04000 >> i):
-			codeword ^= matrix[i]
+			codeword ^= golay_24_12_8_matrix[i]
 	return codeword
 
 # (23,12,7) Golay encoder
@@ -300,42 +315,45 @@ def golay_18_6_8_encode(data):
 	assert data < 2**6
 	return golay_24_12_8_encode(data)
 
+cyclic_16_8_5_matrix = (0x804e, 0x4027, 0x208f, 0x10db,
+	0x08f1, 0x04e4, 0x0272, 0x0139)
+
 # (16,8,5) shortened cyclic encoder
 # argument is an integer
 # returns an integer
 def cyclic_16_8_5_encode(data):
-	matrix = (0x804e, 0x4027, 0x208f, 0x10db,
-		0x08f1, 0x04e4, 0x0272, 0x0139)
 	assert data < 2**8
 	codeword = 0
 	for i in range(8):
 		if data & (0x80 >> i):
-			codeword ^= matrix[i]
+			codeword ^= cyclic_16_8_5_matrix[i]
 	return codeword
 
+hamming_10_6_3_matrix = (0x20e, 0x10d, 0x08b, 0x047, 0x023, 0x01c)
+
 # (10,6,3) shortened Hamming encoder
 # argument is an integer
 # returns an integer
 def hamming_10_6_3_encode(data):
-	matrix = (0x20e, 0x10d, 0x08b, 0x047, 0x023, 0x01c)
 	assert data < 2**6
 	codeword = 0
 	for i in range(6):
 		if data & (0x20 >> i):
-			codeword ^= matrix[i]
+			codeword ^= hamming_10_6_3_matrix[i]
 	return codeword
 
+hamming_15_11_3_matrix = (0x400f, 0x200e, 0x100d, 0x080c, 0x040b,
+	0x020a, 0x0109, 0x0087, 0x0046, 0x0025, 0x0013)
+
 # (15,11,3) Hamming encoder
 # argument is an integer
 # returns an integer
 def hamming_15_11_3_encode(data):
-	matrix = (0x400f, 0x200e, 0x100d, 0x080c, 0x040b,
-		0x020a, 0x0109, 0x0087, 0x0046, 0x0025, 0x0013)
 	assert data < 2**11
 	codeword = 0
 	for i in range(11):
 		if data & (0x400 >> i):
-			codeword ^= matrix[i]
+			codeword ^= hamming_15_11_3_matrix[i]
 	return codeword
 
 # sequence of cyclic encodings for LDU1
@@ -1801,14 +1819,24 @@ if __name__ == "__main__":
 		if not options.late:
 			construct_hdu(options.nac, options.ss, options.mi, options.mfid,
 					options.algid, options.kid, options.tgid)
-		for i in range(options.superframes):
-			construct_ldu1(options.nac, options.ss, options.imbe,
+		if quiet and outfile:
+			# binary output only: use the array encoders
+			import p25bulk
+			p25bulk.write_superframes(outfile, options.superframes,
+					options.nac, options.ss, options.imbe,
 					options.lsd, options.lco, options.mfid,
 					options.svcopt, 0, options.tgid,
-					options.dst, options.src)
-			construct_ldu2(options.nac, options.ss, options.imbe,
-					options.lsd, options.mi, options.algid,
-					options.kid)
+					options.dst, options.src, options.mi,
+					options.algid, options.kid, flip=flip)
+		else:
+			for i in range(options.superframes):
+				construct_ldu1(options.nac, options.ss, options.imbe,
+						options.lsd, options.lco, options.mfid,
+						options.svcopt, 0, options.tgid,
+						options.dst, options.src)
+				construct_ldu2(options.nac, options.ss, options.imbe,
+						options.lsd, options.mi, options.algid,
+						options.kid)
 		construct_stdu(options.nac, options.ss)
 	else:
 		if options.hdu:
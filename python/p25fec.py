@@ -0,0 +1,398 @@
+#!/usr/bin/python
+#
+# p25fec.py - APCO P25 Reed-Solomon and Golay decoders for offline analysis
+#
+# p25craft.py and p25bulk.py only encode.  This module decodes the block codes
+# protecting the header, link control and terminator words, so that captured
+# or simulated data units can be checked and corrected without the C++
+# blocks.  Like the p25bulk.py encoders, every decoder takes an array with one
+# row (or one integer) per codeword and returns the corrected data along with
+# the number of errors corrected in each codeword, -1 where the errors were
+# beyond the correction capability of the code.
+#
+# The Reed-Solomon codes are shortened from the (63,63-2t) code over GF(2^6)
+# with generator roots alpha^1 .. alpha^2t.  They are decoded by computing the
+# syndromes from tables, then running Berlekamp-Massey, the Chien search and
+# Forney's algorithm for all the failed codewords at once.  The Golay codes
+# are decoded by looking up the error pattern for each syndrome.
+#
+# example:
+# $ python
+# >>> import p25craft, p25fec
+# >>> cw = p25craft.rs_24_12_13_encode(0x123456789abcdef012)
+# >>> cw[3] ^= 0x15
+# >>> p25fec.rs_24_12_13_decode(cw)
+# (335812727670730321938L, 1)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import itertools
+import numpy as np
+
+import p25craft
+import p25bulk
+
+gf6_exp = np.array(p25craft.gf6_exp, dtype=np.uint8)
+gf6_log = np.array(p25craft.gf6_log, dtype=np.int32)
+gf6_mult_table = p25bulk.gf6_mult_table
+gf6_inv_table = np.array([0] + [p25craft.gf6_exp[63 - p25craft.gf6_log[a]] for a in range(1, 64)],
+	dtype=np.uint8)
+
+
+#########################
+# Reed-Solomon decoding #
+#########################
+
+# Tables of a shortened Reed-Solomon code, as encoded by p25craft.py.  Hexbit i of a codeword is the
+# coefficient of x^(n-1-i), so its contribution to syndrome j (the codeword
+# polynomial at alpha^(j+1)) is c[i] * alpha^((j+1)(n-1-i)).
+class rs_code(object):
+	def __init__(self, n, k):
+		self.n = n
+		self.k = k
+		self.t = (n - k) // 2
+		power = n - 1 - np.arange(n)
+		# syndrome_table[i, v, j]: v * alpha^((j+1)(n-1-i))
+		roots = gf6_exp[(power[:, np.newaxis] * np.arange(1, n - k + 1)) % 63]
+		self.syndrome_table = gf6_mult_table[:, roots].transpose(1, 0, 2).copy()
+		# chien[i, d]: alpha^(-d(n-1-i)), the powers of the inverse of the
+		# locator of position i
+		self.chien = gf6_exp[(-power[:, np.newaxis] * np.arange(n - k + 1)) % 63]
+
+	# argument is an array of shape (count, n) of hexbits
+	# returns an array of shape (count, n - k) of syndromes
+	def syndromes(self, codewords):
+		terms = self.syndrome_table[np.arange(self.n), codewords]
+		return np.bitwise_xor.reduce(terms, axis=-2)
+
+	# Berlekamp-Massey, run on every row at once.
+	# argument is an array of shape (count, n - k) of syndromes
+	# returns the error locator polynomials, lowest order coefficient
+	# first, and their lengths
+	def locators(self, s):
+		count, nk = s.shape
+		locator = np.zeros((count, nk + 1), dtype=np.uint8)
+		locator[:, 0] = 1
+		b = locator.copy()	# previous locator, divided by its discrepancy
+		length = np.zeros(count, dtype=np.int32)
+		for r in range(nk):
+			delta = np.bitwise_xor.reduce(gf6_mult_table[locator[:, :r + 1], s[:, r::-1]], axis=-1)
+			xb = np.zeros_like(b)
+			xb[:, 1:] = b[:, :-1]
+			new = locator ^ gf6_mult_table[delta[:, np.newaxis], xb]
+			grow = (delta != 0) & (2 * length <= r)
+			b = np.where(grow[:, np.newaxis], gf6_mult_table[gf6_inv_table[delta][:, np.newaxis], locator], xb)
+			length = np.where(grow, r + 1 - length, length)
+			locator = new
+		return locator, length
+
+	# Evaluate polynomials at the inverse locators of every position.
+	# argument is an array of shape (count, d) of coefficients, lowest first
+	# returns an array of shape (count, n)
+	def evaluate(self, poly):
+		d = poly.shape[1]
+		terms = gf6_mult_table[poly[:, np.newaxis, :], self.chien[np.newaxis, :, :d]]
+		return np.bitwise_xor.reduce(terms, axis=-1)
+
+	# argument is an array of shape (count, n) of hexbits
+	# returns an array of shape (count, k) of hexbits and an array of
+	# the number of hexbits corrected in each codeword
+	def decode_array(self, codewords):
+		codewords = np.array(codewords, dtype=np.uint8)
+		assert codewords.shape[-1] == self.n
+		nerrors = np.zeros(codewords.shape[0], dtype=np.int32)
+		s = self.syndromes(codewords)
+		bad = np.flatnonzero(s.any(axis=1))
+		if len(bad):
+			corrected, nerrors[bad] = self.correct(codewords[bad], s[bad])
+			codewords[bad] = corrected
+		return codewords[:, :self.k], nerrors
+
+	def correct(self, codewords, s):
+		count, nk = s.shape
+		locator, length = self.locators(s)
+		# error values by Forney: omega(X^-1) / locator'(X^-1), where
+		# omega = s(x) locator(x) mod x^(n-k)
+		omega = np.zeros((count, nk), dtype=np.uint8)
+		for i in range(nk):
+			omega[:, i] = np.bitwise_xor.reduce(gf6_mult_table[locator[:, :i + 1], s[:, i::-1]], axis=-1)
+		derivative = np.zeros((count, nk), dtype=np.uint8)
+		derivative[:, 0::2] = locator[:, 1::2]
+		roots = self.evaluate(locator) == 0
+		num = self.evaluate(omega)
+		den = self.evaluate(derivative)
+		value = gf6_mult_table[num, gf6_inv_table[den]]
+		errors = np.where(roots, value, 0)
+		found = roots.sum(axis=1)
+		ok = (length <= self.t) & (found == length) & ~(roots & (den == 0)).any(axis=1)
+		ok &= ~locator[:, self.t + 1:].any(axis=1)
+		fixed = codewords ^ errors
+		ok &= ~self.syndromes(fixed).any(axis=1)
+		out = np.where(ok[:, np.newaxis], fixed, codewords)
+		return out, np.where(ok, length, -1)
+
+	# argument is a list of n hexbits, as returned by the p25craft encoders
+	# returns the data as an integer, as taken by the p25craft encoders,
+	# and the number of hexbits corrected
+	def decode(self, codeword):
+		data, nerrors = self.decode_array([codeword])
+		value = 0
+		for h in data[0]:
+			value = (value << 6) | int(h)
+		return value, int(nerrors[0])
+
+rs_36_20_17 = rs_code(36, 20)
+rs_24_12_13 = rs_code(24, 12)
+rs_24_16_9 = rs_code(24, 16)
+
+def rs_36_20_17_decode_array(codewords):
+	return rs_36_20_17.decode_array(codewords)
+
+def rs_24_12_13_decode_array(codewords):
+	return rs_24_12_13.decode_array(codewords)
+
+def rs_24_16_9_decode_array(codewords):
+	return rs_24_16_9.decode_array(codewords)
+
+def rs_36_20_17_decode(codeword):
+	return rs_36_20_17.decode(codeword)
+
+def rs_24_12_13_decode(codeword):
+	return rs_24_12_13.decode(codeword)
+
+def rs_24_16_9_decode(codeword):
+	return rs_24_16_9.decode(codeword)
+
+
+##################
+# Golay decoding #
+##################
+
+# Syndrome decoding of a systematic binary code, data in the high k bits.
+# The syndrome of a received word is the parity of its data bits, as the
+# encoder would compute it, added to its parity bits.  Every error pattern
+# of up to t bits has a distinct syndrome; the others are left unknown.
+class syndrome_code(object):
+	def __init__(self, n, k, t, codeword_table):
+		self.n = n
+		self.k = k
+		self.t = t
+		self.mask = (1 << (n - k)) - 1
+		self.parity = (np.asarray(codeword_table, dtype=np.int64) & self.mask)[:1 << k]
+		self.pattern = np.zeros(1 << (n - k), dtype=np.int64)
+		self.weight = np.empty(1 << (n - k), dtype=np.int32)
+		self.weight[:] = -1
+		for w in range(t, -1, -1):
+			e = np.array([sum([1 << b for b in bits]) for bits in itertools.combinations(range(n), w)],
+				dtype=np.int64)
+			s = self.syndrome(e)
+			self.pattern[s] = e
+			self.weight[s] = w
+
+	def syndrome(self, words):
+		return self.parity[words >> (self.n - self.k)] ^ (words & self.mask)
+
+	# argument is an array of integer codewords
+	# returns an array of data and an array of the number of bits
+	# corrected in each codeword
+	def decode_array(self, words):
+		words = np.asarray(words, dtype=np.int64)
+		assert (words >> self.n == 0).all()
+		s = self.syndrome(words)
+		nerrors = self.weight[s]
+		return (words ^ self.pattern[s]) >> (self.n - self.k), nerrors
+
+	# argument is an integer codeword
+	# returns the data as an integer and the number of bits corrected
+	def decode(self, word):
+		data, nerrors = self.decode_array([word])
+		return int(data[0]), int(nerrors[0])
+
+# the perfect (23,12,7) code is the (24,12,8) code less its parity bit;
+# p25craft and p25bulk call its encoder golay_23_12_8
+golay_24_12_8 = syndrome_code(24, 12, 3, p25bulk.golay_24_12_8_table)
+golay_23_12_7 = syndrome_code(23, 12, 3, p25bulk.golay_24_12_8_table >> np.uint64(1))
+golay_18_6_8 = syndrome_code(18, 6, 3, p25bulk.golay_24_12_8_table)
+
+def golay_24_12_8_decode_array(words):
+	return golay_24_12_8.decode_array(words)
+
+def golay_23_12_7_decode_array(words):
+	return golay_23_12_7.decode_array(words)
+
+def golay_18_6_8_decode_array(words):
+	return golay_18_6_8.decode_array(words)
+
+def golay_24_12_8_decode(word):
+	return golay_24_12_8.decode(word)
+
+def golay_23_12_7_decode(word):
+	return golay_23_12_7.decode(word)
+
+def golay_18_6_8_decode(word):
+	return golay_18_6_8.decode(word)
+
+hamming_10_6_3 = syndrome_code(10, 6, 1, p25bulk.hamming_10_6_3_table)
+
+def hamming_10_6_3_decode_array(words):
+	return hamming_10_6_3.decode_array(words)
+
+def hamming_10_6_3_decode(word):
+	return hamming_10_6_3.decode(word)
+
+
+#########################
+# header and terminator #
+#########################
+
+# Golay words whose errors could not be corrected are passed on as received,
+# leaving them to the Reed-Solomon code.
+
+# HDU: inverse of header_golay()
+# argument is an array of shape (count, 36) of 18 bit Golay codewords
+# returns an array of shape (count, 20) of hexbits and the number of
+# hexbits corrected by the Reed-Solomon code in each
+def header_decode_array(words):
+	words = np.asarray(words, dtype=np.int64)
+	data, nerrors = golay_18_6_8_decode_array(words)
+	data = np.where(nerrors < 0, words >> 12, data)
+	return rs_36_20_17_decode_array(data.astype(np.uint8))
+
+# xTDU link control: inverse of xtdu_golay()
+# argument is an array of shape (count, 12) of 24 bit Golay codewords
+# returns an array of shape (count, 12) of hexbits and the number of
+# hexbits corrected by the Reed-Solomon code in each
+def xtdu_decode_array(words):
+	words = np.asarray(words, dtype=np.int64)
+	data, nerrors = golay_24_12_8_decode_array(words)
+	data = np.where(nerrors < 0, words >> 12, data)
+	hexbits = np.empty((words.shape[0], 24), dtype=np.uint8)
+	hexbits[:, 0::2] = data >> 6
+	hexbits[:, 1::2] = data & 0x3f
+	return rs_24_12_13_decode_array(hexbits)
+
+# LDU1 link control: inverse of ldu_hamming(rs_24_12_13_encode())
+# argument is an array of shape (count, 24) of 10 bit Hamming codewords
+# returns an array of shape (count, 12) of hexbits and the number of
+# hexbits corrected by the Reed-Solomon code in each
+def ldu1_lc_decode_array(words):
+	words = np.asarray(words, dtype=np.int64)
+	data, nerrors = hamming_10_6_3_decode_array(words)
+	data = np.where(nerrors < 0, words >> 4, data)
+	return rs_24_12_13_decode_array(data.astype(np.uint8))
+
+
+####################
+# Trellis decoding #
+####################
+
+# fsk4_demod_ff symbol value of each dibit, as fsk4_slicer_fb slices them
+dibit_levels = np.array([1.0, 3.0, -1.0, -3.0])
+
+# inverse of data_interleave()
+data_deinterleave_index = np.argsort(p25bulk.data_interleave_index)
+
+def data_deinterleave_array(data):
+	return data[..., data_deinterleave_index]
+
+# nearest dibit to each soft symbol value
+def slice_symbols(symbols):
+	return np.abs(np.asarray(symbols)[..., np.newaxis] - dibit_levels).argmin(axis=-1).astype(np.uint8)
+
+# Viterbi decoding of a trellis code whose state is the previous input
+# symbol, as encoded by p25craft.py.  Received symbols are either soft
+# values from fsk4_demod_ff, nominally -3, -1, +1 and +3, scored by squared
+# distance, or (as a fallback for sliced data) dibits, scored by the number
+# of bits in error.
+class trellis_code(object):
+	def __init__(self, table):
+		self.table = table
+		self.nstates = table.shape[0]
+		# transition (state, input) emits the dibit pair numbered pair[state, input]
+		self.pair = (table[:, :, 0] << 2) | table[:, :, 1]
+		self.hamming = np.array([[bin(a ^ b).count('1') for b in range(16)] for a in range(16)])
+
+	# argument is an array of shape (count, 2m) of symbols
+	# returns an array of shape (count, m, 16): the cost of each dibit pair
+	def branch_metrics(self, symbols):
+		if symbols.dtype.kind in 'iu':
+			pairs = (symbols[:, 0::2].astype(np.int32) << 2) | symbols[:, 1::2]
+			return self.hamming[pairs]
+		d = (symbols[..., np.newaxis] - dibit_levels) ** 2
+		return (d[:, 0::2, :, np.newaxis] + d[:, 1::2, np.newaxis, :]).reshape(symbols.shape[0], -1, 16)
+
+	# argument is an array of shape (count, 2n + 2) of soft symbols or dibits
+	# returns an array of shape (count, n) of dibits or tribits and an
+	# array of the number of received dibits that differ from the
+	# re-encoded data
+	def decode_array(self, symbols):
+		symbols = np.asarray(symbols)
+		count, m = symbols.shape[0], symbols.shape[1] // 2
+		bm = self.branch_metrics(symbols)
+		metric = np.empty((count, self.nstates))
+		metric[:] = np.inf
+		metric[:, 0] = 0
+		survivors = np.empty((m, count, self.nstates), dtype=np.uint8)
+		for t in range(m):
+			# the state after a transition is its input
+			cost = metric[:, :, np.newaxis] + bm[:, t][:, self.pair]
+			survivors[t] = cost.argmin(axis=1)
+			metric = cost.min(axis=1)
+		# trace back from state 0, left by the flushing symbol
+		rows = np.arange(count)
+		state = np.zeros(count, dtype=np.uint8)
+		data = np.empty((count, m), dtype=np.uint8)
+		for t in range(m - 1, -1, -1):
+			data[:, t] = state
+			state = survivors[t][rows, state]
+		data = data[:, :-1]
+		if symbols.dtype.kind in 'iu':
+			hard = symbols
+		else:
+			hard = slice_symbols(symbols)
+		nerrors = (p25bulk.trellis_encode_array(data, self.table) != hard).sum(axis=1)
+		return data, nerrors
+
+trellis_1_2 = trellis_code(p25bulk.trellis_1_2_table)
+trellis_3_4 = trellis_code(p25bulk.trellis_3_4_table)
+
+def trellis_1_2_decode_array(symbols):
+	return trellis_1_2.decode_array(symbols)
+
+def trellis_3_4_decode_array(symbols):
+	return trellis_3_4.decode_array(symbols)
+
+# CRC-CCITT check of 96 bit blocks (TSBKs and PDU headers)
+# argument is an array of shape (count, 12) of bytes
+# returns an array of whether each CRC is good
+def crc_ccitt_check_array(blocks):
+	bits = np.unpackbits(np.asarray(blocks, dtype=np.uint8), axis=1)
+	crc = np.zeros(blocks.shape[0], dtype=np.int32)
+	for i in range(80):
+		fb = ((crc >> 15) ^ bits[:, i]) & 1
+		crc = ((crc << 1) & 0xffff) ^ (fb * 0x1021)
+	crc ^= 0xffff
+	received = np.packbits(bits[:, 80:], axis=1).astype(np.int32)
+	return crc == (received[:, 0] << 8) | received[:, 1]
+
+# TSBK or PDU header: inverse of data_interleave(trellis_1_2_encode())
+# argument is an array of shape (count, 98) of symbols, as received
+# returns an array of shape (count, 12) of bytes, the number of dibits
+# corrected in each and whether its CRC is good
+def tsbk_decode_array(symbols):
+	data, nerrors = trellis_1_2_decode_array(data_deinterleave_array(np.asarray(symbols)))
+	blocks = np.packbits(np.unpackbits(data[:, :, np.newaxis], axis=2)[:, :, 6:].reshape(data.shape[0], -1), axis=1)
+	return blocks, nerrors, crc_ccitt_check_array(blocks)
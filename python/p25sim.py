@@ -0,0 +1,148 @@
+#!/usr/bin/python
+#
+# p25sim.py - test signals and scoring for receiver benchmarks
+#
+# Known traffic is generated with p25bulk.py, modulated, and passed through
+# a simulated channel (white noise at a given Eb/N0, a carrier frequency
+# offset and a transmitter symbol clock error) before being run through a
+# receiver.  The dibits the receiver recovers are then aligned with the
+# transmitted frames to count the frames found, the bit error rate and the
+# frames whose network identifier was received in error.
+#
+# Everything here works on NumPy arrays; the GNU Radio modulators and
+# receive chains are in rx-bench.py.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import numpy as np
+
+import p25bulk
+
+SYMBOL_RATE = 4800
+FRAME_DIBITS = p25bulk.LDU_DIBITS
+SYNC_DIBITS = 24
+NID_DIBITS = np.array([i for i in range(24, 57) if i != 35])	# skipping the status symbol
+CHUNK = 1 << 20		# dibits searched for frame sync at a time
+
+# number of bits differing between two dibits, indexed by their xor
+dibit_errors = np.array([0, 1, 1, 2], dtype=np.uint8)
+
+
+##################
+# test traffic   #
+##################
+
+# count superframes with random voice, link control and low speed data,
+# so that every frame is distinct
+# returns an array of shape (2 * count, 864) of dibits, one row per LDU
+def test_frames(count, nac=0x293, seed=1):
+	rng = np.random.RandomState(seed)
+	u64 = lambda bits: rng.randint(0, 1 << bits, count).astype(np.uint64)
+	mi = [int(a) << 40 | int(b) for a, b in zip(u64(32), u64(40))]
+	frames = p25bulk.construct_superframes_array(count, nac, 1,
+		rng.randint(0, 256, (count, 9, 18)).astype(np.uint8),
+		u64(32), 0, 0, 0, 0, u64(16), 1, u64(24), mi, 0x80, 0,
+		imbe2=rng.randint(0, 256, (count, 9, 18)).astype(np.uint8))
+	return frames.reshape(2 * count, FRAME_DIBITS)
+
+
+##################
+# channel        #
+##################
+
+# White gaussian noise at ebn0_db for a signal of samples_per_symbol
+# samples per two bit symbol (no noise if ebn0_db is None)
+def add_noise(x, ebn0_db, samples_per_symbol, rng):
+	if ebn0_db is None:
+		return x
+	power = np.mean(np.abs(x) ** 2)
+	n0 = power * samples_per_symbol / (2 * 10 ** (ebn0_db / 10.0))
+	noise = rng.standard_normal(len(x)) + 1j * rng.standard_normal(len(x))
+	return x + noise * np.sqrt(n0 / 2)
+
+# Carrier frequency offset of hz
+def freq_offset(x, hz, sample_rate):
+	if not hz:
+		return x
+	return x * np.exp(2j * np.pi * hz / sample_rate * np.arange(len(x)))
+
+# Transmitter symbol clock running ppm fast, by linear interpolation
+def timing_drift(x, ppm):
+	if not ppm:
+		return x
+	t = np.arange(0, len(x) - 1, 1 + ppm * 1e-6)
+	n = np.arange(len(x))
+	return np.interp(t, n, x.real) + 1j * np.interp(t, n, x.imag)
+
+# apply the whole channel model to complex baseband samples
+# returns complex64 samples
+def impair(x, sample_rate, ebn0_db=None, offset=0.0, drift_ppm=0.0, seed=0):
+	rng = np.random.RandomState(seed)
+	x = timing_drift(np.asarray(x, dtype=np.complex128), drift_ppm)
+	x = freq_offset(x, offset, sample_rate)
+	x = add_noise(x, ebn0_db, float(sample_rate) / SYMBOL_RATE, rng)
+	return x.astype(np.complex64)
+
+
+##################
+# scoring        #
+##################
+
+# Positions of frame sync in a dibit stream, allowing up to max_errors
+# differing dibits.
+# returns an array of the index of the first dibit of each sync found
+def sync_positions(dibits, max_errors=2):
+	dibits = np.asarray(dibits, dtype=np.uint8)
+	found = []
+	for start in range(0, max(len(dibits) - SYNC_DIBITS + 1, 0), CHUNK):
+		d = dibits[start:start + CHUNK + SYNC_DIBITS - 1]
+		windows = np.lib.stride_tricks.as_strided(d,
+			shape=(len(d) - SYNC_DIBITS + 1, SYNC_DIBITS), strides=(d.strides[0], d.strides[0]))
+		errors = (windows != p25bulk.frame_sync).sum(axis=1)
+		found.append(np.flatnonzero(errors <= max_errors) + start)
+	if not found:
+		return np.zeros(0, dtype=int)
+	return np.concatenate(found)
+
+# Align the received dibits with the transmitted frames and count errors.
+# The first frame found is matched against every transmitted frame; later
+# frames are numbered by their distance from it, so a receiver that slips
+# a few symbols is still scored against the right frame.
+# arguments are the received dibits and the transmitted frames, in order
+# returns a dict of counts and rates
+def score(rx, frames, max_errors=4):
+	rx = np.asarray(rx, dtype=np.uint8)
+	result = dict(frames_sent=len(frames), frames_synced=0, bits=0, bit_errors=0,
+		ber=None, nid_errors=0, nid_error_rate=None)
+	pos = sync_positions(rx, max_errors)
+	pos = pos[pos + FRAME_DIBITS <= len(rx)]
+	if not len(pos):
+		return result
+	got = rx[pos[:, np.newaxis] + np.arange(FRAME_DIBITS)]
+	first = dibit_errors[got[0] ^ frames].sum(axis=1)
+	n = np.argmin(first) + np.round((pos - pos[0]) / float(FRAME_DIBITS)).astype(int)
+	n, keep = np.unique(n, return_index=True)
+	got = got[keep]
+	keep = n < len(frames)
+	n, got = n[keep], got[keep]
+	sent = frames[n]
+	errors = dibit_errors[got[:, SYNC_DIBITS:] ^ sent[:, SYNC_DIBITS:]]
+	nid = (got[:, NID_DIBITS] != sent[:, NID_DIBITS]).any(axis=1)
+	result.update(frames_synced=len(n), bits=errors.size * 2, bit_errors=int(errors.sum()),
+		nid_errors=int(nid.sum()))
+	result['ber'] = float(result['bit_errors']) / result['bits']
+	result['nid_error_rate'] = float(result['nid_errors']) / len(n)
+	return result
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import os
+import sys
+import json
+import wave
+import shutil
+import cPickle
+import tempfile
+import unittest
+import StringIO
+import numpy as np
+from gnuradio import gr, gr_unittest
+
+import p25bulk
+import p25craft
+import file_c4fm_rx_nogui
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'repeater', 'src', 'python'))
+import capture
+
+NAC = 0x293
+CAPTURE_RATE = 125000
+START_TIME = 1300000000.0
+SECONDS = 20.0
+SQUELCH = -20.0
+SUPERFRAMES = 10
+
+# dibit to C4FM deviation, in units of 600 Hz
+C4FM_LEVELS = np.array([1.0, 3.0, -1.0, -3.0])
+
+def terminator():
+    out = StringIO.StringIO()
+    p25craft.quiet = True
+    p25craft.outfile = out
+    p25craft.construct_stdu(NAC, 0)
+    b = np.frombuffer(out.getvalue(), dtype=np.uint8)
+    return ((b[:, np.newaxis] >> np.array([6, 4, 2, 0])) & 3).reshape(-1)
+
+def c4fm(symbols, rate):
+    sps = rate // 4800
+    freq = np.repeat(C4FM_LEVELS[symbols] * 600.0, sps)
+    freq = np.convolve(freq, np.ones(sps // 2) / (sps // 2), mode='same')
+    return np.exp(2j * np.pi * np.cumsum(freq) / rate)
+
+def recording(rng, calls):
+    """
+    SECONDS of noise at CAPTURE_RATE, with the calls (time, talkgroup)
+    keyed up in it: SUPERFRAMES of voice, then terminators
+    """
+    x = 0.01 * (rng.randn(int(SECONDS * CAPTURE_RATE)) + 1j * rng.randn(int(SECONDS * CAPTURE_RATE)))
+    for t, tgid in calls:
+        imbe = rng.randint(0, 256, (SUPERFRAMES, 9, 18)).astype(np.uint8)
+        ldus = p25bulk.construct_superframes_array(SUPERFRAMES, NAC, 1, imbe, 0, 0, 0, 0, 0, tgid, 0, 0x101, 0, 0x80, 0)
+        symbols = np.concatenate([ldus.reshape(-1)] + [terminator()] * 3)
+        burst = c4fm(symbols, CAPTURE_RATE)
+        start = int(t * CAPTURE_RATE)
+        x[start:start + len(burst)] = burst
+    return x.astype(np.complex64)
+
+class qa_file_c4fm_rx_nogui (gr_unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+        self.tmpdir = tempfile.mkdtemp()
+        self.outdir = os.path.join(self.tmpdir, 'calls')
+        os.mkdir(os.path.join(self.tmpdir, 'recordings'))
+        # a capture file, and a raw capture with its .info
+        self.capture = os.path.join(self.tmpdir, 'recordings', 'one.cap')
+        w = capture.capture_writer(self.capture, CAPTURE_RATE, 851000000, start_time=START_TIME)
+        w.write(recording(self.rng, [(2.0, 101), (10.0, 202)]))
+        w.close()
+        self.raw = os.path.join(self.tmpdir, 'recordings', 'two.dat')
+        recording(self.rng, [(5.0, 303)]).tofile(self.raw)
+        f = open(self.raw + '.info', 'wb')
+        cPickle.dump({'capture-rate': CAPTURE_RATE}, f)
+        f.close()
+
+    def tearDown (self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001_decode (self):
+        events = file_c4fm_rx_nogui.decode_recording((self.capture, self.outdir, 0.0, SQUELCH))
+        calls = [e for e in events if e['event'] == 'call']
+        self.assertEqual([e['tgid'] for e in calls], [101, 202])
+        frames = SUPERFRAMES * 18
+        for e, t in zip(calls, (2.0, 10.0)):
+            # the first LDU may go by before the receiver has locked
+            self.assertTrue(frames - 9 <= e['frames'] <= frames, e)
+            self.assertTrue(abs(e['start'] - START_TIME - t) < 0.5, e)
+            self.assertEqual(e['nac'], NAC)
+            w = wave.open(e['wav'], 'rb')
+            self.assertEqual(w.getframerate(), 8000)
+            self.assertEqual(w.getnframes(), e['frames'] * 160)
+            w.close()
+            self.assertEqual(os.path.basename(os.path.dirname(e['wav'])), 'tg%d' % e['tgid'])
+        self.assertEqual(events[-1]['event'], 'recording')
+        self.assertAlmostEqual(events[-1]['duration'], SECONDS, 3)
+        # every message out of the flow graph reached the call splitter
+        self.assertEqual(events[-1]['dropped'], 0)
+        # far faster than real time
+        self.assertTrue(events[-1]['seconds'] < SECONDS / 4, events[-1])
+
+    def test_002_batch (self):
+        recordings = file_c4fm_rx_nogui.find_recordings([os.path.join(self.tmpdir, 'recordings')])
+        self.assertEqual(recordings, [self.capture, self.raw])
+        log = StringIO.StringIO()
+        file_c4fm_rx_nogui.batch_decode(recordings, self.outdir, log, 2, 0.0, SQUELCH)
+        events = [json.loads(line) for line in log.getvalue().splitlines()]
+        self.assertEqual(sorted([e['recording'] for e in events if e['event'] == 'recording']), recordings)
+        self.assertEqual(sorted([e['tgid'] for e in events if e['event'] == 'call']), [101, 202, 303])
+        self.assertEqual(sorted(os.listdir(self.outdir)), ['tg101', 'tg202', 'tg303'])
+        self.assertEqual([e['dropped'] for e in events if e['event'] == 'recording'], [0, 0])
+
+if __name__ == '__main__':
+    unittest.main ()
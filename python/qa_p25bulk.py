@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import random
+import unittest
+import StringIO
+import numpy as np
+
+import p25craft
+import p25bulk
+
+class qa_p25bulk (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = random.Random(1)
+        p25craft.quiet = True
+        p25craft.flip = 0
+
+    def tearDown (self):
+        p25craft.outfile = ""
+
+    def test_001_gf6 (self):
+        def mult(a, b):
+            p = 0
+            for i in range(6):
+                if b & 1:
+                    p ^= a
+                a <<= 1
+                if a & 0x40:
+                    a ^= 0x43
+                b >>= 1
+            return p
+        for a in range(64):
+            for b in range(64):
+                self.assertEqual(p25craft.gf6mult(a, b), mult(a, b))
+                self.assertEqual(p25bulk.gf6_mult_table[a, b], mult(a, b))
+
+    def test_002_rs (self):
+        for k, fn, fn_array in ((20, p25craft.rs_36_20_17_encode, p25bulk.rs_36_20_17_encode_array),
+                                (12, p25craft.rs_24_12_13_encode, p25bulk.rs_24_12_13_encode_array),
+                                (16, p25craft.rs_24_16_9_encode, p25bulk.rs_24_16_9_encode_array)):
+            data = [self.rng.getrandbits(6 * k) for i in range(50)]
+            hexbits = np.array([p25craft.split_tribits(d, 2 * k)[0::2] for d in data]) << 3
+            hexbits |= np.array([p25craft.split_tribits(d, 2 * k)[1::2] for d in data])
+            cw = fn_array(hexbits)
+            for i in range(50):
+                self.assertEqual(list(cw[i]), fn(data[i]))
+
+    def test_003_binary_codes (self):
+        for bits, fn, fn_array in ((16, p25craft.bch_64_16_23_encode, p25bulk.bch_64_16_23_encode_array),
+                                   (12, p25craft.golay_24_12_8_encode, p25bulk.golay_24_12_8_encode_array),
+                                   (12, p25craft.golay_23_12_8_encode, p25bulk.golay_23_12_8_encode_array),
+                                   (8, p25craft.cyclic_16_8_5_encode, p25bulk.cyclic_16_8_5_encode_array),
+                                   (6, p25craft.hamming_10_6_3_encode, p25bulk.hamming_10_6_3_encode_array),
+                                   (11, p25craft.hamming_15_11_3_encode, p25bulk.hamming_15_11_3_encode_array)):
+            data = np.array([self.rng.getrandbits(bits) for i in range(200)])
+            cw = fn_array(data)
+            self.assertEqual([int(c) for c in cw], [fn(int(d)) for d in data])
+
+    def test_004_trellis (self):
+        for n, fn, fn_array in ((4, p25craft.trellis_1_2_encode, p25bulk.trellis_1_2_encode_array),
+                                (8, p25craft.trellis_3_4_encode, p25bulk.trellis_3_4_encode_array)):
+            data = np.array([[self.rng.randrange(n) for i in range(48)] for j in range(20)])
+            out = fn_array(data)
+            for i in range(20):
+                self.assertEqual(list(out[i]), fn(list(data[i])))
+        data = np.arange(98)
+        self.assertEqual(list(p25bulk.data_interleave_array(data)), p25craft.data_interleave(list(data)))
+
+    def test_005_superframes (self):
+        n = 12
+        imbe = [self.rng.getrandbits(144) for i in range(n)]
+        lsd = [self.rng.getrandbits(32) for i in range(n)]
+        lco = [self.rng.choice((0, 3)) for i in range(n)]
+        tgid = [self.rng.getrandbits(16) for i in range(n)]
+        dst = [self.rng.getrandbits(24) for i in range(n)]
+        mi = [self.rng.getrandbits(72) for i in range(n)]
+        for flip in (0, 0xaaa):
+            ref = StringIO.StringIO()
+            p25craft.outfile = ref
+            p25craft.flip = flip
+            for i in range(n):
+                p25craft.construct_ldu1(0x293, i & 3, imbe[i], lsd[i], lco[i], 0x90, 0x40,
+                                        0, tgid[i], dst[i], 0x123456)
+                p25craft.construct_ldu2(0x293, i & 3, imbe[i], lsd[i], mi[i], 0x80, 0x1234)
+            out = StringIO.StringIO()
+            # several blocks, the last one short
+            block = p25bulk.BLOCK
+            p25bulk.BLOCK = 5
+            try:
+                p25bulk.write_superframes(out, n, 0x293, [i & 3 for i in range(n)], imbe, lsd, lco,
+                                          0x90, 0x40, 0, tgid, dst, 0x123456, mi, 0x80, 0x1234, flip=flip)
+            finally:
+                p25bulk.BLOCK = block
+            self.assertEqual(out.getvalue(), ref.getvalue())
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import os
+import wave
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import p25bulk
+import p25calls
+import vocoder_frames
+
+NAC = 0x293
+
+def vocoder_frame(rng, flags, seq, timestamp):
+    """
+    the frame assembler's binary frame of a random codeword
+    """
+    return vocoder_frames.pack([int(x) for x in rng.randint(0, 4096, 8)], seq, timestamp, flags)
+
+def traffic(rng, calls):
+    """
+    what the batch decoder's flow graph would put out for calls, each
+    (symbols of noise before it, talkgroup, source, superframes, whether
+    it has a terminator): the dibits, the vocoder frames, the audio and
+    the calls expected
+    """
+    dibits = []
+    frames = []
+    audio = []
+    expected = []
+    nsymbols = 0
+    seq = 0
+    for gap, tgid, src, count, terminated in calls:
+        dibits.append(rng.randint(0, 4, gap).astype(np.uint8))
+        nsymbols += gap
+        ldus = p25bulk.construct_superframes_array(count, NAC, 1,
+            rng.randint(0, 256, (count, 9, 18)).astype(np.uint8), 0, 0, 0, 0, 0, tgid, 0, src, 0, 0x80, 0)
+        dibits.append(ldus.reshape(-1))
+        samples = rng.randint(-20000, 20000, 2 * count * 9 * 160).astype(np.int16)
+        audio.append(samples)
+        first = None
+        for j in range(2 * count):
+            nsymbols += p25bulk.LDU_DIBITS
+            ticks = nsymbols * 5 // 3
+            for i in range(9):
+                flags = vocoder_frames.VOICE
+                if first is None:
+                    first = ticks - 9 * 160
+                    flags |= vocoder_frames.START
+                frames.append(vocoder_frame(rng, flags, seq, ticks - (9 - i) * 160))
+                seq += 1
+        if terminated:
+            dibits.append(rng.randint(0, 4, 144).astype(np.uint8))
+            nsymbols += 144
+            frames.append(vocoder_frame(rng, vocoder_frames.END, seq, nsymbols * 5 // 3))
+            seq += 1
+        expected.append(dict(offset=first / 8000.0, tgid=tgid, src=src, frames=18 * count, audio=samples))
+    return np.concatenate(dibits), ''.join(frames), np.concatenate(audio), expected
+
+def blocks(rng, a, mean):
+    """
+    a cut into blocks of random lengths
+    """
+    cuts = np.cumsum(rng.randint(1, 2 * mean, len(a) // mean + 2))
+    return [b for b in np.split(a, cuts[cuts < len(a)]) if len(b)]
+
+class qa_p25calls (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def test_001_frames (self):
+        # a damaged frame is dropped, and the frames after it still read
+        frames = [vocoder_frame(self.rng, vocoder_frames.VOICE | (vocoder_frames.START if i == 0 else 0), i, i * 160)
+                  for i in range(100)]
+        frames[10] = frames[10][:12] + chr(ord(frames[10][12]) ^ 0x40) + frames[10][13:]
+        frames.append(vocoder_frame(self.rng, vocoder_frames.END, 100, 100 * 160))
+        calls = []
+        splitter = p25calls.call_splitter(calls.append)
+        for b in blocks(self.rng, np.frombuffer(''.join(frames), dtype=np.uint8), 37):
+            splitter.add_frames(b.tostring())
+        splitter.add_audio(np.zeros(99 * 160, dtype=np.int16))
+        splitter.close()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['frames'], 99)
+        self.assertEqual(calls[0]['offset'], 0.0)
+        self.assertEqual(splitter.reader.frames, 100)
+
+    def test_002_link_control (self):
+        dibits, frames, audio, expected = traffic(self.rng, [(500, 101, 0x1234, 3, True), (2000, 0xbeef, 77, 2, False)])
+        scanner = p25calls.ldu1_scanner()
+        for b in blocks(self.rng, dibits, 1000):
+            scanner.add(b)
+        self.assertEqual(len(scanner.found), 5)
+        self.assertEqual([lc[1:] for lc in scanner.found], [(NAC, 0, 101, 0x1234)] * 3 + [(NAC, 0, 0xbeef, 77)] * 2)
+        self.assertEqual(scanner.found[0][0], 500)
+        self.assertEqual(scanner.found[1][0], 500 + 2 * 864)
+
+    def test_003_calls (self):
+        # the second call ends without a terminator; the third is after
+        # the hang time
+        dibits, frames, audio, expected = traffic(self.rng,
+            [(300, 101, 1, 2, True), (100, 102, 2, 3, False), (12000, 103, 3, 1, True)])
+        calls = []
+        splitter = p25calls.call_splitter(calls.append, start_time=1e9)
+        streams = [[(splitter.add_dibits, b) for b in blocks(self.rng, dibits, 3000)],
+                   [(splitter.add_audio, b) for b in blocks(self.rng, audio, 5000)],
+                   [(splitter.add_frames, b.tostring()) for b in blocks(self.rng, np.frombuffer(frames, dtype=np.uint8), 300)]]
+        # in any order between the streams
+        while any(streams):
+            s = streams[self.rng.randint(len(streams))]
+            if s:
+                add, b = s.pop(0)
+                add(b)
+        self.assertEqual(len(calls), 2)
+        splitter.close()
+        self.assertEqual(len(calls), 3)
+        for call, e in zip(calls, expected):
+            self.assertEqual((call['tgid'], call['src'], call['nac'], call['frames']), (e['tgid'], e['src'], NAC, e['frames']))
+            self.assertAlmostEqual(call['offset'], e['offset'], 6)
+            self.assertAlmostEqual(call['start'], 1e9 + e['offset'], 3)
+            self.assertAlmostEqual(call['duration'], e['frames'] * 0.02, 6)
+            self.assertTrue((call['audio'] == e['audio']).all())
+
+    def test_004_recorder (self):
+        outdir = tempfile.mkdtemp()
+        try:
+            events = []
+            recorder = p25calls.call_recorder(outdir, '/data/site1.dat', events.append)
+            audio = self.rng.randint(-1000, 1000, 1600).astype(np.int16)
+            recorder(dict(start=1380000000.25, end=1380000000.45, offset=1.5, duration=0.2, frames=10,
+                          nac=NAC, tgid=101, src=5, audio=audio))
+            recorder(dict(start=1380000001.0, end=1380000001.2, offset=2.25, duration=0.2, frames=10,
+                          nac=None, tgid=None, src=None, audio=audio))
+            self.assertEqual(events[0]['wav'], os.path.join(outdir, 'tg101', '20130924-052000.250-site1.wav'))
+            self.assertEqual(events[1]['wav'], os.path.join(outdir, 'tg-unknown', '20130924-052001.000-site1.wav'))
+            self.assertEqual(events[0]['event'], 'call')
+            self.assertEqual(events[0]['recording'], '/data/site1.dat')
+            self.assertFalse('audio' in events[0])
+            w = wave.open(events[0]['wav'], 'rb')
+            self.assertEqual((w.getnchannels(), w.getsampwidth(), w.getframerate()), (1, 2, 8000))
+            self.assertEqual(np.fromstring(w.readframes(w.getnframes()), dtype='<i2').tolist(), audio.tolist())
+            w.close()
+        finally:
+            shutil.rmtree(outdir)
+
+if __name__ == '__main__':
+    unittest.main ()
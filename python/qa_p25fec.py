@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import random
+import itertools
+import unittest
+import numpy as np
+
+import p25craft
+import p25bulk
+import p25fec
+
+def error_patterns(n, weight):
+    return np.array([sum([1 << b for b in bits]) for bits in itertools.combinations(range(n), weight)])
+
+class qa_p25fec (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def inject (self, codewords, nerrors):
+        """
+        add nonzero errors to nerrors random hexbits of each codeword
+        """
+        count, n = codewords.shape
+        received = codewords.copy()
+        for row in range(count):
+            pos = self.rng.permutation(n)[:nerrors]
+            received[row, pos] ^= self.rng.randint(1, 64, nerrors).astype(np.uint8)
+        return received
+
+    def test_001_rs (self):
+        count = 200
+        for code, encode in ((p25fec.rs_36_20_17, p25bulk.rs_36_20_17_encode_array),
+                             (p25fec.rs_24_12_13, p25bulk.rs_24_12_13_encode_array),
+                             (p25fec.rs_24_16_9, p25bulk.rs_24_16_9_encode_array)):
+            data = self.rng.randint(0, 64, (count, code.k)).astype(np.uint8)
+            codewords = encode(data)
+            for nerrors in range(code.t + 1):
+                out, corrected = code.decode_array(self.inject(codewords, nerrors))
+                self.assertTrue((out == data).all())
+                self.assertEqual(list(corrected), [nerrors] * count)
+            # beyond t: detected, or decoded to another codeword within t
+            received = self.inject(codewords, code.t + 1)
+            out, corrected = code.decode_array(received)
+            self.assertTrue((corrected == -1).sum() > count * 0.9)
+            for row in np.flatnonzero(corrected >= 0):
+                self.assertTrue((out[row] != data[row]).any())
+                distance = (encode(out[row:row + 1])[0] != received[row]).sum()
+                self.assertEqual(distance, corrected[row])
+                self.assertTrue(distance <= code.t)
+
+    def test_002_rs_scalar (self):
+        rng = random.Random(1)
+        for k, encode, decode in ((20, p25craft.rs_36_20_17_encode, p25fec.rs_36_20_17_decode),
+                                  (12, p25craft.rs_24_12_13_encode, p25fec.rs_24_12_13_decode),
+                                  (16, p25craft.rs_24_16_9_encode, p25fec.rs_24_16_9_decode)):
+            data = rng.getrandbits(6 * k)
+            codeword = encode(data)
+            self.assertEqual(decode(codeword), (data, 0))
+            codeword[0] ^= 0x3f
+            codeword[-1] ^= 1
+            self.assertEqual(decode(codeword), (data, 2))
+
+    def test_003_golay (self):
+        for code, encode, t, detect in ((p25fec.golay_24_12_8, p25bulk.golay_24_12_8_encode_array, 3, True),
+                                        (p25fec.golay_23_12_7, p25bulk.golay_23_12_8_encode_array, 3, False),
+                                        (p25fec.golay_18_6_8, p25bulk.golay_18_6_8_encode_array, 3, True)):
+            # every error pattern up to t bits, each on random data
+            for weight in range(t + 1):
+                e = error_patterns(code.n, weight)
+                data = self.rng.randint(0, 1 << code.k, len(e))
+                codewords = encode(data).astype(np.int64)
+                out, corrected = code.decode_array(codewords ^ e)
+                self.assertTrue((out == data).all())
+                self.assertTrue((corrected == weight).all())
+            # four bit errors are always detected by the extended codes
+            if detect:
+                e = error_patterns(code.n, 4)
+                data = self.rng.randint(0, 1 << code.k, len(e))
+                out, corrected = code.decode_array(encode(data).astype(np.int64) ^ e)
+                self.assertTrue((corrected == -1).all())
+        self.assertEqual(p25fec.golay_23_12_7_decode(p25craft.golay_23_12_8_encode(0xabc) ^ 0x400101), (0xabc, 3))
+
+    def test_004_header_terminator (self):
+        rng = random.Random(1)
+        for i in range(20):
+            lc = rng.getrandbits(72)
+            rs = p25craft.rs_24_12_13_encode(lc)
+            words = [(p25craft.xtdu_golay(rs) >> (24 * (11 - j))) & 0xffffff for j in range(12)]
+            words[i % 12] ^= 0x00f000	# too many for the Golay code
+            words[(i + 5) % 12] ^= 0x100001
+            data, nerrors = p25fec.xtdu_decode_array(np.array([words]))
+            self.assertEqual(list(data[0]), [(lc >> (6 * (11 - j))) & 0x3f for j in range(12)])
+            self.assertEqual(nerrors[0], 1)
+
+            hdr = rng.getrandbits(120)
+            rs = p25craft.rs_36_20_17_encode(hdr)
+            words = [(p25craft.header_golay(rs) >> (18 * (35 - j))) & 0x3ffff for j in range(36)]
+            for j in range(0, 36, 5):
+                words[j] ^= 0x0f000
+            data, nerrors = p25fec.header_decode_array(np.array([words]))
+            self.assertEqual(list(data[0]), [(hdr >> (6 * (19 - j))) & 0x3f for j in range(20)])
+            self.assertEqual(nerrors[0], 8)
+
+    def noisy (self, symbols, ebn0, info_bits):
+        """
+        fsk4_demod_ff levels of symbols with Gaussian noise at ebn0 dB,
+        info_bits being the data bits carried per symbol
+        """
+        es = (p25fec.dibit_levels ** 2).mean()
+        n0 = es / info_bits / 10 ** (ebn0 / 10.0)
+        return p25fec.dibit_levels[symbols] + self.rng.randn(*symbols.shape) * np.sqrt(n0 / 2)
+
+    def test_005_trellis (self):
+        p25craft.quiet = True
+        count = 200
+        for decode, encode, bits, n in ((p25fec.trellis_1_2_decode_array, p25bulk.trellis_1_2_encode_array, 2, 48),
+                                        (p25fec.trellis_3_4_decode_array, p25bulk.trellis_3_4_encode_array, 3, 32)):
+            data = self.rng.randint(0, 1 << bits, (count, n)).astype(np.uint8)
+            symbols = encode(data)
+            for received in (symbols, p25fec.dibit_levels[symbols]):
+                out, nerrors = decode(received)
+                self.assertTrue((out == data).all())
+                self.assertTrue((nerrors == 0).all())
+            # two slips to a neighbouring level, far apart, are corrected
+            # from sliced data
+            received = symbols.copy()
+            received[:, 10] ^= 2
+            received[:, 60] ^= 1
+            out, nerrors = decode(received)
+            self.assertTrue((out == data).all())
+            self.assertTrue((nerrors == 2).all())
+        # a TSBK as it goes over the air
+        rng = random.Random(1)
+        for i in range(20):
+            tsbk = p25craft.construct_tsbk(i & 1, 0, rng.getrandbits(6), 0, rng.getrandbits(64))
+            symbols = p25craft.data_interleave(p25craft.trellis_1_2_encode(p25craft.split_dibits(tsbk, 48)))
+            received = np.array([symbols])
+            received[0, i * 4] ^= 2
+            blocks, nerrors, crc_ok = p25fec.tsbk_decode_array(received)
+            self.assertEqual(list(blocks[0]), [(tsbk >> (8 * (11 - j))) & 0xff for j in range(12)])
+            self.assertEqual((nerrors[0], crc_ok[0]), (1, True))
+            blocks[0, 5] ^= 1
+            self.assertFalse(p25fec.crc_ccitt_check_array(blocks)[0])
+
+    def test_006_ber (self):
+        # bit error rate against Eb/N0, decoding the same noisy symbols
+        # from soft values, by Viterbi from sliced dibits and, as the frame
+        # assembler once did, by taking the nearest codeword pair one at a time
+        count = 1000
+        data = self.rng.randint(0, 4, (count, 48)).astype(np.uint8)
+        symbols = p25bulk.trellis_1_2_encode_array(data)
+        def ber(out):
+            return np.unpackbits((out ^ data)[..., np.newaxis], axis=-1).sum() / float(data.size * 2)
+        curves = []
+        for ebn0 in (2, 4, 6):
+            received = self.noisy(symbols, ebn0, 96 / 98.0)
+            hard = p25fec.slice_symbols(received)
+            soft_out, nerrors = p25fec.trellis_1_2_decode_array(received)
+            hard_out, nerrors = p25fec.trellis_1_2_decode_array(hard)
+            greedy_out = greedy_decode(hard)
+            curves.append((ber(soft_out), ber(hard_out), ber(greedy_out)))
+        for soft, hard, greedy in curves:
+            self.assertTrue(soft < hard <= greedy, (soft, hard, greedy))
+        for i in range(3):
+            self.assertTrue(curves[0][i] > curves[1][i] > curves[2][i], curves)
+        self.assertTrue(curves[2][0] < 0.005, curves)
+        self.assertTrue(curves[2][0] * 10 < curves[2][1], curves)
+
+    def test_007_ldu1_lc (self):
+        rng = random.Random(2)
+        for i in range(20):
+            lc = rng.getrandbits(72)
+            rs = p25craft.rs_24_12_13_encode(lc)
+            words = [p25craft.hamming_10_6_3_encode(h) for h in rs]
+            words[i % 24] ^= 1 << (i % 10)	# corrected by the Hamming code
+            words[(i + 7) % 24] ^= 0x3c0	# left to the Reed-Solomon code
+            data, nerrors = p25fec.ldu1_lc_decode_array(np.array([words]))
+            self.assertEqual(list(data[0]), [(lc >> (6 * (11 - j))) & 0x3f for j in range(12)])
+            self.assertEqual(nerrors[0], 1)
+
+    def test_008_wrong_accept (self):
+        # TSBKs with 0-24 of their 196 bits in error, accepted as the
+        # frame assembler accepts them: at most MAX_TRELLIS_ERRORS bits
+        # corrected, then the crc.  The limit alone lets through many
+        # wrong decodes; with the crc, practically none get through
+        p25craft.quiet = True
+        count = 10000
+        max_trellis_errors = 10	# as in repeater_p25_frame_assembler.cc
+        rng = random.Random(3)
+        tsbks = [p25craft.construct_tsbk(0, 0, rng.getrandbits(6), 0, rng.getrandbits(64)) for i in range(count)]
+        sent = np.array([[(t >> (8 * (11 - j))) & 0xff for j in range(12)] for t in tsbks], dtype=np.uint8)
+        data = np.array([p25craft.split_dibits(t, 48) for t in tsbks], dtype=np.uint8)
+        def bits(symbols):
+            return np.unpackbits(symbols[:, :, np.newaxis], axis=2)[:, :, 6:].reshape(len(symbols), -1)
+        received = bits(p25bulk.data_interleave_array(p25bulk.trellis_1_2_encode_array(data)))
+        for row, nerrors in enumerate(self.rng.randint(0, 25, count)):
+            received[row, self.rng.permutation(196)[:nerrors]] ^= 1
+        symbols = (received[:, 0::2] << 1) | received[:, 1::2]
+        blocks, nerrors, crc_ok = p25fec.tsbk_decode_array(symbols)
+        out = p25fec.trellis_1_2_decode_array(p25fec.data_deinterleave_array(symbols))[0]
+        corrected = (bits(p25bulk.data_interleave_array(p25bulk.trellis_1_2_encode_array(out))) != received).sum(axis=1)
+        wrong = (blocks != sent).any(axis=1)
+        trusted = corrected <= max_trellis_errors
+        accepted = trusted & crc_ok
+        self.assertTrue((wrong & trusted).sum() > 0.05 * trusted.sum(), (wrong & trusted).sum())
+        self.assertTrue(accepted.sum() > 0.3 * count, accepted.sum())
+        self.assertTrue((wrong & accepted).sum() < 1e-4 * accepted.sum(), (wrong & accepted).sum())
+
+def greedy_decode (dibits):
+    """
+    the old 1/2 rate decoder: from the previous output, the input whose
+    dibit pair is nearest in Hamming distance
+    """
+    count, m = dibits.shape[0], dibits.shape[1] // 2
+    code = p25fec.trellis_1_2
+    pairs = (dibits[:, 0::2].astype(np.int32) << 2) | dibits[:, 1::2]
+    out = np.empty((count, m), dtype=np.uint8)
+    state = np.zeros(count, dtype=np.int32)
+    for t in range(m):
+        out[:, t] = code.hamming[code.pair[state], pairs[:, t][:, np.newaxis]].argmin(axis=1)
+        state = out[:, t]
+    return out[:, :-1]
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import unittest
+import numpy as np
+
+import p25bulk
+import p25sim
+
+class qa_p25sim (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+        self.frames = p25sim.test_frames(20)
+
+    def test_001_frames (self):
+        self.assertEqual(self.frames.shape, (40, 864))
+        self.assertTrue((self.frames[:, :24] == p25bulk.frame_sync).all())
+        # no two frames alike
+        self.assertEqual(len(set([f.tostring() for f in self.frames])), 40)
+        pos = p25sim.sync_positions(self.frames.reshape(-1), 0)
+        self.assertEqual(list(pos), range(0, 40 * 864, 864))
+
+    def test_002_perfect (self):
+        # received from the middle of the third frame onwards
+        rx = np.concatenate((self.rng.randint(0, 4, 100).astype(np.uint8), self.frames.reshape(-1)[2000:]))
+        r = p25sim.score(rx, self.frames)
+        self.assertEqual((r['frames_sent'], r['frames_synced']), (40, 37))
+        self.assertEqual((r['bit_errors'], r['nid_errors'], r['ber']), (0, 0, 0.0))
+        self.assertEqual(r['bits'], 37 * 840 * 2)
+
+    def test_003_errors (self):
+        rx = self.frames.copy()
+        rx[5, 100] ^= 3		# two bit errors
+        rx[9, 30] ^= 1		# NID
+        rx[11, 5] ^= 2		# frame sync, not counted
+        rx = rx.reshape(-1)
+        # a receiver slipping a symbol after frame 20
+        rx = np.concatenate((rx[:20 * 864 + 500], rx[20 * 864 + 501:]))
+        r = p25sim.score(rx, self.frames)
+        self.assertEqual(r['frames_synced'], 40)
+        self.assertEqual(r['nid_errors'], 1)
+        self.assertTrue(r['bit_errors'] >= 3)
+        self.assertAlmostEqual(r['nid_error_rate'], 1 / 40.0)
+        self.assertEqual(p25sim.score(np.zeros(5000, dtype=np.uint8), self.frames)['frames_synced'], 0)
+
+    def test_004_channel (self):
+        rate = 48000
+        x = np.exp(1j * np.pi * 0.01 * np.arange(48000))
+        y = p25sim.impair(x, rate, offset=100.0)
+        phase = np.angle(y[1:] * np.conj(x[1:]) * np.conj(y[:-1] * np.conj(x[:-1])))
+        self.assertTrue(np.allclose(phase, 2 * np.pi * 100 / rate, atol=1e-4))
+        y = p25sim.impair(x, rate, ebn0_db=10.0)
+        # Eb/N0 = 10 dB at 10 samples per symbol: noise power 1/2 per sample
+        self.assertAlmostEqual(np.mean(np.abs(y - x) ** 2), 0.5, 1)
+        y = p25sim.impair(x, rate, drift_ppm=1000.0)
+        self.assertEqual(len(y), 47952)
+        self.assertTrue(np.allclose(y[40000], x[40040], atol=1e-3))
+
+if __name__ == '__main__':
+    unittest.main ()
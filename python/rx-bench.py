@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#
+# rx-bench.py - throughput and error rate benchmark for the receive chains
+#
+# Known LDU1/LDU2 traffic from p25bulk.py is modulated with p25_mod_bf (C4FM)
+# or cqpsk_mod (CQPSK), impaired by p25sim.py with noise, a frequency offset
+# and a symbol clock error, and written to a file.  Each file is then run
+# through the offline receive chain as fast as the flowgraph allows:
+#
+#   c4fm:  quadrature_demod_cf, fsk4_demod_ff, fsk4_slicer_fb, decoder_bf
+#   cqpsk: gardner_costas_cc, diff_phasor_cc, fsk4_slicer_fb
+#
+# with the slicer output also feeding p25_frame_assembler and a vector sink.
+# For every case the samples processed per second, the frames the frame
+# assembler decoded, the bit error rate and the NID error rate are printed
+# and appended as one JSON object per line to the results file, so that runs
+# on different builds can be compared with
+#
+#   rx-bench.py --compare before.json after.json
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+
+import os, time, json, socket, shutil, tempfile
+from math import pi
+from optparse import OptionParser
+import numpy as np
+
+from gnuradio import gr, op25, repeater
+
+import p25bulk
+import p25sim
+from op25_c4fm_mod import p25_mod_bf
+from cqpsk import cqpsk_mod
+
+SAMPLE_RATE = 48000
+SYMBOL_DEVIATION = 600.0	# Hz per unit of the +/-1, +/-3 C4FM levels
+NAC = 0x293
+LDU_UNITS = ((0x05, NAC), (0x0a, NAC))	# (duid, nac) reported for good LDUs
+SLICER_LEVELS = [-2.0, 0.0, 2.0, 4.0]
+
+# fields identifying a case, in the order printed
+CASE_KEYS = ('modulation', 'ebn0_db', 'offset_hz', 'drift_ppm')
+
+
+##################
+# transmitter    #
+##################
+
+# Modulate a dibit stream to complex baseband at SAMPLE_RATE.
+def modulate(modulation, frames, dirname):
+	dibits = frames.reshape(-1)
+	fn_in = os.path.join(dirname, 'tx.sym')
+	fn_out = os.path.join(dirname, 'tx.dat')
+	tb = gr.top_block()
+	if modulation == 'c4fm':
+		# one dibit per byte, +/-1 out of p25_mod_bf for the outer levels
+		dibits.tofile(fn_in)
+		mod = p25_mod_bf(output_sample_rate=SAMPLE_RATE)
+		fm = gr.frequency_modulator_fc(2 * pi * 3 * SYMBOL_DEVIATION / SAMPLE_RATE)
+		tb.connect(gr.file_source(gr.sizeof_char, fn_in), mod, fm)
+	else:
+		# cqpsk_mod unpacks bytes two bits at a time, MSB first
+		open(fn_in, 'wb').write(p25bulk.pack_dibits(dibits))
+		fm = cqpsk_mod(samples_per_symbol=SAMPLE_RATE // p25sim.SYMBOL_RATE)
+		tb.connect(gr.file_source(gr.sizeof_char, fn_in), fm)
+	tb.connect(fm, gr.file_sink(gr.sizeof_gr_complex, fn_out))
+	tb.run()
+	return np.fromfile(fn_out, dtype=np.complex64)
+
+
+##################
+# receivers      #
+##################
+
+class c4fm_rx(gr.top_block):
+	def __init__(self, filename):
+		gr.top_block.__init__(self)
+		src = gr.file_source(gr.sizeof_gr_complex, filename, False)
+		fm_demod = gr.quadrature_demod_cf(SAMPLE_RATE / (2 * pi * SYMBOL_DEVIATION))
+		sps = SAMPLE_RATE // p25sim.SYMBOL_RATE
+		symbol_filter = gr.fir_filter_fff(1, (1.0 / sps,) * sps)
+		# the autotune messages are dropped by fsk4_demod_ff once the queue is full
+		demod = op25.fsk4_demod_ff(gr.msg_queue(2), SAMPLE_RATE, p25sim.SYMBOL_RATE)
+		self.slicer = op25.fsk4_slicer_fb(SLICER_LEVELS)
+		self.connect(src, fm_demod, symbol_filter, demod, self.slicer)
+		self.connect(self.slicer, op25.decoder_bf(), gr.null_sink(gr.sizeof_float))
+
+class cqpsk_rx(gr.top_block):
+	def __init__(self, filename):
+		gr.top_block.__init__(self)
+		src = gr.file_source(gr.sizeof_gr_complex, filename, False)
+		agc = gr.feedforward_agc_cc(16, 1.0)
+		# decimate by 2 to five samples per symbol, as cqpsk-demod-file.py does
+		rate = SAMPLE_RATE // 2
+		taps = gr.firdes.low_pass(1.0, SAMPLE_RATE, 6.5e3, 650, gr.firdes.WIN_HANN)
+		decim = gr.fir_filter_ccf(2, taps)
+		timing_error_gain = 0.025
+		alpha = 0.125
+		demod = repeater.gardner_costas_cc(rate // p25sim.SYMBOL_RATE, timing_error_gain,
+			0.25 * timing_error_gain * timing_error_gain, alpha, 0.125 * alpha * alpha, 0.025, -0.025)
+		rescale = gr.multiply_const_ff(1 / (pi / 4.0))
+		self.slicer = repeater.fsk4_slicer_fb(SLICER_LEVELS)
+		self.connect(src, agc, decim, demod, gr.diff_phasor_cc(), gr.complex_to_arg(), rescale, self.slicer)
+
+receivers = {'c4fm': c4fm_rx, 'cqpsk': cqpsk_rx}
+
+# Run one receiver over a file, without throttling.
+# returns the recovered dibits, the data units reported by the frame
+# assembler (duid, nac) and the run time
+def receive(modulation, filename):
+	msgq = gr.msg_queue()
+	tb = receivers[modulation](filename)
+	sink = gr.vector_sink_b()
+	assembler = repeater.p25_frame_assembler('', 0, 0, False, False, True, msgq)
+	tb.connect(tb.slicer, sink)
+	tb.connect(tb.slicer, assembler)
+	t0 = time.time()
+	tb.run()
+	elapsed = time.time() - t0
+	units = []
+	while not msgq.empty_p():
+		msg = msgq.delete_head()
+		s = msg.to_string()
+		units.append((msg.type(), (ord(s[-2]) << 8) | ord(s[-1])))
+	return np.array(sink.data(), dtype=np.uint8), units, elapsed
+
+
+##################
+# benchmark      #
+##################
+
+def run_case(modulation, clean, frames, ebn0_db, offset, drift, dirname, seed):
+	filename = os.path.join(dirname, 'rx.dat')
+	p25sim.impair(clean, SAMPLE_RATE, ebn0_db, offset, drift, seed).tofile(filename)
+	nsamples = os.path.getsize(filename) // 8
+	dibits, units, elapsed = receive(modulation, filename)
+	result = dict(modulation=modulation, ebn0_db=ebn0_db, offset_hz=offset, drift_ppm=drift,
+		samples=nsamples, seconds=elapsed, samples_per_sec=nsamples / elapsed,
+		realtime=nsamples / float(SAMPLE_RATE) / elapsed,
+		frames_decoded=len([u for u in units if u in LDU_UNITS]))
+	result.update(p25sim.score(dibits, frames))
+	return result
+
+def parse_list(s, conv=float):
+	return [None if v == 'inf' else conv(v) for v in s.split(',')]
+
+def print_header():
+	print '%-6s %7s %8s %6s %10s %7s %9s %9s %9s' % ('mod', 'Eb/N0', 'offset', 'ppm',
+		'samples/s', 'x rt', 'decoded', 'BER', 'NID err')
+
+def print_result(r):
+	ber = r['ber'] is not None and '%9.2e' % r['ber'] or '%9s' % '-'
+	nid = r['nid_error_rate'] is not None and '%9.4f' % r['nid_error_rate'] or '%9s' % '-'
+	ebn0 = r['ebn0_db'] is None and 'inf' or '%.1f' % r['ebn0_db']
+	print '%-6s %7s %8.0f %6.0f %10.0f %7.1f %4d/%-4d %s %s' % (r['modulation'], ebn0,
+		r['offset_hz'], r['drift_ppm'], r['samples_per_sec'], r['realtime'],
+		r['frames_decoded'], r['frames_sent'], ber, nid)
+
+def read_results(filename):
+	results = {}
+	for line in open(filename):
+		if line.strip():
+			r = json.loads(line)
+			results[tuple([r[k] for k in CASE_KEYS])] = r
+	return results
+
+# Print the cases common to two results files side by side.
+def compare(before, after):
+	a = read_results(before)
+	b = read_results(after)
+	print '%-6s %7s %8s %6s %12s %12s %8s %9s %9s' % ('mod', 'Eb/N0', 'offset', 'ppm',
+		'samples/s', 'samples/s', 'speedup', 'BER', 'BER')
+	for case in sorted(set(a) & set(b)):
+		ra, rb = a[case], b[case]
+		ebn0 = case[1] is None and 'inf' or '%.1f' % case[1]
+		print '%-6s %7s %8.0f %6.0f %12.0f %12.0f %7.2fx %9s %9s' % (case[0], ebn0, case[2], case[3],
+			ra['samples_per_sec'], rb['samples_per_sec'], rb['samples_per_sec'] / ra['samples_per_sec'],
+			'%.2e' % (ra['ber'] or 0), '%.2e' % (rb['ber'] or 0))
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-n", "--superframes", type="int", default=50,
+		help="superframes of test traffic (Default: 50, 18 s)")
+	parser.add_option("-m", "--modulation", type="string", default="c4fm,cqpsk",
+		help="comma separated modulations (Default: c4fm,cqpsk)")
+	parser.add_option("-e", "--ebn0", type="string", default="inf,20,14,10,8",
+		help="comma separated Eb/N0 in dB, inf for none (Default: inf,20,14,10,8)")
+	parser.add_option("-f", "--offset", type="string", default="0,500",
+		help="comma separated carrier offsets in Hz (Default: 0,500)")
+	parser.add_option("-d", "--drift", type="string", default="0,100",
+		help="comma separated symbol clock errors in ppm (Default: 0,100)")
+	parser.add_option("-o", "--output", type="string", default="rx-bench.json",
+		help="results file, appended to (Default: rx-bench.json)")
+	parser.add_option("-l", "--label", type="string", default=None,
+		help="build label stored with the results (Default: host name)")
+	parser.add_option("-k", "--keep", type="string", default=None,
+		help="keep the sample files in this directory")
+	parser.add_option("-s", "--seed", type="int", default=1, help="random seed")
+	parser.add_option("-c", "--compare", action="store_true", default=False,
+		help="compare two results files given as arguments")
+	(options, args) = parser.parse_args()
+
+	if options.compare:
+		if len(args) != 2:
+			parser.error('--compare takes two results files')
+		compare(args[0], args[1])
+		return
+
+	label = options.label or socket.gethostname()
+	dirname = options.keep or tempfile.mkdtemp()
+	if not os.path.isdir(dirname):
+		os.makedirs(dirname)
+	frames = p25sim.test_frames(options.superframes, NAC, options.seed)
+	out = open(options.output, 'a')
+	print_header()
+	try:
+		for modulation in options.modulation.split(','):
+			clean = modulate(modulation, frames, dirname)
+			for ebn0 in parse_list(options.ebn0):
+				for offset in parse_list(options.offset):
+					for drift in parse_list(options.drift):
+						r = run_case(modulation, clean, frames, ebn0, offset or 0.0,
+							drift or 0.0, dirname, options.seed)
+						r.update(label=label, date=time.time(), superframes=options.superframes)
+						print_result(r)
+						out.write(json.dumps(r, sort_keys=True) + '\n')
+						out.flush()
+	finally:
+		out.close()
+		if options.keep is None:
+			shutil.rmtree(dirname)
+
+if __name__ == "__main__":
+	main()
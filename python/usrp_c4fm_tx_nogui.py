@@ -98,7 +98,7 @@ Simple tx-from-pcap-file utility.
 """
 class usrp_c4fm_tx_block(gr.top_block):
 
-    def __init__(self, subdev_spec, freq, subdev_gain, filename, delay):
+    def __init__(self, subdev_spec, freq, subdev_gain, filename, delay, repeat=True, rate=0.0, udp_port=0):
 
         gr.top_block.__init__ (self)
 
@@ -113,7 +113,7 @@ class usrp_c4fm_tx_block(gr.top_block):
         interp_factor = int(usrp_rate // channel_rate)
 
         # open the pcap source
-        pcap = op25.pcap_source_b(filename, delay)
+        pcap = op25.pcap_source_b(filename, delay, repeat, rate, udp_port)
 #        pcap = gr.glfsr_source_b(16)
 
         # convert octets into dibits
@@ -170,13 +170,20 @@ if __name__ == '__main__':
                       help="packet capture file [required]")
     parser.add_option("-d", "--delay", type="int", default=0,
                       help="delay before TX of first symbol [default=%default]")
+    parser.add_option("-o", "--one-shot", action="store_true", default=False,
+                      help="stop at the end of the capture instead of repeating it")
+    parser.add_option("-r", "--rate", type="eng_float", default=0.0,
+                      help="send packets at RATE times their captured timing, 0 for as fast as the modulator takes them [default=%default]")
+    parser.add_option("-u", "--udp-port", type="int", default=0,
+                      help="only send UDP packets to or from this port, 0 for any [default=%default]")
     (options, args) = parser.parse_args ()
     if options.freq is None:
         parser.print_help()
         sys.exit(1)
     
     try:
-        rx = usrp_c4fm_tx_block(options.subdev_spec, options.freq, options.gain, options.pcap_file, options.delay)
+        rx = usrp_c4fm_tx_block(options.subdev_spec, options.freq, options.gain, options.pcap_file, options.delay,
+                                not options.one_shot, options.rate, options.udp_port)
         rx.run()
     except KeyboardInterrupt:
         rx.db.set_enable(False)
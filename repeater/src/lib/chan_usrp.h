@@ -18,6 +18,9 @@
  *
  */
 
+#ifndef INCLUDED_CHAN_USRP_H
+#define INCLUDED_CHAN_USRP_H
+
 #define USRP_VOICE_FRAME_SIZE (160*sizeof(short))  // 0.02 * 8k
 
 enum { USRP_TYPE_VOICE=0, USRP_TYPE_DTMF, USRP_TYPE_TEXT };
@@ -33,3 +36,5 @@ struct _chan_usrp_bufhdr {
 	uint32_t mpxid;		// for future use
 	uint32_t reserved;	// for future use
 };
+
+#endif /* INCLUDED_CHAN_USRP_H */
@@ -53,13 +53,14 @@ private:
 // ----------------------------------------------------------------
 
 GR_SWIG_BLOCK_MAGIC(repeater,p25_frame_assembler);
+enum { VOCODER_FORMAT_TEXT=0, VOCODER_FORMAT_BINARY };
 
-repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue);
+repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format = VOCODER_FORMAT_TEXT);
 
 class repeater_p25_frame_assembler : public gr_sync_block
 {
 private:
-  repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue);
+  repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format);
 };
 
 // ----------------------------------------------------------------
@@ -142,23 +143,38 @@ class repeater_tdetect_cc : public gr_sync_block
 
 GR_SWIG_BLOCK_MAGIC(repeater,vocoder);
 
-repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag);
+repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format = VOCODER_FORMAT_TEXT);
 
 class repeater_vocoder : public gr_block
 {
 private:
-  repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag);
+  repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format);
+
+public:
+  unsigned int frames_received() const;
+  unsigned int frames_lost() const;
+  unsigned int bytes_skipped() const;
 };
 
 // ----------------------------------------------------------------
 GR_SWIG_BLOCK_MAGIC(repeater,chan_usrp);
-repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue);
+enum { CHAN_USRP_DROP_OLDEST=0, CHAN_USRP_DROP_NEWEST };
+repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth = 3, int max_frames = 50, int drop_policy = CHAN_USRP_DROP_OLDEST);
 
 class repeater_chan_usrp : public gr_block
 {
 private:
 
-  repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue);  	// private constructor
+  repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth, int max_frames, int drop_policy);  	// private constructor
+
+public:
+  unsigned int received() const;
+  unsigned int late() const;
+  unsigned int duplicate() const;
+  unsigned int reordered() const;
+  unsigned int lost() const;
+  unsigned int overflow() const;
+  unsigned int underrun() const;
 };
 
 // ----------------------------------------------------------------
@@ -86,6 +86,7 @@ static const int phase_table[4] = {+1, +3, -1, -3};
 #include <sys/time.h>
 #include <sys/types.h>
 #include <sys/select.h>
+#include <sys/uio.h>
 
 #include <op25_p25_frame.h>
 #include <op25_imbe_frame.h>
@@ -96,20 +97,28 @@ static const int phase_table[4] = {+1, +3, -1, -3};
 #define min(a,b) ((a<b)?a:b)
 #endif
 
+static const unsigned int JITTER_SLOTS = 64;	// more than any jitter depth
+static const int32_t JITTER_RESYNC = 1000;	// a jump this big is a new stream
+static const int RX_BATCH = 32;		// packets per recvmmsg()
+static const int RX_BUF_SZ = 1024;
+static const size_t FRAME_SAMPLES = USRP_VOICE_FRAME_SIZE / sizeof(int16_t);
+static const size_t LDU_DIBITS = P25_VOICE_FRAME_SIZE / 2;
+static const size_t FRAME_DIBITS = LDU_DIBITS / nof_voice_codewords;
+
 /*
  * Create a new instance of repeater_chan_usrp and return
  * a boost shared_ptr.  This is effectively the public constructor.
  */
 repeater_chan_usrp_sptr 
-repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue)
+repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth, int max_frames, int drop_policy)
 {
-  return repeater_chan_usrp_sptr (new repeater_chan_usrp (listen_port, do_imbe, do_complex, do_float, gain, decim, queue));
+  return repeater_chan_usrp_sptr (new repeater_chan_usrp (listen_port, do_imbe, do_complex, do_float, gain, decim, queue, jitter_depth, max_frames, drop_policy));
 }
 
 /*
  * The private constructor
  */
-repeater_chan_usrp::repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue)
+repeater_chan_usrp::repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth, int max_frames, int drop_policy)
   : gr_block ("chan_usrp",
 		   gr_make_io_signature (0, 0, 0),
 		   gr_make_io_signature (1, 1, (do_float) ? sizeof(float) : ((do_complex) ? sizeof(gr_complex) : ((do_imbe) ? sizeof(char) : sizeof(int16_t))))),
@@ -123,12 +132,33 @@ repeater_chan_usrp::repeater_chan_usrp (int listen_port, bool do_imbe, bool do_c
     d_timeout_time(0),
     d_timeout_value(4),	// in sec.
     f_body(P25_VOICE_FRAME_SIZE),
+    d_jitter(JITTER_SLOTS),
+    d_jitter_depth(jitter_depth),
+    d_max_frames(max_frames),
+    d_prime_frames(0),
+    d_drop_policy(drop_policy),
+    d_started(false),
+    d_draining(false),
+    d_playing(false),
+    d_play_seq(0),
+    d_max_seq(0),
+    d_held(0),
+    d_conceal_count(0),
+    d_rx_bufs(RX_BATCH * RX_BUF_SZ),
+    d_received(0),
+    d_late(0),
+    d_duplicate(0),
+    d_reordered(0),
+    d_lost(0),
+    d_overflow(0),
+    d_underrun(0),
     d_msgq(queue),
     d_gain(gain),
     d_decim(decim),
     d_phase(0),
     d_next_samp(0),
     d_current_sym(0),
+    d_current_fsym(0),
     d_active_dibit(0),
     d_shift_reg(0),
     d_muted(0),
@@ -138,6 +168,21 @@ repeater_chan_usrp::repeater_chan_usrp (int listen_port, bool do_imbe, bool do_c
 	int i, j, k;
 	float t;
 	float *fp;
+	if (d_jitter_depth < 0)
+		d_jitter_depth = 0;
+	if (d_jitter_depth > (int)JITTER_SLOTS / 2)
+		d_jitter_depth = JITTER_SLOTS / 2;
+	// output starts with d_jitter_depth frames in hand, beyond the LDU
+	// being sent when the frames are IMBE encoded
+	d_prime_frames = d_jitter_depth;
+	int step = 1;	// frames added to the output queue at a time
+	if (d_do_imbe || d_do_complex || d_do_float) {
+		d_prime_frames += nof_voice_codewords;
+		step = nof_voice_codewords;
+	}
+	if (d_max_frames < d_prime_frames + step)
+		d_max_frames = d_prime_frames + step;
+	reset_jitter();
 	if (d_do_complex) {
 		for (i = 0; i < N_PHASES; i++) {
 			for (j = 0; j < N_WAVEFORMS; j++) {
@@ -185,6 +230,12 @@ void repeater_chan_usrp::append_imbe_codeword(bit_vector& frame_body, int16_t fr
 			frame_body[imbe_ldu_ls_data_bits[i]] = 0;
 		}
 		// finally, output the frame
+		if (!make_room()) {
+			d_overflow += nof_voice_codewords;
+			codeword_ct = 0;
+			frame_cnt++;
+			return;
+		}
 		for (uint32_t i = 0; i < P25_VOICE_FRAME_SIZE; i += 2) {
 			uint8_t dibit = 
 				(frame_body[i+0] << 1) +
@@ -202,67 +253,13 @@ repeater_chan_usrp::general_work (int noutput_items,
                                gr_vector_const_void_star &input_items,
                                gr_vector_void_star &output_items)
 {
-	int rc;
-	struct sockaddr saddr;
-	char rcvbuf[1024];
-	socklen_t addrlen;
-	int16_t *bufdata;
-	struct _chan_usrp_bufhdr *bufhdrp;
-	int16_t frame_vector[8];
-	unsigned int rseq;
-
-	for (;;) {	// read all pending msgs
-		addrlen = sizeof(saddr);
-		rc = recvfrom(read_sock, rcvbuf, sizeof(rcvbuf), MSG_DONTWAIT,
-			&saddr, &addrlen);
-		if (rc < 0 && (errno == EAGAIN || errno == EWOULDBLOCK))
-			break;
-		if (rc < 0 && !warned_select) {
-			fprintf(stderr, "repeater_chan_usrp: recvfrom: %d\n", errno);
-			warned_select = 1;
-		}
-		if (rc < 0)
-			break;
-		if (rc !=  sizeof(struct _chan_usrp_bufhdr) &&
-		    rc != (sizeof(struct _chan_usrp_bufhdr) + USRP_VOICE_FRAME_SIZE)) {
-			fprintf(stderr, "repeater_chan_usrp: error: received size %d invalid\n", rc) ;
-			continue;
-		}
-		bufhdrp = (struct _chan_usrp_bufhdr*)rcvbuf;
-		bufdata = (int16_t*) &rcvbuf[ sizeof(struct _chan_usrp_bufhdr) ];
-		if (ntohl(bufhdrp->keyup) != d_keyup_state) {
-			// tx keyup state change has occurred
-#if 0
-			fprintf(stderr, "repeater_chan_usrp: keyup state %d was %d\n", ntohl(bufhdrp->keyup), d_keyup_state);
-#endif
-			d_keyup_state = ntohl(bufhdrp->keyup);
-			// TODO queue hdu / tdu(s)
-#if 0
-			if (d_msgq) {
-				gr_message_sptr msg = gr_make_message(0,d_keyup_state,0,0);
-				d_msgq->handle(msg);
-			}
-#endif
-		}
-		rseq = ntohl(bufhdrp->seq);
-		if (rseq != d_expected_seq && rseq != 0 && d_expected_seq != 0) {
-			fprintf(stderr, "repeater_chan_usrp: possible data loss, expected seq %d received %d\n", d_expected_seq, rseq);
-		}
-		d_expected_seq = rseq + 1;
-		if (bufhdrp->keyup) {
-			d_timeout_time = time(NULL) + d_timeout_value;
-		}
-		if ((unsigned int)rc < sizeof(struct _chan_usrp_bufhdr) + USRP_VOICE_FRAME_SIZE)
-			continue;
-		if (d_do_imbe || d_do_complex || d_do_float) {
-			vocoder.imbe_encode(frame_vector, bufdata);
-			append_imbe_codeword(f_body, frame_vector, codeword_ct);
-		} else {
-			for (unsigned int i=0; i < (USRP_VOICE_FRAME_SIZE>>1); i++) {
-				output_queue_s.push_back(bufdata[i]);
-			}
-		}
+	if (read_sock > 0) {
+		// read all pending msgs
+		while (receive_batch() == RX_BATCH)
+			;
 	}
+	release_frames();
+
 	if (d_do_complex) {
 		gr_complex *out = (gr_complex*) output_items[0];
 		int o=0;
@@ -276,7 +273,7 @@ repeater_chan_usrp::general_work (int noutput_items,
 				continue;
 			}
 			if (!d_current_sym) {
-				if (!output_queue.size()) {
+				if (!ready_to_play()) {
 					out[o++] = gr_complex(0, 0);
 					continue;
 				}
@@ -316,7 +313,7 @@ repeater_chan_usrp::general_work (int noutput_items,
 				continue;
 			}
 			if (!d_current_fsym) {
-				if (!output_queue.size()) {
+				if (!ready_to_play()) {
 					out[o++] = 0.0;
 					continue;
 				}
@@ -339,7 +336,7 @@ repeater_chan_usrp::general_work (int noutput_items,
 	} else if (d_do_imbe) {
 		char *out = (char*) output_items[0];
 		// if no output available at all, output zeros
-		if (output_queue.empty()) {
+		if (!ready_to_play()) {
 			for (int i = 0; i < noutput_items; i++) {
 				out[i] = 0;
 				// out[i] = i & 3;
@@ -356,7 +353,7 @@ repeater_chan_usrp::general_work (int noutput_items,
 	} else {
 		int16_t *out = (int16_t*) output_items[0];
 		// if no output available at all, output zeros
-		if (output_queue_s.empty()) {
+		if (!ready_to_play()) {
 			for (int i = 0; i < noutput_items; i++) {
 				out[i] = 0;
 			}
@@ -371,6 +368,242 @@ repeater_chan_usrp::general_work (int noutput_items,
 	}
 }
 
+/*
+ * Read up to RX_BATCH packets without waiting.  Returns the number read.
+ */
+int repeater_chan_usrp::receive_batch(void)
+{
+#ifdef MSG_WAITFORONE
+	struct mmsghdr msgs[RX_BATCH];
+	struct iovec iovecs[RX_BATCH];
+
+	memset(msgs, 0, sizeof(msgs));
+	for (int i = 0; i < RX_BATCH; i++) {
+		iovecs[i].iov_base = &d_rx_bufs[i * RX_BUF_SZ];
+		iovecs[i].iov_len = RX_BUF_SZ;
+		msgs[i].msg_hdr.msg_iov = &iovecs[i];
+		msgs[i].msg_hdr.msg_iovlen = 1;
+	}
+	int rc = recvmmsg(read_sock, msgs, RX_BATCH, MSG_DONTWAIT, NULL);
+	if (rc < 0 && errno != EAGAIN && errno != EWOULDBLOCK && !warned_select) {
+		fprintf(stderr, "repeater_chan_usrp: recvmmsg: %d\n", errno);
+		warned_select = 1;
+	}
+	for (int i = 0; i < rc; i++)
+		receive_packet(&d_rx_bufs[i * RX_BUF_SZ], msgs[i].msg_len);
+	return (rc < 0) ? 0 : rc;
+#else
+	// no recvmmsg(): one packet per call
+	struct sockaddr saddr;
+	socklen_t addrlen = sizeof(saddr);
+	int rc = recvfrom(read_sock, &d_rx_bufs[0], RX_BUF_SZ, MSG_DONTWAIT,
+		&saddr, &addrlen);
+	if (rc < 0 && errno != EAGAIN && errno != EWOULDBLOCK && !warned_select) {
+		fprintf(stderr, "repeater_chan_usrp: recvfrom: %d\n", errno);
+		warned_select = 1;
+	}
+	if (rc < 0)
+		return 0;
+	receive_packet(&d_rx_bufs[0], rc);
+	return RX_BATCH;	// keep reading
+#endif
+}
+
+/*
+ * Place one packet in the jitter buffer by its sequence number.
+ */
+void repeater_chan_usrp::receive_packet(const char *buf, int rc)
+{
+	if (rc !=  sizeof(struct _chan_usrp_bufhdr) &&
+	    rc != (sizeof(struct _chan_usrp_bufhdr) + USRP_VOICE_FRAME_SIZE)) {
+		fprintf(stderr, "repeater_chan_usrp: error: received size %d invalid\n", rc) ;
+		return;
+	}
+	const struct _chan_usrp_bufhdr *bufhdrp = (const struct _chan_usrp_bufhdr*)buf;
+	uint32_t rseq = ntohl(bufhdrp->seq);
+	uint32_t keyup = ntohl(bufhdrp->keyup);
+	if (keyup) {
+		d_timeout_time = time(NULL) + d_timeout_value;
+	}
+	if (!d_started) {
+		d_started = true;
+		d_play_seq = rseq;
+		d_max_seq = rseq;
+	}
+	int32_t ahead = (int32_t)(rseq - d_play_seq);
+	if (ahead < 0 && ahead > -JITTER_RESYNC) {
+		d_late++;
+		return;
+	}
+	if (ahead < 0 || ahead >= (int32_t)JITTER_SLOTS) {
+		// the sender has restarted, or skipped too far ahead to wait
+		// for what is missing: finish the old stream first
+		if (ahead > 0 && ahead < JITTER_RESYNC)
+			d_lost += rseq - d_max_seq - 1;
+		d_draining = true;
+		release_frames();
+		d_started = true;
+		d_play_seq = rseq;
+		d_max_seq = rseq;
+	}
+	jitter_slot& slot = d_jitter[rseq % JITTER_SLOTS];
+	if (slot.full && slot.seq == rseq) {
+		d_duplicate++;
+		return;
+	}
+	if ((int32_t)(rseq - d_max_seq) < 0)
+		d_reordered++;
+	else
+		d_max_seq = rseq;
+	slot.full = true;
+	slot.seq = rseq;
+	slot.keyup = keyup;
+	slot.voice = (rc == sizeof(struct _chan_usrp_bufhdr) + USRP_VOICE_FRAME_SIZE);
+	if (slot.voice)
+		memcpy(slot.samples, buf + sizeof(struct _chan_usrp_bufhdr), USRP_VOICE_FRAME_SIZE);
+	d_held++;
+	d_received++;
+	if (!keyup)
+		d_draining = true;
+}
+
+/*
+ * Release packets in sequence.  A gap is waited for until more than
+ * d_jitter_depth packets are held behind it, the output queue runs dry
+ * (see ready_to_play()) or the transmission ends.
+ */
+void repeater_chan_usrp::release_frames(void)
+{
+	while (d_held) {
+		const jitter_slot& slot = d_jitter[d_play_seq % JITTER_SLOTS];
+		bool present = slot.full && slot.seq == d_play_seq;
+		if (!present && d_held <= (unsigned int)d_jitter_depth && !d_draining)
+			break;
+		advance();
+	}
+	if (d_draining && !d_held)
+		reset_jitter();
+}
+
+void repeater_chan_usrp::advance(void)
+{
+	jitter_slot& slot = d_jitter[d_play_seq % JITTER_SLOTS];
+	if (slot.full && slot.seq == d_play_seq) {
+		if (slot.voice)
+			play_frame(slot.samples);
+		d_keyup_state = slot.keyup;
+		slot.full = false;
+		d_held--;
+	} else {
+		d_lost++;
+		conceal_frame();
+	}
+	d_play_seq++;
+}
+
+void repeater_chan_usrp::play_frame(const int16_t *samples)
+{
+	memcpy(d_last_frame, samples, USRP_VOICE_FRAME_SIZE);
+	d_conceal_count = 0;
+	emit_frame(samples);
+}
+
+/*
+ * Stand in for a lost frame: the last frame at half level once, then
+ * silence.
+ */
+void repeater_chan_usrp::conceal_frame(void)
+{
+	int16_t samples[FRAME_SAMPLES];
+	for (size_t i = 0; i < FRAME_SAMPLES; i++)
+		samples[i] = (d_conceal_count == 0) ? d_last_frame[i] / 2 : 0;
+	d_conceal_count++;
+	emit_frame(samples);
+}
+
+void repeater_chan_usrp::emit_frame(const int16_t *samples)
+{
+	int16_t frame_vector[8];
+	if (d_do_imbe || d_do_complex || d_do_float) {
+		// make_room() is applied to whole LDUs by append_imbe_codeword()
+		vocoder.imbe_encode(frame_vector, const_cast<int16_t*>(samples));
+		append_imbe_codeword(f_body, frame_vector, codeword_ct);
+	} else {
+		if (!make_room()) {
+			d_overflow++;
+			return;
+		}
+		output_queue_s.insert(output_queue_s.end(), samples, samples + FRAME_SAMPLES);
+	}
+}
+
+void repeater_chan_usrp::reset_jitter(void)
+{
+	for (size_t i = 0; i < d_jitter.size(); i++)
+		d_jitter[i].full = false;
+	d_started = false;
+	d_draining = false;
+	d_held = 0;
+	d_conceal_count = 0;
+	memset(d_last_frame, 0, sizeof(d_last_frame));
+}
+
+size_t repeater_chan_usrp::queued_frames(void) const
+{
+	if (d_do_imbe || d_do_complex || d_do_float)
+		return output_queue.size() / FRAME_DIBITS;
+	return output_queue_s.size() / FRAME_SAMPLES;
+}
+
+/*
+ * Keep the output queue within d_max_frames voice frames before one more
+ * is added.  Returns false if the new frame is to be dropped instead.
+ */
+bool repeater_chan_usrp::make_room(void)
+{
+	if (queued_frames() < (size_t)d_max_frames)
+		return true;
+	if (d_drop_policy == CHAN_USRP_DROP_NEWEST)
+		return false;
+	if (d_do_imbe || d_do_complex || d_do_float) {
+		// whole LDUs, so the queue stays frame aligned
+		size_t n = min(output_queue.size(), LDU_DIBITS);
+		output_queue.erase(output_queue.begin(), output_queue.begin() + n);
+		d_overflow += nof_voice_codewords;
+	} else {
+		output_queue_s.erase(output_queue_s.begin(), output_queue_s.begin() + FRAME_SAMPLES);
+		d_overflow++;
+	}
+	return true;
+}
+
+/*
+ * Output starts once d_prime_frames frames are queued, or the end of the
+ * transmission is in the queue, and stops when the queue runs dry.
+ */
+bool repeater_chan_usrp::ready_to_play(void)
+{
+	bool dibits = d_do_imbe || d_do_complex || d_do_float;
+	bool empty = dibits ? output_queue.empty() : output_queue_s.empty();
+	if (d_playing && empty) {
+		// the missing packet's turn has come: wait for it no longer
+		while (empty && d_held) {
+			advance();
+			empty = dibits ? output_queue.empty() : output_queue_s.empty();
+		}
+	}
+	if (d_playing) {
+		if (empty) {
+			d_playing = false;
+			if (d_started)
+				d_underrun++;
+		}
+	} else if (!empty && (queued_frames() >= (size_t)d_prime_frames || !d_started)) {
+		d_playing = true;
+	}
+	return d_playing;
+}
+
 void repeater_chan_usrp::init_sock(int udp_port)
 {
         memset (&read_sock_addr, 0, sizeof(read_sock_addr));
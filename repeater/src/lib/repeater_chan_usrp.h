@@ -28,6 +28,7 @@
 #include <netinet/in.h>
 #include <arpa/inet.h>
 #include <deque>
+#include <vector>
 
 class repeater_chan_usrp;
 
@@ -35,6 +36,7 @@ typedef std::vector<bool> bit_vector;
 
 #include <imbe_vocoder.h>
 #include "waveforms.h"
+#include "chan_usrp.h"
 
 static const int N_PHASES = 8;	// no. of points in PI/4 constellation
 static const int N_PHASES_2 = N_PHASES >> 1;
@@ -53,6 +55,9 @@ static const int N_PHASES_2 = N_PHASES >> 1;
 typedef boost::shared_ptr<repeater_chan_usrp> repeater_chan_usrp_sptr;
 typedef std::deque<uint8_t> dibit_queue;
 
+// what to do with a frame arriving when the output queue is full
+enum { CHAN_USRP_DROP_OLDEST=0, CHAN_USRP_DROP_NEWEST };
+
 /*!
  * \brief Return a shared_ptr to a new instance of repeater_chan_usrp.
  *
@@ -60,8 +65,20 @@ typedef std::deque<uint8_t> dibit_queue;
  * constructor is private.  repeater_make_chan_usrp is the public
  * interface for creating new instances.
  */
-repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue);
+repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth = 3, int max_frames = 50, int drop_policy = CHAN_USRP_DROP_OLDEST);
 
+/*!
+ * \brief Source of audio, IMBE dibits or modulated P25 from app_rpt chan_usrp.
+ *
+ * UDP packets are read in batches into a jitter buffer ordered by
+ * sequence number.  A missing packet is waited for until jitter_depth
+ * later packets have arrived and then counted as lost and concealed.
+ * At the start of each transmission the output is held back until
+ * jitter_depth frames are queued (beyond a whole LDU when the output is
+ * IMBE encoded), and the queue is never allowed to
+ * grow beyond max_frames voice frames, dropping frames as drop_policy
+ * says.
+ */
 class repeater_chan_usrp : public gr_block
 {
 private:
@@ -70,11 +87,22 @@ private:
 
   void init_sock(int udp_port);
 
-  friend repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue);
+  friend repeater_chan_usrp_sptr repeater_make_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth, int max_frames, int drop_policy);
 
-  repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue);  	// private constructor
+  repeater_chan_usrp (int listen_port, bool do_imbe, bool do_complex, bool do_float, float gain, int decim, gr_msg_queue_sptr queue, int jitter_depth, int max_frames, int drop_policy);  	// private constructor
   // internal functions
   void check_read(void);
+  int receive_batch(void);
+  void receive_packet(const char *buf, int len);
+  void release_frames(void);
+  void advance(void);
+  void play_frame(const int16_t *samples);
+  void conceal_frame(void);
+  void emit_frame(const int16_t *samples);
+  void reset_jitter(void);
+  bool make_room(void);
+  size_t queued_frames(void) const;
+  bool ready_to_play(void);
   void append_imbe_codeword(bit_vector& frame_body, int16_t frame_vector[], unsigned int& codeword_ct);
 
   // internal data
@@ -96,6 +124,40 @@ private:
   std::deque<uint8_t> output_queue;
   std::deque<int16_t> output_queue_s;
 
+  // jitter buffer, indexed by sequence number modulo its size
+  struct jitter_slot {
+    bool full;
+    bool voice;
+    uint32_t seq;
+    uint32_t keyup;
+    int16_t samples[USRP_VOICE_FRAME_SIZE / sizeof(int16_t)];
+  };
+  std::vector<jitter_slot> d_jitter;
+  int d_jitter_depth;
+  int d_max_frames;
+  int d_prime_frames;	// frames queued before output starts
+  int d_drop_policy;
+  bool d_started;	// d_play_seq is valid
+  bool d_draining;	// keyup dropped: release everything held
+  bool d_playing;	// output primed for this transmission
+  uint32_t d_play_seq;	// next sequence number to be released
+  uint32_t d_max_seq;	// highest sequence number received
+  unsigned int d_held;	// packets in the jitter buffer
+  int16_t d_last_frame[USRP_VOICE_FRAME_SIZE / sizeof(int16_t)];
+  int d_conceal_count;	// frames concealed since the last one received
+
+  // batched receive buffers
+  std::vector<char> d_rx_bufs;
+
+  // counters
+  unsigned int d_received;
+  unsigned int d_late;
+  unsigned int d_duplicate;
+  unsigned int d_reordered;
+  unsigned int d_lost;
+  unsigned int d_overflow;
+  unsigned int d_underrun;
+
   gr_msg_queue_sptr d_msgq;
 
   float d_gain;
@@ -114,6 +176,14 @@ private:
  public:
   ~repeater_chan_usrp ();	// public destructor
 
+  unsigned int received() const { return d_received; }	// packets accepted
+  unsigned int late() const { return d_late; }		// arrived after their turn
+  unsigned int duplicate() const { return d_duplicate; }
+  unsigned int reordered() const { return d_reordered; }	// arrived out of order, in time
+  unsigned int lost() const { return d_lost; }		// never arrived; concealed
+  unsigned int overflow() const { return d_overflow; }	// frames dropped, queue full
+  unsigned int underrun() const { return d_underrun; }	// queue ran dry mid transmission
+
   // Where all the action really happens
 
   int general_work (int noutput_items,
@@ -54,9 +54,9 @@
  * a boost shared_ptr.  This is effectively the public constructor.
  */
 repeater_p25_frame_assembler_sptr 
-repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue)
+repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format)
 {
-  return repeater_p25_frame_assembler_sptr (new repeater_p25_frame_assembler (udp_host, port, debug, do_imbe, do_output, do_msgq, queue));
+  return repeater_p25_frame_assembler_sptr (new repeater_p25_frame_assembler (udp_host, port, debug, do_imbe, do_output, do_msgq, queue, imbe_format));
 }
 
 static const int MIN_IN = 1;	// mininum number of input streams
@@ -78,31 +78,26 @@ static uint16_t crc16(uint8_t buf[], int len) {
         return crc & 0xffff;
 }
 
-/* find_min is from wireshark/plugins/p25/packet-p25cai.c */
-/* Copyright 2008, Michael Ossmann <mike@ossmann.com>  */
-/* return the index of the lowest value in a list */
-static int
-find_min(uint8_t list[], int len)
-{
-	int min = list[0];	
-	int index = 0;	
-	int unique = 1;	
-	int i;
-
-	for (i = 1; i < len; i++) {
-		if (list[i] < min) {
-			min = list[i];
-			index = i;
-			unique = 1;
-		} else if (list[i] == min) {
-			unique = 0;
+/* packet crc of the data blocks of an unconfirmed packet (or MBT) */
+static uint32_t crc32(uint8_t buf[], int len) {
+	uint32_t crc = 0;
+	for (int i = 0; i < len; i++) {
+		for (int j = 7; j >= 0; j--) {
+			uint32_t bit = ((buf[i] >> j) ^ (crc >> 31)) & 1;
+			crc <<= 1;
+			if (bit)
+				crc ^= 0x04c11db7;
 		}
 	}
-	/* return -1 if a minimum can't be found */
-	if (!unique)
-		return -1;
+	return crc ^ 0xffffffff;
+}
 
-	return index;
+/* whether the last four bytes of a packet's data blocks are its crc */
+static bool
+packet_crc_ok(uint8_t buf[], int len)
+{
+	uint32_t crc = (buf[len-4] << 24) | (buf[len-3] << 16) | (buf[len-2] << 8) | buf[len-1];
+	return crc32(buf, len - 4) == crc;
 }
 
 /* count_bits is from wireshark/plugins/p25/packet-p25cai.c */
@@ -117,12 +112,22 @@ count_bits(unsigned int n)
     return i;
 }
 
+static const unsigned int MAX_PDU_BLOCKS = 8;	// data blocks following a PDU header
+// most bit errors the Viterbi decoder may correct in a block.  Random
+// bits come out at 21 or more of the 196, and past about 10 a decode
+// is often wrong; this only limits the wrong decodes left for the crc
+// checks to reject.  Nothing is passed on without its crc checked: the
+// CRC-CCITT of a TSBK or PDU header, the packet crc of data blocks.
+static const int MAX_TRELLIS_ERRORS = 10;
+
 /* adapted from wireshark/plugins/p25/packet-p25cai.c */
 /* Copyright 2008, Michael Ossmann <mike@ossmann.com>  */
-/* deinterleave and trellis1_2 decoding */
+/* deinterleave and trellis1_2 (Viterbi) decoding, without any crc check */
 /* tsbk_buf is assumed to be a buffer of 12 bytes */
+/* returns -1 if the best path differs from the block in more than
+ * MAX_TRELLIS_ERRORS bits, taking it to be uncorrectable */
 static int
-tsbk_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
+block_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
 {
 	static const uint16_t deinterleave_tb[] = {
 	  0,  1,  2,  3,  52, 53, 54, 55, 100,101,102,103, 148,149,150,151,
@@ -139,11 +144,12 @@ tsbk_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
 	 44, 45, 46, 47,  96, 97, 98, 99, 144,145,146,147, 192,193,194,195,
 	 48, 49, 50, 51 };
 
-	uint8_t hd[4];
-	int b, d, j;
-	int state = 0;
+	int b, j, k, t;
+	int state;
 	uint8_t codeword;
-	uint16_t crc;
+	uint8_t survivor[49][4];
+	int metric[4] = { 0, 1000, 1000, 1000 };	// starting in state 0
+	int next_metric[4];
 
 	static const uint8_t next_words[4][4] = {
 		{0x2, 0xC, 0x1, 0xF},
@@ -154,35 +160,53 @@ tsbk_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
 
 	memset(tsbk_buf, 0, 12);
 
-	for (b=0; b < 98*2; b += 4) {
+	/* the state is the previous dibit.  Keep the path of least Hamming
+	 * distance into each state, rather than committing to the nearest
+	 * codeword one dibit at a time
+	 */
+	for (b=0, t=0; b < 98*2; b += 4, t++) {
 		codeword = (bv[start+deinterleave_tb[b+0]] << 3) + 
 		           (bv[start+deinterleave_tb[b+1]] << 2) + 
 		           (bv[start+deinterleave_tb[b+2]] << 1) + 
 		            bv[start+deinterleave_tb[b+3]]     ;
 
-		/* try each codeword in a row of the state transition table */
 		for (j = 0; j < 4; j++) {
-			/* find Hamming distance for candidate */
-			hd[j] = count_bits(codeword ^ next_words[state][j]);
+			next_metric[j] = metric[0] + count_bits(codeword ^ next_words[0][j]);
+			survivor[t][j] = 0;
+			for (k = 1; k < 4; k++) {
+				int m = metric[k] + count_bits(codeword ^ next_words[k][j]);
+				if (m < next_metric[j]) {
+					next_metric[j] = m;
+					survivor[t][j] = k;
+				}
+			}
 		}
-		/* find the dibit that matches the most codeword bits (minimum Hamming distance) */
-		state = find_min(hd, 4);
-		/* error if minimum can't be found */
-		if(state == -1)
-			return -1;	// decode error, return failure
-		/* It also might be nice to report a condition where the minimum is
-		 * non-zero, i.e. an error has been corrected.  It probably shouldn't
-		 * be a permanent failure, though.
-		 *
-		 * DISSECTOR_ASSERT(hd[state] == 0);
-		 */
+		memcpy(metric, next_metric, sizeof(metric));
+	}
 
-		/* append dibit onto output buffer */
-		d = b >> 2;	// dibit ctr
-		if (d < 48) {
-			tsbk_buf[d >> 2] |= state << (6 - ((d%4) * 2));
+	/* trace back from state 0, left by the flushing dibit, and
+	 * append each dibit onto the output buffer
+	 */
+	state = 0;
+	for (t = 48; t >= 0; t--) {
+		if (t < 48) {
+			tsbk_buf[t >> 2] |= state << (6 - ((t%4) * 2));
 		}
+		state = survivor[t][state];
 	}
+	if (metric[0] > MAX_TRELLIS_ERRORS)
+		return -1;	// too many errors to trust the decode
+	return 0;	// trellis decode OK
+}
+
+/* deinterleave, trellis1_2 decode and crc check a TSBK or PDU header */
+static int
+tsbk_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
+{
+	uint16_t crc;
+
+	if (block_deinterleave(bv, start, tsbk_buf) != 0)
+		return -1;	// decode error, return failure
 	crc = crc16(tsbk_buf, 12);
 	if (crc != 0)
 		return -1;	// trellis decode OK, but CRC error occurred
@@ -192,7 +216,7 @@ tsbk_deinterleave(bit_vector& bv, unsigned int start, uint8_t* tsbk_buf)
 /*
  * The private constructor
  */
-repeater_p25_frame_assembler::repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue)
+repeater_p25_frame_assembler::repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format)
   : gr_block ("p25_frame_assembler",
 		   gr_make_io_signature (MIN_IN, MAX_IN, sizeof (char)),
 		   gr_make_io_signature ((do_output) ? 1 : 0, (do_output) ? 1 : 0, (do_output) ? sizeof(char) : 0 )),
@@ -205,6 +229,10 @@ repeater_p25_frame_assembler::repeater_p25_frame_assembler (const char* udp_host
 	d_do_output(do_output),
 	d_do_msgq(do_msgq),
 	d_msg_queue(queue),
+	d_imbe_format(imbe_format),
+	d_imbe_seq(0),
+	d_in_call(false),
+	d_symbols(0),
 	symbol_queue(),
 	framer(new p25_framer())
 {
@@ -224,24 +252,25 @@ repeater_p25_frame_assembler::forecast(int nof_output_items, gr_vector_int &nof_
 {
    // for do_imbe=false: we output packed bytes (4:1 ratio)
    // for do_imbe=true: input rate= 4800, output rate= 1600 = 32 * 50 (3:1)
+   // or with binary frames 1000 = 20 * 50 (4.8:1)
    const size_t nof_inputs = nof_input_items_reqd.size();
    int nof_samples_reqd = 4.0 * nof_output_items;
    if (d_do_imbe)
-     nof_samples_reqd = 3.0 * nof_output_items;
+     nof_samples_reqd = ((d_imbe_format == VOCODER_FORMAT_BINARY) ? 4.8 : 3.0) * nof_output_items;
    std::fill(&nof_input_items_reqd[0], &nof_input_items_reqd[nof_inputs], nof_samples_reqd);
 }
 void 
-repeater_p25_frame_assembler::process_duid(uint32_t const duid, uint32_t const nac, uint8_t const tsbk_buf[])
+repeater_p25_frame_assembler::process_duid(uint32_t const duid, uint32_t const nac, uint8_t const buf[], size_t const len)
 {
-	char wbuf[12];
+	char wbuf[10 + MAX_PDU_BLOCKS*12 + 2];
 	int p = 0;
 	if (!d_do_msgq)
 		return;
 	if (d_msg_queue->full_p())
 		return;
-	if (tsbk_buf) {
-		memcpy(wbuf, tsbk_buf, 10);	// copy tsbk (less crc)
-		p += 10;
+	if (buf) {
+		memcpy(wbuf, buf, len);	// tsbk or pdu header (less crc) and data blocks
+		p += len;
 	}
 	wbuf[p++] = (nac >> 8) & 0xff;
 	wbuf[p++] = nac & 0xff;
@@ -269,7 +298,7 @@ repeater_p25_frame_assembler::general_work (int noutput_items,
 			 (framer->duid == 0x05) ||
 			 (framer->duid == 0x0A) ||
 			 (framer->duid == 0x0F))) {
-			process_duid(framer->duid, framer->nac, NULL);
+			process_duid(framer->duid, framer->nac, NULL, 0);
 		}
 		if (framer->duid == 0x07 && framer->bch_errors >= 0) {
 			unsigned int d, b;
@@ -290,17 +319,46 @@ repeater_p25_frame_assembler::general_work (int noutput_items,
 			if (framer->frame_size >= 360) {
 				rc = tsbk_deinterleave(bv1,48+64        , tsbk_buf);
 				if (rc == 0)
-					process_duid(framer->duid, framer->nac, tsbk_buf);
+					process_duid(framer->duid, framer->nac, tsbk_buf, 10);
 			}
 			if (framer->frame_size >= 576) {
 				rc = tsbk_deinterleave(bv1,48+64+196    , tsbk_buf);
 				if (rc == 0)
-					process_duid(framer->duid, framer->nac, tsbk_buf);
+					process_duid(framer->duid, framer->nac, tsbk_buf, 10);
 			}
 			if (framer->frame_size >= 720) {
 				rc = tsbk_deinterleave(bv1,48+64+196+196, tsbk_buf);
 				if (rc == 0)
-					process_duid(framer->duid, framer->nac, tsbk_buf);
+					process_duid(framer->duid, framer->nac, tsbk_buf, 10);
+			}
+		}
+		if (framer->duid == 0x0c && framer->bch_errors >= 0) {
+			// PDU: send the header and its data blocks as one message
+			unsigned int d, b;
+			bit_vector bv1(P25_VOICE_FRAME_SIZE);
+			uint8_t hdr_buf[12];
+			uint8_t pdu_buf[10 + MAX_PDU_BLOCKS*12];
+			size_t pdu_len = 0;
+
+			for (d=0, b=0; d < framer->frame_size >> 1; d++) {
+				if ((d+1) % 36 == 0)
+					continue;	// skip SS
+				bv1[b++] = framer->frame_body[d*2];
+				bv1[b++] = framer->frame_body[d*2+1];
+			}
+			if (b >= 48+64+196 && tsbk_deinterleave(bv1, 48+64, hdr_buf) == 0) {
+				unsigned int blocks = hdr_buf[6] & 0x7f;	// blocks to follow
+				memcpy(pdu_buf, hdr_buf, 10);	// header (less crc)
+				pdu_len = 10;
+				for (unsigned int i = 1; i <= blocks && i <= MAX_PDU_BLOCKS; i++) {
+					if (48+64+196*(i+1) > b)
+						break;	// frame truncated
+					if (block_deinterleave(bv1, 48+64+196*i, &pdu_buf[pdu_len]) != 0)
+						break;
+					pdu_len += 12;
+				}
+				if (pdu_len == 10 + blocks*12 && blocks > 0 && packet_crc_ok(&pdu_buf[10], pdu_len - 10))
+					process_duid(framer->duid, framer->nac, pdu_buf, pdu_len);
 			}
 		}
 		if (d_debug >= 10 && framer->duid == 0x00) {
@@ -314,6 +372,9 @@ repeater_p25_frame_assembler::general_work (int noutput_items,
 		}
 		if (d_debug >= 10)
 			fprintf(stderr, "\n");
+		// time at the end of this frame, in 8 KHz ticks (8000 / 4800 per symbol).
+		// the frame header holds the low 32 bits, which wrap every 6.2 days
+		const uint64_t ticks = (d_symbols + i + 1) * 5 / 3;
 		if (d_do_imbe && (framer->duid == 0x5 || framer->duid == 0xa)) {  // if voice - ldu1 or ldu2
 			for(size_t i = 0; i < nof_voice_codewords; ++i) {
 				voice_codeword cw(voice_codeword_sz);
@@ -323,25 +384,30 @@ repeater_p25_frame_assembler::general_work (int noutput_items,
 				imbe_deinterleave(framer->frame_body, cw, i);
 				// recover 88-bit IMBE voice code word
 				imbe_header_decode(cw, u[0], u[1], u[2], u[3], u[4], u[5], u[6], u[7], E0, ET);
-				// output one 32-byte msg per 0.020 sec.
-				// also, 32*9 = 288 byte pkts (for use via UDP)
-				sprintf(s, "%03x %03x %03x %03x %03x %03x %03x %03x\n", u[0], u[1], u[2], u[3], u[4], u[5], u[6], u[7]);
-				if (d_do_output) {
-					for (size_t j=0; j < strlen(s); j++) {
-						symbol_queue.push_back(s[j]);
-					}
-				}
-				if (write_sock > 0) {
-					memcpy(&write_buf[write_bufp], s, strlen(s));
-					write_bufp += strlen(s);
-					if (write_bufp >= 288) { // 9 * 32 = 288
-						sendto(write_sock, write_buf, 288, 0, (struct sockaddr *)&write_sock_addr, sizeof(write_sock_addr));
-						// FIXME check sendto() rc
-						write_bufp = 0;
-					}
+				if (d_imbe_format == VOCODER_FORMAT_BINARY) {
+					// output one 20-byte frame per 0.020 sec.,
+					// stamped with the time the codeword began
+					uint8_t flags = VOCODER_FRAME_VOICE;
+					if (!d_in_call)
+						flags |= VOCODER_FRAME_START;
+					d_in_call = true;
+					vocoder_frame_pack((uint8_t *)s, u, d_imbe_seq++, (uint32_t)((ticks - (nof_voice_codewords - i) * 160) & 0xffffffff), flags);
+					output_imbe(s, VOCODER_FRAME_SZ, false);
+				} else {
+					// output one 32-byte msg per 0.020 sec.
+					sprintf(s, "%03x %03x %03x %03x %03x %03x %03x %03x\n", u[0], u[1], u[2], u[3], u[4], u[5], u[6], u[7]);
+					output_imbe(s, strlen(s), false);
 				}
 			}
 		} // end of imbe/voice
+		if (d_do_imbe && d_in_call && (framer->duid == 0x3 || framer->duid == 0xf)) {
+			// terminator: mark the end of the call
+			uint32_t u[8] = { 0, 0, 0, 0, 0, 0, 0, 0 };
+			char s[VOCODER_FRAME_SZ];
+			vocoder_frame_pack((uint8_t *)s, u, d_imbe_seq++, (uint32_t)(ticks & 0xffffffff), VOCODER_FRAME_END);
+			output_imbe(s, VOCODER_FRAME_SZ, true);
+			d_in_call = false;
+		}
 		if (!d_do_imbe) {
 			// pack the bits into bytes, MSB first
 			size_t obuf_ct = 0;
@@ -379,11 +445,33 @@ repeater_p25_frame_assembler::general_work (int noutput_items,
     symbol_queue.erase(symbol_queue.begin(), symbol_queue.begin() + amt_produce);
   }
   // printf ("work: ninp[0]: %d nout: %d size %d produce: %d surplus %d\n", ninput_items[0], noutput_items, symbol_queue.size(), amt_produce, surplus);
+  d_symbols += noutput_items;
   consume_each(noutput_items);
   // Tell runtime system how many output items we produced.
   return amt_produce;
 }
 
+/*
+ * queue one codeword for output, and send a UDP packet once it holds
+ * nine of them (32*9 = 288 bytes of text, or 20*9 = 180 bytes of frames)
+ * or when flush is set
+ */
+void repeater_p25_frame_assembler::output_imbe(const char *buf, size_t len, bool flush)
+{
+	if (d_do_output) {
+		symbol_queue.insert(symbol_queue.end(), buf, buf + len);
+	}
+	if (write_sock > 0) {
+		memcpy(&write_buf[write_bufp], buf, len);
+		write_bufp += len;
+		if (flush || write_bufp >= (int)(nof_voice_codewords * len)) {
+			sendto(write_sock, write_buf, write_bufp, 0, (struct sockaddr *)&write_sock_addr, sizeof(write_sock_addr));
+			// FIXME check sendto() rc
+			write_bufp = 0;
+		}
+	}
+}
+
 void repeater_p25_frame_assembler::init_sock(const char* udp_host, int udp_port)
 {
         memset (&write_sock_addr, 0, sizeof(write_sock_addr));
@@ -28,6 +28,7 @@
 #include <netinet/in.h>
 #include <arpa/inet.h>
 #include <deque>
+#include <vocoder_frame.h>
 
 class repeater_p25_frame_assembler;
 class p25_framer;
@@ -53,7 +54,7 @@ typedef std::deque<uint8_t> dibit_queue;
  * constructor is private.  repeater_make_p25_frame_assembler is the public
  * interface for creating new instances.
  */
-repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue);
+repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format = VOCODER_FORMAT_TEXT);
 
 /*!
  * \brief produce a stream of dibits, given a stream of floats in [-3,-1,1,3]
@@ -70,14 +71,15 @@ private:
 
   void init_sock(const char* udp_host, int udp_port);
 
-  friend repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue);
+  friend repeater_p25_frame_assembler_sptr repeater_make_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format);
 
-  repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue);  	// private constructor
+  repeater_p25_frame_assembler (const char* udp_host, int port, int debug, bool do_imbe, bool do_output, bool do_msgq, gr_msg_queue_sptr queue, int imbe_format);  	// private constructor
   // internal functions
 	typedef std::vector<bool> bit_vector;
 	bool header_codeword(uint64_t acc, uint32_t& nac, uint32_t& duid);
 	void proc_voice_unit(bit_vector& frame_body) ;
-	void process_duid(uint32_t const duid, uint32_t const nac, uint8_t const tsbk_buf[]);
+	void process_duid(uint32_t const duid, uint32_t const nac, uint8_t const buf[], size_t const len);
+	void output_imbe(const char *buf, size_t len, bool flush);
   // internal instance variables and state
 	int write_bufp;
 	int write_sock;
@@ -90,6 +92,10 @@ private:
 	bool d_do_output;
 	bool d_do_msgq;
 	gr_msg_queue_sptr d_msg_queue;
+	int d_imbe_format;
+	uint16_t d_imbe_seq;
+	bool d_in_call;
+	uint64_t d_symbols;
 	dibit_queue symbol_queue;
 	p25_framer* framer;
 
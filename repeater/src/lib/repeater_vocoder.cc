@@ -160,9 +160,9 @@ static void clear_bits(bit_vector& v) {
  * a boost shared_ptr.  This is effectively the public constructor.
  */
 repeater_vocoder_sptr 
-repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag)
+repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format)
 {
-  return repeater_vocoder_sptr (new repeater_vocoder (encode_flag, verbose_flag, stretch_amt, udp_host, udp_port, raw_vectors_flag));
+  return repeater_vocoder_sptr (new repeater_vocoder (encode_flag, verbose_flag, stretch_amt, udp_host, udp_port, raw_vectors_flag, frame_format));
 }
 
 //////////////////////////////////////////////////////////////
@@ -171,6 +171,11 @@ repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, cha
 //	dec		yes	byte input; null output
 //	enc		no	short input; char output
 //	enc		yes	short input; null output
+//
+// Codewords are exchanged as lines of hex text (VOCODER_FORMAT_TEXT) or
+// as 20-byte binary frames (VOCODER_FORMAT_BINARY, see vocoder_frame.h):
+// on the decoder input, and on the encoder output when raw_vectors_flag
+// is set.
 
 #define M_IN(encode_flag, udp_port)  (1)
 #define M_OUT(encode_flag, udp_port) ((udp_port) ? 0 : 1)
@@ -180,7 +185,7 @@ repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, cha
 /*
  * The private constructor
  */
-repeater_vocoder::repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag)
+repeater_vocoder::repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format)
 	: gr_block ("vocoder",
 	      gr_make_io_signature (M_IN(encode_flag, udp_port), M_IN(encode_flag, udp_port), S_IN(encode_flag, udp_port)),
 	      gr_make_io_signature (M_OUT(encode_flag, udp_port), M_OUT(encode_flag, udp_port), S_OUT(encode_flag, udp_port))),
@@ -191,6 +196,14 @@ repeater_vocoder::repeater_vocoder (bool encode_flag, bool verbose_flag, int str
 	peak(0),
 	samp_ct(0),
 	rxbufp(0),
+	framebufp(0),
+	rx_started(false),
+	rx_seq(0),
+	rx_frames(0),
+	rx_lost(0),
+	rx_skipped(0),
+	tx_seq(0),
+	tx_timestamp(0),
 	codeword_ct(0),
 	sampbuf_ct(0),
 	stretch_count(0),
@@ -201,6 +214,7 @@ repeater_vocoder::repeater_vocoder (bool encode_flag, bool verbose_flag, int str
 	opt_dump_raw_vectors = raw_vectors_flag;
 	opt_verbose = verbose_flag;
 	opt_udp_port = udp_port;
+	opt_frame_format = frame_format;
 
 	opt_stretch_amt = 0;
 	if (stretch_amt < 0) {
@@ -215,7 +229,8 @@ repeater_vocoder::repeater_vocoder (bool encode_flag, bool verbose_flag, int str
 		if (encode_flag) {
 			// local output to gr source
 			// encoding: an LDU's worth of dibits
-			set_output_multiple(P25_VOICE_FRAME_SIZE >> 1);
+			if (!raw_vectors_flag)
+				set_output_multiple(P25_VOICE_FRAME_SIZE >> 1);
 		} else {
 			// decoding: an LDU's worth of audio samples
 			// set_output_multiple(FRAME * nof_voice_codewords);
@@ -308,46 +323,52 @@ void repeater_vocoder::append_imbe_codeword(bit_vector& frame_body, int16_t fram
 	}
 }
 
-void repeater_vocoder::rxchar(char c)
+void repeater_vocoder::decode_codeword(uint32_t u[8])
 {
 	int16_t snd[FRAME];
 	int16_t frame_vector[8];
-	int u[8];
+
+	// decode 88 bits, outputs 160 sound samples (8000 rate)
+	if (d_software_imbe_decoder) {
+		voice_codeword cw(voice_codeword_sz);
+		imbe_header_encode(cw, u[0], u[1], u[2], u[3], u[4], u[5], u[6], u[7]);
+		software_decoder.decode(cw);
+		audio_samples *samples = software_decoder.audio();
+		for (int i=0; i < FRAME; i++) {
+			if (samples->size() > 0) {
+				snd[i] = (int16_t)(samples->front() * 32768.0);
+				samples->pop_front();
+			} else {
+				snd[i] = 0;
+			}
+		}
+	} else {
+		for (int i=0; i < 8; i++) {
+			frame_vector[i] = u[i];
+		}
+/* TEST*/	frame_vector[7] >>= 1;
+		vocoder.imbe_decode(frame_vector, snd);
+	}
+	if (opt_udp_port > 0) {
+		sendto(write_sock, snd, FRAME * sizeof(int16_t), 0, (struct sockaddr*)&write_sock_addr, sizeof(write_sock_addr));
+	} else {
+		// add generated samples to output queue
+		for (int i = 0; i < FRAME; i++) {
+			output_queue_decode.push_back(snd[i]);
+		}
+	}
+}
+
+void repeater_vocoder::rxchar(char c)
+{
+	uint32_t u[8];
 
 	if (c < ' ') {
 		if (c == '\n') {
 			rxbuf[rxbufp] = 0;
-			sscanf(rxbuf, "%x %x %x %x %x %x %x %x", &u[0], &u[1], &u[2], &u[3], &u[4], &u[5], &u[6], &u[7]);
 			rxbufp = 0;
-			// decode 88 bits, outputs 160 sound samples (8000 rate)
-			if (d_software_imbe_decoder) {
-				voice_codeword cw(voice_codeword_sz);
-				imbe_header_encode(cw, u[0], u[1], u[2], u[3], u[4], u[5], u[6], u[7]);
-				software_decoder.decode(cw);
-				audio_samples *samples = software_decoder.audio();
-				for (int i=0; i < FRAME; i++) {
-					if (samples->size() > 0) {
-						snd[i] = (int16_t)(samples->front() * 32768.0);
-						samples->pop_front();
-					} else {
-						snd[i] = 0;
-					}
-				}
-			} else {
-				for (int i=0; i < 8; i++) {
-					frame_vector[i] = u[i];
-				}
-		/* TEST*/	frame_vector[7] >>= 1;
-				vocoder.imbe_decode(frame_vector, snd);
-			}
-			if (opt_udp_port > 0) {
-				sendto(write_sock, snd, FRAME * sizeof(int16_t), 0, (struct sockaddr*)&write_sock_addr, sizeof(write_sock_addr));
-			} else {
-				// add generated samples to output queue
-				for (int i = 0; i < FRAME; i++) {
-					output_queue_decode.push_back(snd[i]);
-				}
-			}
+			if (sscanf(rxbuf, "%x %x %x %x %x %x %x %x", &u[0], &u[1], &u[2], &u[3], &u[4], &u[5], &u[6], &u[7]) == 8)
+				decode_codeword(u);
 		}
 		return;
 	}
@@ -357,6 +378,63 @@ void repeater_vocoder::rxchar(char c)
 	}
 }
 
+void repeater_vocoder::rxframe(uint32_t u[8], uint16_t seq, uint8_t flags)
+{
+	// count the frames missing from the sequence, except across calls
+	if (rx_started && !(flags & VOCODER_FRAME_START))
+		rx_lost += (uint16_t)(seq - rx_seq);
+	rx_started = !(flags & VOCODER_FRAME_END);
+	rx_seq = seq + 1;
+	rx_frames++;
+	if (flags & VOCODER_FRAME_VOICE)
+		decode_codeword(u);
+}
+
+void repeater_vocoder::rxbyte(uint8_t c)
+{
+	// hunt for the sync byte, then collect a frame
+	if (framebufp == 0 && c != VOCODER_FRAME_SYNC) {
+		rx_skipped++;
+		return;
+	}
+	framebuf[framebufp++] = c;
+	if (framebufp < VOCODER_FRAME_SZ)
+		return;
+	uint32_t u[8];
+	uint16_t seq;
+	uint32_t timestamp;
+	uint8_t flags;
+	if (vocoder_frame_unpack(framebuf, u, seq, timestamp, flags)) {
+		rxframe(u, seq, flags);
+		framebufp = 0;
+		return;
+	}
+	// bad CRC: the sync byte was false, so start again from the next one
+	int j;
+	for (j = 1; j < VOCODER_FRAME_SZ && framebuf[j] != VOCODER_FRAME_SYNC; j++)
+		;
+	rx_skipped += j;
+	framebufp = VOCODER_FRAME_SZ - j;
+	memmove(framebuf, &framebuf[j], framebufp);
+	if (opt_verbose)
+		fprintf(stderr, "repeater_vocoder: resync, %u bytes skipped\n", rx_skipped);
+}
+
+void repeater_vocoder::write_frame(const char *buf, int len)
+{
+	if (opt_udp_port == 0) {
+		output_queue.insert(output_queue.end(), buf, buf + len);
+		return;
+	}
+	// one LDU's worth of codewords per packet
+	memcpy(&write_buf[write_bufp], buf, len);
+	write_bufp += len;
+	if (write_bufp >= (int)nof_voice_codewords * len) {
+		sendto(write_sock, write_buf, write_bufp, 0, (struct sockaddr*)&write_sock_addr, sizeof(write_sock_addr));
+		write_bufp = 0;
+	}
+}
+
 void repeater_vocoder::compress_frame(int16_t snd[])
 {
 	int16_t frame_vector[8];	
@@ -366,13 +444,21 @@ void repeater_vocoder::compress_frame(int16_t snd[])
 
 	// if dump option, dump u0-u7 to output
 	if (opt_dump_raw_vectors) {
-		char s[128];
-		sprintf(s, "%03x %03x %03x %03x %03x %03x %03x %03x\n", frame_vector[0], frame_vector[1], frame_vector[2], frame_vector[3], frame_vector[4], frame_vector[5], frame_vector[6], frame_vector[7]);
-		memcpy(&write_buf[write_bufp], s, strlen(s));
-		write_bufp += strlen(s);
-		if (write_bufp >= 288) {
-			sendto(write_sock, write_buf, 288, 0, (struct sockaddr*)&write_sock_addr, sizeof(write_sock_addr));
-			write_bufp = 0;
+		if (opt_frame_format == VOCODER_FORMAT_BINARY) {
+			uint8_t buf[VOCODER_FRAME_SZ];
+			uint32_t u[8];
+			for (int i = 0; i < 8; i++)
+				u[i] = (uint16_t)frame_vector[i];
+			uint8_t flags = VOCODER_FRAME_VOICE;
+			if (tx_timestamp == 0)
+				flags |= VOCODER_FRAME_START;
+			vocoder_frame_pack(buf, u, tx_seq++, tx_timestamp, flags);
+			tx_timestamp += FRAME;
+			write_frame((const char *)buf, VOCODER_FRAME_SZ);
+		} else {
+			char s[128];
+			sprintf(s, "%03x %03x %03x %03x %03x %03x %03x %03x\n", frame_vector[0], frame_vector[1], frame_vector[2], frame_vector[3], frame_vector[4], frame_vector[5], frame_vector[6], frame_vector[7]);
+			write_frame(s, strlen(s));
 		}
 		return;
 	}
@@ -446,12 +532,14 @@ repeater_vocoder::forecast(int nof_output_items, gr_vector_int &nof_input_items_
     *
     * When decoding, the block consumes one line of text per voice codeword.
     * Each line of text is exactly 32 bytes.  It outputs 160 samples for each 
-    * codeword; the ratio is thus 32/160 = 0.2.
+    * codeword; the ratio is thus 32/160 = 0.2.  A binary frame is 20 bytes,
+    * for a ratio of 20/160 = 0.125.
     *
     * Thanks to Matt Mills for catching a bug where this value wasn't set correctly
     */
    const size_t nof_inputs = nof_input_items_reqd.size();
-   const int nof_samples_reqd = (opt_encode_flag) ? (1.66667 * nof_output_items) : (0.2 * nof_output_items);
+   const double decode_ratio = (opt_frame_format == VOCODER_FORMAT_BINARY) ? 0.125 : 0.2;
+   const int nof_samples_reqd = (opt_encode_flag) ? (1.66667 * nof_output_items) : (decode_ratio * nof_output_items);
    std::fill(&nof_input_items_reqd[0], &nof_input_items_reqd[nof_inputs], nof_samples_reqd);
 }
 
@@ -463,8 +551,14 @@ repeater_vocoder::general_work_decode (int noutput_items,
 {
   const char *in = (const char *) input_items[0];
 
-  for (int i = 0; i < ninput_items[0]; i++){
-    rxchar(in[i]);
+  if (opt_frame_format == VOCODER_FORMAT_BINARY) {
+    for (int i = 0; i < ninput_items[0]; i++){
+      rxbyte(in[i]);
+    }
+  } else {
+    for (int i = 0; i < ninput_items[0]; i++){
+      rxchar(in[i]);
+    }
   }
 
   // Tell runtime system how many input items we consumed on
@@ -34,6 +34,7 @@ typedef std::vector<bool> bit_vector;
 
 #include <imbe_decoder.h>
 #include <software_imbe_decoder.h>
+#include <vocoder_frame.h>
 
 class repeater_vocoder;
 
@@ -57,7 +58,7 @@ typedef boost::shared_ptr<repeater_vocoder> repeater_vocoder_sptr;
  * constructor is private.  repeater_make_vocoder is the public
  * interface for creating new instances.
  */
-repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag);
+repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format = VOCODER_FORMAT_TEXT);
 
 /*!
  * \brief 
@@ -70,9 +71,9 @@ private:
   // The friend declaration allows repeater_make_vocoder to
   // access the private constructor.
 
-  friend repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag);
+  friend repeater_vocoder_sptr repeater_make_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format);
 
-  repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag);  	// private constructor
+  repeater_vocoder (bool encode_flag, bool verbose_flag, int stretch_amt, char* udp_host, int udp_port, bool raw_vectors_flag, int frame_format);  	// private constructor
 
  public:
   ~repeater_vocoder ();	// public destructor
@@ -94,6 +95,11 @@ private:
 		    gr_vector_const_void_star &input_items,
 		    gr_vector_void_star &output_items);
 
+  // binary frame statistics (decoding)
+  unsigned int frames_received() const { return rx_frames; }
+  unsigned int frames_lost() const { return rx_lost; }
+  unsigned int bytes_skipped() const { return rx_skipped; }
+
   private:
 	static const int RXBUF_MAX = 80;
 
@@ -111,6 +117,15 @@ private:
 	int samp_ct;
 	char rxbuf[RXBUF_MAX];
 	int rxbufp ;
+	uint8_t framebuf[VOCODER_FRAME_SZ];
+	int framebufp;
+	bool rx_started;
+	uint16_t rx_seq;
+	unsigned int rx_frames;
+	unsigned int rx_lost;
+	unsigned int rx_skipped;
+	uint16_t tx_seq;
+	uint32_t tx_timestamp;
 	unsigned int codeword_ct ;
 	int16_t sampbuf[FRAME];
 	size_t sampbuf_ct ;
@@ -130,9 +145,14 @@ private:
 	int opt_stretch_amt;
 	int opt_stretch_sign;
 	int opt_udp_port;
+	int opt_frame_format;
 	/* local methods */
 	void append_imbe_codeword(bit_vector& frame_body, int16_t frame_vector[], unsigned int& codeword_ct);
 	void rxchar(char c);
+	void rxbyte(uint8_t c);
+	void rxframe(uint32_t u[8], uint16_t seq, uint8_t flags);
+	void decode_codeword(uint32_t u[8]);
+	void write_frame(const char *buf, int len);
 	void compress_frame(int16_t snd[]);
 	void add_sample(int16_t samp);
 	void compress_samp(int16_t samp);
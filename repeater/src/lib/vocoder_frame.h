@@ -0,0 +1,147 @@
+/* -*- c++ -*- */
+
+/*
+ * compact binary framing of IMBE voice codewords
+ * Copyright 2013, KA1RBI
+ *
+ * Each 88-bit voice codeword (u0-u7) travels in a fixed 20-byte frame
+ * instead of a 32-byte line of hex text:
+ *
+ *	0	sync (0xa5)
+ *	1	flags
+ *	2-3	sequence number, big endian
+ *	4-7	timestamp in 8 KHz sample ticks, big endian
+ *	8-18	u0-u3 (12 bits each), u4-u6 (11 bits each) and the
+ *		upper seven bits of u7, packed MSB first
+ *	19	CRC-8 (x^8 + x^2 + x + 1) of bytes 1-18
+ *
+ * Nine frames (one LDU) make a 180-byte UDP packet.  In a byte stream,
+ * a receiver that loses its place skips to the next sync byte and
+ * accepts a frame only when its CRC checks.
+ */
+
+#ifndef INCLUDED_VOCODER_FRAME_H
+#define INCLUDED_VOCODER_FRAME_H
+
+#include <stdint.h>
+
+enum { VOCODER_FORMAT_TEXT=0, VOCODER_FORMAT_BINARY };
+
+static const int VOCODER_FRAME_SZ = 20;
+static const int VOCODER_TEXT_SZ = 32;		// "%03x %03x ... %03x\n"
+static const uint8_t VOCODER_FRAME_SYNC = 0xa5;
+
+/* flags */
+static const uint8_t VOCODER_FRAME_VOICE = 0x01;	// bytes 8-18 hold a codeword
+static const uint8_t VOCODER_FRAME_START = 0x02;	// first codeword of a call
+static const uint8_t VOCODER_FRAME_END = 0x04;		// the call has ended
+static const uint8_t VOCODER_FRAME_U7_LSB = 0x08;	// bit 0 of u7
+
+static const int vocoder_frame_widths[8] = { 12, 12, 12, 12, 11, 11, 11, 7 };
+
+static const uint8_t vocoder_frame_crc8_table[256] = {
+	0x00, 0x07, 0x0e, 0x09, 0x1c, 0x1b, 0x12, 0x15,
+	0x38, 0x3f, 0x36, 0x31, 0x24, 0x23, 0x2a, 0x2d,
+	0x70, 0x77, 0x7e, 0x79, 0x6c, 0x6b, 0x62, 0x65,
+	0x48, 0x4f, 0x46, 0x41, 0x54, 0x53, 0x5a, 0x5d,
+	0xe0, 0xe7, 0xee, 0xe9, 0xfc, 0xfb, 0xf2, 0xf5,
+	0xd8, 0xdf, 0xd6, 0xd1, 0xc4, 0xc3, 0xca, 0xcd,
+	0x90, 0x97, 0x9e, 0x99, 0x8c, 0x8b, 0x82, 0x85,
+	0xa8, 0xaf, 0xa6, 0xa1, 0xb4, 0xb3, 0xba, 0xbd,
+	0xc7, 0xc0, 0xc9, 0xce, 0xdb, 0xdc, 0xd5, 0xd2,
+	0xff, 0xf8, 0xf1, 0xf6, 0xe3, 0xe4, 0xed, 0xea,
+	0xb7, 0xb0, 0xb9, 0xbe, 0xab, 0xac, 0xa5, 0xa2,
+	0x8f, 0x88, 0x81, 0x86, 0x93, 0x94, 0x9d, 0x9a,
+	0x27, 0x20, 0x29, 0x2e, 0x3b, 0x3c, 0x35, 0x32,
+	0x1f, 0x18, 0x11, 0x16, 0x03, 0x04, 0x0d, 0x0a,
+	0x57, 0x50, 0x59, 0x5e, 0x4b, 0x4c, 0x45, 0x42,
+	0x6f, 0x68, 0x61, 0x66, 0x73, 0x74, 0x7d, 0x7a,
+	0x89, 0x8e, 0x87, 0x80, 0x95, 0x92, 0x9b, 0x9c,
+	0xb1, 0xb6, 0xbf, 0xb8, 0xad, 0xaa, 0xa3, 0xa4,
+	0xf9, 0xfe, 0xf7, 0xf0, 0xe5, 0xe2, 0xeb, 0xec,
+	0xc1, 0xc6, 0xcf, 0xc8, 0xdd, 0xda, 0xd3, 0xd4,
+	0x69, 0x6e, 0x67, 0x60, 0x75, 0x72, 0x7b, 0x7c,
+	0x51, 0x56, 0x5f, 0x58, 0x4d, 0x4a, 0x43, 0x44,
+	0x19, 0x1e, 0x17, 0x10, 0x05, 0x02, 0x0b, 0x0c,
+	0x21, 0x26, 0x2f, 0x28, 0x3d, 0x3a, 0x33, 0x34,
+	0x4e, 0x49, 0x40, 0x47, 0x52, 0x55, 0x5c, 0x5b,
+	0x76, 0x71, 0x78, 0x7f, 0x6a, 0x6d, 0x64, 0x63,
+	0x3e, 0x39, 0x30, 0x37, 0x22, 0x25, 0x2c, 0x2b,
+	0x06, 0x01, 0x08, 0x0f, 0x1a, 0x1d, 0x14, 0x13,
+	0xae, 0xa9, 0xa0, 0xa7, 0xb2, 0xb5, 0xbc, 0xbb,
+	0x96, 0x91, 0x98, 0x9f, 0x8a, 0x8d, 0x84, 0x83,
+	0xde, 0xd9, 0xd0, 0xd7, 0xc2, 0xc5, 0xcc, 0xcb,
+	0xe6, 0xe1, 0xe8, 0xef, 0xfa, 0xfd, 0xf4, 0xf3
+};
+
+static inline uint8_t
+vocoder_frame_crc8(const uint8_t buf[], int len)
+{
+	uint8_t crc = 0;
+	for (int i = 0; i < len; i++)
+		crc = vocoder_frame_crc8_table[crc ^ buf[i]];
+	return crc;
+}
+
+/*
+ * fill buf[VOCODER_FRAME_SZ] with one frame.  u7 is as produced by
+ * imbe_header_decode() and imbe_vocoder::imbe_encode(), shifted left one bit
+ */
+static inline void
+vocoder_frame_pack(uint8_t buf[], const uint32_t u[8], uint16_t seq, uint32_t timestamp, uint8_t flags)
+{
+	buf[0] = VOCODER_FRAME_SYNC;
+	buf[1] = (flags & ~VOCODER_FRAME_U7_LSB) | ((u[7] & 1) ? VOCODER_FRAME_U7_LSB : 0);
+	buf[2] = seq >> 8;
+	buf[3] = seq;
+	buf[4] = timestamp >> 24;
+	buf[5] = timestamp >> 16;
+	buf[6] = timestamp >> 8;
+	buf[7] = timestamp;
+	uint32_t acc = 0;
+	int nbits = 0;
+	int p = 8;
+	for (int i = 0; i < 8; i++) {
+		const int w = vocoder_frame_widths[i];
+		const uint32_t v = (i == 7) ? u[7] >> 1 : u[i];
+		acc = (acc << w) | (v & ((1 << w) - 1));
+		nbits += w;
+		while (nbits >= 8) {
+			nbits -= 8;
+			buf[p++] = acc >> nbits;
+		}
+		acc &= (1 << nbits) - 1;
+	}
+	buf[19] = vocoder_frame_crc8(&buf[1], 18);
+}
+
+/*
+ * inverse of vocoder_frame_pack().  returns false, leaving the outputs
+ * alone, if buf does not hold a valid frame
+ */
+static inline bool
+vocoder_frame_unpack(const uint8_t buf[], uint32_t u[8], uint16_t& seq, uint32_t& timestamp, uint8_t& flags)
+{
+	if (buf[0] != VOCODER_FRAME_SYNC || buf[19] != vocoder_frame_crc8(&buf[1], 18))
+		return false;
+	flags = buf[1];
+	seq = (buf[2] << 8) | buf[3];
+	timestamp = ((uint32_t)buf[4] << 24) | (buf[5] << 16) | (buf[6] << 8) | buf[7];
+	uint32_t acc = 0;
+	int nbits = 0;
+	int p = 8;
+	for (int i = 0; i < 8; i++) {
+		const int w = vocoder_frame_widths[i];
+		while (nbits < w) {
+			acc = (acc << 8) | buf[p++];
+			nbits += 8;
+		}
+		nbits -= w;
+		u[i] = (acc >> nbits) & ((1 << w) - 1);
+		acc &= (1 << nbits) - 1;
+	}
+	u[7] = (u[7] << 1) | ((flags & VOCODER_FRAME_U7_LSB) ? 1 : 0);
+	return true;
+}
+
+#endif /* INCLUDED_VOCODER_FRAME_H */
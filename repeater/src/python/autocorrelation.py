@@ -0,0 +1,237 @@
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Autocorrelation and symbol rate estimation for the Auto Correlation scope
+
+A frame of samples is first reduced to a feature whose mean follows the
+symbol clock: the magnitude of the instantaneous frequency (of complex
+input, after FM discrimination) about its mean.  The power spectrum of
+the feature is taken with a Hann window and zero padded to twice the
+frame, so the autocorrelation it gives is linear rather than circular,
+and it is averaged from frame to frame.  Before the inverse FFT the
+spectrum is divided by its noise floor and the bins that do not stand
+clearly above it are dropped.  What is left are the spectral lines of
+the symbol clock, and the autocorrelation has peaks at multiples of
+the symbol period.
+
+Only one frame is analyzed for each display update, so the cost
+follows the display rate and not the sample rate.
+"""
+
+import threading
+import numpy
+
+FLOOR_BLOCK = 64	# spectrum bins per noise floor estimate
+
+def discriminator(x):
+    """
+    instantaneous frequency of complex samples, in radians per sample
+    """
+    return numpy.angle(x[1:] * numpy.conj(x[:-1]))
+
+def symbol_feature(x):
+    """
+    the magnitude of the (discriminated, if complex) signal about its
+    mean, less its own mean
+    """
+    if numpy.iscomplexobj(x):
+        x = discriminator(x)
+    d = numpy.abs(x - x.mean())
+    return d - d.mean()
+
+def noise_floor(p, block=FLOOR_BLOCK):
+    """
+    median of p over blocks of bins, interpolated to every bin.  The
+    median is not pulled up by the few bins of a spectral line.
+    """
+    nblocks = max(1, len(p) // block)
+    block = len(p) // nblocks
+    medians = numpy.median(p[:nblocks * block].reshape(nblocks, block), axis=1)
+    centres = numpy.arange(nblocks) * block + (block - 1) / 2.0
+    return numpy.interp(numpy.arange(len(p)), centres, medians)
+
+def parabolic_peak(r, i):
+    """
+    position, to a fraction of a sample, of the peak of r near i
+    """
+    a, b, c = r[i - 1], r[i], r[i + 1]
+    denom = a - 2 * b + c
+    if denom >= 0:
+        return float(i)
+    return i + 0.5 * (a - c) / denom
+
+def find_period(r, min_lag, max_lag, threshold=0.3, max_multiples=50):
+    """
+    the lag of the first peak of r between min_lag and max_lag that
+    reaches threshold and half the highest peak there, refined by a fit
+    to the peaks at its multiples.  None if there is no such peak.
+    """
+    lo = max(int(numpy.ceil(min_lag)), 1)
+    hi = min(int(numpy.ceil(max_lag)), len(r) - 2)
+    if hi <= lo:
+        return None
+    i = numpy.arange(lo, hi + 1)
+    peaks = i[(r[i] >= r[i - 1]) & (r[i] > r[i + 1])]
+    if not len(peaks):
+        return None
+    peaks = peaks[r[peaks] >= max(threshold, 0.5 * r[peaks].max())]
+    if not len(peaks):
+        return None
+    period = parabolic_peak(r, peaks[0])
+    # least squares fit of lag = k * period through the later peaks
+    num = period
+    den = 1.0
+    for k in range(2, max_multiples + 1):
+        j = int(round(k * period))
+        if j + 2 >= len(r):
+            break
+        j += numpy.argmax(r[j - 1:j + 2]) - 1
+        if r[j] < threshold:
+            break
+        num += k * parabolic_peak(r, j)
+        den += k * k
+    return num / den
+
+def feature_spectrum(z, nfft):
+    """
+    power spectrum of z, Hann windowed and zero padded to nfft
+    """
+    return numpy.abs(numpy.fft.rfft(z * numpy.hanning(len(z)), nfft)) ** 2
+
+def line_autocorrelation(spectrum, m, nlags, false_alarm=1e-3):
+    """
+    normalized autocorrelation, for lags of 0 to nlags - 1, of the lines
+    that stand clear of the noise floor of a power spectrum averaged
+    over m frames.  All zero if there are none.  false_alarm is about
+    the chance that noise alone gives a line.
+    """
+    # a noise bin averaged over m frames is roughly gamma distributed,
+    # its median 1 - 1 / 3m of its mean
+    floor = noise_floor(spectrum) / (1.0 - 1.0 / (3.0 * m + 0.2))
+    p = spectrum / numpy.maximum(floor, 1e-30)
+    # and with a spread of 1 / sqrt(m): set the bar so that among all
+    # the bins, a noise bin (or an FM click) seldom reaches it
+    threshold = 1.0 + numpy.log(len(p) / false_alarm) / numpy.sqrt(m)
+    lines = numpy.maximum(p - threshold, 0.0)
+    lines[0] = 0.0
+    if not lines.any():
+        return numpy.zeros(nlags)
+    r = numpy.fft.irfft(lines, 2 * (len(p) - 1))[:nlags]
+    return r / r[0]
+
+class autocorrelator(object):
+    """
+    analyze frames of fac_size samples of type dtype (complex64 or
+    float32) arriving at sample_rate.  Each new power spectrum is
+    averaged in with weight avg_alpha, 1.0 for no averaging.  Symbol
+    rates from min_rate to max_rate are searched for.
+    """
+    def __init__(self, fac_size, sample_rate, avg_alpha=1.0, min_rate=300.0, max_rate=19200.0,
+                 dtype=numpy.complex64):
+        self.fac_size = fac_size
+        self.sample_rate = sample_rate
+        self.avg_alpha = avg_alpha
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.dtype = numpy.dtype(dtype)
+        self.nfft = 2 * fac_size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.spectrum = None
+        self.frames = 0		# frames averaged since the reset
+        self.r = numpy.zeros(self.fac_size)
+        self.rate = None
+
+    def set_avg_alpha(self, avg_alpha):
+        self.lock.acquire()
+        try:
+            self.avg_alpha = avg_alpha
+            self.reset()
+        finally:
+            self.lock.release()
+
+    def set_sample_rate(self, sample_rate):
+        self.lock.acquire()
+        try:
+            self.sample_rate = sample_rate
+            self.reset()
+        finally:
+            self.lock.release()
+
+    def add(self, buf):
+        """
+        analyze the last frame in a message buffer.  returns False if
+        there is not a whole frame
+        """
+        x = numpy.frombuffer(buf, dtype=self.dtype)
+        if len(x) < self.fac_size:
+            return False
+        self.lock.acquire()
+        try:
+            self.update(x[-self.fac_size:])
+            return True
+        finally:
+            self.lock.release()
+
+    def update(self, x):
+        z = symbol_feature(x.astype(numpy.complex128 if self.dtype.kind == 'c' else numpy.float64))
+        p = feature_spectrum(z, self.nfft)
+        self.frames += 1
+        if self.spectrum is None:
+            self.spectrum = p
+        else:
+            # a plain mean until there are enough frames for avg_alpha
+            self.spectrum += max(self.avg_alpha, 1.0 / self.frames) * (p - self.spectrum)
+        self.r = self.autocorrelation()
+        period = find_period(self.r, self.sample_rate / self.max_rate, self.sample_rate / self.min_rate)
+        self.rate = self.sample_rate / period if period else None
+
+    def averaged(self):
+        """
+        the number of frames the averaged spectrum is worth
+        """
+        if self.avg_alpha >= 1.0:
+            return 1.0
+        return min(self.frames, (2.0 - self.avg_alpha) / self.avg_alpha)
+
+    def autocorrelation(self):
+        """
+        normalized autocorrelation of the lines in the averaged spectrum,
+        for lags of 0 to fac_size - 1 samples
+        """
+        return line_autocorrelation(self.spectrum, self.averaged(), self.fac_size)
+
+    def points(self):
+        """
+        (fac_size / 2, 2) array of (lag in ms, autocorrelation) and the
+        estimated symbol rate, or None
+        """
+        self.lock.acquire()
+        try:
+            n = self.fac_size // 2
+            points = numpy.empty((n, 2))
+            points[:, 0] = numpy.arange(n) * (1000.0 / self.sample_rate)
+            points[:, 1] = self.r[:n]
+            return points, self.rate
+        finally:
+            self.lock.release()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Self-describing sample capture files
+
+A capture file is a fixed size header, the raw samples, then an index:
+
+    header  HEADER_LEN bytes: magic, version, sample type, sample rate,
+            centre frequency, gain, start time, source name, sample
+            count, index interval and the location of the index
+    data    samples, starting at HEADER_LEN (a multiple of every item
+            size, so gr.file_source can seek straight to any sample)
+    index   (sample number, time) pairs, one every index_interval
+            samples and at every discontinuity in the sample times
+
+Seeking to a time looks up the index entry preceding it and computes
+the sample number from the sample rate, without reading any samples.
+Existing raw captures with a pickled .info file can be converted with
+
+    capture.py [-o output.cap] capture.dat
+"""
+
+import os
+import sys
+import time
+import struct
+import cPickle
+import numpy as np
+from optparse import OptionParser
+
+CAPTURE_MAGIC = 'OP25CAP1'
+CAPTURE_VERSION = 1
+HEADER_LEN = 4096
+HEADER_FORMAT = '<8sII8sdddd32sQQQQ'
+INDEX_DTYPE = np.dtype([('sample', '<u8'), ('time', '<f8')])
+CHUNK_LEN = 1 << 20	# samples per block when converting
+
+# sample type name: (item size in bytes, numpy dtype)
+sample_types = {
+    'fc32': (8, np.complex64),	# gr_complex
+    'sc16': (4, np.dtype([('i', '<i2'), ('q', '<i2')])),
+    'f32':  (4, np.float32),
+    's16':  (2, np.int16),
+}
+
+def is_capture(filename):
+    f = open(filename, 'rb')
+    magic = f.read(len(CAPTURE_MAGIC))
+    f.close()
+    return magic == CAPTURE_MAGIC
+
+class capture_file(object):
+    """
+    read the header and index of a capture file.  Samples are numbered
+    from 0; times are seconds since the epoch, as in start_time.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        f = open(filename, 'rb')
+        header = f.read(struct.calcsize(HEADER_FORMAT))
+        if len(header) < struct.calcsize(HEADER_FORMAT) or not header.startswith(CAPTURE_MAGIC):
+            f.close()
+            raise ValueError('%s is not a capture file' % filename)
+        (magic, version, self.data_offset, sample_type, self.sample_rate,
+         self.center_freq, self.gain, self.start_time, source,
+         self.nsamples, self.index_interval, index_offset, index_count) = struct.unpack(HEADER_FORMAT, header)
+        if version > CAPTURE_VERSION:
+            f.close()
+            raise ValueError('%s: unsupported capture version %d' % (filename, version))
+        self.sample_type = sample_type.rstrip('\0')
+        self.source = source.rstrip('\0')
+        self.itemsize, self.dtype = sample_types[self.sample_type]
+        if index_count:
+            f.seek(index_offset)
+            self.index = np.fromfile(f, dtype=INDEX_DTYPE, count=index_count)
+        else:
+            # capture was not closed: assume the samples are contiguous
+            size = os.fstat(f.fileno()).st_size
+            self.nsamples = (size - self.data_offset) // self.itemsize
+            self.index = np.zeros(1, dtype=INDEX_DTYPE)
+            self.index['time'] = self.start_time
+        f.close()
+
+    def info(self):
+        """
+        capture properties, with the keys used by scope.py
+        """
+        return {
+            "capture-rate": self.sample_rate,
+            "center-freq": self.center_freq,
+            "source-dev": self.source,
+            "sample-type": self.sample_type,
+            "gain": self.gain,
+            "start-time": self.start_time,
+            "source-decim": 1 }
+
+    def duration(self):
+        return float(self.nsamples) / self.sample_rate
+
+    def sample_at(self, t):
+        """
+        number of the sample taken at time t, clipped to the capture
+        """
+        i = max(np.searchsorted(self.index['time'], t, side='right') - 1, 0)
+        sample = int(self.index['sample'][i]) + int(round((t - self.index['time'][i]) * self.sample_rate))
+        if i + 1 < len(self.index):
+            # t falls in a gap in the capture: start at the next entry
+            sample = min(sample, int(self.index['sample'][i + 1]))
+        return max(0, min(sample, self.nsamples))
+
+    def time_of(self, sample):
+        """
+        time at which sample was taken
+        """
+        i = max(np.searchsorted(self.index['sample'], sample, side='right') - 1, 0)
+        return self.index['time'][i] + float(sample - int(self.index['sample'][i])) / self.sample_rate
+
+    def item_offset(self, sample):
+        """
+        position of sample in items of the file, for gr.file_source.seek()
+        """
+        return self.data_offset // self.itemsize + sample
+
+    def read(self, start, count):
+        """
+        return count samples from sample start, as an array
+        """
+        count = max(0, min(count, self.nsamples - start))
+        f = open(self.filename, 'rb')
+        f.seek(self.data_offset + start * self.itemsize)
+        a = np.fromfile(f, dtype=self.dtype, count=count)
+        f.close()
+        return a
+
+class capture_writer(object):
+    """
+    write a capture file.  write() appends blocks of samples, each
+    optionally tagged with the time of its first sample; untagged blocks
+    are assumed to follow the previous one without a gap.  The index and
+    the final sample count are written by close().
+    """
+    def __init__(self, filename, sample_rate, center_freq=0.0, sample_type='fc32',
+                 gain=0.0, start_time=None, source='', index_interval=None):
+        if start_time is None:
+            start_time = time.time()
+        if index_interval is None:
+            index_interval = max(1, int(sample_rate))	# one second
+        self.itemsize = sample_types[sample_type][0]
+        self.params = [sample_type, float(sample_rate), float(center_freq), float(gain),
+                       float(start_time), source[:32]]
+        self.sample_rate = float(sample_rate)
+        self.index_interval = index_interval
+        self.index = [(0, float(start_time))]
+        self.nsamples = 0
+        self.next_time = float(start_time)
+        self.f = open(filename, 'wb')
+        self.__write_header(0, 0)
+        self.f.seek(HEADER_LEN)
+
+    def __write_header(self, index_offset, index_count):
+        sample_type, rate, freq, gain, start, source = self.params
+        header = struct.pack(HEADER_FORMAT, CAPTURE_MAGIC, CAPTURE_VERSION, HEADER_LEN,
+                             sample_type, rate, freq, gain, start, source,
+                             self.nsamples, self.index_interval, index_offset, index_count)
+        self.f.seek(0)
+        self.f.write(header.ljust(HEADER_LEN, '\0'))
+
+    def write(self, samples, timestamp=None):
+        """
+        samples is an array, or a string of raw sample bytes
+        """
+        if isinstance(samples, np.ndarray):
+            samples = samples.tostring()
+        n = len(samples) // self.itemsize
+        if n == 0:
+            return
+        if timestamp is not None and abs(timestamp - self.next_time) * self.sample_rate >= 1:
+            if self.index[-1][0] == self.nsamples:
+                self.index[-1] = (self.nsamples, float(timestamp))
+            else:
+                self.index.append((self.nsamples, float(timestamp)))
+            self.next_time = float(timestamp)
+        # periodic entries falling within this block
+        first = -(-self.nsamples // self.index_interval) * self.index_interval
+        if first == self.index[-1][0]:
+            first += self.index_interval
+        for s in xrange(first, self.nsamples + n, self.index_interval):
+            self.index.append((s, self.next_time + (s - self.nsamples) / self.sample_rate))
+        self.f.write(samples[:n * self.itemsize])
+        self.nsamples += n
+        self.next_time += n / self.sample_rate
+
+    def close(self):
+        index_offset = HEADER_LEN + self.nsamples * self.itemsize
+        self.f.seek(index_offset)
+        np.array(self.index, dtype=INDEX_DTYPE).tofile(self.f)
+        self.__write_header(index_offset, len(self.index))
+        self.f.close()
+
+def read_info(filename):
+    """
+    read a legacy pickled .info file.  Only plain values are accepted;
+    a pickle naming any class or function is refused instead of loaded.
+    """
+    f = open(filename, 'rb')
+    u = cPickle.Unpickler(f)
+    u.find_global = None
+    try:
+        info = u.load()
+    finally:
+        f.close()
+    if not isinstance(info, dict):
+        raise ValueError('%s: not a capture properties file' % filename)
+    return info
+
+def convert(raw_filename, output_filename, info=None, sample_type='fc32', start_time=None):
+    """
+    copy a raw capture (with properties from info, or from its .info
+    file) into a capture file
+    """
+    if info is None:
+        info = read_info(raw_filename + '.info')
+    rate = info["capture-rate"]
+    if not isinstance(rate, (int, long, float)):
+        raise ValueError('%s: unknown capture rate %r' % (raw_filename, rate))
+    itemsize = sample_types[sample_type][0]
+    size = os.path.getsize(raw_filename)
+    if start_time is None:
+        # best guess: the capture ended when the file was last written
+        start_time = os.path.getmtime(raw_filename) - float(size // itemsize) / rate
+    center_freq = info.get("center-freq", 0)
+    if not isinstance(center_freq, (int, long, float)):
+        center_freq = 0
+    w = capture_writer(output_filename, rate, center_freq, sample_type=sample_type,
+                       gain=info.get("gain", 0) or 0, start_time=start_time,
+                       source=str(info.get("source-dev", "")))
+    f = open(raw_filename, 'rb')
+    while True:
+        buf = f.read(CHUNK_LEN * itemsize)
+        if not buf:
+            break
+        w.write(buf)
+    f.close()
+    w.close()
+
+def main():
+    parser = OptionParser(usage="%prog [options] capture.dat ...")
+    parser.add_option("-o", "--output", type="string", default=None, help="output file (default: input name with .cap)")
+    parser.add_option("-r", "--rate", type="float", default=None, help="sample rate, when there is no .info file")
+    parser.add_option("-f", "--frequency", type="float", default=0.0, help="centre frequency, when there is no .info file")
+    parser.add_option("-t", "--sample-type", type="choice", choices=sorted(sample_types.keys()), default='fc32', help="sample type (default: fc32)")
+    parser.add_option("-T", "--start-time", type="float", default=None, help="capture start time (default: from file time)")
+    (options, args) = parser.parse_args()
+    if len(args) == 0 or (options.output and len(args) > 1):
+        parser.print_help()
+        sys.exit(1)
+    for filename in args:
+        info = None
+        if options.rate:
+            info = {"capture-rate": options.rate, "center-freq": options.frequency}
+        output = options.output or os.path.splitext(filename)[0] + '.cap'
+        convert(filename, output, info, options.sample_type, options.start_time)
+        c = capture_file(output)
+        print '%s: %d samples at %g sps, %.1f s' % (output, c.nsamples, c.sample_rate, c.duration())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Compare the cost per channel of channel selection in usrp_rx.py
+
+A synthetic capture at the usrp_rx.py input rate carries 64 C4FM
+carriers on a 12.5 kHz raster.  For 1 to 64 channels it is run through
+one freq_xlating_fir_filter per channel at the input rate (usrp_rx.py
+-X), then through the polyphase channelizer followed by the short
+per-channel filters, and the time per channel is reported.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from optparse import OptionParser
+
+from gnuradio import gr
+from gnuradio.eng_option import eng_option
+
+from channelizer import pfb_channelizer
+
+INPUT_RATE = 64e6 / 60
+CHANNEL_DECIM = 50
+LOW_PASS = 15e3
+SPACING = 12.5e3
+
+def mk_file(filename, seconds, nchans=64, seed=0):
+    """
+    write nchans C4FM carriers (random symbols, 4800 baud, 600 Hz
+    deviation per level) centred on 0 Hz
+    """
+    rng = np.random.RandomState(seed)
+    n = int(seconds * INPUT_RATE)
+    t = np.arange(n) / INPUT_RATE
+    sps = INPUT_RATE / 4800
+    x = np.zeros(n, dtype=np.complex128)
+    for k in xrange(nchans):
+        offset = (k - nchans / 2) * SPACING
+        levels = rng.choice([-3, -1, 1, 3], int(n / sps) + 1)
+        dev = 600.0 * levels[(np.arange(n) / sps).astype(int)]
+        phase = 2 * np.pi * (offset * t + np.cumsum(dev) / INPUT_RATE)
+        x += np.exp(1j * phase)
+    (x / nchans).astype(np.complex64).tofile(filename)
+    return [(k - nchans / 2) * SPACING for k in xrange(nchans)]
+
+def run_xlating(filename, nsamples, lo_freqs):
+    tb = gr.top_block()
+    src = gr.file_source(gr.sizeof_gr_complex, filename, True)
+    head = gr.head(gr.sizeof_gr_complex, nsamples)
+    tb.connect(src, head)
+    taps = gr.firdes.low_pass(1.0, INPUT_RATE, LOW_PASS, LOW_PASS * 0.1, gr.firdes.WIN_HANN)
+    for f in lo_freqs:
+        chan = gr.freq_xlating_fir_filter_ccf(CHANNEL_DECIM, taps, f, INPUT_RATE)
+        tb.connect(head, chan, gr.null_sink(gr.sizeof_gr_complex))
+    t0 = time.time()
+    tb.run()
+    return time.time() - t0
+
+def run_channelizer(filename, nsamples, lo_freqs):
+    tb = gr.top_block()
+    src = gr.file_source(gr.sizeof_gr_complex, filename, True)
+    head = gr.head(gr.sizeof_gr_complex, nsamples)
+    chz = pfb_channelizer(INPUT_RATE, CHANNEL_DECIM, lo_freqs, LOW_PASS * 1.1)
+    tb.connect(src, head, chz)
+    taps = chz.channel_taps(LOW_PASS)
+    for i in xrange(len(lo_freqs)):
+        chan = gr.freq_xlating_fir_filter_ccf(chz.oversample, taps, chz.residuals[i], chz.output_rate)
+        tb.connect((chz, chz.ports[i]), chan, gr.null_sink(gr.sizeof_gr_complex))
+    t0 = time.time()
+    tb.run()
+    return time.time() - t0
+
+def main():
+    parser = OptionParser(option_class=eng_option)
+    parser.add_option("-s", "--seconds", type="eng_float", default=10.0, help="length of input processed per run")
+    parser.add_option("-i", "--input-file", type="string", default=None, help="reuse or keep this capture file")
+    (options, args) = parser.parse_args()
+
+    filename = options.input_file
+    if filename is None:
+        fd, filename = tempfile.mkstemp(suffix='.dat')
+        os.close(fd)
+    lo_freqs = mk_file(filename, 1.0)
+    nsamples = int(options.seconds * INPUT_RATE)
+
+    print '%d s of input at %d sps' % (options.seconds, INPUT_RATE)
+    print 'chans  xlating s  per chan   pfb s  per chan  speedup'
+    for n in (1, 2, 4, 8, 16, 32, 64):
+        # spread the channels over the band
+        chans = lo_freqs[::64 / n]
+        tx = run_xlating(filename, nsamples, chans)
+        tp = run_channelizer(filename, nsamples, chans)
+        print '%5d  %9.2f  %8.3f  %6.2f  %8.3f  %6.1fx' % (n, tx, tx / n, tp, tp / n, tx / tp)
+    if options.input_file is None:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
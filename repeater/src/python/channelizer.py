@@ -0,0 +1,154 @@
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Polyphase FFT channelizer for the multichannel receiver
+
+The wideband input is split once into bins spaced at the channel rate
+by a polyphase filterbank, oversampled so that a channel lying anywhere
+within a bin is passed without aliasing.  Each receiver channel then
+needs only a short frequency-translating filter at the bin rate to
+remove the residual offset from the bin centre and decimate to the
+channel rate, instead of a long filter running at the wideband rate.
+
+Channel plans are text files:
+
+    # centre frequency of the receiver
+    center 430.25M
+    # freq      mode   port    options
+    430.1000M   c4fm   32001
+    430.2000M   cqpsk  32002   wireshark
+    430.4000M   fm     32004   ctcss=97.4
+
+mode is one of c4fm, cqpsk, fm or nfm.  Frequencies may carry a k, M or
+G suffix.
+"""
+
+import math
+
+from gnuradio import gr, blks2
+
+modes = ('c4fm', 'cqpsk', 'fm', 'nfm')
+
+def parse_freq(s):
+    scale = {'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+    if s[-1] in scale:
+        return float(s[:-1]) * scale[s[-1]]
+    return float(s)
+
+def read_channel_plan(filename):
+    """
+    return the centre frequency and the list of channels of a plan
+    file, each channel a dict with the keys freq, mode and port and
+    optionally ctcss and wireshark
+    """
+    center_freq = None
+    channels = []
+    f = open(filename)
+    for lineno, line in enumerate(f):
+        words = line.split('#')[0].split()
+        if not words:
+            continue
+        try:
+            if words[0] == 'center':
+                center_freq = parse_freq(words[1])
+                continue
+            channel = {'freq': parse_freq(words[0]), 'mode': words[1], 'port': int(words[2])}
+            for opt in words[3:]:
+                if opt == 'wireshark':
+                    channel['wireshark'] = 1
+                elif opt.startswith('ctcss='):
+                    channel['ctcss'] = float(opt[6:])
+                else:
+                    raise ValueError('unknown option %s' % opt)
+        except (IndexError, ValueError), e:
+            raise ValueError('%s:%d: %s' % (filename, lineno + 1, e))
+        if channel['mode'] not in modes:
+            raise ValueError('%s:%d: unknown mode %s' % (filename, lineno + 1, channel['mode']))
+        channels.append(channel)
+    f.close()
+    if center_freq is None:
+        raise ValueError('%s: no center frequency' % filename)
+    return center_freq, channels
+
+def channel_bins(lo_freqs, input_rate, nbins):
+    """
+    for each channel (given as the frequency of the channel within the
+    input, as for freq_xlating_fir_filter), the channelizer bin holding
+    it and its offset from the centre of that bin
+    """
+    spacing = float(input_rate) / nbins
+    bins = []
+    for f in lo_freqs:
+        k = int(round(f / spacing))
+        bins.append((k % nbins, f - k * spacing))
+    return bins
+
+def oversample_rate(nbins, spacing, bandwidth):
+    """
+    smallest oversampling rate (a divisor of nbins) at which a channel
+    of the given one-sided bandwidth, offset by up to half a bin, lies
+    clear of the aliases of the neighbouring bins
+    """
+    for os in xrange(1, nbins + 1):
+        if nbins % os == 0 and os * spacing - (spacing / 2 + bandwidth) >= spacing / 2 + bandwidth:
+            return os
+    return nbins
+
+class pfb_channelizer(gr.hier_block2):
+    """
+    split the input into the bins holding the channels at lo_freqs.
+    Output i carries the bin ports[i] at output_rate; channel j is
+    in output ports[j] at offset residuals[j] from its centre.
+    bandwidth is the widest one-sided bandwidth any channel needs.
+    """
+    def __init__(self, input_rate, channel_decim, lo_freqs, bandwidth):
+        nbins = int(channel_decim)
+        spacing = float(input_rate) / nbins
+        self.oversample = oversample_rate(nbins, spacing, bandwidth)
+        self.output_rate = spacing * self.oversample
+        bins = channel_bins(lo_freqs, input_rate, nbins)
+        used = sorted(set([b for b, r in bins]))
+        self.ports = [used.index(b) for b, r in bins]
+        self.residuals = [r for b, r in bins]
+
+        gr.hier_block2.__init__(self, "pfb_channelizer",
+                                gr.io_signature(1, 1, gr.sizeof_gr_complex),
+                                gr.io_signature(len(used), len(used), gr.sizeof_gr_complex))
+
+        # pass the channel at any offset within its bin, stop everything
+        # that would alias onto it after decimation to the output rate
+        passband = spacing / 2 + bandwidth
+        stopband = self.output_rate - passband
+        taps = gr.firdes.low_pass(1.0, input_rate, (passband + stopband) / 2, stopband - passband, gr.firdes.WIN_HANN)
+        self.pfb = blks2.pfb_channelizer_ccf(nbins, taps, self.oversample)
+        self.connect(self, self.pfb)
+        for b in xrange(nbins):
+            if b in used:
+                self.connect((self.pfb, b), (self, used.index(b)))
+            else:
+                self.connect((self.pfb, b), gr.null_sink(gr.sizeof_gr_complex))
+
+    def channel_taps(self, low_pass):
+        """
+        taps for a channel filter at the output rate, as used before
+        the channelizer at the input rate
+        """
+        return gr.firdes.low_pass(1.0, self.output_rate, low_pass, low_pass * 0.1, gr.firdes.WIN_HANN)
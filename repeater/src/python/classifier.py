@@ -0,0 +1,178 @@
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Blind classification of a channel from a short window of samples
+
+Two features decide the mode:
+
+    the spectral line that the symbol clock puts on the magnitude of
+    the instantaneous frequency (see autocorrelation.py), found as the
+    first strong peak of its autocorrelation.  Digital modes have one;
+    voice FM and noise do not.
+
+    the variance of the envelope.  C4FM and FM keep a constant
+    envelope; the filtered CQPSK (LSM) carrier does not, nor does noise.
+
+The deviation of C4FM (that of the +1 and -1 symbols, 600 Hz for P25)
+follows from the power of the instantaneous frequency, low-passed to
+the band of the raised cosine shaping.  For FM it is the level that
+the low-passed instantaneous frequency seldom exceeds.
+"""
+
+import numpy
+
+import autocorrelation
+
+C4FM_ALPHA = 0.2	# excess bandwidth of the C4FM shaping filter
+ENVELOPE_LIMIT = 0.04	# above this envelope variance, not constant envelope
+FM_BANDWIDTH = 4000.0	# low pass for the deviation of voice FM
+FALSE_ALARM = 1e-4	# chance of finding a symbol clock in voice FM
+CQPSK_FALSE_ALARM = 1e-20	# and in noise, whose CQPSK lines are far stronger
+WINDOW = 1.0		# seconds of samples to classify
+MIN_RATE = 300.0
+MAX_RATE = 19200.0
+
+def envelope_variance(x):
+    """
+    variance of the envelope of complex x, relative to its mean squared
+    """
+    env = numpy.abs(x)
+    mean = env.mean()
+    if mean == 0:
+        return 0.0
+    return env.var() / mean ** 2
+
+def band_limit(x, sample_rate, smooth=200.0, margin=0.1):
+    """
+    complex x with the noise outside its occupied band taken out.  The
+    band is where the power spectrum, smoothed over smooth Hz, stands
+    6 dB above its median, widened by margin of its width each side.
+    Without the noise, the FM discriminator clicks far less.
+    """
+    spectrum = numpy.fft.fft(x)
+    n = max(1, int(smooth * len(x) / sample_rate))
+    p = numpy.convolve(numpy.abs(spectrum) ** 2, numpy.ones(n) / n, 'same')
+    p = numpy.fft.fftshift(p)
+    occupied = numpy.flatnonzero(p > 4 * numpy.median(p))
+    if not len(occupied):
+        return x
+    lo, hi = occupied[0], occupied[-1]
+    width = hi - lo + 1
+    lo = max(0, lo - int(margin * width))
+    hi = min(len(x) - 1, hi + int(margin * width))
+    mask = numpy.zeros(len(x), dtype=bool)
+    mask[lo:hi + 1] = True
+    spectrum[~numpy.fft.ifftshift(mask)] = 0
+    return numpy.fft.ifft(spectrum)
+
+def symbol_rate(x, sample_rate, min_rate=MIN_RATE, max_rate=MAX_RATE, false_alarm=FALSE_ALARM):
+    """
+    the symbol rate of the samples in x (complex, or already demodulated
+    floats), or None if there is no symbol clock to be found
+    """
+    z = autocorrelation.symbol_feature(x)
+    nlags = len(z)
+    nfft = 1 << int(numpy.ceil(numpy.log2(2 * nlags)))
+    spectrum = autocorrelation.feature_spectrum(z, nfft)
+    r = autocorrelation.line_autocorrelation(spectrum, 1.0, nlags, false_alarm)
+    period = autocorrelation.find_period(r, sample_rate / max_rate, sample_rate / min_rate)
+    if period is None:
+        return None
+    return sample_rate / period
+
+def low_pass(x, sample_rate, cutoff):
+    """
+    x with everything above cutoff Hz taken out
+    """
+    nfft = 1 << int(numpy.ceil(numpy.log2(len(x))))
+    spectrum = numpy.fft.rfft(x, nfft)
+    spectrum[int(numpy.ceil(cutoff * nfft / float(sample_rate))):] = 0
+    return numpy.fft.irfft(spectrum, nfft)[:len(x)]
+
+def c4fm_deviation(freq, sample_rate, rate):
+    """
+    deviation of the +1 and -1 symbols in freq, the instantaneous
+    frequency in Hz.  Random symbols of -3, -1, +1 and +3 have a mean
+    square of 5, and raised cosine shaping keeps 1 - alpha / 4 of it.
+    """
+    f = low_pass(freq - freq.mean(), sample_rate, (1 + C4FM_ALPHA) * rate / 2 * 1.05)
+    return numpy.sqrt((f ** 2).mean() / (5 * (1 - C4FM_ALPHA / 4)))
+
+def fm_deviation(freq, sample_rate):
+    """
+    peak deviation of voice FM: the level the instantaneous frequency,
+    low-passed to FM_BANDWIDTH, is below for all but 0.5% of the time
+    """
+    f = low_pass(freq - freq.mean(), sample_rate, FM_BANDWIDTH)
+    return numpy.percentile(numpy.abs(f), 99.5)
+
+def nearest_speed(rate, speeds, tolerance=0.02):
+    """
+    the entry in speeds within tolerance (a fraction) of rate, or None
+    """
+    if rate is None:
+        return None
+    best = min(speeds, key=lambda s: abs(s - rate))
+    if abs(best - rate) > tolerance * best:
+        return None
+    return best
+
+def classify(x, sample_rate, min_rate=MIN_RATE, max_rate=MAX_RATE):
+    """
+    classify a window of samples: complex baseband, or the floats of an
+    FM demodulator (whose scale is not known, so the deviation is not
+    given).  returns a dict of
+
+        mode            'c4fm', 'cqpsk', 'fm' or None for no signal,
+                        the names used in channel plans
+        symbol_rate     symbols/sec, or None
+        deviation       Hz, for c4fm the +1/-1 symbol deviation and for
+                        fm the peak deviation, otherwise None
+        offset          carrier offset in Hz (complex input only)
+        envelope        the envelope variance (complex input only)
+    """
+    x = numpy.asarray(x)
+    result = {'mode': None, 'symbol_rate': None, 'deviation': None, 'offset': None, 'envelope': None}
+    if not numpy.iscomplexobj(x):
+        rate = symbol_rate(x, sample_rate, min_rate, max_rate)
+        result['symbol_rate'] = rate
+        result['mode'] = 'fm' if rate is None else 'c4fm'
+        return result
+    x = band_limit(x.astype(numpy.complex128), sample_rate)
+    env = envelope_variance(x)
+    result['envelope'] = env
+    if env > ENVELOPE_LIMIT:
+        rate = symbol_rate(x, sample_rate, min_rate, max_rate, CQPSK_FALSE_ALARM)
+    else:
+        rate = symbol_rate(x, sample_rate, min_rate, max_rate)
+    result['symbol_rate'] = rate
+    freq = autocorrelation.discriminator(x) * (sample_rate / (2 * numpy.pi))
+    result['offset'] = freq.mean()
+    if env > ENVELOPE_LIMIT:
+        if rate is not None:
+            result['mode'] = 'cqpsk'
+    elif rate is not None:
+        result['mode'] = 'c4fm'
+        result['deviation'] = c4fm_deviation(freq, sample_rate, rate)
+    else:
+        result['mode'] = 'fm'
+        result['deviation'] = fm_deviation(freq, sample_rate)
+    return result
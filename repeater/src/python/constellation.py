@@ -0,0 +1,126 @@
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Display preparation for the constellation scope
+
+The scope receives gr_complex samples from a message sink.  Frames are
+taken straight from the message buffers with numpy.frombuffer and every
+step from there to the plotted points (splitting alternate symbols,
+phase binning, persistence and conversion back to x/y) is done on whole
+arrays, so preparing a frame costs a few NumPy calls however many points
+it holds.
+"""
+
+import numpy
+from math import pi
+
+BUCKETS_PER_RADIAN = 6.0
+
+class frame_collector(object):
+    """
+    cut a stream of message buffers into frames of frame_len samples,
+    dropping skip_len samples after each frame.  add() returns the
+    frames completed by a buffer.
+    """
+    def __init__(self, frame_len, skip_len=0):
+        self.frame_len = frame_len
+        self.skip_len = skip_len
+        self.frame = numpy.empty(frame_len, dtype=numpy.complex64)
+        self.fill = 0
+        self.skip = 0
+
+    def add(self, buf):
+        data = numpy.frombuffer(buf, dtype=numpy.complex64)
+        frames = []
+        pos = 0
+        while pos < len(data):
+            if self.skip:
+                n = min(self.skip, len(data) - pos)
+                self.skip -= n
+                pos += n
+                continue
+            n = min(self.frame_len - self.fill, len(data) - pos)
+            if self.fill == 0 and n == self.frame_len:
+                # whole frame within the buffer: no copy
+                frames.append(data[pos:pos + n])
+            else:
+                self.frame[self.fill:self.fill + n] = data[pos:pos + n]
+                self.fill += n
+                if self.fill < self.frame_len:
+                    break
+                frames.append(self.frame)
+                self.frame = numpy.empty(self.frame_len, dtype=numpy.complex64)
+            self.fill = 0
+            pos += n
+            self.skip = self.skip_len
+        return frames
+
+def split_points(frame, flag=False):
+    """
+    (n, 2) arrays of the x/y points of alternate samples, as plotted in
+    the two colours; flag is True if the first sample belongs to the
+    second set
+    """
+    xy = frame.view(numpy.float32).reshape(-1, 2)
+    if flag:
+        return xy[1::2], xy[0::2]
+    return xy[0::2], xy[1::2]
+
+class phase_histogram(object):
+    """
+    population display: a histogram of the phase of alternate samples,
+    drawn as two closed polar curves.  Each frame's counts are added to
+    the previous counts scaled by decay (0 shows every frame afresh).
+    """
+    def __init__(self, decay=0.0, buckets_per_radian=BUCKETS_PER_RADIAN):
+        self.decay = decay
+        self.buckets_per_radian = buckets_per_radian
+        self.nbuckets = int(2 * pi * buckets_per_radian) + 1
+        theta = numpy.arange(self.nbuckets + 1) * (2 * pi / self.nbuckets) - pi
+        self.unit = numpy.column_stack((numpy.cos(theta), numpy.sin(theta)))
+        self.counts = numpy.zeros((2, self.nbuckets))
+        self.flag = False
+
+    def bucket(self, frame):
+        # as in the original display, the angle is atan2(I, Q)
+        theta = numpy.arctan2(frame.real, frame.imag)
+        return ((theta + pi) * self.buckets_per_radian).astype(numpy.intp)
+
+    def update(self, frame):
+        """
+        add a frame and return the two curves as (nbuckets + 1, 2) arrays
+        """
+        b = self.bucket(frame)
+        first = int(self.flag)
+        counts = numpy.empty_like(self.counts)
+        counts[first] = numpy.bincount(b[1::2], minlength=self.nbuckets)[:self.nbuckets]
+        counts[1 - first] = numpy.bincount(b[0::2], minlength=self.nbuckets)[:self.nbuckets]
+        if len(frame) & 1:
+            self.flag = not self.flag
+        self.counts *= self.decay
+        self.counts += counts
+        avg = self.counts.mean()
+        if avg == 0:
+            avg = 1.0
+        radius = 0.5 * self.counts / avg
+        radius = numpy.concatenate((radius, radius[:, :1]), axis=1)
+        return (self.unit * radius[0][:, numpy.newaxis],
+                self.unit * radius[1][:, numpy.newaxis])
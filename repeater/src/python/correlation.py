@@ -0,0 +1,225 @@
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Frame sync correlation for the Correlation scope
+
+The demodulated samples are correlated against the signature of a
+frame sync by FFT overlap-save.  A record is cut into blocks of nfft
+samples, each overlapping the next by the length of the signature less
+one.  The blocks are all transformed at once and multiplied by the
+conjugate spectrum of the signature.  After the inverse transform, the
+lags that did not wrap around are kept.  The end of each record is
+carried over to the next, so a sync that straddles two records is
+still found.
+
+A sync is a peak of the magnitude of the correlation that clears a
+threshold.  The threshold is a multiple of the spread of the
+correlation itself (from its median absolute deviation), so it follows
+the signal level and the noise.  Each hit gives its time, its margin
+over the threshold and its polarity.  The spacing of successive hits,
+which must be a whole number of symbols, gives the offset of the
+symbol clock.  Only a decimated envelope of the correlation is plotted.
+"""
+
+import threading
+import numpy
+from numpy.lib.stride_tricks import as_strided
+
+import autocorrelation
+
+THRESHOLD = 5.5		# spreads of the correlation for a hit
+CLOCK_HITS = 16		# recent hits the clock offset is fitted to
+
+def sync_signature(frame_sync, sps):
+    """
+    the template of a frame sync written as symbols, '1' for +3 and '3'
+    for -3, at sps samples per symbol
+    """
+    symbols = numpy.array([1.0 if c == '1' else -1.0 for c in frame_sync])
+    return numpy.repeat(symbols, sps)
+
+def correlate(x, h, nfft=None):
+    """
+    y[n] = sum(x[n:n + len(h)] * h) for each lag n at which h lies
+    wholly within x, by overlap-save in blocks of nfft samples (by
+    default the power of two at least eight times the length of h)
+    """
+    m = len(h)
+    n = len(x) - m + 1
+    if n <= 0:
+        return numpy.zeros(0)
+    if nfft is None:
+        nfft = 1 << int(numpy.ceil(numpy.log2(8 * m)))
+    step = nfft - m + 1
+    nblocks = -(-n // step)
+    padded = numpy.zeros(nblocks * step + m - 1)
+    padded[:len(x)] = x
+    stride = padded.strides[0]
+    blocks = as_strided(padded, (nblocks, nfft), (step * stride, stride))
+    spectrum = numpy.fft.rfft(blocks, axis=1) * numpy.conj(numpy.fft.rfft(h, nfft))
+    return numpy.fft.irfft(spectrum, nfft, axis=1)[:, :step].ravel()[:n]
+
+def spread(y):
+    """
+    the standard deviation of y, from its median absolute deviation,
+    which the few large values at the syncs do not pull up
+    """
+    return 1.4826 * numpy.median(numpy.abs(y - numpy.median(y)))
+
+def find_peaks(a, threshold, min_distance):
+    """
+    indices of the peaks of a above threshold, each the highest within
+    min_distance of it
+    """
+    above = numpy.flatnonzero(a > threshold)
+    if not len(above):
+        return above
+    # the highest sample of each run above the threshold
+    run = numpy.concatenate(([0], numpy.cumsum(numpy.diff(above) > 1)))
+    order = numpy.lexsort((-a[above], run))
+    first = numpy.concatenate(([True], run[order][1:] != run[order][:-1]))
+    peaks = above[order[first]]
+    # then the highest of the peaks closer together than min_distance
+    keep = []
+    for i in peaks[numpy.argsort(-a[peaks], kind='mergesort')]:
+        if all([abs(i - j) >= min_distance for j in keep]):
+            keep.append(i)
+    return numpy.array(sorted(keep), dtype=int)
+
+def envelope(y, decim):
+    """
+    the largest magnitude of y in each block of decim samples
+    """
+    nblocks = -(-len(y) // decim)
+    a = numpy.zeros(nblocks * decim)
+    a[:len(y)] = numpy.abs(y)
+    return a.reshape(nblocks, decim).max(axis=1)
+
+class correlator(object):
+    """
+    find frame syncs in records of demodulated samples arriving at
+    sample_rate.  The syncs searched for are those of the template
+    given to set_signature().
+    """
+    def __init__(self, sample_rate=48000.0, threshold=THRESHOLD):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.template = None
+        self.sps = 1
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.tail = numpy.zeros(0)
+        self.start = 0		# stream index of the next lag
+        self.record_start = 0	# and of the first lag in y
+        self.y = numpy.zeros(0)	# correlation of the lags of the last record
+        self.level = 0.0	# and the threshold it was held to
+        self.hits = []		# (time, margin dB, polarity) in the last record
+        self.last_hit = None
+        self.positions = []	# recent hits, in samples
+        self.symbols = []	# and in symbols from the first of them
+        self.clock_offset = None
+
+    def set_signature(self, template, sps):
+        self.lock.acquire()
+        try:
+            self.template = numpy.asarray(template, dtype=numpy.float64)
+            self.sps = sps
+            self.reset()
+        finally:
+            self.lock.release()
+
+    def add(self, x):
+        """
+        correlate a record of samples.  returns the number of syncs found
+        """
+        self.lock.acquire()
+        try:
+            return self.update(x)
+        finally:
+            self.lock.release()
+
+    def update(self, x):
+        m = len(self.template)
+        buf = numpy.concatenate((self.tail, x))
+        y = correlate(buf, self.template)
+        # the last m lags wait for the next record, so that a peak there
+        # is compared with what follows it
+        done = max(0, len(y) - m)
+        self.tail = buf[done:]
+        a = numpy.abs(y)
+        self.level = self.threshold * spread(y)
+        self.hits = []
+        peaks = find_peaks(a, self.level, m) if self.level > 0 else []
+        for i in peaks:
+            if i >= done:
+                continue
+            index = self.start + i
+            if self.last_hit is not None and index - self.last_hit < m:
+                continue
+            self.last_hit = index
+            position = self.start + (autocorrelation.parabolic_peak(a, i) if i else 0.0)
+            margin = 20 * numpy.log10(a[i] / self.level)
+            self.hits.append((position / self.sample_rate, margin, 1 if y[i] > 0 else -1))
+            self.add_position(position)
+        self.y = y[:done]
+        self.record_start = self.start
+        self.start += done
+        return len(self.hits)
+
+    def add_position(self, position):
+        """
+        count the symbols since the previous hit and refit the clock
+        """
+        if self.positions:
+            samples_per_symbol = self.sps * (1.0 + 1e-6 * (self.clock_offset or 0.0))
+            symbols = self.symbols[-1] + int(round((position - self.positions[-1]) / samples_per_symbol))
+        else:
+            symbols = 0
+        self.positions = (self.positions + [position])[-CLOCK_HITS:]
+        self.symbols = (self.symbols + [symbols])[-CLOCK_HITS:]
+        if len(self.positions) > 1 and self.symbols[-1] != self.symbols[0]:
+            slope = numpy.polyfit(self.symbols, self.positions, 1)[0]
+            self.clock_offset = (slope / self.sps - 1.0) * 1e6
+
+    def points(self, npoints=1000):
+        """
+        the envelope of the last record's correlation as an array of (ms,
+        magnitude) of about npoints rows, the hits as (ms, magnitude)
+        rows, the threshold, and the hits as (time in seconds, margin in
+        dB, polarity)
+        """
+        self.lock.acquire()
+        try:
+            decim = max(1, len(self.y) // npoints)
+            env = envelope(self.y, decim)
+            ms = 1000.0 / self.sample_rate
+            points = numpy.empty((len(env), 2))
+            points[:, 0] = numpy.arange(len(env)) * decim * ms
+            points[:, 1] = env
+            markers = numpy.empty((len(self.hits), 2))
+            for k, (t, margin, polarity) in enumerate(self.hits):
+                markers[k, 0] = (t * self.sample_rate - self.record_start) * ms
+                markers[k, 1] = self.level * 10 ** (margin / 20.0)
+            return points, markers, self.level, list(self.hits)
+        finally:
+            self.lock.release()
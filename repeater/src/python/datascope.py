@@ -0,0 +1,143 @@
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Eye diagram preparation for the data scope
+
+Samples from the message sink are written into a ring buffer that keeps
+every sample twice, so the most recent samples can always be read as
+one contiguous array.  A frame of the eye diagram is a reshape of that
+array into one trace per symbol, with no copying.  When triggering is
+on, the traces start at a fixed distance before the symbol instants,
+found from the mean power at each sample phase, so the eye stays still
+between frames instead of wandering with the message boundaries.
+"""
+
+import threading
+import numpy
+
+class ring_buffer(object):
+    """
+    the last size float samples written, readable as one array by last()
+    """
+    def __init__(self, size):
+        self.size = size
+        self.buf = numpy.zeros(2 * size, dtype=numpy.float32)
+        self.head = 0	# where the next sample goes
+        self.count = 0	# samples written in all
+
+    def write(self, data):
+        self.count += len(data)
+        if len(data) > self.size:
+            data = data[-self.size:]
+        n = min(len(data), self.size - self.head)
+        for base in (0, self.size):
+            self.buf[base + self.head:base + self.head + n] = data[:n]
+            self.buf[base:base + len(data) - n] = data[n:]
+        self.head = (self.head + len(data)) % self.size
+
+    def last(self, n):
+        """
+        view of the last n (up to size) samples, oldest first
+        """
+        end = self.head + self.size
+        return self.buf[end - n:end]
+
+class eye_traces(object):
+    """
+    consume message buffers of floats and present the latest num_plots
+    symbols as a (num_plots, samples_per_symbol) array.  add() returns
+    True once interval samples have arrived since the previous frame.
+    With trigger set, the symbol instants are placed in the middle
+    column of the traces.
+    """
+    def __init__(self, samples_per_symbol, num_plots, interval, trigger=True, decay=0.9):
+        self.samples_per_symbol = samples_per_symbol
+        self.num_plots = num_plots
+        self.interval = interval
+        self.trigger = trigger
+        self.decay = decay
+        self.ring = ring_buffer((num_plots + 1) * samples_per_symbol)
+        self.power = numpy.zeros(samples_per_symbol)
+        self.next_frame = self.ring.size
+        self.lock = threading.Lock()
+
+    def add(self, buf):
+        data = numpy.frombuffer(buf, dtype=numpy.float32)
+        self.lock.acquire()
+        try:
+            self.ring.write(data)
+            if self.ring.count < self.next_frame:
+                return False
+            self.next_frame = self.ring.count + self.interval
+            if self.trigger:
+                self.update_timing()
+            return True
+        finally:
+            self.lock.release()
+
+    def update_timing(self):
+        sps = self.samples_per_symbol
+        n = self.num_plots * sps
+        # align the columns with the sample phase
+        start = self.ring.count - n - sps
+        x = self.ring.last(n + sps)[-start % sps:][:n].reshape(-1, sps)
+        self.power = self.decay * self.power + (1 - self.decay) * (x.astype(numpy.float64) ** 2).mean(axis=0)
+
+    def symbol_phase(self):
+        """
+        sample phase (sample number modulo samples_per_symbol) of the
+        symbol instants
+        """
+        return int(numpy.argmax(self.power))
+
+    def traces(self):
+        """
+        (num_plots, samples_per_symbol) view of the latest symbols
+        """
+        sps = self.samples_per_symbol
+        n = self.num_plots * sps
+        window = self.ring.last(n + sps)
+        if not self.trigger:
+            return window[sps:].reshape(-1, sps)
+        start = self.ring.count - n - sps
+        offset = (self.symbol_phase() - sps // 2 - start) % sps
+        return window[offset:offset + n].reshape(-1, sps)
+
+    def points(self):
+        """
+        trace_points() of the latest traces, taken while no samples are
+        being added
+        """
+        self.lock.acquire()
+        try:
+            return trace_points(self.traces())
+        finally:
+            self.lock.release()
+
+def trace_points(traces):
+    """
+    (num_plots, samples_per_symbol, 2) array of the (time, amplitude)
+    points of each trace
+    """
+    points = numpy.empty(traces.shape + (2,))
+    points[:, :, 0] = numpy.arange(traces.shape[1])
+    points[:, :, 1] = traces
+    return points
@@ -0,0 +1,374 @@
+#
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Message queue dispatcher
+
+The flow graph talks to python through gr.msg_queues: data units from
+the frame assembler, frequency corrections from the demodulator, sample
+frames for each scope.  Every message is decoded into an event of its
+queue's type and handed to the handlers subscribed to that type, all
+handlers being called from the one dispatcher thread.
+
+A gr.msg_queue cannot be waited on together with others, so each queue
+has a reader thread blocked in delete_head().  When a message arrives
+the reader takes it and whatever else is queued behind it (up to a
+batch) with delete_head_nowait(), decodes them and wakes the dispatcher
+through a condition variable: one hand-off per batch, not per message.
+Nothing sleeps on a timer, so a message on a quiet queue is handled as
+soon as it arrives, where one thread polling every queue in turn would
+have to sleep between empty rounds.  remove_queue() wakes the reader
+with an empty message so that its thread ends.
+
+Each handler has its own bounded queue.  A handler that falls behind
+loses its oldest events, counted in dropped, rather than holding up the
+others or letting a burst of control channel traffic pile up.  A
+lossless handler, for a file writer or a batch decoder, instead holds
+back the readers of its event type once depth events are waiting for
+it: they stop taking messages, the queues fill and the message sinks in
+the flow graph block until the handler catches up.
+"""
+
+import sys
+import time
+import struct
+import threading
+import traceback
+import collections
+
+MIN_WAIT = 0.001
+
+class data_unit(object):
+    """
+    a frame assembler message: the duid, the NAC and the body (TSBK, or
+    PDU header and blocks; empty for the other data units) as a string
+    """
+    __slots__ = ['duid', 'nac', 'body']
+
+    def __init__(self, duid, nac, body):
+        self.duid = duid
+        self.nac = nac
+        self.body = body
+
+def decode_data_unit(msg):
+    s = msg.to_string()
+    if len(s) < 2:
+        return data_unit(int(msg.type()), 0, '')
+    nac, = struct.unpack('>H', s[-2:])
+    return data_unit(int(msg.type()), nac, s[:-2])
+
+def decode_body(msg):
+    return msg.to_string()
+
+def decode_arg1(msg):
+    return msg.arg1()
+
+def wake_message():
+    """
+    an empty message, to wake a reader blocked in delete_head()
+    """
+    from gnuradio import gr
+    return gr.message()
+
+class handler_queue(object):
+    """
+    the bounded queue of events waiting for one handler
+    """
+    def __init__(self, handler, depth, batch, lossless=False):
+        self.handler = handler
+        self.batch = batch
+        self.depth = depth
+        self.lossless = lossless	# the readers wait instead
+        self.events = collections.deque(maxlen=None if lossless else depth)
+        self.delivered = 0
+        self.dropped = 0	# events lost to a full queue
+        self.max_depth = 0	# most events ever waiting
+        self.errors = 0		# exceptions raised by the handler
+
+    def put(self, events):
+        if not self.lossless:
+            room = self.events.maxlen - len(self.events)
+            if len(events) > room:
+                self.dropped += len(events) - room
+        self.events.extend(events)
+        self.max_depth = max(self.max_depth, len(self.events))
+
+    def deliver(self):
+        events = list(self.events)
+        self.events.clear()
+        self.delivered += len(events)
+        if self.batch:
+            self.call(events)
+        else:
+            for event in events:
+                self.call(event)
+
+    def call(self, arg):
+        try:
+            self.handler(arg)
+        except Exception:
+            self.errors += 1
+            traceback.print_exc(file=sys.stderr)
+
+class queue_reader(threading.Thread):
+    """
+    block on one message queue and pass its messages, decoded, to the
+    dispatcher
+    """
+    def __init__(self, dispatcher, source, **kwds):
+        threading.Thread.__init__ (self, **kwds)
+        self.setDaemon(1)
+        self.dispatcher = dispatcher
+        self.source = source
+        self.keep_running = True
+
+    def run(self):
+        msgq, event_type, decode = self.source
+        batch = self.dispatcher.batch
+        while self.keep_running:
+            msg = msgq.delete_head()
+            if not self.keep_running:
+                break
+            # this thread is the only reader, so none of these will wait
+            msgs = [msg] + [msgq.delete_head_nowait() for i in xrange(min(msgq.count(), batch - 1))]
+            self.dispatcher.put(event_type, [decode(m) for m in msgs])
+
+class dispatcher(threading.Thread):
+    """
+    route the decoded messages of any number of message queues to the
+    handlers subscribed to each queue's event type.  add_queue(),
+    subscribe() and their inverses may be called at any time.  start()
+    runs the dispatcher and a reader thread for each queue; poll() may
+    instead be called directly, taking the messages without waiting.
+    """
+    def __init__(self, batch=64, wake=wake_message, **kwds):
+        threading.Thread.__init__ (self, **kwds)
+        self.setDaemon(1)
+        self.batch = batch
+        self.wake = wake	# makes the message that ends a removed queue's reader
+        self.sources = ()
+        self.readers = {}	# msgq -> its queue_reader, once started
+        self.handlers = {}
+        self.all_handlers = ()
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.drained = threading.Condition(self.lock)
+        self.pending = []	# (event_type, events) from the readers
+        self.waiting = {}	# events put and not yet delivered, by type
+        self.started = False
+        self.keep_running = True
+        self.read = 0		# messages taken from the queues
+        self.messages = 0	# and delivered
+        self.rounds = 0
+        self.idle_rounds = 0
+
+    def add_queue(self, msgq, event_type, decode=decode_body):
+        """
+        take messages from msgq, each turned by decode(msg) into an
+        event of event_type
+        """
+        self.lock.acquire()
+        source = (msgq, event_type, decode)
+        self.sources = self.sources + (source,)
+        if self.started:
+            self.start_reader(source)
+        self.lock.release()
+
+    def remove_queue(self, msgq):
+        """
+        stop taking messages from msgq.  Its reader is woken with an
+        empty message and ends; any messages still queued are thrown
+        away.
+        """
+        self.lock.acquire()
+        self.sources = tuple([s for s in self.sources if s[0] is not msgq])
+        reader = self.readers.pop(msgq, None)
+        if reader is not None:
+            reader.keep_running = False
+        self.lock.release()
+        if reader is not None:
+            msgq.insert_tail(self.wake())
+
+    def start_reader(self, source):
+        reader = queue_reader(self, source)
+        self.readers[source[0]] = reader
+        reader.start()
+
+    def subscribe(self, event_type, handler, depth=100, batch=False, lossless=False):
+        """
+        call handler(event) for each event of event_type, or with batch
+        set, handler(events) with the list of events taken together.
+        With lossless, no event is dropped: the readers of event_type
+        wait while depth events are undelivered.  Returns the
+        handler_queue, which holds the counters.
+        """
+        h = handler_queue(handler, depth, batch, lossless)
+        self.lock.acquire()
+        self.handlers[event_type] = self.handlers.get(event_type, ()) + (h,)
+        self.all_handlers = self.all_handlers + (h,)
+        self.lock.release()
+        return h
+
+    def unsubscribe(self, h):
+        """
+        stop calling the handler of h, a handler_queue from subscribe()
+        """
+        self.lock.acquire()
+        for event_type, handlers in self.handlers.items():
+            handlers = tuple([x for x in handlers if x is not h])
+            if handlers:
+                self.handlers[event_type] = handlers
+            else:
+                del self.handlers[event_type]
+        self.all_handlers = tuple([x for x in self.all_handlers if x is not h])
+        self.drained.notifyAll()
+        self.lock.release()
+
+    def limit(self, event_type):
+        """
+        the most undelivered events of event_type its lossless handlers
+        allow, None if it has none
+        """
+        depths = [h.depth for h in self.handlers.get(event_type, ()) if h.lossless]
+        if depths:
+            return min(depths)
+        return None
+
+    def put(self, event_type, events):
+        """
+        events of event_type from a reader, for the dispatcher thread.
+        Waits while a lossless handler of event_type is full.
+        """
+        self.ready.acquire()
+        while self.keep_running:
+            limit = self.limit(event_type)
+            waiting = self.waiting.get(event_type, 0)
+            if limit is None or not waiting or waiting + len(events) <= limit:
+                break
+            self.drained.wait()
+        self.pending.append((event_type, events))
+        self.waiting[event_type] = self.waiting.get(event_type, 0) + len(events)
+        self.read += len(events)
+        self.ready.notify()
+        self.ready.release()
+
+    def release(self, pending):
+        """
+        pending, taken from the readers, has been delivered
+        """
+        if not pending:
+            return
+        self.lock.acquire()
+        for event_type, events in pending:
+            self.waiting[event_type] -= len(events)
+        self.drained.notifyAll()
+        self.lock.release()
+
+    def take(self):
+        """
+        the events put since the last call, oldest first
+        """
+        self.lock.acquire()
+        pending = self.pending
+        self.pending = []
+        self.lock.release()
+        return pending
+
+    def poll(self):
+        """
+        take up to batch messages from each queue without waiting, and
+        deliver them with those from the readers; returns the number of
+        messages delivered
+        """
+        taken = self.take()
+        pending = list(taken)
+        for msgq, event_type, decode in self.sources:
+            if msgq in self.readers:
+                continue
+            count = min(msgq.count(), self.batch)
+            if count:
+                pending.append((event_type, [decode(msgq.delete_head_nowait()) for i in xrange(count)]))
+                self.read += count
+        n = self.deliver(pending)
+        self.release(taken)
+        return n
+
+    def deliver(self, pending):
+        n = 0
+        for event_type, events in pending:
+            n += len(events)
+            for h in self.handlers.get(event_type, ()):
+                h.put(events)
+        for h in self.all_handlers:
+            if h.events:
+                h.deliver()
+        self.messages += n
+        self.rounds += 1
+        if not n:
+            self.idle_rounds += 1
+        return n
+
+    def start(self):
+        self.lock.acquire()
+        self.started = True
+        for source in self.sources:
+            self.start_reader(source)
+        self.lock.release()
+        threading.Thread.start(self)
+
+    def run(self):
+        while self.keep_running:
+            self.ready.acquire()
+            while not self.pending and self.keep_running:
+                self.ready.wait()
+            self.ready.release()
+            pending = self.take()
+            self.deliver(pending)
+            self.release(pending)
+
+    def stop(self):
+        """
+        end the dispatcher thread once it has delivered what it holds
+        """
+        self.ready.acquire()
+        self.keep_running = False
+        self.ready.notify()
+        self.drained.notifyAll()
+        self.ready.release()
+
+    def flush(self):
+        """
+        wait until everything queued before the call has been delivered
+        """
+        quiet = 0
+        while self.isAlive() and quiet < 2:
+            busy = self.messages != self.read or [s for s in self.sources if s[0].count()]
+            quiet = 0 if busy else quiet + 1
+            time.sleep(MIN_WAIT)
+
+    def stats(self):
+        """
+        the counters of each handler, by event type
+        """
+        s = {}
+        for event_type, handlers in self.handlers.items():
+            s[event_type] = [dict(delivered=h.delivered, dropped=h.dropped,
+                                  max_depth=h.max_depth, errors=h.errors) for h in handlers]
+        return s
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Headless P25 receiver
+
+The receive chain and trunk following of scope.py without any of the
+wx windows or scopes, so that it can run as a daemon, or work through a
+capture file as fast as the flow graph goes (--throttle plays it in real
+time instead).  The channel is selected from the source with a
+frequency translating filter: with an osmosdr source the tuner follows
+the trunk, with a capture file the filter does, over the band held in
+the file.
+
+With --voice-decoders the control channel is received continuously and
+the calls it grants are shared among that many voice channel receivers
+on the same wideband source, by trunking.voice_scheduler.
+"""
+
+import os
+import sys
+import time
+import numpy
+import threading
+from gnuradio import audio, gr, op25, repeater
+from gnuradio import blks2
+from gnuradio.eng_option import eng_option
+from math import pi
+from optparse import OptionParser
+
+import trunking
+import capture
+import dispatch
+import symbol_stream
+
+WIRESHARK_PORT = 23456
+EXPIRE_INTERVAL = 0.5	# seconds between checks for calls no longer granted
+
+class p25_rx (gr.top_block):
+
+    def __init__(self, options):
+        gr.top_block.__init__(self)
+
+        # setup (read-only) attributes
+        self.symbol_rate = 4800
+        self.symbol_deviation = 600.0
+        self.basic_rate = 48000
+
+        self.options = options
+        self.src = None
+        self.center_freq = 0.0
+        self.tune_events = []	# frequencies tuned by the trunk follower
+        self.voice_events = []	# (decoder, frequency, talkgroup) of each call followed
+
+        if options.ifile:
+            source, capture_rate = self.open_ifile(options.ifile, options.seek, options.seek_time)
+        else:
+            source, capture_rate = self.open_osmosdr()
+
+        self.dispatcher = dispatch.dispatcher()
+        if options.voice_decoders:
+            self.scheduler = trunking.voice_scheduler(options.voice_decoders, self.tune_voice, self.release_voice,
+                                                      priority=parse_priority(options.priority),
+                                                      lockout=parse_lockout(options.lockout))
+            self.trunk_ctl = trunking.trunked_system(debug=options.verbosity, grant_set=self.scheduler.grant)
+            control = self.control_units
+        else:
+            self.trunk = trunking.trunk_follower(options.trunk_cc_freq, self.change_freq, debug=options.verbosity)
+            self.trunk_ctl = self.trunk.trunk_ctl
+            control = self.trunk.process_data_units
+        self.__build_graph(source, capture_rate, control)
+        if self.src and options.voice_decoders:
+            # the tuner stays put, the channels are picked from its band
+            self.src.set_center_freq(options.frequency + options.calibration + options.offset)
+            self.center_freq = options.frequency + options.offset
+        self.set_freq(options.trunk_cc_freq or options.frequency)
+        self.dispatcher.start()
+        if options.voice_decoders:
+            # calls end without grants to say so when the control channel
+            # is lost; their decoders are freed by the hold time alone
+            timer = threading.Thread(target=self.expire_calls)
+            timer.setDaemon(1)
+            timer.start()
+
+    def open_osmosdr(self):
+        import osmosdr
+        self.src = osmosdr.source_c(self.options.args)
+        if self.options.gains:
+            for tuple in self.options.gains.split(","):
+                name, gain = tuple.split(":")
+                self.src.set_gain(int(gain), name)
+        capture_rate = self.src.set_sample_rate(self.options.sample_rate)
+        self.src.set_bandwidth(capture_rate)
+        return self.src, capture_rate
+
+    def open_ifile(self, filename, file_seek, seek_time=None):
+        if capture.is_capture(filename):
+            capfile = capture.capture_file(filename)
+            if capfile.sample_type != 'fc32':
+                raise ValueError("cannot play %s samples" % capfile.sample_type)
+            if seek_time is not None:
+                start = capfile.sample_at(capfile.start_time + seek_time)
+            else:
+                start = min(file_seek * 1024, capfile.nsamples)
+            ifile = gr.file_source(gr.sizeof_gr_complex, filename, False)
+            rc = ifile.seek(capfile.item_offset(start), gr.SEEK_SET)
+            assert rc == True
+            # the header and index are never played
+            head = gr.head(gr.sizeof_gr_complex, capfile.nsamples - start)
+            self.connect(ifile, head)
+            source = head
+            capture_rate = capfile.sample_rate
+            self.center_freq = capfile.center_freq
+        else:
+            source = gr.file_source(gr.sizeof_gr_complex, filename, False)
+            if file_seek > 0:
+                rc = source.seek(file_seek*1024, gr.SEEK_SET)
+                assert rc == True
+            capture_rate = self.options.sample_rate
+            self.center_freq = self.options.frequency
+        if self.options.throttle:
+            throttle = gr.throttle(gr.sizeof_gr_complex, capture_rate)
+            self.connect(source, throttle)
+            source = throttle
+        return source, capture_rate
+
+    # setup the flow graph: the receiver of scope.py with its default
+    # speed, once for the control (or only) channel and once for each
+    # voice decoder
+    #
+    def __build_graph(self, source, capture_rate, control):
+        # voice codewords pass from frame assembler to vocoder as binary
+        # frames, unless they are also sent out to the Wireshark host
+        self.imbe_format = repeater.VOCODER_FORMAT_BINARY
+        if self.options.wireshark:
+            self.imbe_format = repeater.VOCODER_FORMAT_TEXT
+        self.capture_rate = capture_rate
+        self.channel_filter, self.slicer = self.__channel(source, capture_rate, 'data_unit', self.__imbe_sink()[0])
+        self.dispatcher.subscribe('data_unit', control, batch=True)
+        self.symbol_file = None
+        if self.options.raw_symbols and self.options.unpacked_symbols:
+            self.sink_sf = gr.file_sink(gr.sizeof_char, self.options.raw_symbols)
+            self.connect(self.slicer, self.sink_sf)
+        elif self.options.raw_symbols:
+            self.open_symbol_file()
+        self.voice_filters = []
+        self.voice_mutes = []
+        for slot in xrange(self.options.voice_decoders):
+            wav = None
+            if self.options.wav_dir:
+                wav = os.path.join(self.options.wav_dir, 'decoder%d.wav' % slot)
+            imbe_sink, mute = self.__imbe_sink(wav, True)
+            channel_filter, slicer = self.__channel(source, capture_rate, ('voice', slot), imbe_sink)
+            self.voice_filters.append(channel_filter)
+            self.voice_mutes.append(mute)
+            self.idle_voice(slot)
+            self.dispatcher.subscribe(('voice', slot), lambda units, slot=slot: self.voice_units(slot, units), batch=True)
+
+    def __channel(self, source, capture_rate, event_type, imbe_sink):
+        """
+        channel filter, demodulator and frame assembler, with the data
+        units dispatched as event_type; returns the channel filter, which
+        picks the channel, and the symbol slicer
+        """
+        sps = int(self.basic_rate // self.symbol_rate)
+        channel_decim = max(1, int(capture_rate // self.basic_rate))
+        channel_rate = float(capture_rate) / channel_decim
+        trans_width = 12.5e3 / 2;
+        trans_centre = trans_width + (trans_width / 2)
+        coeffs = gr.firdes.low_pass(1.0, capture_rate, trans_centre, trans_width, gr.firdes.WIN_HANN)
+        channel_filter = gr.freq_xlating_fir_filter_ccf(channel_decim, coeffs, 0.0, capture_rate)
+        arb_resampler = blks2.pfb_arb_resampler_ccf(
+           float(self.basic_rate)/float(channel_rate))
+
+        levels = [ -2.0, 0.0, 2.0, 4.0 ]
+        slicer = repeater.fsk4_slicer_fb(levels)
+
+        if self.options.fsk4:
+            fm_demod_gain = self.basic_rate / (2.0 * pi * self.symbol_deviation)
+            fm_demod = gr.quadrature_demod_cf(fm_demod_gain)
+            symbol_filter = gr.fir_filter_fff(1, (1.0/sps,)*sps)
+            autotuneq = gr.msg_queue(2)
+            fsk4_demod = op25.fsk4_demod_ff(autotuneq, self.basic_rate, self.symbol_rate)
+            self.connect(source, channel_filter, arb_resampler, fm_demod, symbol_filter, fsk4_demod, slicer)
+        else:
+            gain_mu = self.options.gain_mu
+            omega = float(sps)
+            gain_omega = 0.1  * gain_mu * gain_mu
+            alpha = self.options.costas_alpha
+            beta = 0.125 * alpha * alpha
+            fmin = -0.025
+            fmax =  0.025
+            agc = gr.feedforward_agc_cc(16, 1.0)
+            clock = repeater.gardner_costas_cc(omega, gain_mu, gain_omega, alpha,  beta, fmax, fmin)
+            diffdec = gr.diff_phasor_cc()
+            to_float = gr.complex_to_arg()
+            rescale = gr.multiply_const_ff( (1 / (pi / 4)) )
+            self.connect(source, channel_filter, arb_resampler, agc, clock, diffdec, to_float, rescale, slicer)
+
+        msgq = gr.msg_queue(100)
+        self.dispatcher.add_queue(msgq, event_type, dispatch.decode_data_unit)
+        udp_port = 0
+        if self.options.wireshark:
+            udp_port = WIRESHARK_PORT
+        do_imbe = 1
+        do_output = 1
+        do_msgq = 1
+        frame_assembler = repeater.p25_frame_assembler(self.options.wireshark_host, udp_port, self.options.verbosity, do_imbe, do_output, do_msgq, msgq, self.imbe_format)
+        self.connect(slicer, frame_assembler, imbe_sink)
+        return channel_filter, slicer
+
+    def __imbe_sink(self, wav=None, mute=False):
+        """
+        where the voice frames of a frame assembler go: the vocoder and
+        the audio device (or with wav, a file), or nowhere.  Returns the
+        sink and, with mute, a gr.mute_ff in the audio path (None if
+        there is no audio)
+        """
+        if wav is None and not self.options.vocoder:
+            return gr.null_sink(gr.sizeof_char), None
+        vocoder = repeater.vocoder(0, 0, 0, '', 0, 0, self.imbe_format)
+        audio_s2f = gr.short_to_float()
+        audio_scaler = gr.multiply_const_ff(1 / 32768.0)
+        if wav is None:
+            audio_output = audio.sink(8000, self.options.audio_output, True)
+        else:
+            audio_output = gr.wavfile_sink(wav, 1, 8000, 16)
+        muter = None
+        if mute:
+            muter = gr.mute_ff(True)
+            self.connect(vocoder, audio_s2f, audio_scaler, muter, audio_output)
+        else:
+            self.connect(vocoder, audio_s2f, audio_scaler, audio_output)
+        return vocoder, muter
+
+    def open_symbol_file(self):
+        """
+        the --raw-symbols file, in the symbol_stream format as scope.py
+        writes it.  The symbols reach the writer through a lossless
+        subscription, so a slow disk holds back the flow graph rather
+        than cutting symbols out of the file, and each retune of the
+        trunk follower is recorded in the file.
+        """
+        self.symbol_file = symbol_stream.writer(open(self.options.raw_symbols, 'wb'),
+                                                symbol_rate=self.symbol_rate,
+                                                modulation='c4fm' if self.options.fsk4 else 'cqpsk',
+                                                frequency=self.options.trunk_cc_freq or self.options.frequency or 0,
+                                                stamp_interval=1.0)
+        msgq = gr.msg_queue(100)
+        self.connect(self.slicer, gr.message_sink(gr.sizeof_char, msgq, False))
+        self.dispatcher.add_queue(msgq, 'raw_symbols', lambda msg: numpy.fromstring(msg.to_string(), dtype=numpy.uint8))
+        self.dispatcher.subscribe('raw_symbols', self.write_symbols, depth=1000, batch=True, lossless=True)
+
+    def write_symbols(self, events):
+        for dibits in events:
+            self.symbol_file.write(dibits)
+
+    def close_symbol_file(self):
+        if self.symbol_file is not None:
+            self.symbol_file.close()
+            self.symbol_file = None
+
+    def control_units(self, units):
+        for u in units:
+            self.trunk_ctl.decode_data_unit(u.duid, u.body)
+
+    def voice_units(self, slot, units):
+        for u in units:
+            self.scheduler.data_unit(slot, u.duid)
+
+    def expire_calls(self):
+        while True:
+            time.sleep(EXPIRE_INTERVAL)
+            self.scheduler.expire()
+
+    def tune_voice(self, slot, freq, tgid):
+        self.voice_events.append((slot, freq, tgid))
+        if self.options.verbosity:
+            print "decoder %d: talkgroup %d on %f" % (slot, tgid, freq / 1e6)
+        self.voice_filters[slot].set_center_freq(self.channel_offset(freq))
+        if self.voice_mutes[slot]:
+            self.voice_mutes[slot].set_mute(False)
+
+    def release_voice(self, slot):
+        if self.options.verbosity:
+            print "decoder %d: released" % slot
+        self.idle_voice(slot)
+
+    def idle_voice(self, slot):
+        """
+        mute decoder slot and park its channel filter at the edge of the
+        band, where there is no channel for it to decode
+        """
+        if self.voice_mutes[slot]:
+            self.voice_mutes[slot].set_mute(True)
+        self.voice_filters[slot].set_center_freq(self.capture_rate / 2.0)
+
+    def change_freq(self, freq):
+        self.tune_events.append(freq)
+        if self.symbol_file is not None:
+            # on the dispatcher thread, as write_symbols() is
+            self.symbol_file.retune(frequency=freq)
+        self.set_freq(freq)
+
+    def set_freq(self, target_freq):
+        """
+        tune the tuner, or the channel filter within a capture file, to
+        target_freq (Hz)
+        """
+        if self.src and not self.options.voice_decoders:
+            r = self.src.set_center_freq(target_freq + self.options.calibration + self.options.offset)
+            if not r:
+                return False
+            self.channel_filter.set_center_freq(-self.options.offset)
+        else:
+            self.channel_filter.set_center_freq(self.channel_offset(target_freq))
+        return True
+
+    def channel_offset(self, freq):
+        """
+        where freq lies in the band of a capture file, or of the tuner
+        when it is not following the trunk
+        """
+        if self.src:
+            return freq - self.center_freq
+        return freq - self.center_freq + self.options.calibration
+
+    def drain(self):
+        """
+        wait for the data units left in the queue to be processed
+        """
+        self.dispatcher.flush()
+
+def parse_priority(s):
+    priority = {}
+    if s:
+        for tuple in s.split(","):
+            tgid, p = tuple.split(":")
+            priority[int(tgid)] = int(p)
+    return priority
+
+def parse_lockout(s):
+    if not s:
+        return []
+    return [int(tgid) for tgid in s.split(",")]
+
+def main():
+    parser = OptionParser(option_class=eng_option)
+    parser.add_option("--args", type="string", default="", help="device args")
+    parser.add_option("-c", "--calibration", type="eng_float", default=0.0, help="USRP offset or capture file frequency error", metavar="Hz")
+    parser.add_option("-C", "--costas-alpha", type="eng_float", default=0.125, help="value of alpha for Costas loop", metavar="Hz")
+    parser.add_option("-D", "--fsk4", action="store_true", default=False, help="use the C4FM (FSK4) demodulator instead of CQPSK")
+    parser.add_option("-f", "--frequency", type="eng_float", default=0.0, help="USRP center frequency", metavar="Hz")
+    parser.add_option("-F", "--ifile", type="string", default=None, help="read input from complex capture file")
+    parser.add_option("-s", "--seek", type="int", default=0, help="ifile seek in K")
+    parser.add_option("-j", "--seek-time", type="eng_float", default=None, help="start playback this many seconds into a capture file", metavar="sec")
+    parser.add_option("-S", "--sample-rate", type="int", default=320e3, help="source samp rate")
+    parser.add_option("-t", "--throttle", action="store_true", default=False, help="play ifile in real time")
+    parser.add_option("-T", "--trunk-cc-freq", type="eng_float", default=None, help="trunk control channel frequency", metavar="Hz")
+    parser.add_option("-v", "--verbosity", type="int", default=10, help="message debug level")
+    parser.add_option("-V", "--vocoder", action="store_true", default=False, help="voice codec")
+    parser.add_option("-o", "--offset", type="eng_float", default=0.0, help="tuning offset frequency [to circumvent DC offset]", metavar="Hz")
+    parser.add_option("-w", "--wireshark", action="store_true", default=False, help="output data to Wireshark")
+    parser.add_option("-W", "--wireshark-host", type="string", default="127.0.0.1", help="Wireshark host")
+    parser.add_option("-r", "--raw-symbols", type="string", default=None, help="dump decoded symbols to file")
+    parser.add_option("--unpacked-symbols", action="store_true", default=False, help="write --raw-symbols one dibit per byte, without a header")
+    parser.add_option("-G", "--gain-mu", type="eng_float", default=0.025, help="gardner gain")
+    parser.add_option("-N", "--gains", type="string", default=None, help="gain settings")
+    parser.add_option("-O", "--audio-output", type="string", default="plughw:0,0", help="audio output device name")
+    parser.add_option("-n", "--voice-decoders", type="int", default=0, help="follow this many calls at once from a wideband source")
+    parser.add_option("-P", "--priority", type="string", default=None, help="talkgroup priorities, e.g. 101:5,102:1 (default 0)")
+    parser.add_option("-L", "--lockout", type="string", default=None, help="talkgroups never followed, e.g. 101,102")
+    parser.add_option("-d", "--wav-dir", type="string", default=None, help="write the audio of each voice decoder to a wav file here")
+    (options, args) = parser.parse_args()
+    if len(args) != 0:
+        parser.print_help()
+        sys.exit(1)
+    if not options.ifile and not (options.frequency or options.trunk_cc_freq):
+        sys.stderr.write("either --ifile or a frequency is required\n")
+        sys.exit(1)
+    if options.voice_decoders and not options.trunk_cc_freq:
+        sys.stderr.write("--voice-decoders needs --trunk-cc-freq\n")
+        sys.exit(1)
+
+    tb = p25_rx(options)
+    try:
+        tb.run()
+        tb.drain()
+    except KeyboardInterrupt:
+        tb.stop()
+    tb.close_symbol_file()
+    if options.trunk_cc_freq:
+        print tb.trunk_ctl.to_string()
+    if options.voice_decoders:
+        print tb.scheduler.stats
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import time
+import unittest
+import numpy as np
+
+import autocorrelation
+
+RATE = 48000.0
+
+def raised_cosine(sps, alpha=0.2, span=8):
+    t = np.arange(-span * sps, span * sps + 1) / float(sps)
+    denom = 1.0 - (2.0 * alpha * t) ** 2
+    edge = np.abs(denom) < 1e-9
+    h = np.sinc(t) * np.cos(np.pi * alpha * t) / np.where(edge, 1.0, denom)
+    return np.where(edge, np.pi / 4 * np.sinc(1.0 / (2.0 * alpha)), h)
+
+def c4fm(rng, nsamples, baud, snr=20.0):
+    """
+    complex baseband C4FM at RATE: random symbols, raised cosine
+    shaping, 600 Hz deviation per level and Gaussian noise at snr dB
+    """
+    sps = int(RATE // baud)
+    nsym = nsamples // sps + 20
+    impulses = np.zeros(nsym * sps)
+    impulses[::sps] = rng.choice([-3, -1, 1, 3], nsym)
+    freq = 600.0 * np.convolve(impulses, raised_cosine(sps), 'same')[:nsamples]
+    x = np.exp(2j * np.pi * np.cumsum(freq) / RATE)
+    sigma = np.sqrt(10 ** (-snr / 10.0) / 2)
+    x += sigma * (rng.randn(nsamples) + 1j * rng.randn(nsamples))
+    return x.astype(np.complex64)
+
+class qa_autocorrelation (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def run_frames (self, analyzer, x, per_message=1):
+        """
+        feed x to analyzer per_message frames to a message, as the
+        message sink would, returning the rate estimated after each
+        """
+        n = analyzer.fac_size * per_message
+        rates = []
+        for i in range(0, len(x) - n + 1, n):
+            self.assertTrue(analyzer.add(x[i:i + n].tostring()))
+            rates.append(analyzer.rate)
+        return rates
+
+    def test_001_c4fm (self):
+        x = c4fm(self.rng, 32768 * 8, 4800)
+        # one frame at a time: a frame holds enough symbols on its own
+        analyzer = autocorrelation.autocorrelator(32768, RATE)
+        for rate in self.run_frames(analyzer, x):
+            self.assertTrue(abs(rate - 4800) < 1.0, rate)
+        # peaks at multiples of the symbol period, 10 samples
+        r = analyzer.r
+        peaks = [i for i in range(3, 100) if r[i] > r[i - 1] and r[i] > r[i + 1] and r[i] > 0.3]
+        self.assertEqual(peaks, range(10, 100, 10))
+        points, rate = analyzer.points()
+        self.assertEqual(points.shape, (16384, 2))
+        self.assertAlmostEqual(points[10, 0], 10 / RATE * 1000)
+        self.assertEqual(points[10, 1], r[10])
+        # shorter frames, averaged, and only the last of each message used
+        analyzer = autocorrelation.autocorrelator(8192, RATE, avg_alpha=0.1)
+        rates = self.run_frames(analyzer, c4fm(self.rng, 8192 * 40, 4800), per_message=2)
+        self.assertEqual(analyzer.frames, 20)
+        for rate in rates[5:]:
+            self.assertTrue(abs(rate - 4800) < 2.0, rate)
+
+    def test_002_rates (self):
+        for baud in (1200, 2400, 6000, 9600):
+            analyzer = autocorrelation.autocorrelator(32768, RATE, avg_alpha=0.2)
+            rates = self.run_frames(analyzer, c4fm(self.rng, 32768 * 4, baud))
+            self.assertTrue(abs(rates[-1] - baud) < baud * 1e-3, (baud, rates))
+        # demodulated input, as fac_sink_f is given
+        x = c4fm(self.rng, 32768 * 4, 4800)
+        demod = autocorrelation.discriminator(x).astype(np.float32)
+        analyzer = autocorrelation.autocorrelator(32768, RATE, dtype=np.float32)
+        rates = self.run_frames(analyzer, demod)
+        self.assertTrue(abs(rates[-1] - 4800) < 1.0, rates)
+
+    def test_003_noise (self):
+        analyzer = autocorrelation.autocorrelator(32768, RATE, avg_alpha=0.067)
+        x = (self.rng.randn(32768 * 20) + 1j * self.rng.randn(32768 * 20)).astype(np.complex64)
+        self.assertEqual(self.run_frames(analyzer, x), [None] * 20)
+        self.assertFalse(analyzer.add(x[:100].tostring()))
+
+    def test_004_find_period (self):
+        lags = np.arange(2000)
+        r = np.cos(2 * np.pi * lags / 7.3) * np.exp(-lags / 500.0)
+        self.assertAlmostEqual(autocorrelation.find_period(r, 2, 100), 7.3, 2)
+        # the period, not one of its multiples
+        r = np.cos(2 * np.pi * lags / 40.0) * np.exp(-lags / 500.0)
+        self.assertAlmostEqual(autocorrelation.find_period(r, 2, 160), 40.0, 1)
+        self.assertEqual(autocorrelation.find_period(r * 0.2, 2, 160), None)
+        self.assertEqual(autocorrelation.find_period(r, 2, 30), None)
+
+    def test_005_cost (self):
+        # the analysis keeps to the display rate: at three updates a
+        # second it takes a small part of the time available
+        analyzer = autocorrelation.autocorrelator(32768, RATE, avg_alpha=0.067)
+        x = c4fm(self.rng, 32768 * 10, 4800)
+        t0 = time.time()
+        self.run_frames(analyzer, x)
+        per_frame = (time.time() - t0) / 10
+        self.assertTrue(per_frame * 3 < 0.25, per_frame)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import capture
+
+class qa_capture (unittest.TestCase):
+
+    def setUp (self):
+        self.dir = tempfile.mkdtemp()
+        self.rng = np.random.RandomState(1)
+
+    def tearDown (self):
+        shutil.rmtree(self.dir)
+
+    def samples (self, n):
+        return (self.rng.randn(n) + 1j * self.rng.randn(n)).astype(np.complex64)
+
+    def test_001_write_read (self):
+        filename = os.path.join(self.dir, 'a.cap')
+        x = self.samples(25000)
+        w = capture.capture_writer(filename, 1000, 851.0125e6, gain=20, start_time=1000.0, source='USRP')
+        for i in xrange(0, len(x), 3001):
+            w.write(x[i:i + 3001])
+        w.close()
+        self.assertTrue(capture.is_capture(filename))
+        c = capture.capture_file(filename)
+        self.assertEqual((c.sample_rate, c.center_freq, c.gain, c.source, c.sample_type),
+                         (1000, 851.0125e6, 20, 'USRP', 'fc32'))
+        self.assertEqual(c.nsamples, len(x))
+        self.assertEqual(list(c.index['sample']), range(0, 25000, 1000))
+        self.assertEqual(c.item_offset(0) * 8, capture.HEADER_LEN)
+        self.assertTrue((c.read(12345, 100) == x[12345:12445]).all())
+        self.assertEqual(len(c.read(24990, 100)), 10)
+        self.assertEqual(c.info()["capture-rate"], 1000)
+
+    def test_002_seek (self):
+        filename = os.path.join(self.dir, 'b.cap')
+        w = capture.capture_writer(filename, 1000, start_time=1000.0)
+        w.write(self.samples(5500))
+        # a 2.5 s gap in the capture, then more samples
+        w.write(self.samples(4500), timestamp=1008.0)
+        w.close()
+        c = capture.capture_file(filename)
+        self.assertEqual(c.sample_at(1000.0), 0)
+        self.assertEqual(c.sample_at(1003.2506), 3251)
+        self.assertEqual(c.sample_at(1006.0), 5500)
+        self.assertEqual(c.sample_at(1008.0), 5500)
+        self.assertEqual(c.sample_at(1009.5), 7000)
+        self.assertEqual(c.sample_at(2000.0), 10000)
+        self.assertEqual(c.sample_at(0), 0)
+        self.assertAlmostEqual(c.time_of(7000), 1009.5)
+        self.assertAlmostEqual(c.time_of(5499), 1005.499)
+
+    def test_003_convert (self):
+        raw = os.path.join(self.dir, 'c.dat')
+        x = self.samples(40000)
+        x.tofile(raw)
+        f = open(raw + '.info', 'w')
+        pickle.dump({"capture-rate": 8000, "center-freq": 460.5e6, "source-dev": "USRP", "source-decim": 1}, f)
+        f.close()
+        filename = os.path.join(self.dir, 'c.cap')
+        capture.convert(raw, filename, start_time=500.0)
+        c = capture.capture_file(filename)
+        self.assertEqual((c.sample_rate, c.center_freq, c.source, c.nsamples), (8000, 460.5e6, 'USRP', 40000))
+        self.assertTrue((c.read(0, 40000) == x).all())
+        self.assertEqual(c.sample_at(502.5), 20000)
+        self.assertEqual(open(filename, 'rb').read()[capture.HEADER_LEN:capture.HEADER_LEN + 8 * 40000],
+                         open(raw, 'rb').read())
+
+    def test_004_unsafe_info (self):
+        filename = os.path.join(self.dir, 'd.info')
+        f = open(filename, 'w')
+        pickle.dump({"capture-rate": 8000, "evil": tempfile.mkdtemp}, f)
+        f.close()
+        self.assertRaises(Exception, capture.read_info, filename)
+
+if __name__ == '__main__':
+    unittest.main ()
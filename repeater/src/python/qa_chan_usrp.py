@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import time
+import array
+import socket
+import struct
+import threading
+from gnuradio import gr, gr_unittest
+import repeater
+
+FRAME_SAMPLES = 160	# 20 ms at 8 kHz
+RATE = 8000
+
+def free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+class usrp_sender(threading.Thread):
+    """
+    send chan_usrp packets to a port on the loopback interface, as
+    app_rpt would, but in bursts and with the given packets reordered,
+    lost or repeated.  Every sample of frame seq is seq + 1.
+    """
+    def __init__(self, port, nframes, burst=1, swap=(), lose=(), repeat=(), late=(), start=0.0):
+        threading.Thread.__init__(self)
+        self.setDaemon(1)
+        self.addr = ('127.0.0.1', port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        order = range(nframes)
+        for i in swap:
+            order[i], order[i + 1] = order[i + 1], order[i]
+        order = [seq for seq in order if seq not in lose]
+        for seq in repeat:
+            order.insert(order.index(seq) + 1, seq)
+        order += list(late)
+        self.order = order
+        self.nframes = nframes
+        self.burst = burst
+        self.start_time = start
+
+    def packet(self, seq, keyup, voice=True):
+        hdr = struct.pack('>4sIIIIIII', 'USRP', seq, 0, keyup, 0, 0, 0, 0)
+        if not voice:
+            return hdr
+        return hdr + array.array('h', [seq + 1] * FRAME_SAMPLES).tostring()
+
+    def run(self):
+        time.sleep(self.start_time)
+        t0 = time.time()
+        for i in range(0, len(self.order), self.burst):
+            # each burst is sent when its last frame is due
+            due = t0 + (i + self.burst) * FRAME_SAMPLES / float(RATE)
+            time.sleep(max(0.0, due - time.time()))
+            for seq in self.order[i:i + self.burst]:
+                self.sock.sendto(self.packet(seq, 1), self.addr)
+        self.sock.sendto(self.packet(self.nframes, 0, voice=False), self.addr)
+
+def frames(data):
+    """
+    the value of each voice frame in the output, with silence removed
+    """
+    samples = [s for s in data if s]
+    return [samples[i] for i in range(0, len(samples), FRAME_SAMPLES)], samples
+
+class qa_chan_usrp (gr_unittest.TestCase):
+
+    def setUp (self):
+        self.tb = gr.top_block()
+        self.port = free_port()
+
+    def tearDown (self):
+        self.tb = None
+
+    def run_channel(self, sender, seconds, depth=6, max_frames=50, policy=0):
+        chan = repeater.chan_usrp(self.port, False, False, False, 1.0, 1, gr.msg_queue(2),
+                                  depth, max_frames, policy)
+        throttle = gr.throttle(gr.sizeof_short, RATE)
+        head = gr.head(gr.sizeof_short, int(seconds * RATE))
+        sink = gr.vector_sink_s()
+        self.tb.connect(chan, throttle, head, sink)
+        sender.start()
+        self.tb.run()
+        sender.join()
+        return chan, sink.data()
+
+    def test_001_in_order (self):
+        sender = usrp_sender(self.port, 50, start=0.1)
+        chan, data = self.run_channel(sender, 1.6)
+        values, samples = frames(data)
+        self.assertEqual(values, range(1, 51))
+        self.assertEqual(len(samples), 50 * FRAME_SAMPLES)
+        self.assertEqual((chan.received(), chan.lost(), chan.reordered()), (51, 0, 0))
+
+    def test_002_jitter (self):
+        # bursts of four, with reordering, loss, a duplicate (held behind
+        # a gap, so it cannot have been released yet) and a late packet
+        sender = usrp_sender(self.port, 100, burst=4, swap=(10, 21, 53), lose=(30, 77),
+                             repeat=(31,), late=(5,), start=0.1)
+        chan, data = self.run_channel(sender, 2.8)
+        values, samples = frames(data)
+        expected = []
+        for seq in range(100):
+            if seq in (30, 77):
+                expected.append(seq // 2)	# the previous frame at half level
+            else:
+                expected.append(seq + 1)
+        self.assertEqual(values, expected)
+        self.assertEqual(chan.lost(), 2)
+        self.assertEqual(chan.reordered(), 3)
+        self.assertEqual(chan.duplicate(), 1)
+        self.assertEqual(chan.late(), 1)
+        # the bursts are smoothed out: once started, the audio is unbroken
+        first = list(data).index(1)
+        self.assertEqual(list(data[first:first + len(samples)]), samples)
+        self.assertEqual(chan.underrun(), 0)
+        # and it starts no later than the jitter depth plus a burst
+        self.assertTrue(first < (0.1 + 0.02 * (6 + 4) + 0.05) * RATE, first)
+
+    def test_003_overflow (self):
+        for policy in (repeater.CHAN_USRP_DROP_OLDEST, repeater.CHAN_USRP_DROP_NEWEST):
+            self.tb = gr.top_block()
+            self.port = free_port()
+            # everything at once, far more than the queue may hold
+            sender = usrp_sender(self.port, 60, burst=60, start=0.1)
+            chan, data = self.run_channel(sender, 1.0, depth=3, max_frames=10, policy=policy)
+            values, samples = frames(data)
+            self.assertEqual(len(values) + chan.overflow(), 60)
+            self.assertTrue(chan.overflow() >= 40)
+            self.assertEqual(values, sorted(values))
+            if policy == repeater.CHAN_USRP_DROP_OLDEST:
+                self.assertEqual(values[-1], 60)
+            else:
+                self.assertEqual(values[:10], range(1, 11))
+
+if __name__ == '__main__':
+    gr_unittest.main ()
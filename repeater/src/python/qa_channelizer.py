@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import os
+import tempfile
+from gnuradio import gr, gr_unittest
+import channelizer
+
+class qa_channelizer (gr_unittest.TestCase):
+
+    def setUp (self):
+        self.fg = gr.top_block ()
+
+    def tearDown (self):
+        self.fg = None
+
+    def test_001_plan (self):
+        fd, filename = tempfile.mkstemp()
+        os.write(fd, "center 430.25M\n# comment\n430.1M c4fm 32001\n\n430400000 fm 32004 ctcss=97.4 wireshark  # x\n")
+        os.close(fd)
+        center, channels = channelizer.read_channel_plan(filename)
+        os.remove(filename)
+        self.assertEqual(center, 430.25e6)
+        self.assertEqual(channels, [{'freq': 430.1e6, 'mode': 'c4fm', 'port': 32001},
+                                    {'freq': 430.4e6, 'mode': 'fm', 'port': 32004, 'ctcss': 97.4, 'wireshark': 1}])
+
+    def test_002_bins (self):
+        rate = 64e6 / 60
+        bins = channelizer.channel_bins([0, 150e3, -150e3, 12e3], rate, 50)
+        self.assertEqual([b for b, r in bins], [0, 7, 43, 1])
+        for (b, r), f in zip(bins, [0, 150e3, -150e3, 12e3]):
+            self.assertTrue(abs(r) <= rate / 100)
+            self.assertAlmostEqual(((b + 25) % 50 - 25) * rate / 50 + r, f, 3)
+        self.assertEqual(channelizer.oversample_rate(50, rate / 50, 16.5e3), 5)
+
+    def test_003_tone (self):
+        rate = 64e6 / 60
+        lo_freqs = [150e3, -50e3]
+        src = gr.sig_source_c (rate, gr.GR_COS_WAVE, 150e3 + 3e3, 1.0)
+        head = gr.head (gr.sizeof_gr_complex, int(rate / 10))
+        chz = channelizer.pfb_channelizer (rate, 50, lo_freqs, 16.5e3)
+        self.fg.connect (src, head, chz)
+        dst = []
+        for i in xrange(len(lo_freqs)):
+            chan = gr.freq_xlating_fir_filter_ccf (chz.oversample, chz.channel_taps(15e3), chz.residuals[i], chz.output_rate)
+            dst.append (gr.vector_sink_c ())
+            self.fg.connect ((chz, chz.ports[i]), chan, dst[i])
+        self.fg.run ()
+        power = [sum([abs(x) ** 2 for x in d.data()[100:]]) for d in dst]
+        self.assertTrue (power[0] > 1000 * power[1])
+        # the tone is 3 kHz above the channel centre at the channel rate
+        data = dst[0].data()[100:]
+        turns = sum([(data[i + 1] * data[i].conjugate()).imag > 0 for i in xrange(len(data) - 1)])
+        self.assertEqual (turns, len(data) - 1)
+
+if __name__ == '__main__':
+    gr_unittest.main ()
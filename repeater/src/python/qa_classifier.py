@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import unittest
+import numpy as np
+
+import classifier
+
+RATE = 48000.0
+WINDOW = int(classifier.WINDOW * RATE)
+
+def raised_cosine(sps, alpha=0.2, span=8, root=False):
+    t = np.arange(-span * sps, span * sps + 1) / float(sps)
+    if not root:
+        denom = 1.0 - (2.0 * alpha * t) ** 2
+        edge = np.abs(denom) < 1e-9
+        h = np.sinc(t) * np.cos(np.pi * alpha * t) / np.where(edge, 1.0, denom)
+        return np.where(edge, np.pi / 4 * np.sinc(1.0 / (2.0 * alpha)), h)
+    # root raised cosine, with its values at t = 0 and t = 1 / 4 alpha
+    centre = np.abs(t) < 1e-9
+    edge = np.abs(np.abs(4 * alpha * t) - 1) < 1e-9
+    t = np.where(centre | edge, 0.5, t)
+    h = (np.sin(np.pi * t * (1 - alpha)) + 4 * alpha * t * np.cos(np.pi * t * (1 + alpha))) / \
+        (np.pi * t * (1 - (4 * alpha * t) ** 2))
+    h[centre] = 1 - alpha + 4 * alpha / np.pi
+    h[edge] = alpha / np.sqrt(2) * ((1 + 2 / np.pi) * np.sin(np.pi / (4 * alpha)) +
+                                    (1 - 2 / np.pi) * np.cos(np.pi / (4 * alpha)))
+    return h
+
+def add_noise(rng, x, snr):
+    sigma = np.sqrt(10 ** (-snr / 10.0) / 2)
+    return x + sigma * (rng.randn(len(x)) + 1j * rng.randn(len(x)))
+
+def symbols(rng, baud, choices):
+    sps = int(round(RATE / baud))
+    nsym = WINDOW // sps + 20
+    impulses = np.zeros(nsym * sps, dtype=np.asarray(choices).dtype)
+    impulses[::sps] = rng.choice(choices, nsym)
+    return sps, impulses
+
+def c4fm_freq(rng, baud, deviation):
+    sps, impulses = symbols(rng, baud, [-3, -1, 1, 3])
+    return deviation * np.convolve(impulses, raised_cosine(sps), 'same')[:WINDOW]
+
+def c4fm(rng, baud, deviation=600.0, snr=20.0, offset=0.0):
+    freq = c4fm_freq(rng, baud, deviation) + offset
+    return add_noise(rng, np.exp(2j * np.pi * np.cumsum(freq) / RATE), snr)
+
+def cqpsk(rng, baud, snr=20.0):
+    """
+    pi/4 DQPSK, root raised cosine shaped as the LSM transmitter does
+    """
+    phases = np.exp(1j * np.pi / 4 * np.arange(1, 8, 2))
+    sps, impulses = symbols(rng, baud, phases)
+    impulses[::sps] = np.exp(1j * np.cumsum(np.angle(impulses[::sps])))
+    x = np.convolve(impulses, raised_cosine(sps, root=True), 'same')[:WINDOW]
+    return add_noise(rng, x / np.sqrt(np.mean(np.abs(x) ** 2)), snr)
+
+def voice(rng):
+    """
+    a voice-like modulating signal: noise band limited to 300-3000 Hz,
+    with a syllabic envelope, peaking at about +/-1
+    """
+    a = np.fft.rfft(rng.randn(WINDOW))
+    f = np.arange(len(a)) * RATE / WINDOW
+    a[(f < 300) | (f > 3000)] = 0
+    a = np.fft.irfft(a, WINDOW)
+    a *= 0.3 + np.abs(np.sin(2 * np.pi * 3 * np.arange(WINDOW) / RATE + rng.rand() * 6))
+    return a / np.percentile(np.abs(a), 99.5)
+
+def fm(rng, deviation, snr=20.0):
+    freq = deviation * voice(rng)
+    return add_noise(rng, np.exp(2j * np.pi * np.cumsum(freq) / RATE), snr)
+
+class qa_classifier (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def check (self, x, mode, rate=None, deviation=None):
+        result = classifier.classify(x.astype(np.complex64), RATE)
+        ok = result['mode'] == mode
+        if rate is not None:
+            ok = ok and result['symbol_rate'] is not None and abs(result['symbol_rate'] - rate) < 0.01 * rate
+        if deviation is not None:
+            ok = ok and result['deviation'] is not None and abs(result['deviation'] - deviation) < 0.1 * deviation
+        return ok, result
+
+    def test_001_corpus (self):
+        failed = []
+        for snr in (15.0, 30.0):
+            for baud in (1200, 2400, 4800, 9600):
+                for deviation in (450.0, 600.0, 700.0):
+                    ok, result = self.check(c4fm(self.rng, baud, deviation, snr), 'c4fm', baud, deviation)
+                    if not ok:
+                        failed.append(('c4fm', snr, baud, deviation, result))
+            for baud in (2400, 4800, 6000, 9600):
+                ok, result = self.check(cqpsk(self.rng, baud, snr), 'cqpsk', baud)
+                if not ok:
+                    failed.append(('cqpsk', snr, baud, result))
+            for deviation in (2500.0, 5000.0):
+                ok, result = self.check(fm(self.rng, deviation, snr), 'fm', None, deviation)
+                if not ok:
+                    failed.append(('fm', snr, deviation, result))
+        self.assertEqual(failed, [])
+
+    def test_002_offset (self):
+        for offset in (-2000.0, -700.0, 1500.0):
+            ok, result = self.check(c4fm(self.rng, 4800, offset=offset), 'c4fm', 4800, 600.0)
+            self.assertTrue(ok, result)
+            self.assertTrue(abs(result['offset'] - offset) < 50, result)
+
+    def test_003_noise (self):
+        for i in range(20):
+            x = add_noise(self.rng, np.zeros(WINDOW), 0.0)
+            result = classifier.classify(x, RATE)
+            self.assertEqual(result['mode'], None, result)
+            self.assertEqual(result['symbol_rate'], None, result)
+
+    def test_004_demodulated (self):
+        # the floats of an FM demodulator, as with a discriminator tap
+        for baud in (2400, 4800):
+            result = classifier.classify(c4fm_freq(self.rng, baud, 600.0), RATE)
+            self.assertEqual(result['mode'], 'c4fm')
+            self.assertAlmostEqual(result['symbol_rate'] / baud, 1.0, 2)
+        self.assertEqual(classifier.classify(voice(self.rng), RATE)['mode'], 'fm')
+
+    def test_005_nearest_speed (self):
+        speeds = [300, 600, 1200, 2400, 4800, 6000, 9600]
+        self.assertEqual(classifier.nearest_speed(4791.3, speeds), 4800)
+        self.assertEqual(classifier.nearest_speed(6050.0, speeds), 6000)
+        self.assertEqual(classifier.nearest_speed(5400.0, speeds), None)
+        self.assertEqual(classifier.nearest_speed(None, speeds), None)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import math
+import time
+import unittest
+import numpy as np
+from math import pi
+
+import constellation
+
+FRAME_POINTS = 8192
+FRAME_BUDGET = 0.005	# seconds to prepare one population display frame
+
+def reference_pop(r, flag):
+    # the per-point population display formerly in scope.py
+    l = len(r) / 2
+    max_buckets = 6.0
+    m = int(2 * pi * max_buckets)
+    b0 = [0] * (m + 1)
+    b1 = [0] * (m + 1)
+    for i in range(l):
+        theta = math.atan2 ( r[ i*2 ], r[ i*2+1 ] )
+        bucket = int((theta + pi) * max_buckets)
+        if flag:
+            b0[bucket] += 1
+        else:
+            b1[bucket] += 1
+        flag = not flag
+    avg = float(sum(b0 + b1)) / len(b0 + b1)
+    curves = []
+    for b in (b0, b1):
+        p = []
+        for i in range(len(b)):
+            theta = ((float(i) / len(b)) * 2 * pi) - pi
+            a = 0.5 * b[i] / avg
+            p.append([a * math.cos(theta), a * math.sin(theta)])
+        p.append(p[0])
+        curves.append(p)
+    return curves, flag
+
+class qa_constellation (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def samples (self, n):
+        phase = self.rng.randint(0, 4, n) * pi / 2 + pi / 4 + self.rng.randn(n) * 0.1
+        return (np.exp(1j * phase) * 0.7).astype(np.complex64)
+
+    def test_001_collector (self):
+        x = self.samples(3000)
+        c = constellation.frame_collector(250, 500)
+        frames = []
+        for i in range(0, len(x), 333):
+            frames += c.add(x[i:i + 333].tostring())
+        self.assertEqual(len(frames), 4)
+        for i, f in enumerate(frames):
+            self.assertTrue((f == x[i * 750:i * 750 + 250]).all())
+        # a frame lying within one buffer is not copied
+        c = constellation.frame_collector(250)
+        buf = x.tostring()
+        frames = c.add(buf)
+        self.assertEqual(len(frames), 12)
+        self.assertFalse(frames[0].flags.owndata)
+
+    def test_002_points (self):
+        x = self.samples(11)
+        p0, p1 = constellation.split_points(x, False)
+        self.assertEqual(p0.shape, (6, 2))
+        self.assertEqual(list(p0[1]), [x[2].real, x[2].imag])
+        self.assertEqual(list(p1[0]), [x[1].real, x[1].imag])
+        p0, p1 = constellation.split_points(x, True)
+        self.assertEqual(list(p1[0]), [x[0].real, x[0].imag])
+
+    def test_003_histogram (self):
+        h = constellation.phase_histogram()
+        flag = False
+        for n in (250, 251, 250):
+            x = self.samples(n)
+            ref, flag = reference_pop(list(x.view(np.float32)), flag)
+            p0, p1 = h.update(x)
+            self.assertTrue(np.allclose(p0, ref[0], atol=1e-6))
+            self.assertTrue(np.allclose(p1, ref[1], atol=1e-6))
+        self.assertEqual(h.flag, flag)
+
+    def test_004_decay (self):
+        h = constellation.phase_histogram(decay=0.5)
+        x = self.samples(1000)
+        h.update(x)
+        h.update(np.zeros(0, dtype=np.complex64))
+        counts = h.counts.copy()
+        h.update(x)
+        self.assertTrue(np.allclose(h.counts, counts * 0.5 + counts * 2))
+        self.assertEqual(h.counts.sum(), 1000 * 1.25)
+
+    def test_005_budget (self):
+        x = self.samples(FRAME_POINTS)
+        buf = x.tostring()
+        c = constellation.frame_collector(FRAME_POINTS)
+        h = constellation.phase_histogram(decay=0.5)
+        best = None
+        for i in range(20):
+            t0 = time.time()
+            for frame in c.add(buf):
+                h.update(frame)
+                constellation.split_points(frame)
+            t = time.time() - t0
+            best = min(best or t, t)
+        self.assertTrue(best < FRAME_BUDGET, 'frame took %.2f ms' % (best * 1e3))
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import unittest
+import numpy as np
+
+import correlation
+
+RATE = 48000.0
+SPS = 10
+P25_SYNC = '111113113311333313133333'
+
+def sync_stream(rng, nsymbols, syncs, noise=0.3, ppm=0.0):
+    """
+    random 4 level symbols at SPS samples per symbol (through the boxcar
+    of the symbol filter) with the P25 frame sync at the symbol indices
+    in syncs, inverted where the index is negative.  ppm stretches the
+    symbols, as a slow transmit clock would.
+    """
+    levels = rng.choice([-3.0, -1.0, 1.0, 3.0], nsymbols)
+    sync = np.array([3.0 if c == '1' else -3.0 for c in P25_SYNC])
+    for k in syncs:
+        levels[abs(k):abs(k) + len(sync)] = sync if k >= 0 else -sync
+    n = int(nsymbols * SPS * (1 + 1e-6 * ppm)) - SPS
+    x = levels[(np.arange(n) / (1 + 1e-6 * ppm) / SPS).astype(int)]
+    x = np.convolve(x, np.ones(SPS) / SPS)[:n]
+    return x + noise * rng.randn(n)
+
+def run_records(analyzer, x, record=24000):
+    hits = []
+    for p in range(0, len(x), record):
+        analyzer.add(x[p:p + record])
+        hits += analyzer.hits
+    return hits
+
+class qa_correlation (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def test_001_correlate (self):
+        for n, m, nfft in ((24000, 240, None), (1000, 33, 64), (500, 240, None), (240, 240, None)):
+            x = self.rng.randn(n)
+            h = self.rng.randn(m)
+            y = correlation.correlate(x, h, nfft)
+            self.assertEqual(len(y), n - m + 1)
+            self.assertTrue(np.allclose(y, np.correlate(x, h, 'valid')))
+        self.assertEqual(len(correlation.correlate(np.ones(10), np.ones(20))), 0)
+
+    def test_002_hits (self):
+        # syncs one LDU (864 symbols) apart, one across the boundary of the
+        # first two records, one inverted
+        syncs = [500, 1364, 2228, -3092, 3956, 4820, 5684]
+        x = sync_stream(self.rng, 7000, syncs)
+        analyzer = correlation.correlator(RATE)
+        analyzer.set_signature(correlation.sync_signature(P25_SYNC, SPS), SPS)
+        hits = run_records(analyzer, x)
+        self.assertEqual(len(hits), len(syncs))
+        for (t, margin, polarity), k in zip(hits, syncs):
+            # the boxcar delays the symbols by half a symbol
+            expected = (abs(k) * SPS + (SPS - 1) / 2.0) / RATE
+            self.assertTrue(abs(t - expected) < 1.0 / RATE, (t, expected))
+            self.assertTrue(margin > 0.3, margin)
+            self.assertEqual(polarity, 1 if k >= 0 else -1)
+        self.assertTrue(abs(analyzer.clock_offset) < 20, analyzer.clock_offset)
+
+    def test_003_threshold (self):
+        # no syncs, in noise (through the symbol filter) or random
+        # symbols, at any level
+        analyzer = correlation.correlator(RATE)
+        analyzer.set_signature(correlation.sync_signature(P25_SYNC, SPS), SPS)
+        for gain in (1e-3, 1.0, 1e3):
+            analyzer.reset()
+            self.assertEqual(run_records(analyzer, gain * sync_stream(self.rng, 10000, [])), [])
+            analyzer.reset()
+            noise = np.convolve(self.rng.randn(100000), np.ones(SPS) / SPS)
+            self.assertEqual(run_records(analyzer, gain * noise), [])
+        analyzer.reset()
+        self.assertEqual(run_records(analyzer, np.zeros(50000)), [])
+        # and at any level, a noisy sync is found
+        for gain in (1e-3, 1e3):
+            analyzer.reset()
+            hits = run_records(analyzer, gain * sync_stream(self.rng, 2000, [1000], noise=1.0))
+            self.assertEqual(len(hits), 1)
+
+    def test_004_clock_offset (self):
+        syncs = range(100, 20000, 864)
+        for ppm in (-150.0, 80.0, 300.0):
+            analyzer = correlation.correlator(RATE)
+            analyzer.set_signature(correlation.sync_signature(P25_SYNC, SPS), SPS)
+            hits = run_records(analyzer, sync_stream(self.rng, 20500, syncs, ppm=ppm))
+            self.assertEqual(len(hits), len(syncs))
+            self.assertTrue(abs(analyzer.clock_offset - ppm) < 10, (analyzer.clock_offset, ppm))
+
+    def test_005_points (self):
+        analyzer = correlation.correlator(RATE)
+        analyzer.set_signature(correlation.sync_signature(P25_SYNC, SPS), SPS)
+        x = sync_stream(self.rng, 2400, [1000])
+        analyzer.add(x)
+        points, markers, level, hits = analyzer.points(1000)
+        self.assertTrue(900 <= len(points) <= 1100)
+        self.assertEqual(len(markers), 1)
+        self.assertAlmostEqual(markers[0, 0], (1000 * SPS + 4.5) / RATE * 1000, 1)
+        # the envelope holds the peak
+        self.assertAlmostEqual(points[:, 1].max(), markers[0, 1], 6)
+        self.assertTrue(level < markers[0, 1])
+        self.assertEqual(len(hits), 1)
+
+if __name__ == '__main__':
+    unittest.main ()
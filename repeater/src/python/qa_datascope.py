@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+# Copyright 2010, 2011 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import datascope
+
+SPS = 10
+NUM_PLOTS = 100
+MSG_BYTES = 4096	# size of the message sink buffers replayed
+
+def reference_points(r, num_plots, sps):
+    # the per-point trace construction formerly in scope.py
+    objects = []
+    for i in range(num_plots):
+        points = []
+        for j in range(sps):
+            p = [ j, r[ i*sps + j ] ]
+            points.append(p)
+        objects.append(points)
+    return objects
+
+class qa_datascope (unittest.TestCase):
+
+    def setUp (self):
+        self.dir = tempfile.mkdtemp()
+        self.rng = np.random.RandomState(1)
+
+    def tearDown (self):
+        shutil.rmtree(self.dir)
+
+    def record (self, nsymbols, delay):
+        """
+        write the symbol filter output for random C4FM symbols, as
+        recorded from scope.py with a file sink, delayed by delay samples
+        """
+        symbols = self.rng.choice([-3.0, -1.0, 1.0, 3.0], nsymbols)
+        x = np.concatenate((np.zeros(delay), np.repeat(symbols, SPS)))
+        x = np.convolve(x, np.ones(SPS) / SPS)[:len(x)]
+        x += self.rng.randn(len(x)) * 0.05
+        filename = os.path.join(self.dir, 'fsk4.dat')
+        x.astype(np.float32).tofile(filename)
+        return filename, symbols
+
+    def replay (self, filename, eye):
+        """
+        feed a recording to eye in message sized pieces, returning the
+        middle column of the traces at each frame
+        """
+        f = open(filename, 'rb')
+        columns = []
+        while True:
+            buf = f.read(MSG_BYTES)
+            if not buf:
+                break
+            if eye.add(buf):
+                columns.append((eye.ring.count, eye.traces()[:, SPS // 2].copy()))
+        f.close()
+        return columns
+
+    def test_001_ring (self):
+        ring = datascope.ring_buffer(100)
+        x = self.rng.randn(1000).astype(np.float32)
+        pos = 0
+        for n in (30, 80, 1, 99, 250, 7, 100):
+            ring.write(x[pos:pos + n])
+            pos += n
+            for k in (1, 30, min(pos, 100)):
+                self.assertTrue((ring.last(k) == x[pos - k:pos]).all())
+        self.assertEqual(ring.count, pos)
+
+    def test_002_untriggered (self):
+        eye = datascope.eye_traces(SPS, NUM_PLOTS, 5000, trigger=False)
+        x = self.rng.randn(20000).astype(np.float32)
+        frames = 0
+        for i in range(0, len(x), 777):
+            if eye.add(x[i:i + 777].tostring()):
+                frames += 1
+                n = eye.ring.count
+                t = eye.traces()
+                self.assertEqual(t.shape, (NUM_PLOTS, SPS))
+                self.assertTrue((t.reshape(-1) == x[n - NUM_PLOTS * SPS:n]).all())
+                # a view of the ring, not a copy
+                self.assertTrue(np.may_share_memory(t, eye.ring.buf))
+                p = eye.points()
+                self.assertEqual(p.tolist(), reference_points(list(x[n - NUM_PLOTS * SPS:n]), NUM_PLOTS, SPS))
+        self.assertEqual(frames, 4)
+
+    def test_003_trigger (self):
+        for delay in (0, 3, 7):
+            filename, symbols = self.record(20000, delay)
+            eye = datascope.eye_traces(SPS, NUM_PLOTS, NUM_PLOTS * SPS * 20)
+            columns = self.replay(filename, eye)
+            self.assertTrue(len(columns) >= 9)
+            # the filter output is settled on the last sample of each symbol
+            self.assertEqual(eye.symbol_phase(), (delay + SPS - 1) % SPS)
+            for count, column in columns[1:]:
+                # every trace is centred on a symbol: the eye is open
+                self.assertTrue((abs(abs(column) - 2) > 0.7).all())
+                # the sample in the middle of the last trace, and its symbol
+                hi = count - SPS + SPS // 2 - 1
+                mid = hi - (hi - eye.symbol_phase()) % SPS
+                last = (mid - delay - (SPS - 1)) // SPS
+                self.assertTrue(np.allclose(column, symbols[last - NUM_PLOTS + 1:last + 1], atol=0.3))
+
+    def test_004_cost (self):
+        filename, symbols = self.record(2000, 0)
+        x = np.fromfile(filename, dtype=np.float32)
+        eye = datascope.eye_traces(SPS, NUM_PLOTS, NUM_PLOTS * SPS)
+        eye.add(x.tostring())
+        t0 = time.time()
+        for i in range(20):
+            eye.points()
+        new = time.time() - t0
+        t0 = time.time()
+        for i in range(20):
+            reference_points(x, NUM_PLOTS, SPS)
+        old = time.time() - t0
+        self.assertTrue(new * 5 < old, 'new %.2f ms, old %.2f ms' % (new * 50, old * 50))
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+#
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import sys
+import time
+import random
+import StringIO
+import unittest
+import threading
+import collections
+
+import dispatch
+import trunking
+from tsbk_synth import mk_tsbk, tsbk_message
+
+RATE_REQUIRED = 1000	# messages per second through the dispatcher
+LATENCY_REQUIRED = 0.005	# seconds from a quiet queue to its handler
+
+class message(object):
+    # the parts of gr.message the dispatcher uses
+    def __init__(self, type, s, arg1=0.0):
+        self._type = type
+        self._s = s
+        self._arg1 = arg1
+    def type(self):
+        return self._type
+    def to_string(self):
+        return self._s
+    def arg1(self):
+        return self._arg1
+
+class msg_queue(object):
+    # the parts of gr.msg_queue the dispatcher uses, with insert_tail()
+    # dropping messages when full as the frame assembler does, or with
+    # block waiting for room as gr.message_sink does
+    def __init__(self, limit=0, block=False):
+        self.limit = limit
+        self.block = block
+        self.q = collections.deque()
+        self.dropped = 0
+        self.cond = threading.Condition()
+    def insert_tail(self, msg):
+        self.cond.acquire()
+        while self.block and self.limit and len(self.q) >= self.limit:
+            self.cond.wait()
+        if self.limit and len(self.q) >= self.limit:
+            self.dropped += 1
+        else:
+            self.q.append(msg)
+            self.cond.notifyAll()
+        self.cond.release()
+    def count(self):
+        return len(self.q)
+    def delete_head(self):
+        self.cond.acquire()
+        while not self.q:
+            self.cond.wait()
+        msg = self.q.popleft()
+        self.cond.notifyAll()
+        self.cond.release()
+        return msg
+    def delete_head_nowait(self):
+        self.cond.acquire()
+        msg = self.q.popleft()
+        self.cond.notifyAll()
+        self.cond.release()
+        return msg
+
+def traffic(n, seed=0):
+    """
+    frame assembler messages of a control channel that now and then
+    grants a channel, on which a call follows
+    """
+    rng = random.Random(seed)
+    msgs = [message(7, tsbk_message(mk_tsbk(0x3d, (1 << 60) | (100 << 32) | (851000000 // 5))))]
+    while len(msgs) < n:
+        for i in xrange(rng.randint(1, 40)):
+            opcode = rng.choice([0x3a, 0x3b, 0x3c, 0x3d])
+            msgs.append(message(7, tsbk_message(mk_tsbk(opcode, rng.getrandbits(72) & ~(0xf << 60) | (1 << 60)))))
+        ch = 0x1000 | rng.randint(1, 100)
+        msgs.append(message(7, tsbk_message(mk_tsbk(0x02, (ch << 48) | (0x101 << 32)))))
+        for i in xrange(rng.randint(0, 10)):
+            msgs.append(message(rng.choice([5, 10]), '\x02\x93'))
+        msgs.append(message(rng.choice([3, 15]), '\x02\x93'))
+    return msgs[:n]
+
+class qa_dispatch (unittest.TestCase):
+
+    def test_001_routing (self):
+        d = dispatch.dispatcher(batch=4)
+        duq = msg_queue()
+        tuneq = msg_queue()
+        d.add_queue(duq, 'data_unit', dispatch.decode_data_unit)
+        d.add_queue(tuneq, 'correction', dispatch.decode_arg1)
+        units = []
+        batches = []
+        corrections = []
+        d.subscribe('data_unit', units.append)
+        d.subscribe('data_unit', batches.append, batch=True)
+        d.subscribe('correction', corrections.append)
+        tsbk = tsbk_message(mk_tsbk(0x3a, 0x123456))
+        for i in xrange(6):
+            duq.insert_tail(message(7, tsbk))
+        duq.insert_tail(message(5, '\x02\x93'))
+        tuneq.insert_tail(message(0, '', 12.5))
+        self.assertEqual(d.poll(), 5)	# a batch from each queue
+        self.assertEqual(d.poll(), 3)
+        self.assertEqual(d.poll(), 0)
+        self.assertEqual([len(b) for b in batches], [4, 3])
+        self.assertEqual(len(units), 7)
+        self.assertEqual((units[0].duid, units[0].nac, units[0].body), (7, 0x293, tsbk[:10]))
+        self.assertEqual((units[6].duid, units[6].nac, units[6].body), (5, 0x293, ''))
+        self.assertEqual(corrections, [12.5])
+        self.assertEqual((d.messages, d.idle_rounds), (8, 1))
+
+    def test_002_bounded (self):
+        d = dispatch.dispatcher(batch=10)
+        q = msg_queue()
+        d.add_queue(q, 'samples')
+        slow = []
+        h = d.subscribe('samples', slow.append, depth=3)
+        def fails(s):
+            raise ValueError(s)
+        bad = d.subscribe('samples', fails, depth=100)
+        for i in xrange(25):
+            q.insert_tail(message(0, str(i)))
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        d.poll()
+        # only the newest events of a burst are kept
+        self.assertEqual(slow, ['7', '8', '9'])
+        self.assertEqual((h.delivered, h.dropped, h.max_depth), (3, 7, 3))
+        d.poll()
+        d.poll()
+        errors = sys.stderr.getvalue()
+        sys.stderr = stderr
+        self.assertEqual(errors.count('ValueError: '), 25)
+        self.assertEqual(slow[-3:], ['22', '23', '24'])
+        s = d.stats()['samples']
+        self.assertEqual(s[0], dict(delivered=9, dropped=16, max_depth=3, errors=0))
+        # a failing handler is counted, and does not stop the dispatcher
+        self.assertEqual((s[1]['errors'], s[1]['delivered']), (25, 25))
+
+    def test_003_batched_trunking (self):
+        msgs = traffic(5000)
+        single = []
+        ref = trunking.trunk_follower(851000000, single.append)
+        for msg in msgs:
+            ref.process_data_unit(msg.type(), msg.to_string())
+        batched = []
+        f = trunking.trunk_follower(851000000, batched.append)
+        d = dispatch.dispatcher(batch=50)
+        q = msg_queue()
+        d.add_queue(q, 'data_unit', dispatch.decode_data_unit)
+        d.subscribe('data_unit', f.process_data_units, batch=True)
+        for msg in msgs:
+            q.insert_tail(msg)
+        while d.poll():
+            pass
+        self.assertTrue(len(single) > 100)
+        self.assertEqual(batched, single)
+        self.assertEqual(f.trunk_ctl.freq_table, ref.trunk_ctl.freq_table)
+        self.assertEqual(f.trunk_ctl.adjacent, ref.trunk_ctl.adjacent)
+        self.assertEqual(f.state, ref.state)
+
+    def test_004_rate (self):
+        msgs = traffic(20000, seed=1)
+        f = trunking.trunk_follower(851000000, lambda freq: None)
+        d = dispatch.dispatcher()
+        q = msg_queue(100)
+        d.add_queue(q, 'data_unit', dispatch.decode_data_unit)
+        d.subscribe('data_unit', f.process_data_units, batch=True)
+        d.start()
+        # bursts of a queue full at a time, as fast as the queue allows
+        t0 = time.time()
+        for i in xrange(0, len(msgs), 100):
+            while q.count():
+                time.sleep(0.0005)
+            for msg in msgs[i:i + 100]:
+                q.insert_tail(msg)
+        d.flush()
+        rate = len(msgs) / (time.time() - t0)
+        d.stop()
+        d.join()
+        self.assertEqual((q.dropped, d.messages), (0, len(msgs)))
+        self.assertTrue(rate > RATE_REQUIRED, '%d messages/s' % rate)
+
+    def test_005_latency (self):
+        # single messages on a quiet queue reach the handler at once,
+        # with no polling interval to wait out
+        d = dispatch.dispatcher()
+        q = msg_queue()
+        d.add_queue(q, 'samples')
+        arrived = []
+        d.subscribe('samples', lambda s: arrived.append(time.time() - float(s)))
+        d.start()
+        for i in xrange(20):
+            time.sleep(0.03)
+            q.insert_tail(message(0, repr(time.time())))
+        d.flush()
+        d.stop()
+        d.join()
+        self.assertEqual(len(arrived), 20)
+        self.assertTrue(sorted(arrived)[10] < LATENCY_REQUIRED, arrived)
+        self.assertTrue(d.rounds <= 21, d.rounds)
+
+    def test_006_remove (self):
+        d = dispatch.dispatcher(wake=lambda: message(0, ''))
+        q1 = msg_queue()
+        q2 = msg_queue()
+        got = []
+        d.add_queue(q1, 'samples')
+        h = d.subscribe('samples', got.append)
+        d.start()
+        q1.insert_tail(message(0, 'a'))
+        d.flush()
+        # as when the flow graph is rebuilt: the old queue and handler go,
+        # and each message is handled once
+        reader = d.readers[q1]
+        d.remove_queue(q1)
+        reader.join(1.0)
+        self.assertFalse(reader.isAlive())
+        d.unsubscribe(h)
+        d.add_queue(q2, 'samples')
+        d.subscribe('samples', got.append)
+        q1.insert_tail(message(0, 'stale'))
+        q2.insert_tail(message(0, 'b'))
+        d.flush()
+        d.stop()
+        d.join()
+        self.assertEqual(got, ['a', 'b'])
+        self.assertEqual(d.stats()['samples'][0]['delivered'], 1)
+
+    def test_007_lossless (self):
+        # a handler slower than its source, as a WAV writer is: the
+        # source is held back, and nothing is lost or reordered
+        d = dispatch.dispatcher(batch=8)
+        q = msg_queue(10, block=True)
+        d.add_queue(q, 'samples')
+        got = []
+        def slow(events):
+            time.sleep(0.005)
+            got.extend(events)
+        h = d.subscribe('samples', slow, depth=20, batch=True, lossless=True)
+        lossy = d.subscribe('samples', lambda events: time.sleep(0.005), depth=20, batch=True)
+        d.start()
+        for i in xrange(2000):
+            q.insert_tail(message(0, str(i)))
+        d.flush()
+        d.stop()
+        d.join()
+        self.assertEqual(got, [str(i) for i in xrange(2000)])
+        self.assertEqual((h.delivered, h.dropped), (2000, 0))
+        self.assertTrue(h.max_depth <= 20, h.max_depth)
+        self.assertEqual(q.dropped, 0)
+        # the other handler of the type is not held to the same
+        self.assertEqual(lossy.delivered + lossy.dropped, 2000)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# Copyright 2011, 2012, 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import os
+import sys
+import shutil
+import tempfile
+import StringIO
+import numpy as np
+from gnuradio import gr, gr_unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'python'))
+import p25craft
+
+import capture
+import p25_rx
+import symbol_stream
+
+NAC = 0x293
+CAPTURE_RATE = 240000
+CENTER_FREQ = 851050000
+CC_FREQ = 851000000
+VC_FREQ = 851100000	# channel 8 of table 1
+SECONDS = 6.0
+
+# dibit to C4FM deviation, in units of 600 Hz
+C4FM_LEVELS = np.array([1.0, 3.0, -1.0, -3.0])
+
+def dibits(construct, *args):
+    """
+    the dibits of a data unit built by p25craft
+    """
+    out = StringIO.StringIO()
+    p25craft.quiet = True
+    p25craft.outfile = out
+    construct(*args)
+    b = np.frombuffer(out.getvalue(), dtype=np.uint8)
+    return ((b[:, np.newaxis] >> np.array([6, 4, 2, 0])) & 3).reshape(-1)
+
+def c4fm(symbols, rate, offset):
+    """
+    C4FM at offset Hz from the centre of a capture at rate
+    """
+    sps = rate // 4800
+    freq = np.repeat(C4FM_LEVELS[symbols] * 600.0, sps)
+    freq = np.convolve(freq, np.ones(sps // 2) / (sps // 2), mode='same') + offset
+    return np.exp(2j * np.pi * np.cumsum(freq) / rate)
+
+def control_channel(nsymbols):
+    # table 1 at 851 MHz in 12.5 kHz steps, and grants of channel 8
+    iden = dibits(p25craft.construct_tsdu, NAC, 0, 1, 0, 0x3d, (1 << 60) | (100 << 32) | (CC_FREQ // 5))
+    grant = dibits(p25craft.construct_tsdu, NAC, 0, 1, 0, 0x00, (0x1008 << 40) | (0x101 << 24) | 1)
+    cycle = np.concatenate((iden, grant))
+    return np.resize(cycle, nsymbols)
+
+def voice_channel(nsymbols):
+    # calls of two superframes, each ended by a terminator
+    imbe = 0x123456789abcdef0123456789abcdef01234
+    ldu1 = dibits(p25craft.construct_ldu1, NAC, 0, imbe, 0, 0, 0, 0, 0, 0x101, 0, 1)
+    ldu2 = dibits(p25craft.construct_ldu2, NAC, 0, imbe, 0, 0, 0x80, 0)
+    tdu = dibits(p25craft.construct_xtdu, NAC, 0, 0, 0, 0, 0, 0x101, 0, 1)
+    cycle = np.concatenate([ldu1, ldu2] * 2 + [tdu] * 3)
+    return np.resize(cycle, nsymbols)
+
+def mk_trunked_capture(filename):
+    """
+    write a capture of a control channel granting a busy voice channel,
+    100 kHz apart
+    """
+    nsymbols = int(SECONDS * 4800)
+    x = c4fm(control_channel(nsymbols), CAPTURE_RATE, CC_FREQ - CENTER_FREQ)
+    x += c4fm(voice_channel(nsymbols), CAPTURE_RATE, VC_FREQ - CENTER_FREQ)
+    w = capture.capture_writer(filename, CAPTURE_RATE, CENTER_FREQ, start_time=0.0)
+    w.write((x * 0.5).astype(np.complex64))
+    w.close()
+
+class options(object):
+    args = ''
+    calibration = 0.0
+    costas_alpha = 0.125
+    fsk4 = True
+    frequency = 0.0
+    seek = 0
+    seek_time = None
+    sample_rate = CAPTURE_RATE
+    throttle = False
+    trunk_cc_freq = CC_FREQ
+    verbosity = 0
+    vocoder = False
+    offset = 0.0
+    wireshark = False
+    wireshark_host = '127.0.0.1'
+    raw_symbols = None
+    unpacked_symbols = False
+    gain_mu = 0.025
+    gains = None
+    audio_output = ''
+    voice_decoders = 0
+    priority = None
+    lockout = None
+    wav_dir = None
+
+class qa_p25_rx (gr_unittest.TestCase):
+
+    def setUp (self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown (self):
+        shutil.rmtree(self.dir)
+
+    def test_001_trunk_follow (self):
+        o = options()
+        o.ifile = os.path.join(self.dir, 'trunked.cap')
+        mk_trunked_capture(o.ifile)
+        tb = p25_rx.p25_rx(o)
+        tb.run()
+        tb.drain()
+        events = tb.tune_events
+        # every call is followed to its end and back to the control channel
+        self.assertTrue(len(events) >= 6, events)
+        self.assertEqual(events[0::2], [VC_FREQ] * len(events[0::2]))
+        self.assertEqual(events[1::2], [CC_FREQ] * len(events[1::2]))
+
+    def test_002_voice_decoders (self):
+        o = options()
+        o.ifile = os.path.join(self.dir, 'trunked.cap')
+        o.voice_decoders = 2
+        mk_trunked_capture(o.ifile)
+        tb = p25_rx.p25_rx(o)
+        tb.run()
+        tb.drain()
+        # the control channel is never left; each call gets a decoder
+        self.assertEqual(tb.tune_events, [])
+        self.assertTrue(len(tb.voice_events) >= 3, tb.voice_events)
+        for slot, freq, tgid in tb.voice_events:
+            self.assertEqual((freq, tgid), (VC_FREQ, 0x101))
+        self.assertEqual(tb.scheduler.stats['blocked'], 0)
+
+    def test_003_raw_symbols (self):
+        # the symbol file is in the format scope.py writes, with the
+        # trunk follower's retunes in it
+        o = options()
+        o.ifile = os.path.join(self.dir, 'trunked.cap')
+        o.raw_symbols = os.path.join(self.dir, 'symbols')
+        mk_trunked_capture(o.ifile)
+        tb = p25_rx.p25_rx(o)
+        tb.run()
+        tb.drain()
+        tb.close_symbol_file()
+        r = symbol_stream.reader(o.raw_symbols)
+        self.assertTrue(r.packed)
+        self.assertEqual((r.symbol_rate, r.modulation, r.frequency), (4800, 'c4fm', CC_FREQ))
+        nsymbols = 0
+        while True:
+            dibits = r.read()
+            if not len(dibits):
+                break
+            nsymbols += len(dibits)
+        r.close()
+        self.assertTrue(abs(nsymbols - SECONDS * 4800) < 4800, nsymbols)
+        retunes = [value[0] for index, kind, value in r.events if kind == 'retune']
+        self.assertEqual(retunes, tb.tune_events)
+
+if __name__ == '__main__':
+    gr_unittest.main ()
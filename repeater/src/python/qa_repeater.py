@@ -20,8 +20,10 @@
 # Boston, MA 02111-1307, USA.
 # 
 
+import math
 from gnuradio import gr, gr_unittest
 import repeater
+import vocoder_frames
 
 class qa_repeater (gr_unittest.TestCase):
 
@@ -43,6 +45,48 @@ class qa_repeater (gr_unittest.TestCase):
         self.fg.run ()
         result_data = dst.data ()
         self.assertFloatTuplesAlmostEqual (expected_result, result_data, 4)
-        
+
+    def encode (self, samples, frame_format):
+        src = gr.vector_source_s (samples)
+        encoder = repeater.vocoder (True, False, 0, '', 0, True, frame_format)
+        dst = gr.vector_sink_b ()
+        self.fg = gr.top_block ()
+        self.fg.connect (src, encoder, dst)
+        self.fg.run ()
+        return ''.join([chr(b) for b in dst.data ()])
+
+    def decode (self, data, frame_format):
+        src = gr.vector_source_b ([ord(c) for c in data])
+        decoder = repeater.vocoder (False, False, 0, '', 0, False, frame_format)
+        dst = gr.vector_sink_s ()
+        self.fg = gr.top_block ()
+        self.fg.connect (src, decoder, dst)
+        self.fg.run ()
+        return decoder, dst.data ()
+
+    def test_002_vocoder_frames (self):
+        # a second of a warbling tone
+        samples = [int(8000 * math.sin(2 * math.pi * (440 + 100 * math.sin(i / 800.0)) * i / 8000))
+                   for i in range(8000)]
+        text = self.encode (samples, repeater.VOCODER_FORMAT_TEXT)
+        binary = self.encode (samples, repeater.VOCODER_FORMAT_BINARY)
+        lines = text.splitlines ()
+        reader = vocoder_frames.frame_reader ()
+        frames = reader.feed (binary)
+        self.assertEqual (len(lines), 50)
+        self.assertEqual (len(binary), 50 * vocoder_frames.FRAME_LEN)
+        for i, (u, seq, timestamp, flags) in enumerate(frames):
+            self.assertEqual (u, vocoder_frames.parse_text (lines[i]))
+            self.assertEqual ((seq, timestamp), (i, i * vocoder_frames.FRAME_SAMPLES))
+            self.assertEqual (flags & vocoder_frames.START != 0, i == 0)
+        # either way the decoder makes the same audio, even when the
+        # binary frames arrive after some noise
+        decoder, audio_text = self.decode (text, repeater.VOCODER_FORMAT_TEXT)
+        decoder, audio_binary = self.decode ('\xa5 noise' + binary, repeater.VOCODER_FORMAT_BINARY)
+        self.assertEqual (len(audio_text), 50 * 160)
+        self.assertEqual (audio_text, audio_binary)
+        self.assertEqual ((decoder.frames_received (), decoder.frames_lost (), decoder.bytes_skipped ()),
+                          (50, 0, 7))
+
 if __name__ == '__main__':
     gr_unittest.main ()
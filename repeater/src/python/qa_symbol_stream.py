@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+
+import os
+import time
+import tempfile
+import unittest
+import numpy as np
+
+import symbol_stream
+
+class qa_symbol_stream (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown (self):
+        os.unlink(self.filename)
+
+    def read_all (self, r):
+        dibits = []
+        soft = []
+        while True:
+            d = r.read()
+            if not len(d):
+                break
+            dibits.append(d)
+            if r.soft_values is not None:
+                soft.append(r.soft_values)
+        r.close()
+        if soft:
+            soft = np.concatenate(soft)
+        return np.concatenate(dibits), soft
+
+    def test_001_pack (self):
+        for n in (0, 1, 3, 4, 5, 1001, 4096):
+            dibits = self.rng.randint(0, 4, n).astype(np.uint8)
+            packed = symbol_stream.pack(dibits)
+            self.assertEqual(len(packed), (n + 3) // 4)
+            self.assertTrue((symbol_stream.unpack(packed, n) == dibits).all())
+        # first dibit in the top bits; only the low bits of a byte count
+        self.assertEqual(list(symbol_stream.pack([1, 2, 3, 0, 0xfd])), [0x6c, 0x40])
+
+    def test_002_round_trip (self):
+        dibits = self.rng.randint(0, 4, 10000).astype(np.uint8)
+        soft = (2 * dibits.astype(float) - 3) + 0.2 * self.rng.randn(len(dibits))
+        w = symbol_stream.writer(open(self.filename, 'wb'), symbol_rate=4800, modulation='cqpsk',
+                                 polarity=-1, frequency=460025000, soft=True, start_time=1e9, record=3000)
+        # soft values arriving apart from their dibits, in other lengths
+        w.write(dibits[:2500])
+        w.write(soft=soft[:1000])
+        w.write(dibits[2500:4000], soft[1000:4000])
+        w.timestamp(1e9 + 1.5)
+        w.write(soft=soft[4000:7000])
+        w.write(dibits[4000:7000])
+        w.retune(frequency=851012500, symbol_rate=6000, modulation='tdma')
+        w.write(dibits[7000:], soft[7000:])
+        w.close()
+        r = symbol_stream.reader(self.filename)
+        self.assertTrue(r.packed)
+        self.assertTrue(r.soft)
+        self.assertEqual((r.symbol_rate, r.modulation, r.polarity, r.frequency, r.start_time),
+                         (4800, 'cqpsk', -1, 460025000, 1e9))
+        got, got_soft = self.read_all(r)
+        self.assertTrue((got == dibits).all())
+        self.assertTrue(np.abs(got_soft - soft).max() <= 0.5 / symbol_stream.SOFT_SCALE)
+        self.assertEqual(r.events, [(4000, 'time', 1e9 + 1.5),
+                                    (7000, 'retune', (851012500, 6000, 'tdma'))])
+        self.assertEqual((r.symbol_rate, r.modulation, r.frequency), (6000, 'tdma', 851012500))
+
+    def test_003_legacy (self):
+        # the older format, one dibit per byte, reads as it always did
+        dibits = self.rng.randint(0, 4, 100003).astype(np.uint8)
+        dibits.tofile(self.filename)
+        r = symbol_stream.reader(self.filename, chunk=30000)
+        self.assertFalse(r.packed)
+        self.assertEqual(r.symbol_rate, None)
+        got, soft = self.read_all(r)
+        self.assertTrue((got == dibits).all())
+        self.assertEqual(len(soft), 0)
+        # and a file of fewer symbols than the header
+        dibits[:7].tofile(self.filename)
+        got, soft = self.read_all(symbol_stream.reader(self.filename))
+        self.assertTrue((got == dibits[:7]).all())
+
+    def test_004_throughput (self):
+        n = 1 << 25
+        dibits = self.rng.randint(0, 4, n).astype(np.uint8)
+        # the older format
+        dibits.tofile(self.filename)
+        legacy_size = os.path.getsize(self.filename)
+        legacy, soft = self.read_all(symbol_stream.reader(self.filename))
+        # packed, written in blocks as a flowgraph would
+        t = time.time()
+        w = symbol_stream.writer(open(self.filename, 'wb'))
+        for i in xrange(0, n, 1 << 16):
+            w.write(dibits[i:i + (1 << 16)])
+        w.close()
+        write_time = time.time() - t
+        t = time.time()
+        got, soft = self.read_all(symbol_stream.reader(self.filename))
+        read_time = time.time() - t
+        self.assertTrue((got == dibits).all())
+        self.assertTrue((legacy == dibits).all())
+        self.assertTrue(os.path.getsize(self.filename) < legacy_size / 4 + 1024)
+        # in symbols (legacy bytes) per second
+        self.assertTrue(n / write_time > 100e6, n / write_time)
+        self.assertTrue(n / read_time > 100e6, n / read_time)
+
+    def test_005_append (self):
+        # a file closed and reopened, as scope.py does when a capture
+        # file is closed and another opened, reads as one stream
+        dibits = self.rng.randint(0, 4, 5000).astype(np.uint8)
+        soft = (2 * dibits.astype(float) - 3) + 0.2 * self.rng.randn(len(dibits))
+        w = symbol_stream.writer(open(self.filename, 'wb'), frequency=460025000, soft=True, start_time=1e9)
+        w.write(dibits[:2000], soft[:2000])
+        w.close()
+        w = symbol_stream.writer(open(self.filename, 'ab'), frequency=851012500, soft=True, start_time=1e9 + 60, append=True)
+        w.write(dibits[2000:], soft[2000:])
+        w.close()
+        r = symbol_stream.reader(self.filename)
+        self.assertEqual((r.frequency, r.start_time), (460025000, 1e9))
+        got, got_soft = self.read_all(r)
+        self.assertTrue((got == dibits).all())
+        self.assertTrue(np.abs(got_soft - soft).max() <= 0.5 / symbol_stream.SOFT_SCALE)
+        self.assertEqual(r.events, [(2000, 'retune', (851012500, 4800, 'c4fm')), (2000, 'time', 1e9 + 60)])
+
+if __name__ == '__main__':
+    unittest.main ()
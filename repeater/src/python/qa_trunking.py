@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import zlib
+import random
+import struct
+import unittest
+
+import trunking
+from tsbk_synth import mk_tsbk, mk_tsbks, tsbk_message, to_array
+
+class qa_trunking (unittest.TestCase):
+
+    def test_001_crc16 (self):
+        self.assertEqual(trunking.crc16(0x3a000012ae01013348704a54, 12), 0)
+        self.assertNotEqual(trunking.crc16(0x3a001012ae01013348704a54, 12), 0)
+        rng = random.Random(1)
+        data = [rng.getrandbits(96) for i in xrange(500)]
+        for d in data:
+            self.assertEqual(trunking.crc16(d, 12), trunking.crc16_slow(d, 12))
+        self.assertEqual(list(trunking.crc16_array(to_array(data))), [trunking.crc16(d, 12) for d in data])
+
+    def test_002_fields (self):
+        recs = trunking.decode_tsbk_array(to_array([0x3a000012ae01013348704a54]))
+        r = recs[0]
+        self.assertEqual((r['opcode'], r['crc_ok']), (0x3a, True))
+        self.assertEqual((r['syid'], r['rfid'], r['stid'], r['ch1']), (0x2ae, 0x01, 0x01, 0x3348))
+
+    def test_003_batch (self):
+        tsbks = mk_tsbks(2000)
+        # a few corrupted ones must be counted and ignored
+        tsbks[100] ^= 1 << 40
+        tsbks[1500] ^= 1 << 90
+
+        grants = []
+        ts = trunking.trunked_system(frequency_set=grants.append)
+        for t in tsbks:
+            if trunking.crc16(t, 12) == 0:
+                ts.decode_tsbk(t >> 16)
+        batch_grants = []
+        tb = trunking.trunked_system(frequency_set=batch_grants.append)
+        recs = tb.decode_tsbks(to_array(tsbks))
+
+        self.assertEqual((tb.stats['tsbks'], tb.stats['crc']), (len(tsbks), 2))
+        self.assertEqual(ts.stats['tsbks'], len(tsbks) - 2)
+        self.assertTrue(len(grants) > 0)
+        self.assertEqual(batch_grants, grants)
+        for attr in ('freq_table', 'secondary', 'adjacent', 'rfss_syid', 'rfss_rfid', 'rfss_stid', 'rfss_chan', 'rfss_txchan', 'ns_syid', 'ns_wacn', 'ns_chan'):
+            self.assertEqual(getattr(tb, attr), getattr(ts, attr))
+        for t, r in zip(tsbks, recs):
+            opcode = (t >> 88) & 0x3f
+            self.assertEqual(r['opcode'], opcode)
+            for name, shift, mask in trunking.tsbk_fields.get(opcode, []):
+                self.assertEqual(r[name], (t >> shift) & mask)
+
+    # alternate MBTs laid out by hand from the field tables of
+    # TIA-102.AABC: (llid, opcode, header octets 8-9, first data block
+    # as (value, bits) fields).  The header is 0x37 (outbound, format
+    # 0x17), 0xc0 | SAP 0x3d, MFID 0, the llid (the sysid in status
+    # messages), 0x81 (one block follows) and the opcode
+    mbt_fields = [
+        (0x2ae, 0x3d, 0x0000, [(1, 4), (100, 9), (0xb4, 9), (100, 10), (851006250 // 5, 32)]),	# iden_up table 1 851.00625 12.5k -45
+        (0x1234, 0x00, 0x8000, [(0, 16), (0x1010, 16), (0x1012, 16), (0x101, 16)]),		# grant 1-16 / 1-18 ga 0x101
+        (0x2ae, 0x3a, 0x0000, [(1, 8), (2, 8), (0x1001, 16), (0x1002, 16), (0, 16)]),		# rfss rfid 1 stid 2 1-1 / 1-2
+        (0x2ae, 0x3b, 0x0000, [(0xbee00, 20), (0, 4), (0x1001, 16), (0x1002, 16), (0, 8)]),	# net wacn bee00 1-1 / 1-2
+        (0x2ae, 0x3c, 0x0304, [(0x1020, 16), (0x1021, 16), (0, 32)]),				# adjacent rfid 3 stid 4 1-32 / 1-33
+    ]
+
+    def packet_crc (self, s):
+        """
+        the P25 packet crc (CRC-32, register cleared, msb first, result
+        inverted) by way of zlib's lsb-first crc32, so that it shares
+        no code with trunking.crc32()
+        """
+        rev = ''.join([chr(int('{0:08b}'.format(ord(c))[::-1], 2)) for c in s])
+        crc = zlib.crc32(rev, -1) & 0xffffffff
+        return struct.pack('>I', int('{0:032b}'.format(crc)[::-1], 2))
+
+    def mbt (self, llid, opcode, args, fields):
+        """
+        the frame assembler's message for an MBT: the header less its
+        crc, then the data block with the packet crc
+        """
+        data = 0
+        for value, bits in fields:
+            data = (data << bits) | value
+        self.assertEqual(sum([bits for value, bits in fields]), 64)
+        header = struct.pack('>BBB', 0x37, 0xc0 | 0x3d, 0) + struct.pack('>I', llid)[1:] + struct.pack('>BBH', 0x81, opcode, args)
+        block = struct.pack('>Q', data)
+        return header + block + self.packet_crc(block)
+
+    def test_004_mbt (self):
+        grants = []
+        ts = trunking.trunked_system(frequency_set=grants.append)
+        rng = random.Random(4)
+        for s in [''.join([chr(rng.randint(0, 255)) for i in xrange(n)]) for n in (1, 8, 20, 44)]:
+            self.assertEqual(struct.pack('>I', trunking.crc32(s)), self.packet_crc(s))
+        for llid, opcode, args, fields in self.mbt_fields:
+            self.assertTrue(ts.decode_pdu(self.mbt(llid, opcode, args, fields)))
+        self.assertEqual(ts.freq_table, {1: {'frequency': 851006250, 'step': 12500, 'offset': -45000000}})
+        self.assertEqual(grants, [851206250])
+        self.assertEqual((ts.rfss_syid, ts.rfss_rfid, ts.rfss_stid, ts.rfss_chan, ts.rfss_txchan), (0x2ae, 1, 2, 851018750, 851031250))
+        self.assertEqual((ts.ns_syid, ts.ns_wacn, ts.ns_chan), (0x2ae, 0xbee00, 851018750))
+        self.assertEqual(ts.adjacent, {851406250: 'rfid: 3 stid:4'})
+        self.assertEqual((ts.stats['mbts'], ts.stats['crc']), (5, 0))
+
+        pdu = self.mbt(*self.mbt_fields[1])
+        bad = pdu[:-1] + chr(ord(pdu[-1]) ^ 1)
+        self.assertFalse(ts.decode_pdu(bad))
+        self.assertEqual(ts.stats['crc'], 1)
+        # an unconfirmed data packet header (format 0x15) is not an MBT
+        other = '\x35' + pdu[1:]
+        self.assertFalse(ts.decode_pdu(other))
+        self.assertEqual(grants, [851206250])
+
+    def test_005_follower (self):
+        cc = 851000000
+        tunes = []
+        f = trunking.trunk_follower(cc, tunes.append)
+        # table 1: 851 MHz, 12.5 kHz steps
+        iden = tsbk_message(mk_tsbk(0x3d, (1 << 60) | (100 << 32) | (cc // 5)))
+        grant = tsbk_message(mk_tsbk(0x02, (0x1008 << 48) | (0x101 << 32)))
+        other = tsbk_message(mk_tsbk(0x02, (0x1010 << 48) | (0x102 << 32)))
+        nac = '\x02\x93'
+        sequence = [
+            (7, iden), (7, grant),		# to the voice channel
+            (7, other),			# still on the control channel
+            (5, nac), (10, nac), (3, nac),	# call ends: back to the cc
+            (10, nac),			# late LDU, ignored
+            (7, other), (7, grant),		# first TSBK on the cc just settles
+            (15, nac),			# call over with no voice received
+        ]
+        for type, s in sequence:
+            f.process_data_unit(type, s)
+        self.assertEqual(tunes, [851100000, cc, 851100000, cc])
+        self.assertEqual(f.state, trunking.trunked_states.TO_CC)
+        # with no control channel frequency the ends of calls do not tune
+        tunes = []
+        f = trunking.trunk_follower(None, tunes.append)
+        for type, s in sequence:
+            f.process_data_unit(type, s)
+        self.assertEqual(tunes, [851100000, 851100000])
+
+    def simulate (self, ndecoders, seconds, max_active, lockout=(), seed=1):
+        """
+        a control channel granting calls on 8 channels, at most
+        max_active at once, each call ending with a terminator on its
+        voice channel; returns the calls and the scheduler's tunings
+        """
+        rng = random.Random(seed)
+        tick = [0.0]
+        tunes = []
+        sched = trunking.voice_scheduler(ndecoders, lambda slot, freq, tgid: tunes.append((tick[0], slot, freq, tgid)),
+                                         lockout=lockout, clock=lambda: tick[0])
+        ts = trunking.trunked_system(grant_set=sched.grant)
+        ts.decode_tsbk(mk_tsbk(0x3d, (1 << 60) | (100 << 32) | (851000000 // 5)) >> 16)
+        calls = []
+        active = []
+        idle = dict([(ch, 0.0) for ch in xrange(1, 9)])
+        turn = 0
+        for step in xrange(int(seconds * 10)):
+            tick[0] = step * 0.1
+            for call in [c for c in active if c['end'] <= tick[0]]:
+                active.remove(call)
+                idle[call['ch']] = tick[0] + 0.5
+                # the terminator, heard by any decoder on the channel
+                for slot, tgid in enumerate(sched.slots):
+                    if tgid == call['tgid']:
+                        sched.data_unit(slot, 15)
+            if len(active) < max_active and rng.random() < 0.3:
+                free = [ch for ch in idle if idle[ch] <= tick[0] and ch not in [c['ch'] for c in active]]
+                tgids = [t for t in xrange(1, 30) if t not in [c['tgid'] for c in active]]
+                call = dict(tgid=rng.choice(tgids), ch=rng.choice(free), start=tick[0], end=tick[0] + rng.uniform(1, 15))
+                call['freq'] = 851000000 + 12500 * call['ch']
+                active.append(call)
+                calls.append(call)
+                ts.decode_tsbk(mk_tsbk(0x00, ((0x1000 | call['ch']) << 40) | (call['tgid'] << 24) | 1234) >> 16)
+            elif active:
+                # updates for two calls at a time, in turn
+                a = active[turn % len(active)]
+                b = active[(turn + 1) % len(active)]
+                turn += 2
+                ts.decode_tsbk(mk_tsbk(0x02, ((0x1000 | a['ch']) << 48) | (a['tgid'] << 32) | ((0x1000 | b['ch']) << 16) | b['tgid']) >> 16)
+        return calls, tunes, sched
+
+    def test_006_scheduler (self):
+        calls, tunes, sched = self.simulate(4, 1200, 4, lockout=[13])
+        self.assertTrue(len(calls) > 150)
+        followed = [c for c in calls if c['tgid'] != 13 and c['end'] < 1199]
+        # every call is picked up when granted, on a decoder of its own
+        first = {}
+        for t, slot, freq, tgid in tunes:
+            first.setdefault((tgid, freq, t), slot)
+        for c in followed:
+            self.assertTrue((c['tgid'], c['freq'], c['start']) in first, c)
+        self.assertEqual(len(tunes), len(followed) + len([c for c in calls if c['end'] >= 1199]))
+        self.assertTrue(13 not in [t[3] for t in tunes])
+        self.assertEqual((sched.stats['blocked'], sched.stats['preempted']), (0, 0))
+        self.assertTrue(sched.stats['locked_out'] > 0)
+        # with two decoders calls have to wait for a decoder, and are
+        # picked up from their grant updates when one is freed
+        calls, tunes, sched = self.simulate(2, 1200, 4)
+        self.assertTrue(sched.stats['blocked'] > 0)
+        late = 0
+        for t, slot, freq, tgid in tunes:
+            c = [c for c in calls if c['tgid'] == tgid and c['freq'] == freq and c['start'] <= t < c['end']]
+            self.assertEqual(len(c), 1)
+            late += t > c[0]['start']
+        self.assertTrue(late > 100)
+        # a call starting with a decoder free is always followed
+        tuned = set([(t[2], t[3]) for t in tunes])
+        for c in calls:
+            overlap = [o for o in calls if o['start'] <= c['start'] < o['end'] and o is not c]
+            if len(overlap) < 2:
+                self.assertTrue((c['freq'], c['tgid']) in tuned, c)
+
+    def test_007_priority (self):
+        tunes = []
+        released = []
+        sched = trunking.voice_scheduler(1, lambda slot, freq, tgid: tunes.append((freq, tgid)), released.append,
+                                         priority={9: 10}, timeout=3.0)
+        sched.grant(851100000, 5, now=0.0)
+        sched.grant(851200000, 9, now=1.0)	# preempts talkgroup 5
+        sched.grant(851300000, 7, now=1.5)	# no decoder for it
+        sched.grant(851100000, 5, True, now=1.6)
+        self.assertEqual(tunes, [(851100000, 5), (851200000, 9)])
+        self.assertEqual(released, [0])
+        self.assertEqual((sched.stats['preempted'], sched.stats['blocked']), (1, 2))
+        sched.data_unit(0, 3)			# talkgroup 9 ends
+        sched.grant(851200000, 9, True, now=2.0)	# still updated: ignored
+        sched.grant(851100000, 5, True, now=2.1)	# 5 is back
+        self.assertEqual(tunes[-1], (851100000, 5))
+        self.assertEqual(sched.slots, [5])
+        # a call moving channel is followed
+        sched.grant(851150000, 5, now=2.5)
+        self.assertEqual(tunes[-1], (851150000, 5))
+        # another talkgroup granted its channel ends its call
+        sched.grant(851150000, 7, now=3.0)
+        self.assertEqual(sched.slots, [7])
+        # and calls not heard of for timeout seconds end
+        sched.grant(851400000, 11, now=6.5)
+        self.assertEqual(sched.slots, [11])
+        self.assertEqual(sorted(sched.grants.calls.keys()), [11])
+
+    def test_008_expiry (self):
+        # the control channel stops granting: the timer frees the decoder
+        # once the call has gone the hold time without a grant
+        tick = [0.0]
+        released = []
+        sched = trunking.voice_scheduler(1, lambda slot, freq, tgid: None, released.append,
+                                         timeout=3.0, clock=lambda: tick[0])
+        sched.grant(851100000, 5)
+        tick[0] = 1.0
+        sched.grant(851100000, 5, True)
+        tick[0] = 3.5
+        sched.expire()
+        self.assertEqual((sched.slots, released), ([5], []))
+        tick[0] = 4.5
+        sched.expire()
+        self.assertEqual((sched.slots, released), ([None], [0]))
+        self.assertEqual(sched.grants.calls, {})
+        # and the decoder is there for the next call
+        sched.grant(851200000, 7)
+        self.assertEqual(sched.slots, [7])
+
+if __name__ == '__main__':
+    unittest.main ()
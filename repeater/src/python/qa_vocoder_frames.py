@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import time
+import unittest
+import numpy as np
+
+import vocoder_frames
+
+def random_codewords(rng, count):
+    """
+    count codewords, u7 shifted left as imbe_header_decode() leaves it
+    """
+    u = np.empty((count, 8), dtype=np.uint32)
+    for i, w in enumerate(vocoder_frames.WIDTHS):
+        u[:, i] = rng.randint(0, 1 << w, count)
+    u[:, 7] = u[:, 7] * 2 + rng.randint(0, 2, count)
+    return u
+
+class qa_vocoder_frames (unittest.TestCase):
+
+    def setUp (self):
+        self.rng = np.random.RandomState(1)
+
+    def test_001_round_trip (self):
+        for u in random_codewords(self.rng, 500):
+            u = [int(x) for x in u]
+            seq = self.rng.randint(0, 1 << 16)
+            timestamp = self.rng.randint(0, 1 << 31) * 2 + 1
+            flags = vocoder_frames.VOICE | vocoder_frames.START
+            frame = vocoder_frames.pack(u, seq, timestamp, flags)
+            self.assertEqual(len(frame), vocoder_frames.FRAME_LEN)
+            got, got_seq, got_timestamp, got_flags = vocoder_frames.unpack(frame)
+            self.assertEqual((got, got_seq, got_timestamp), (u, seq, timestamp))
+            self.assertEqual(got_flags & ~vocoder_frames.U7_LSB, flags)
+            # and by way of the text format
+            line = vocoder_frames.format_text(u)
+            self.assertEqual(len(line), vocoder_frames.TEXT_LEN)
+            self.assertEqual(vocoder_frames.parse_text(line), u)
+            # any single bit error is caught
+            bit = self.rng.randint(8, 8 * vocoder_frames.FRAME_LEN)
+            bad = list(frame)
+            bad[bit // 8] = chr(ord(bad[bit // 8]) ^ (1 << bit % 8))
+            self.assertEqual(vocoder_frames.unpack(''.join(bad)), None)
+        self.assertEqual(vocoder_frames.parse_text('\n'), None)
+
+    def test_002_arrays (self):
+        u = random_codewords(self.rng, 1000)
+        seq = np.arange(1000) + 65000
+        timestamp = np.arange(1000) * vocoder_frames.FRAME_SAMPLES
+        data = vocoder_frames.pack_array(u, seq, timestamp, vocoder_frames.VOICE)
+        self.assertEqual(len(data), 1000 * vocoder_frames.FRAME_LEN)
+        # the same bytes as one at a time
+        for i in (0, 1, 535, 999):
+            frame = vocoder_frames.pack([int(x) for x in u[i]], seq[i], timestamp[i])
+            self.assertEqual(data[i * 20:(i + 1) * 20], frame)
+        got, got_seq, got_timestamp, flags, valid = vocoder_frames.unpack_array(data)
+        self.assertTrue(valid.all())
+        self.assertTrue((got == u).all())
+        self.assertTrue((got_seq == seq % 65536).all())
+        self.assertTrue((got_timestamp == timestamp).all())
+        self.assertTrue((flags & vocoder_frames.VOICE).all())
+
+    def test_003_stream (self):
+        u = random_codewords(self.rng, 60)
+        flags = [vocoder_frames.VOICE] * 60
+        flags[0] |= vocoder_frames.START
+        flags[30] |= vocoder_frames.START
+        frames = [vocoder_frames.pack([int(x) for x in u[i]], i, i * 160, flags[i]) for i in range(60)]
+        end = vocoder_frames.pack([0] * 8, 60, 9600, vocoder_frames.END)
+        # a sync byte in the noise, a corrupted frame and one lost
+        bad = frames[17][:10] + chr(ord(frames[17][10]) ^ 0x40) + frames[17][11:]
+        stream = 'noise\xa5noise' + ''.join(frames[:17]) + bad + ''.join(frames[18:45]) + \
+                 ''.join(frames[46:]) + end
+        reader = vocoder_frames.frame_reader()
+        got = []
+        p = 0
+        while p < len(stream):
+            n = self.rng.randint(1, 50)
+            got += reader.feed(stream[p:p + n])
+            p += n
+        seqs = [seq for cw, seq, timestamp, f in got]
+        self.assertEqual(seqs, [i for i in range(61) if i not in (17, 45)])
+        for cw, seq, timestamp, f in got[:-1]:
+            self.assertEqual(cw, [int(x) for x in u[seq]])
+            self.assertEqual(timestamp, seq * 160)
+        self.assertEqual(got[-1][3], vocoder_frames.END)
+        self.assertEqual(reader.frames, 59)
+        self.assertEqual(reader.lost, 2)
+        self.assertEqual(reader.skipped, len('noise\xa5noise') + vocoder_frames.FRAME_LEN)
+        self.assertFalse(reader.started)
+
+    def test_004_throughput (self):
+        # a minute of voice on 20 channels, 50 codewords a second each
+        count = 60 * 50 * 20
+        u = random_codewords(self.rng, count)
+        text = ''.join([vocoder_frames.format_text(cw) for cw in u])
+        data = vocoder_frames.pack_array(u, np.arange(count), np.arange(count) * 160, vocoder_frames.VOICE)
+        self.assertEqual(len(data) * vocoder_frames.TEXT_LEN, len(text) * vocoder_frames.FRAME_LEN)
+
+        t0 = time.time()
+        parsed = [vocoder_frames.parse_text(line) for line in text.splitlines()]
+        t_text = time.time() - t0
+        t0 = time.time()
+        got, seq, timestamp, flags, valid = vocoder_frames.unpack_array(data)
+        t_binary = time.time() - t0
+
+        self.assertTrue((np.array(parsed) == got).all())
+        self.assertTrue(valid.all())
+        # the frames are smaller and far quicker to take apart
+        self.assertTrue(t_binary * 5 < t_text, (t_binary, t_text))
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -25,26 +25,20 @@
 # 02110-1301, USA.
 
 import os
-import pickle
 import sys
-import threading
 import wx
 import wx.html
 import wx.wizard
 import math
 import numpy
 import time
+import threading
 import re
 try:
     import Hamlib
 except:
     pass
 
-try:
-    import Numeric
-except:
-    pass
-
 from gnuradio import audio, eng_notation, op25, gr, gru, repeater
 from gnuradio import blks2
 from gnuradio.eng_option import eng_option
@@ -55,11 +49,31 @@ from optparse import OptionParser
 import gnuradio.wxgui.plot as plot
 
 import trunking
+import capture
+import constellation
+import datascope
+import autocorrelation
+import classifier
+import correlation
+import symbol_stream
+import dispatch
 
 speeds = [300, 600, 900, 1200, 1440, 1800, 1920, 2400, 2880, 3200, 3600, 3840, 4000, 4800, 6000, 6400, 7200, 8000, 9600, 14400, 19200]
 
 WIRESHARK_PORT = 23456
 
+# the dispatcher of the message queues of the receiver and scopes
+msg_dispatcher = dispatch.dispatcher()
+
+# --raw-symbols messages: dibits, or (with --soft-symbols) complex pairs
+# of a dibit and its soft value
+def decode_symbols(msg):
+    return numpy.fromstring(msg.to_string(), dtype=numpy.uint8), None
+
+def decode_soft_symbols(msg):
+    pairs = numpy.fromstring(msg.to_string(), dtype=numpy.complex64)
+    return pairs.real.astype(numpy.uint8), pairs.imag
+
 # The P25 receiver
 #
 class p25_rx_block (stdgui2.std_top_block):
@@ -85,6 +99,7 @@ class p25_rx_block (stdgui2.std_top_block):
         parser.add_option("-F", "--ifile", type="string", default=None, help="read input from complex capture file")
         parser.add_option("-H", "--hamlib-model", type="int", default=None, help="specify model for hamlib")
         parser.add_option("-s", "--seek", type="int", default=0, help="ifile seek in K")
+        parser.add_option("-j", "--seek-time", type="eng_float", default=None, help="start playback this many seconds into a capture file", metavar="sec")
         parser.add_option("-S", "--sample-rate", type="int", default=320e3, help="source samp rate")
         parser.add_option("-t", "--tone-detect", action="store_true", default=False, help="use experimental tone detect algorithm")
         parser.add_option("-T", "--trunk-cc-freq", type="eng_float", default=None, help="trunk control channel frequency", metavar="Hz")
@@ -95,6 +110,8 @@ class p25_rx_block (stdgui2.std_top_block):
         parser.add_option("-w", "--wireshark", action="store_true", default=False, help="output data to Wireshark")
         parser.add_option("-W", "--wireshark-host", type="string", default="127.0.0.1", help="Wireshark host")
         parser.add_option("-r", "--raw-symbols", type="string", default=None, help="dump decoded symbols to file")
+        parser.add_option("--soft-symbols", action="store_true", default=False, help="add soft values to the --raw-symbols file")
+        parser.add_option("--unpacked-symbols", action="store_true", default=False, help="write --raw-symbols one dibit per byte, without a header")
         parser.add_option("-R", "--rx-subdev-spec", type="subdev", default=(0, 0), help="select USRP Rx side A or B (default=A)")
         parser.add_option("-g", "--gain", type="eng_float", default=None, help="set USRP gain in dB (default is midpoint) or set audio gain")
         parser.add_option("-G", "--gain-mu", type="eng_float", default=0.025, help="gardner gain")
@@ -137,7 +154,10 @@ class p25_rx_block (stdgui2.std_top_block):
             self.channel_rate = 96000
 
         if options.ifile:
-            self.channel_rate = 96000	# TODO: fixme
+            if capture.is_capture(options.ifile):
+                self.channel_rate = capture.capture_file(options.ifile).sample_rate
+            else:
+                self.channel_rate = 96000	# raw samples: rate unknown
 
         # setup (read-only) attributes
         self.symbol_rate = 4800
@@ -147,6 +167,13 @@ class p25_rx_block (stdgui2.std_top_block):
 
         # keep track of flow graph connections
         self.cnxns = []
+        # and of the message queues and handlers each build of the flow
+        # graph gives the dispatcher, as (msgq, handler_queue)
+        self.graph_queues = []
+
+        self.symbol_file = None		# --raw-symbols writer
+        self.symbol_file_used = False	# a closed one is continued, not truncated
+        self.symbol_lock = threading.Lock()
 
         self.datascope_raw_input = False
         self.data_scope_connected = False
@@ -163,20 +190,9 @@ class p25_rx_block (stdgui2.std_top_block):
         if options.hamlib_model:
             self.hamlib_attach(options.hamlib_model)
 
-        class _trunked_states(object):
-            ACQ = 0
-            CC = 1
-            TO_VC = 2
-            VC = 3
-            TO_CC = 4
-        self.trunked_states = _trunked_states
-
-        self.trunked_state = self.trunked_states.ACQ
         if options.trunk_cc_freq:
             if options.hamlib_model:
                 self.hamlib.set_freq(int(options.trunk_cc_freq))
-        # acquire trunk CC based on list of primary and alternates
-        self.trunked_state = self.trunked_states.CC
 
         # initialize the UI
         # 
@@ -203,15 +219,19 @@ class p25_rx_block (stdgui2.std_top_block):
             self.notebook.AdvanceSelection()
         elif options.ifile:
             self._set_state("CAPTURING")
-            self.open_ifile(self.channel_rate, options.gain, options.ifile, options.seek)
+            self.open_ifile(self.channel_rate, options.gain, options.ifile, options.seek, options.seek_time)
         else:
             self._set_state("STOPPED")
 
+        msg_dispatcher.start()
+
     # setup common flow graph elements
     #
     def __build_graph(self, source, capture_rate):
         global speeds
         global WIRESHARK_PORT
+        # the queues of the last build are done with
+        self.__release_queues()
         # tell the scope the source rate
         self.spectrum.set_sample_rate(capture_rate)
         # channel filter
@@ -227,6 +247,8 @@ class p25_rx_block (stdgui2.std_top_block):
 #       rrc_coeffs = gr.firdes.root_raised_cosine(1.0, self.basic_rate, self.basic_rate * 0.1, 0.2, ntaps)
         rrc_coeffs = (1.0/sps,)*sps
         self.symbol_filter = gr.fir_filter_fff(symbol_decim, rrc_coeffs)
+        self.capture_rate = capture_rate
+        self.detecting = False
 
         autotuneq = gr.msg_queue(2)
         self.fsk4_demod = op25.fsk4_demod_ff(autotuneq, self.basic_rate, self.symbol_rate)
@@ -239,17 +261,29 @@ class p25_rx_block (stdgui2.std_top_block):
         self.buffer = gr.copy(gr.sizeof_float)
 
         msgq = gr.msg_queue(100)
-        self.du_watcher = du_queue_watcher(msgq, self.process_data_unit)
+        self.trunk = trunking.trunk_follower(self.options.trunk_cc_freq, self.change_freq)
+        self.trunk_ctl = self.trunk.trunk_ctl
+        msg_dispatcher.add_queue(msgq, 'data_unit', dispatch.decode_data_unit)
+        self.graph_queues.append((msgq, msg_dispatcher.subscribe('data_unit', self.trunk.process_data_units, batch=True)))
         udp_port = 0
         if self.options.wireshark:
             udp_port = WIRESHARK_PORT
-        if self.options.raw_symbols:
+        self.symbol_pair = None
+        if self.options.raw_symbols and self.options.unpacked_symbols:
             self.sink_sf = gr.file_sink(gr.sizeof_char, self.options.raw_symbols)
+        elif self.options.raw_symbols and self.options.soft_symbols:
+            # each dibit (real) goes out with its soft value (imag)
+            self.open_symbol_file()
+            self.symbol_to_float = gr.char_to_float()
+            self.symbol_pair = gr.float_to_complex()
+            self.sink_sf = gr.message_sink(gr.sizeof_gr_complex, self.symbol_msgq, False)
+        elif self.options.raw_symbols:
+            self.open_symbol_file()
+            self.sink_sf = gr.message_sink(gr.sizeof_char, self.symbol_msgq, False)
         do_imbe = 1
         do_output = 1
         do_msgq = 1
         self.sink_s = repeater.p25_frame_assembler(self.options.wireshark_host, udp_port, self.options.verbosity, do_imbe, do_output, do_msgq, msgq)
-        self.trunk_ctl = trunking.trunked_system(frequency_set = self.change_freq)
         if self.options.vocoder:
             self.sink_imbe = repeater.vocoder(0, 0, 0, '', 0, 0)
             self.audio_s2f = gr.short_to_float()
@@ -279,14 +313,9 @@ class p25_rx_block (stdgui2.std_top_block):
 
         if self.baseband_input:
             self.rescale = gr.multiply_const_ff( 1.0 ) # dummy for compat
-            self.float_resamplers = []
-            for i in xrange(len(speeds)):
-                speed = speeds[i] * sps
-		lcm = gru.lcm(speed, capture_rate)
-                interp = int(lcm // capture_rate)
-                decim = int(lcm // speed)
-                resamp = blks2.rational_resampler_fff(interp,decim)
-                self.float_resamplers.append(resamp)
+            self.resampler = self.make_resampler()
+            self.classifier_tap = classifier_sink(self.frame, capture_rate, input_is_real=True)
+            self.graph_queues.append((self.classifier_tap.msgq, self.classifier_tap.counters))
             self.set_connection(c4fm=1)
         else:	# complex input
             coeffs = gr.firdes.low_pass(1.0, capture_rate, trans_centre, trans_width, gr.firdes.WIN_HANN)
@@ -322,12 +351,9 @@ class p25_rx_block (stdgui2.std_top_block):
 
             #self.symbol_filter_c = gr.interp_fir_filter_ccf(1, rrc_taps)
             self.symbol_filter_c = gr.multiply_const_cc(1.0)
-            self.resamplers = []
-
-            for speed in speeds:
-                resampler = blks2.pfb_arb_resampler_ccf(
-                   float(speed)/float(self.symbol_rate))
-                self.resamplers.append(resampler)
+            self.resampler = self.make_resampler()
+            self.classifier_tap = classifier_sink(self.frame, self.channel_rate)
+            self.graph_queues.append((self.classifier_tap.msgq, self.classifier_tap.counters))
 
             if self.options.tone_detect:
                 step_size = 7.5e-8
@@ -375,6 +401,15 @@ class p25_rx_block (stdgui2.std_top_block):
                     p = b
         self.cnxns.extend(cnxns)
 
+    # Take the queues of the flow graph out of the dispatcher, so that a
+    # rebuilt graph's handlers are not called twice for each message
+    #
+    def __release_queues(self):
+        for msgq, handler in self.graph_queues:
+            msg_dispatcher.remove_queue(msgq)
+            msg_dispatcher.unsubscribe(handler)
+        self.graph_queues = []
+
     # Disconnect the flow graph
     #
     def __disconnect(self):
@@ -387,10 +422,22 @@ class p25_rx_block (stdgui2.std_top_block):
                     p = b
         self.cnxns = []
 
+    # only the resampler for the current symbol rate is built, and it is
+    # replaced when the rate changes
+    def make_resampler(self):
+        speed = speeds[self.current_speed]
+        if self.baseband_input:
+            speed *= int(self.basic_rate // self.symbol_rate)
+            lcm = gru.lcm(speed, self.capture_rate)
+            return blks2.rational_resampler_fff(int(lcm // self.capture_rate), int(lcm // speed))
+        return blks2.pfb_arb_resampler_ccf(float(speed)/float(self.symbol_rate))
+
     def set_speed(self, new_speed):
      # assumes that lock is held, or that we are in init
         self.disconnect_demods()
-        self.current_speed = new_speed
+        if new_speed != self.current_speed:
+            self.current_speed = new_speed
+            self.resampler = self.make_resampler()
         self.connect_fsk4_demod()
 
     def set_connection(self,
@@ -465,10 +512,8 @@ class p25_rx_block (stdgui2.std_top_block):
             self.connect_demods()
             self.set_connection(fscope=1)
         elif sel == 5:   # correlation
-            self.disconnect_demods()
-            self.current_speed = self.default_speed_idx # reset speed for corr
+            self.set_speed(self.default_speed_idx) # reset speed for corr
             self.data_scope.win.radio_box_speed.SetSelection(self.current_speed)
-            self.connect_fsk4_demod()
             self.set_connection(corr=1)
         elif sel == 6:   # fac - fast auto correlation
             if not self.baseband_input:
@@ -503,6 +548,7 @@ class p25_rx_block (stdgui2.std_top_block):
         file_menu.InsertSeparator(4)
         self.file_close = file_menu.Insert(5, wx.ID_CLOSE)
         self.frame.Bind(wx.EVT_MENU, self._on_file_close, self.file_close)
+        self.frame.Bind(wx.EVT_CLOSE, self._on_close_window)
 
         # setup the "Edit" menu
         edit_menu = wx.Menu()
@@ -565,6 +611,8 @@ class p25_rx_block (stdgui2.std_top_block):
         self.data_plotter = self.data_scope.win.graph
         wx.EVT_RADIOBOX(self.data_scope.win.radio_box, 11103, self.filter_select)
         wx.EVT_RADIOBOX(self.data_scope.win.radio_box_speed, 11104, self.speed_select)
+        wx.EVT_BUTTON(self.data_scope.win.detect, 11106, self.detect_select)
+        classifier_EVT_DATA_EVENT(self.frame, self.detected)
         self.data_scope.win.radio_box_speed.SetSelection(self.current_speed)
         self.notebook.AddPage(self.data_scope.win, "Datascope")
         # add complex scope
@@ -593,7 +641,6 @@ class p25_rx_block (stdgui2.std_top_block):
         self.notebook.AddPage(self.fac_scope.win, "Auto Correlation")
         # Setup the decoder and report the TUN/TAP device name
         msgq = gr.msg_queue(2)
-        # self.decode_watcher = decode_watcher(msgq, self.traffic)
         # self.p25_decoder = op25.decoder_ff(msgq)
         # self.frame.SetStatusText("TUN/TAP: " + self.p25_decoder.device_name())
 
@@ -631,13 +678,10 @@ class p25_rx_block (stdgui2.std_top_block):
         vbox.Add(hbox, 0, 0)
 
     def change_freq(self, freq):
-        if self.trunked_state == self.trunked_states.CC:
-            print "%d: change frequency to: %f" % (self.trunked_state, float(freq) / 1000000.0)
-            self.trunked_state = self.trunked_states.TO_VC
-            if self.options.hamlib_model:
-                self.hamlib.set_freq(freq)
-            else:
-                self.set_freq(freq)
+        if self.options.hamlib_model:
+            self.hamlib.set_freq(freq)
+        else:
+            self.set_freq(freq)
 
     def hamlib_attach(self, model):
         Hamlib.rig_set_debug (Hamlib.RIG_DEBUG_NONE)	# RIG_DEBUG_TRACE
@@ -648,31 +692,6 @@ class p25_rx_block (stdgui2.std_top_block):
 
         self.hamlib.open ()
 
-    def process_data_unit(self, msg):
-        type = msg.type()
-        #print "type %d at %f state %d" %(type, time.time(), self.trunked_state)
-        s = msg.to_string()
-        t = 0
-        for c in s:
-                t = (t << 8) + ord(c)
-        nac = t & 0xffff
-        t = t >> 16
-        if type == 7:
-            self.trunk_ctl.decode_tsbk(t)
-            if self.trunked_state == self.trunked_states.TO_CC:
-                self.trunked_state = self.trunked_states.CC
-            #print self.trunk_ctl.to_string()
-        else:
-            if self.trunked_state == self.trunked_states.TO_VC:
-                self.trunked_state = self.trunked_states.VC
-            if self.trunked_state == self.trunked_states.VC and (type == 3 or type == 15):
-                self.trunked_state = self.trunked_states.TO_CC
-                print "%d: change frequency to: %f" % (self.trunked_state, float(self.options.trunk_cc_freq) / 1000000.0)
-                if self.options.hamlib_model:
-                    self.hamlib.set_freq(int(self.options.trunk_cc_freq))
-                else:
-                    self.set_freq(int(self.options.trunk_cc_freq))
-
     def set_gain(self, gain):
         if self.baseband_input:
             f = 1.0
@@ -700,6 +719,7 @@ class p25_rx_block (stdgui2.std_top_block):
         
         if r:
             self.myform['freq'].set_value(target_freq)     # update displayed va
+            self.retune_symbol_file(frequency=target_freq)
             #if self.show_debug_info:
             #    self.myform['baseband'].set_value(r.baseband_freq)
             #    self.myform['ddc'].set_value(r.dxc_freq)
@@ -727,20 +747,37 @@ class p25_rx_block (stdgui2.std_top_block):
     def _set_status_msg(self, msg):
         self.frame.GetStatusBar().SetStatusText(msg, 0)
 
-    # read capture file properties (decimation etc.)
+    # read capture file properties (sample rate etc.) from its header
     #
     def __read_file_properties(self, filename):
-        f = open(filename, "r")
-        self.info = pickle.load(f)
-        ToDo = True
-        f.close()
+        self.capfile = capture.capture_file(filename)
+        self.info = self.capfile.info()
+
+    # sample number at which to start playing the capture
+    #
+    def __capture_start(self, file_seek, seek_time):
+        if seek_time is not None:
+            return self.capfile.sample_at(self.capfile.start_time + seek_time)
+        return min(file_seek * 1024, self.capfile.nsamples)
+
+    # file source for the samples of the capture, from sample start
+    # (the header and index are never played)
+    #
+    def __capture_source(self, start):
+        if self.capfile.sample_type != 'fc32':
+            raise ValueError("cannot play %s samples" % self.capfile.sample_type)
+        file = gr.file_source(gr.sizeof_gr_complex, self.capfile.filename, False)
+        rc = file.seek(self.capfile.item_offset(start), gr.SEEK_SET)
+        assert rc == True
+        head = gr.head(gr.sizeof_gr_complex, self.capfile.nsamples - start)
+        return file, head
 
     # setup to rx from file
     #
-    def __set_rx_from_file(self, filename, capture_rate):
-        file = gr.file_source(gr.sizeof_gr_complex, filename, True)
+    def __set_rx_from_file(self, capture_rate, start):
+        file, head = self.__capture_source(start)
         throttle = gr.throttle(gr.sizeof_gr_complex, capture_rate)
-        self.__connect([[file, throttle]])
+        self.__connect([[file, head, throttle]])
         self.__build_graph(throttle, capture_rate)
 
     # setup to rx from Audio
@@ -824,13 +861,6 @@ class p25_rx_block (stdgui2.std_top_block):
     def _set_titlebar(self, filename):
         ToDo = True
 
-    # Write capture file properties
-    #
-    def __write_file_properties(self, filename):
-        f = open(filename, "w")
-        pickle.dump(self.info, f)
-        f.close()
-
     # Adjust the channel offset
     #
     def adjust_channel_offset(self, delta_hz):
@@ -846,20 +876,31 @@ class p25_rx_block (stdgui2.std_top_block):
         self.stop()
         self.wait()
         self.__disconnect()
+        self.__release_queues()
+        self.close_symbol_file()
         if "CAPTURING" == self.state and self.capture_filename:
             dialog = wx.MessageDialog(self.frame, "Save capture file before closing?", style=wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION)
             if wx.ID_YES == dialog.ShowModal():
-                save_dialog = wx.FileDialog(self.frame, "Save capture file as:", wildcard="*.dat", style=wx.SAVE|wx.OVERWRITE_PROMPT)
+                save_dialog = wx.FileDialog(self.frame, "Save capture file as:", wildcard="*.cap", style=wx.SAVE|wx.OVERWRITE_PROMPT)
                 if save_dialog.ShowModal() == wx.ID_OK:
                     path = str(save_dialog.GetPath())
                     save_dialog.Destroy()
-                    os.rename(self.capture_filename, path)
-                    self.__write_file_properties(path + ".info")
+                    capture.convert(self.capture_filename, path, self.info)
+                    os.remove(self.capture_filename)
             else:
                 os.remove(self.capture_filename)
         self.capture_filename = None
         self._set_state("STOPPED")
 
+    # The window is closing: stop the flow graph and close the
+    # --raw-symbols file before stdgui2 destroys the window
+    #
+    def _on_close_window(self, event):
+        self.stop()
+        self.wait()
+        self.close_symbol_file()
+        event.Skip()
+
     # New capture from USRP 
     #
     def _on_file_new(self, event):
@@ -882,7 +923,7 @@ class p25_rx_block (stdgui2.std_top_block):
     # Open an existing capture
     #
     def _on_file_open(self, event):
-        dialog = wx.FileDialog(self.frame, "Choose a capture file:", wildcard="*.dat", style=wx.OPEN)
+        dialog = wx.FileDialog(self.frame, "Choose a capture file:", wildcard="*.cap", style=wx.OPEN)
         if dialog.ShowModal() == wx.ID_OK:
             file = str(dialog.GetPath())
             dialog.Destroy()
@@ -967,21 +1008,27 @@ class p25_rx_block (stdgui2.std_top_block):
     #
     def open_file(self, capture_file):
         try:
-            self.__read_file_properties(capture_file + ".info")
+            self.__read_file_properties(capture_file)
             capture_rate = self.info["capture-rate"]
-            self.__set_rx_from_file(capture_file, capture_rate)
+            self.__set_rx_from_file(capture_rate, self.__capture_start(self.options.seek, self.options.seek_time))
             self._set_titlebar(capture_file)
             self._set_state("RUNNING")
         except Exception, x:
             wx.MessageBox("Cannot open capture file: " + x.message, "File Error", wx.CANCEL | wx.ICON_EXCLAMATION)
 
-    def open_ifile(self, capture_rate, gain, input_filename, file_seek):
-        speed = 96000 # TODO: fixme
-        ifile = gr.file_source(gr.sizeof_gr_complex, input_filename, 1)
-        if file_seek > 0:
-            rc = ifile.seek(file_seek*1024, gr.SEEK_SET)
-            assert rc == True
-            #print "seek: %d, rc = %d" % (file_seek, rc)
+    def open_ifile(self, capture_rate, gain, input_filename, file_seek, seek_time=None):
+        speed = capture_rate
+        if capture.is_capture(input_filename):
+            self.__read_file_properties(input_filename)
+            ifile, head = self.__capture_source(self.__capture_start(file_seek, seek_time))
+            self.connect(ifile, head)
+            ifile = head
+        else:
+            ifile = gr.file_source(gr.sizeof_gr_complex, input_filename, 1)
+            if file_seek > 0:
+                rc = ifile.seek(file_seek*1024, gr.SEEK_SET)
+                assert rc == True
+                #print "seek: %d, rc = %d" % (file_seek, rc)
         throttle = gr.throttle(gr.sizeof_gr_complex, speed)
         self.source = gr.multiply_const_cc(gain)
         self.connect(ifile, throttle, self.source)
@@ -1046,45 +1093,122 @@ class p25_rx_block (stdgui2.std_top_block):
 
     def disconnect_demods(self):
 # assumes lock held or init
-        idx = self.current_speed
         if self.fsk4_demod_connected:
-#           self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resamplers[idx], self.fm_demod, self.baseband_amp, self.symbol_filter, self.fsk4_demod, self.buffer, self.slicer, self.sink_s)
+#           self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resampler, self.fm_demod, self.baseband_amp, self.symbol_filter, self.fsk4_demod, self.buffer, self.slicer, self.sink_s)
             if self.baseband_input:
-                self.disconnect(self.source, self.baseband_amp, self.float_resamplers[self.current_speed], self.symbol_filter)
+                self.disconnect(self.source, self.baseband_amp, self.resampler, self.symbol_filter)
             else:
-                self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resamplers[idx], self.fm_demod, self.baseband_amp, self.symbol_filter)
+                self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resampler, self.fm_demod, self.baseband_amp, self.symbol_filter)
             self.disconnect(self.symbol_filter, self.fsk4_demod, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
-            if self.options.raw_symbols:
-                self.disconnect(self.slicer, self.sink_sf)
+            self.disconnect_symbol_file()
             self.fsk4_demod_connected = False
         if self.psk_demod_connected:
-            self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resamplers[idx], self.agc, self.symbol_filter_c, self.clock, self.diffdec, self.to_float, self.rescale, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
-            if self.options.raw_symbols:
-                self.disconnect(self.slicer, self.sink_sf)
+            self.disconnect(self.mixer, self.lpf, self.arb_resampler, self.resampler, self.agc, self.symbol_filter_c, self.clock, self.diffdec, self.to_float, self.rescale, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
+            self.disconnect_symbol_file()
             self.psk_demod_connected = False
 
     def connect_psk_demod(self):
 # assumes lock held or init
         self.disconnect_demods()
-        idx = self.current_speed
-        self.connect(self.mixer, self.lpf, self.arb_resampler, self.resamplers[idx], self.agc, self.symbol_filter_c, self.clock, self.diffdec, self.to_float, self.rescale, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
-        if self.options.raw_symbols:
-            self.connect(self.slicer, self.sink_sf)
+        self.connect(self.mixer, self.lpf, self.arb_resampler, self.resampler, self.agc, self.symbol_filter_c, self.clock, self.diffdec, self.to_float, self.rescale, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
+        self.connect_symbol_file('cqpsk')
         self.psk_demod_connected = True
 
     def connect_fsk4_demod(self):
 # assumes lock held or init
         self.disconnect_demods()
-        idx = self.current_speed
         if self.baseband_input:
-            self.connect(self.source, self.baseband_amp, self.float_resamplers[self.current_speed], self.symbol_filter)
+            self.connect(self.source, self.baseband_amp, self.resampler, self.symbol_filter)
         else:
-            self.connect(self.mixer, self.lpf, self.arb_resampler, self.resamplers[idx], self.fm_demod, self.baseband_amp, self.symbol_filter)
+            self.connect(self.mixer, self.lpf, self.arb_resampler, self.resampler, self.fm_demod, self.baseband_amp, self.symbol_filter)
         self.connect(self.symbol_filter, self.fsk4_demod, self.buffer, self.slicer, self.sink_s, self.sink_imbe)
-        if self.options.raw_symbols:
-            self.connect(self.slicer, self.sink_sf)
+        self.connect_symbol_file('c4fm')
         self.fsk4_demod_connected = True
 
+    # the --raw-symbols file follows the slicer, and the demodulator
+    # before it for the soft values, each dibit and its soft value in the
+    # same message.  Symbols reach the writer through a lossless
+    # subscription, so a slow disk holds back the flow graph rather than
+    # cutting symbols out of the file, and a change of rate or
+    # demodulator is recorded in the file when the demodulator is
+    # reconnected.
+    def open_symbol_file(self):
+        if self.symbol_file is not None:
+            return
+        append = self.symbol_file_used
+        self.symbol_file = symbol_stream.writer(open(self.options.raw_symbols, 'ab' if append else 'wb'),
+                                                symbol_rate=speeds[self.current_speed],
+                                                modulation='c4fm',
+                                                frequency=self.options.frequency or 0,
+                                                soft=self.options.soft_symbols,
+                                                stamp_interval=1.0,
+                                                append=append)
+        self.symbol_file_used = True
+        self.symbol_msgq = gr.msg_queue(100)
+        msg_dispatcher.add_queue(self.symbol_msgq, 'raw_symbols',
+                                 decode_soft_symbols if self.options.soft_symbols else decode_symbols)
+        self.symbol_handler = msg_dispatcher.subscribe('raw_symbols', self.write_symbols, depth=1000, batch=True, lossless=True)
+
+    # write out the symbols still queued for the --raw-symbols file and
+    # close it; the flow graph must be stopped.  A file opened after this
+    # continues the same symbol stream.
+    def close_symbol_file(self):
+        if self.symbol_file is None:
+            return
+        msg_dispatcher.flush()
+        msg_dispatcher.remove_queue(self.symbol_msgq)
+        msg_dispatcher.unsubscribe(self.symbol_handler)
+        self.symbol_lock.acquire()
+        try:
+            self.symbol_file.close()
+            self.symbol_file = None
+        finally:
+            self.symbol_lock.release()
+
+    def write_symbols(self, events):
+        self.symbol_lock.acquire()
+        try:
+            for dibits, soft in events:
+                self.symbol_file.write(dibits, soft)
+        finally:
+            self.symbol_lock.release()
+
+    def retune_symbol_file(self, frequency=None, modulation=None):
+        w = self.symbol_file
+        if w is None:
+            return
+        if frequency is None:
+            frequency = w.frequency
+        if modulation is None:
+            modulation = w.modulation
+        self.symbol_lock.acquire()
+        try:
+            if (frequency, speeds[self.current_speed], modulation) != (w.frequency, w.symbol_rate, w.modulation):
+                w.retune(frequency, speeds[self.current_speed], modulation)
+        finally:
+            self.symbol_lock.release()
+
+    def connect_symbol_file(self, modulation):
+        if not self.options.raw_symbols:
+            return
+        if self.symbol_pair is not None:
+            self.connect(self.slicer, self.symbol_to_float, (self.symbol_pair, 0))
+            self.connect(self.buffer, (self.symbol_pair, 1))
+            self.connect(self.symbol_pair, self.sink_sf)
+        else:
+            self.connect(self.slicer, self.sink_sf)
+        self.retune_symbol_file(modulation=modulation)
+
+    def disconnect_symbol_file(self):
+        if not self.options.raw_symbols:
+            return
+        if self.symbol_pair is not None:
+            self.disconnect(self.slicer, self.symbol_to_float, (self.symbol_pair, 0))
+            self.disconnect(self.buffer, (self.symbol_pair, 1))
+            self.disconnect(self.symbol_pair, self.sink_sf)
+        else:
+            self.disconnect(self.slicer, self.sink_sf)
+
     def connect_demods(self):
         if self.baseband_input:
             self.connect_fsk4_demod()
@@ -1134,7 +1258,7 @@ class p25_rx_block (stdgui2.std_top_block):
 
     def corr_select(self, evt):
         new_corr = self.correlation_scope.win.radio_box_corr.GetSelection()
-        self.correlation_scope.win.correlation = self.correlation_scope.win.signatures[new_corr]
+        self.correlation_scope.win.set_signature(new_corr)
         if self.baseband_input:
             return
         self.lock()
@@ -1158,6 +1282,49 @@ class p25_rx_block (stdgui2.std_top_block):
         self.set_speed(new_speed)
         self.unlock()
 
+    def classifier_input(self):
+        if self.baseband_input:
+            return self.source
+        return self.mixer
+
+    # look at a window of the signal and set the symbol rate and demod
+    # type to suit it
+    def detect_select(self, evt):
+        if self.detecting:
+            return
+        self.lock()
+        self.connect(self.classifier_input(), self.classifier_tap)
+        self.detecting = True
+        self.unlock()
+        self._set_status_msg("Detecting...")
+
+    def detected(self, evt):
+        result = evt.data
+        if not self.detecting:
+            return
+        speed = classifier.nearest_speed(result['symbol_rate'], speeds)
+        self.lock()
+        self.disconnect(self.classifier_input(), self.classifier_tap)
+        self.detecting = False
+        if result['mode'] == 'c4fm' or result['mode'] == 'cqpsk':
+            self.disconnect_demods()
+            if speed is not None and speeds.index(speed) != self.current_speed:
+                self.current_speed = speeds.index(speed)
+                self.resampler = self.make_resampler()
+                self.data_scope.win.radio_box_speed.SetSelection(self.current_speed)
+            if not self.baseband_input:
+                self.fsk4_demod_mode = result['mode'] == 'c4fm'
+                self.myform['demod_type'].set_value(self.fsk4_demod_mode and 'FSK4' or 'PSK')
+            sel = self.notebook.GetSelection()
+            if sel == 1 or sel == 2 or sel == 5:
+                self.connect_fsk4_demod()
+            elif sel == 3 and not self.baseband_input:
+                self.connect_psk_demod()
+            else:
+                self.connect_demods()
+        self.unlock()
+        self._set_status_msg(classifier_message(result))
+
 class window_with_ctlbox(wx.Panel):
     def __init__(self, parent, id = -1):
         wx.Panel.__init__(self, parent, id)
@@ -1188,6 +1355,10 @@ class window_with_ctlbox(wx.Panel):
         self.radio_box_speed = wx.RadioBox(self, 11104, "Symbol Rate", style=wx.RA_SPECIFY_ROWS, majorDimension=2, choices = speed_str)
         self.radio_box_speed.SetToolTipString("Symbol Rate")
         ctrlbox.Add (self.radio_box_speed, 0, wx.EXPAND)
+
+        self.detect = wx.Button (self, 11106, "Detect")
+        self.detect.SetToolTipString ("Detect the symbol rate and modulation")
+        ctrlbox.Add (self.detect, 0, wx.EXPAND)
         ctrlbox.Add ((10, 0) ,1)            # stretchy space
 
         return ctrlbox
@@ -1326,61 +1497,6 @@ class wizard_details_page(wx.wizard.WizardPageSimple):
         ToDo = True
 
 
-# data unit receive queue
-#
-class du_queue_watcher(threading.Thread):
-
-    def __init__(self, msgq,  callback, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon(1)
-        self.msgq = msgq
-        self.callback = callback
-        self.keep_running = True
-        self.start()
-
-    def run(self):
-        while(self.keep_running):
-            msg = self.msgq.delete_head()
-            self.callback(msg)
-
-# Frequency tracker
-#
-class demod_watcher(threading.Thread):
-
-    def __init__(self, msgq,  callback, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon(1)
-        self.msgq = msgq
-        self.callback = callback
-        self.keep_running = True
-        self.start()
-
-    def run(self):
-        while(self.keep_running):
-            msg = self.msgq.delete_head()
-            frequency_correction = msg.arg1()
-            self.callback(frequency_correction)
-
-
-# Decoder watcher
-#
-class decode_watcher(threading.Thread):
-
-    def __init__(self, msgq, traffic_pane, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon(1)
-        self.msgq = msgq
-        self.traffic_pane = traffic_pane
-        self.keep_running = True
-        self.start()
-
-    def run(self):
-        while(self.keep_running):
-            msg = self.msgq.delete_head()
-            pickled_dict = msg.to_string()
-            attrs = pickle.loads(pickled_dict)
-            self.traffic_pane.update(attrs)
-
 ############################################################################
 # following code modified from GNURadio sources
 
@@ -1460,61 +1576,25 @@ class datascope_win_info (object):
         return self.marker
 
 
-class datascope_input_watcher (threading.Thread):
-    def __init__ (self, msgq, event_receiver, frame_decim, num_plots, samples_per_symbol, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon (1)
+class datascope_input_watcher (object):
+    def __init__ (self, msgq, event_receiver, frame_decim, num_plots, samples_per_symbol):
         self.msgq = msgq
         self.event_receiver = event_receiver
         self.frame_decim = frame_decim
         self.samples_per_symbol = samples_per_symbol
         self.num_plots = num_plots
-        self.iscan = 0
-        self.keep_running = True
-        self.skip = 0
-        self.totsamp = 0
-        self.skip_samples = 0
-        self.start ()
-        self.msg_string = ""
-
-    def run (self):
-        # print "datascope_input_watcher: pid = ", os.getpid ()
-        while (self.keep_running):
-            msg = self.msgq.delete_head()   # blocking read of message queue
-            nchan = int(msg.arg1())    # number of channels of data in msg
-            nsamples = int(msg.arg2()) # number of samples in each channel
-            self.totsamp += nsamples
-            if self.skip_samples >= nsamples:
-               self.skip_samples -= nsamples
-               continue
-
-            self.msg_string += msg.to_string()      # body of the msg as a string
-
-            bytes_needed = (self.num_plots*self.samples_per_symbol) * gr.sizeof_float
-            if (len(self.msg_string) < bytes_needed):
-                continue
-
-            records = []
-            # start = self.skip * gr.sizeof_float
-            start = 0
-            chan_data = self.msg_string[start:start+bytes_needed]
-            rec = numpy.fromstring (chan_data, numpy.float32)
-            records.append (rec)
-            self.msg_string = ""
-
-            unused = nsamples - (self.num_plots*self.samples_per_symbol)
-            unused -= (start/gr.sizeof_float)
-            self.skip = self.samples_per_symbol - (unused % self.samples_per_symbol)
-            # print "reclen = %d totsamp %d appended %d skip %d start %d unused %d" % (nsamples, self.totsamp, len(rec), self.skip, start/gr.sizeof_float, unused)
-
-            de = datascope_DataEvent (records)
+        # lower interval values = more frequent plots, but higher CPU usage
+        interval = self.num_plots * self.samples_per_symbol * 20
+        self.eye = datascope.eye_traces(samples_per_symbol, num_plots, interval)
+        msg_dispatcher.add_queue(msgq, self)
+        self.counters = msg_dispatcher.subscribe(self, self.add, depth=16)
+
+    def add (self, buf):
+        if self.eye.add(buf):
+            de = datascope_DataEvent (self.eye)
             wx.PostEvent (self.event_receiver, de)
-            records = []
             del de
 
-            # lower values = more frequent plots, but higher CPU usage
-            self.skip_samples = self.num_plots * self.samples_per_symbol * 20
-
 class datascope_window (window_with_ctlbox):
 
     def __init__ (self, info, parent, id = -1,
@@ -1571,32 +1651,22 @@ class datascope_graph_window (plot.PlotCanvas):
 
         EVT_DATA_EVENT (self, self.format_data)
 
-        self.input_watcher = datascope_input_watcher (info.msgq, self, info.frame_decim, self.samples_per_symbol, self.num_plots)
+        self.input_watcher = datascope_input_watcher (info.msgq, self, info.frame_decim, self.num_plots, self.samples_per_symbol)
 
     def format_data (self, evt):
         if not self.info.running:
             return
-        
-        info = self.info
-        records = evt.data
-        nchannels = len (records)
-        npoints = len (records[0])
-        self.total_points += npoints
 
-        x_vals = numpy.arange (0, self.samples_per_symbol)
+        points = evt.data.points()
+        self.total_points += points.shape[0] * points.shape[1]
 
         self.SetXUseScopeTicks (True)   # use 10 divisions, no labels
 
         objects = []
         colors = ['red','orange','yellow','green','blue','violet','cyan','magenta','brown','black']
 
-        r = records[0]  # input data
-        for i in range(self.num_plots):
-            points = []
-            for j in range(self.samples_per_symbol):
-                p = [ j, r[ i*self.samples_per_symbol + j ] ]
-                points.append(p)
-            objects.append (plot.PolyLine (points, colour=colors[i % len(colors)], legend=('')))
+        for i in range(len(points)):
+            objects.append (plot.PolyLine (points[i], colour=colors[i % len(colors)], legend=('')))
 
         graphics = plot.PlotGraphics (objects,
                                       title='Data Scope',
@@ -1678,68 +1748,23 @@ class constellation_plot_win_info (object):
         return self.marker
 
 
-class constellation_plot_input_watcher (threading.Thread):
-    def __init__ (self, msgq, event_receiver, frame_decim, num_plots, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon (1)
+class constellation_plot_input_watcher (object):
+    def __init__ (self, msgq, event_receiver, frame_decim, num_plots):
         self.msgq = msgq
         self.event_receiver = event_receiver
         self.frame_decim = frame_decim
         self.num_plots = num_plots
-        self.iscan = 0
-        self.keep_running = True
-        self.skip = 0
-        self.totsamp = 0
-        self.skip_samples = 0
-        self.start ()
-        self.msg_string = ""
-        self.skip_mode = False
-
-    def run (self):
-        # print "constellation_plot_input_watcher: pid = ", os.getpid ()
-        time.sleep(1)
-        while (self.keep_running):
-            bytes_needed = self.num_plots * gr.sizeof_float * 2
-            if self.skip_mode:
-                bytes_needed = 500 * gr.sizeof_float * 2
-
-            if len(self.msg_string) < bytes_needed:
-                msg = self.msgq.delete_head()   # blocking read of message queue
-                nchan = int(msg.arg1())    # number of channels of data in msg
-                nsamples = int(msg.arg2()) # number of samples in each channel
-                self.totsamp += nsamples
-
-                self.msg_string += msg.to_string()      # body of the msg as a string
-                continue
-
-            chan_data = self.msg_string[:bytes_needed]
-            self.msg_string = self.msg_string[bytes_needed:]
-
-            if self.skip_mode:
-                self.skip_mode = False
-                continue
-
-            records = []
-            # start = self.skip * gr.sizeof_gr_complex
-            # start = 0
-            # chan_data = self.msg_string[start:start+bytes_needed]
-            rec = numpy.fromstring (chan_data, numpy.float32)
-            records.append (rec)
-            # self.msg_string = ""
-
-            # unused = nsamples - self.num_plots
-            # unused -= (start/gr.sizeof_gr_complex)
-            # print "reclen = %d totsamp %d appended %d skip %d start %d unused %d" % (nsamples, self.totsamp, len(rec), self.skip, start/gr.sizeof_float, unused)
-
-            de = constellation_plot_DataEvent (records)
+        # lower skip values = more frequent plots, but higher CPU usage
+        self.frames = constellation.frame_collector(num_plots, 500)
+        msg_dispatcher.add_queue(msgq, self)
+        self.counters = msg_dispatcher.subscribe(self, self.add, depth=16)
+
+    def add (self, buf):
+        for frame in self.frames.add(buf):
+            de = constellation_plot_DataEvent ([frame])
             wx.PostEvent (self.event_receiver, de)
-            records = []
             del de
 
-            # lower values = more frequent plots, but higher CPU usage
-            # self.skip_samples = 5000
-            self.skip_mode = True
-
 class constellation_plot_window (wx.Panel):
 
     constellation_window_size = wx.DefaultSize
@@ -1838,6 +1863,7 @@ class constellation_plot_graph_window (plot.PlotCanvas):
         self.input_watcher = constellation_plot_input_watcher (info.msgq, self, info.frame_decim, self.num_plots)
 
         self.flag = False
+        self.histogram = constellation.phase_histogram(decay=0.5)
 
         self.color1 = 'blue'
         self.color2 = 'blue'
@@ -1851,28 +1877,16 @@ class constellation_plot_graph_window (plot.PlotCanvas):
             self.format_data_std(evt)
 
     def format_data_std (self, evt):
-        info = self.info
         records = evt.data
-        nchannels = len (records)
-        npoints = len (records[0])
-        self.total_points += npoints
+        self.total_points += len (records[0])
 
         self.SetXUseScopeTicks (True)   # use 10 divisions, no labels
 
-        objects = []
-
-        r = records[0]  # input data
-        l = len(r) / 2
-        p0 = []
-        p1 = []
-        for i in range(l):
-            p = [ r[ i*2 ], r[ i*2+1 ] ]
-            if self.flag:
-                p1.append(p)
-            else:
-                p0.append(p)
+        p0, p1 = constellation.split_points(records[0], self.flag)
+        if len(records[0]) & 1:
             self.flag = not self.flag
 
+        objects = []
         objects.append (plot.PolyMarker (p0, marker='plus', colour=self.color1))
         objects.append (plot.PolyMarker (p1, marker='plus', colour=self.color2))
 
@@ -1888,67 +1902,14 @@ class constellation_plot_graph_window (plot.PlotCanvas):
         if not self.info.running:
             return
 
-        info = self.info
         records = evt.data
-        nchannels = len (records)
-        npoints = len (records[0])
-        self.total_points += npoints
+        self.total_points += len (records[0])
 
         self.SetXUseScopeTicks (True)   # use 10 divisions, no labels
 
-        objects = []
-
-        r = records[0]  # input data
-        l = len(r) / 2
-        b0 = []
-        b1 = []
-        max_buckets = 6.0
-        m = int(2 * pi * max_buckets)
-        for i in range(m+1):
-            b0.append(0)
-            b1.append(0)
-        for i in range(l):
-            # p = [ r[ i*2 ], r[ i*2+1 ] ]
-            # if self.flag:
-            #     p1.append(p)
-            # else:
-            #     p0.append(p)
-            theta = math.atan2 ( r[ i*2 ], r[ i*2+1 ] )
-            bucket = int((theta + pi) * max_buckets)
-            if 1:
-                if self.flag:
-                    b0[bucket] += 1
-                else:
-                    b1[bucket] += 1
-            self.flag = not self.flag
+        p0, p1 = self.histogram.update(records[0])
 
-        # determine avg. "power" - for later rescaling of the values 
-        tot = ct = 0
-        for b in b0+b1:
-            tot += b
-            ct += 1
-        avg = float(tot) / float(ct)
-
-        p0 = []
-        p1 = []
-        r = len(b0)
-        for i in range(r):
-            theta = ((float(i)/ r) * 2 * pi) - pi
-            abs = 0.5 * b0[i] / avg
-            p = [ abs * math.cos(theta), abs * math.sin(theta) ]
-            if i == 0:
-                sp = p
-            p0.append(p)
-        p0.append(sp)
-        r = len(b1)
-        for i in range(r):
-            theta = ((float(i) / r) * 2 * pi) - pi
-            abs = 0.5 * b1[i] / avg
-            p = [ abs * math.cos(theta), abs * math.sin(theta) ]
-            if i == 0:
-                sp = p
-            p1.append(p)
-        p1.append(sp)
+        objects = []
         objects.append (plot.PolyLine (p0, colour=self.color1, legend=''))
         objects.append (plot.PolyLine (p1, colour=self.color2, legend=''))
 
@@ -1962,7 +1923,7 @@ class constellation_plot_graph_window (plot.PlotCanvas):
 ############################################################################
 class correlation_plot_f(gr.hier_block2):
     def __init__(self, parent, title='', sps=10,
-                 frame_decim=4,
+                 frame_decim=4, sample_rate=48000,
                  num_inputs=1, **kwargs):
 
         gr.hier_block2.__init__(self, "correlation_plot_f",
@@ -1973,7 +1934,7 @@ class correlation_plot_f(gr.hier_block2):
         self.st = gr.message_sink(gr.sizeof_float, msgq, 1)
         self.connect((self, 0), self.st)
 
-        self.win = correlation_plot_window(correlation_plot_win_info (msgq, sps, frame_decim, None, title), parent, sps=sps)
+        self.win = correlation_plot_window(correlation_plot_win_info (msgq, sps, frame_decim, None, title, sample_rate), parent, sps=sps)
 
 # ========================================================================
 
@@ -1993,14 +1954,15 @@ class correlation_plot_DataEvent(wx.PyEvent):
 
 class correlation_plot_win_info (object):
     __slots__ = ['msgq', 'sps', 'frame_decim',
-                 'scopesink', 'title',
+                 'scopesink', 'title', 'sample_rate',
                  'time_scale_cursor', 'marker', 'xy',
                  'autorange', 'running']
 
     def __init__ (self, msgq, sps, frame_decim,
-                  scopesink, title = "Oscilloscope", xy=True):
+                  scopesink, title = "Oscilloscope", sample_rate=48000, xy=True):
         self.msgq = msgq
         self.sps = sps
+        self.sample_rate = sample_rate
         self.frame_decim = frame_decim
         self.scopesink = scopesink
         self.title = title;
@@ -2019,65 +1981,30 @@ class correlation_plot_win_info (object):
     def get_marker (self):
         return self.marker
 
-class correlation_plot_input_watcher (threading.Thread):
-    def __init__ (self, msgq, event_receiver, frame_decim, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon (1)
+class correlation_plot_input_watcher (object):
+    def __init__ (self, msgq, analyzer, event_receiver, frame_decim):
         self.msgq = msgq
+        self.analyzer = analyzer
         self.event_receiver = event_receiver
         self.frame_decim = frame_decim
-        self.iscan = 0
-        self.keep_running = True
-        self.skip = 0
         self.totsamp = 0
-        self.skip_samples = 0
-        self.start ()
-        self.msg_string = ""
-        self.skip_mode = False
-
-    def run (self):
-        # print "correlation_plot_input_watcher: pid = ", os.getpid ()
-        time.sleep(1)
-        while (self.keep_running):
-            bytes_needed = 24000 * gr.sizeof_float
-
-            if len(self.msg_string) < bytes_needed:
-                msg = self.msgq.delete_head()   # blocking read of message queue
-                nchan = int(msg.arg1())    # number of channels of data in msg
-                nsamples = int(msg.arg2()) # number of samples in each channel
-                self.totsamp += nsamples
-
-                self.msg_string += msg.to_string()      # body of the msg as a string
-                continue
-
-            chan_data = self.msg_string[:bytes_needed]
-            self.msg_string = self.msg_string[bytes_needed:]
-
-#           if self.skip_mode:
-#               self.skip_mode = False
-#               continue
-
-            records = []
-            # start = self.skip * gr.sizeof_gr_complex
-            # start = 0
-            # chan_data = self.msg_string[start:start+bytes_needed]
-            rec = numpy.fromstring (chan_data, numpy.float32)
-            records.append (rec)
-            # self.msg_string = ""
-
-            # unused = nsamples - self.num_plots
-            # unused -= (start/gr.sizeof_gr_complex)
-            # print "reclen = %d totsamp %d appended %d skip %d start %d unused %d" % (nsamples, self.totsamp, len(rec), self.skip, start/gr.sizeof_float, unused)
-
-            de = correlation_plot_DataEvent (records)
+        self.tail = numpy.zeros(0, dtype=numpy.float32)	# samples short of a record
+        msg_dispatcher.add_queue(msgq, self, lambda msg: numpy.fromstring(msg.to_string(), numpy.float32))
+        self.counters = msg_dispatcher.subscribe(self, self.add, depth=64, batch=True)
+
+    def add (self, bufs):
+        record_len = 24000
+        samples = numpy.concatenate([self.tail] + bufs)
+        self.totsamp += len(samples) - len(self.tail)
+        records = len(samples) // record_len
+        for i in xrange(records):
+            self.analyzer.add(samples[i * record_len:(i + 1) * record_len])
+        self.tail = samples[records * record_len:].copy()
+        if records:
+            de = correlation_plot_DataEvent (self.analyzer)
             wx.PostEvent (self.event_receiver, de)
-            records = []
             del de
 
-            # lower values = more frequent plots, but higher CPU usage
-            # self.skip_samples = 5000
-#           self.skip_mode = True
-
 class correlation_plot_window (wx.Panel):
 
     def __init__ (self, info, parent, id = -1,
@@ -2093,6 +2020,7 @@ class correlation_plot_window (wx.Panel):
         vbox.Add (self.graph, 1, wx.EXPAND)
         vbox.Add (self.make_control_box(), 0, wx.EXPAND)
 #       vbox.Add (self.make_control2_box(), 0, wx.EXPAND)
+        self.set_signature(self.radio_box_corr.GetSelection())
 
         self.sizer = vbox
         self.SetSizer (self.sizer)
@@ -2108,6 +2036,10 @@ class correlation_plot_window (wx.Panel):
 
         return ctrlbox
 
+    def set_signature (self, sel):
+        template, sps = self.signatures[sel]
+        self.graph.analyzer.set_signature(template, sps)
+
     def make_control_box (self):
         # 48k iden sync sig
         iden_frame_sync = [0.131053, 0.762875, 0.985880, 0.692932, 0.021247, -0.509172, -0.436476, 0.121728, 0.574703, 0.545912, 0.008813, -0.676659, -0.920639, -0.490609, 0.182287, 0.632788, 0.737212, 0.681760, 0.737237, 0.937172, 1.009479, 0.794382, 0.339788, 0.026356, 0.178487, 0.627079, 0.902744, 0.742624, 0.165377, -0.442614, -0.691702, -0.454418, -0.135002]
@@ -2135,24 +2067,11 @@ class correlation_plot_window (wx.Panel):
             f.close()
             ents.append(line.strip())
 
-            frame_sync = []
-            for c in fn:
-                if c == '1':
-                    frame_sync.append(1)
-                else:	# 3
-                    frame_sync.append(-1)
-	    correlation = []
-            for symbol in frame_sync:
-                for i in xrange(sps):
-                    correlation.append(symbol)
-            correlation.reverse()	# reverse order for convolve()
-            self.signatures.append(correlation)
-
-        #special final entry for iden
+            self.signatures.append((correlation.sync_signature(fn_check, sps), sps))
+
+        #special final entry for iden (4000 symbols/sec)
         ents.append('iDEN')
-        correlation = iden_frame_sync
-        correlation.reverse()	# reverse order for convolve()
-        self.signatures.append(correlation)
+        self.signatures.append((iden_frame_sync, self.info.sample_rate // 4000))
 
         self.radio_box_corr = wx.RadioBox(self, 11105, "Sync Signature", style=wx.RA_SPECIFY_COLS,
                         majorDimension=2, choices = ents )
@@ -2185,44 +2104,43 @@ class correlation_plot_graph_window (plot.PlotCanvas):
         self.info = info;
         self.parent = parent;
 
-        self.total_points = 0
+        self.analyzer = correlation.correlator(info.sample_rate)
 
         EVT_DATA_EVENT (self, self.format_data)
 
-        self.input_watcher = correlation_plot_input_watcher (info.msgq, self, info.frame_decim)
+        self.input_watcher = correlation_plot_input_watcher (info.msgq, self.analyzer, self, info.frame_decim)
 
     def format_data (self, evt):
         if not self.info.running:
             return
 
-        info = self.info
-        records = evt.data
-        nchannels = len (records)
-        npoints = len (records[0])
-        self.total_points += npoints
+        points, markers, level, hits = evt.data.points()
+        if not len(points):
+            return
 
         self.SetXUseScopeTicks (True)   # use 10 divisions, no labels
 
-        objects = []
-
-        r = records[0]  # input data
-
-        sig = self.parent.signatures[self.parent.radio_box_corr.GetSelection()]
-	res = numpy.convolve(r, sig, mode='valid')
-        p0 = []
-        i = 0
-        for p in res:
-            p0.append([i, p])
-            i += 1
-
-        objects.append (plot.PolyLine (p0, colour='blue'))
+        # the envelope of the correlation, the threshold and the syncs
+        objects = [plot.PolyLine (points, colour='blue'),
+                   plot.PolyLine ([[0, level], [points[-1, 0], level]], colour='green')]
+        if len(markers):
+            objects.append (plot.PolyMarker (markers, colour='red', marker='triangle'))
+
+        title = 'Correlation'
+        if hits:
+            t, margin, polarity = hits[-1]
+            title += ': sync at %.3f s, margin %.1f dB' % (t, margin)
+            if polarity < 0:
+                title += ' (inverted)'
+        if evt.data.clock_offset is not None:
+            title += ', clock %+.0f ppm' % evt.data.clock_offset
 
         graphics = plot.PlotGraphics (objects,
-                                      title='Correlation',
-                                      xLabel = '', yLabel = '')
+                                      title=title,
+                                      xLabel = 'ms', yLabel = '')
 
-        x_range = (0, len(res))
-        y_range = (-800.0, 800.0)
+        x_range = (0, points[-1, 0])
+        y_range = (0.0, 800.0)
         self.Draw (graphics, xAxis=x_range, yAxis=y_range)
 
 #
@@ -2231,6 +2149,9 @@ class correlation_plot_graph_window (plot.PlotCanvas):
 #
 # KA1RBI modified Jul. 2011 to current GR (to fix error messages)
 #
+# The flow graph now only passes on whole frames of fac_size samples
+# at the display rate; autocorrelation.autocorrelator does the analysis.
+#
 # Copyright 2003,2004,2005,2006 Free Software Foundation, Inc.
 # 
 # This file is part of GNU Radio
@@ -2256,16 +2177,11 @@ default_facsink_size = wx.DefaultSize
 default_fac_rate = gr.prefs().get_long('wxgui', 'fac_rate', 3) # was 15
 
 class fac_sink_base(object):
-    def __init__(self, input_is_real=False, baseband_freq=0, y_per_div=10, ref_level=50,
-                 sample_rate=1, fac_size=512,	
+    def __init__(self, input_is_real=False, sample_rate=1, fac_size=512,
                  fac_rate=default_fac_rate,
                  average=False, avg_alpha=None, title='', peak_hold=False):
 
         # initialize common attributes
-        self.baseband_freq = baseband_freq
-        self.y_divs = 8
-        self.y_per_div=y_per_div
-        self.ref_level = ref_level
         self.sample_rate = sample_rate
         self.fac_size = fac_size
         self.fac_rate = fac_rate
@@ -2277,21 +2193,20 @@ class fac_sink_base(object):
         self.title = title
         self.peak_hold = peak_hold
         self.input_is_real = input_is_real
+        if input_is_real:
+            dtype = numpy.float32
+        else:
+            dtype = numpy.complex64
+        self.analyzer = autocorrelation.autocorrelator(fac_size, sample_rate, dtype=dtype)
         self.msgq = gr.msg_queue(2)         # queue that holds a maximum of 2 messages
 
-    def set_y_per_div(self, y_per_div):
-        self.y_per_div = y_per_div
-
-    def set_ref_level(self, ref_level):
-        self.ref_level = ref_level
-
     def set_average(self, average):
         self.average = average
         if average:
-            self.avg.set_taps(self.avg_alpha)
+            self.analyzer.set_avg_alpha(self.avg_alpha)
             self.set_peak_hold(False)
         else:
-            self.avg.set_taps(1.0)
+            self.analyzer.set_avg_alpha(1.0)
 
     def set_peak_hold(self, enable):
         self.peak_hold = enable
@@ -2301,12 +2216,12 @@ class fac_sink_base(object):
 
     def set_avg_alpha(self, avg_alpha):
         self.avg_alpha = avg_alpha
-
-    def set_baseband_freq(self, baseband_freq):
-        self.baseband_freq = baseband_freq
+        if self.average:
+            self.analyzer.set_avg_alpha(avg_alpha)
 
     def set_sample_rate(self, sample_rate):
         self.sample_rate = sample_rate
+        self.analyzer.set_sample_rate(sample_rate)
         self._set_n()
 
     def _set_n(self):
@@ -2314,46 +2229,26 @@ class fac_sink_base(object):
         
 
 class fac_sink_f(gr.hier_block2, fac_sink_base):
-    def __init__(self, parent, baseband_freq=0,
-                 y_per_div=10, ref_level=50, sample_rate=1, fac_size=512,
+    def __init__(self, parent, sample_rate=1, fac_size=512,
                  fac_rate=default_fac_rate, 
                  average=False, avg_alpha=None,
                  title='', size=default_facsink_size, peak_hold=False):
 
-        fac_sink_base.__init__(self, input_is_real=True, baseband_freq=baseband_freq,
-                               y_per_div=y_per_div, ref_level=ref_level,
+        fac_sink_base.__init__(self, input_is_real=True,
                                sample_rate=sample_rate, fac_size=fac_size,
                                fac_rate=fac_rate,  
                                average=average, avg_alpha=avg_alpha, title=title,
                                peak_hold=peak_hold)
-                               
+        gr.hier_block2.__init__(self, "fac_sink_f", 
+            gr.io_signature(1, 1, gr.sizeof_float),
+            gr.io_signature(0, 0, 0))
+
+        # only the frames that will be shown go on to the analyzer
         s2p = gr.stream_to_vector(gr.sizeof_float, self.fac_size)
         self.one_in_n = gr.keep_one_in_n(gr.sizeof_float * self.fac_size,
                                          max(1, int(self.sample_rate/self.fac_size/self.fac_rate)))
-
-
-	# windowing removed... 
-
-        fac = gr.fft_vfc(self.fac_size, True, ())
-            
-        c2mag = gr.complex_to_mag(self.fac_size)
-        self.avg = gr.single_pole_iir_filter_ff(1.0, self.fac_size)
-
-	#
-	fac_fac   = gr.fft_vfc(self.fac_size, True, ())
-        fac_c2mag = gr.complex_to_mag(fac_size)
-
-
-        # FIXME  We need to add 3dB to all bins but the DC bin
-        log = gr.nlog10_ff(20, self.fac_size,
-                           -20*math.log10(self.fac_size) )
         sink = gr.message_sink(gr.sizeof_float * self.fac_size, self.msgq, True)
-
-        self.connect(self, s2p, self.one_in_n, fac, c2mag,  fac_fac, fac_c2mag, self.avg, log, sink)
-        # gr.hier_block.__init__(self, fg, s2p, sink)
-        gr.hier_block2.__init__(self, "fac_sink_f", 
-            gr.io_signature(1, 1, gr.sizeof_float),
-            gr.io_signature(0, 0, 0))
+        self.connect(self, s2p, self.one_in_n, sink)
 
         self.win = fac_window(self, parent, size=size)
         self.set_average(self.average)
@@ -2361,14 +2256,12 @@ class fac_sink_f(gr.hier_block2, fac_sink_base):
 
 
 class fac_sink_c(gr.hier_block2, fac_sink_base):
-    def __init__(self, parent, baseband_freq=0,
-                 y_per_div=10, ref_level=90, sample_rate=1, fac_size=512,
+    def __init__(self, parent, sample_rate=1, fac_size=512,
                  fac_rate=default_fac_rate, 
                  average=False, avg_alpha=None,
                  title='', size=default_facsink_size, peak_hold=False):
 
-        fac_sink_base.__init__(self, input_is_real=False, baseband_freq=baseband_freq,
-                               y_per_div=y_per_div, ref_level=ref_level,
+        fac_sink_base.__init__(self, input_is_real=False,
                                sample_rate=sample_rate, fac_size=fac_size,
                                fac_rate=fac_rate, 
                                average=average, avg_alpha=avg_alpha, title=title,
@@ -2377,32 +2270,12 @@ class fac_sink_c(gr.hier_block2, fac_sink_base):
             gr.io_signature(1, 1, gr.sizeof_gr_complex),
             gr.io_signature(0, 0, 0))
 
-        #s2p = gr.stream_to_vector(gr.sizeof_gr_complex, self.fac_size)
+        # only the frames that will be shown go on to the analyzer
         s2p = repeater.s2v(gr.sizeof_gr_complex, self.fac_size)
         self.one_in_n = gr.keep_one_in_n(gr.sizeof_gr_complex * self.fac_size,
                                          max(1, int(self.sample_rate/self.fac_size/self.fac_rate)))
-
-
-	# windowing removed ...
-     
-        fac = gr.fft_vcc(self.fac_size, True, ())
-        c2mag = gr.complex_to_mag(fac_size)
-
-        # Things go off into the weeds if we try for an inverse FFT so a forward FFT will have to do...
-	fac_fac   = gr.fft_vfc(self.fac_size, True, ())
-        fac_c2mag = gr.complex_to_mag(fac_size)
-
-
-        self.avg = gr.single_pole_iir_filter_ff(1.0, fac_size)
-
-        log = gr.nlog10_ff(20, self.fac_size, 
-                           -20*math.log10(self.fac_size)  ) #  - 20*math.log10(norm) ) # - self.avg[0] )
-        sink = gr.message_sink(gr.sizeof_float * fac_size, self.msgq, True)
-
-        self.connect(self, s2p, self.one_in_n, fac, c2mag,  fac_fac, fac_c2mag, self.avg)
-	self.connect(self.avg, log, sink)
-
-        # gr.hier_block.__init__(self, fg, s2p, sink)
+        sink = gr.message_sink(gr.sizeof_gr_complex * self.fac_size, self.msgq, True)
+        self.connect(self, s2p, self.one_in_n, sink)
 
         self.win = fac_window(self, parent, size=size)
         self.set_average(self.average)
@@ -2424,32 +2297,30 @@ class fac_DataEvent(wx.PyEvent):
         self.__class__ (self.GetId())
 
 
-class fac_input_watcher (threading.Thread):
-    def __init__ (self, msgq, fac_size, event_receiver, **kwds):
-        threading.Thread.__init__ (self, **kwds)
-        self.setDaemon (1)
+class fac_input_watcher (object):
+    def __init__ (self, msgq, analyzer, event_receiver):
         self.msgq = msgq
-        self.fac_size = fac_size
+        self.analyzer = analyzer
         self.event_receiver = event_receiver
-        self.keep_running = True
-        self.start ()
+        msg_dispatcher.add_queue(msgq, self, self.last_frame)
+        self.counters = msg_dispatcher.subscribe(self, self.add, depth=1)
 
-    def run (self):
-        while (self.keep_running):
-            msg = self.msgq.delete_head()  # blocking read of message queue
-            itemsize = int(msg.arg1())
-            nitems = int(msg.arg2())
+    def last_frame (self, msg):
+        itemsize = int(msg.arg1())
+        nitems = int(msg.arg2())
 
-            s = msg.to_string()            # get the body of the msg as a string
+        s = msg.to_string()            # get the body of the msg as a string
 
-            # There may be more than one fac frame in the message.
-            # If so, we take only the last one
-            if nitems > 1:
-                start = itemsize * (nitems - 1)
-                s = s[start:start+itemsize]
+        # There may be more than one fac frame in the message.
+        # If so, we take only the last one
+        if nitems > 1:
+            start = itemsize * (nitems - 1)
+            s = s[start:start+itemsize]
+        return s
 
-            complex_data = Numeric.fromstring (s, Numeric.Float32)
-            de = fac_DataEvent (complex_data)
+    def add (self, s):
+        if self.analyzer.add(s):
+            de = fac_DataEvent (self.analyzer)
             wx.PostEvent (self.event_receiver, de)
             del de
     
@@ -2460,7 +2331,7 @@ class fac_window (plot.PlotCanvas):
                   style = wx.DEFAULT_FRAME_STYLE, name = ""):
         plot.PlotCanvas.__init__ (self, parent, id, pos, size, style, name)
 
-        self.y_range = None
+        self.y_range = (-1.0, 1.0)
         self.facsink = facsink
         self.peak_hold = False
         self.peak_vals = None
@@ -2475,7 +2346,7 @@ class fac_window (plot.PlotCanvas):
         wx.EVT_CLOSE (self, self.on_close_window)
         self.Bind(wx.EVT_RIGHT_UP, self.on_right_click)
 
-        self.input_watcher = fac_input_watcher(facsink.msgq, facsink.fac_size, self)
+        self.input_watcher = fac_input_watcher(facsink.msgq, facsink.analyzer, self)
 
 
     def on_close_window (self, event):
@@ -2484,46 +2355,31 @@ class fac_window (plot.PlotCanvas):
 
 
     def set_data (self, evt):
-        dB = evt.data
-        L = len (dB)
+        points, rate = evt.data.points()
 
         if self.peak_hold:
             if self.peak_vals is None:
-                self.peak_vals = dB
+                self.peak_vals = points[:,1].copy()
             else:
-                self.peak_vals = Numeric.maximum(dB, self.peak_vals)
-                dB = self.peak_vals
-
-        x = max(abs(self.facsink.sample_rate), abs(self.facsink.baseband_freq))
-        sf = 1000.0
-        units = "ms"
-
-        x_vals = ((Numeric.arrayrange (L/2)
-                       * ( (sf / self.facsink.sample_rate  ) )) )
-        points = Numeric.zeros((len(x_vals), 2), Numeric.Float64)
-        points[:,0] = x_vals
-        points[:,1] = dB[0:L/2]
+                self.peak_vals = numpy.maximum(points[:,1], self.peak_vals)
+                points[:,1] = self.peak_vals
 
+        title = self.facsink.title
+        if rate:
+            title = '%s: %.1f symbols/sec' % (title, rate)
 
         lines = plot.PolyLine (points, colour='DARKRED')
 
-
         graphics = plot.PlotGraphics ([lines],
-                                      title=self.facsink.title,
-                                      xLabel = units, yLabel = "dB")
+                                      title=title,
+                                      xLabel = "ms", yLabel = "Correlation")
 
         self.Draw (graphics, xAxis=None, yAxis=self.y_range)
-        self.update_y_range ()
 
     def set_peak_hold(self, enable):
         self.peak_hold = enable
         self.peak_vals = None
 
-    def update_y_range (self):
-        ymax = self.facsink.ref_level
-        ymin = self.facsink.ref_level - self.facsink.y_per_div * self.facsink.y_divs
-        self.y_range = self._axisInterval ('min', ymin, ymax)
-
     def on_average(self, evt):
         # print "on_average"
         self.facsink.set_average(evt.IsChecked())
@@ -2532,39 +2388,6 @@ class fac_window (plot.PlotCanvas):
         # print "on_peak_hold"
         self.facsink.set_peak_hold(evt.IsChecked())
 
-    def on_incr_ref_level(self, evt):
-        # print "on_incr_ref_level"
-        self.facsink.set_ref_level(self.facsink.ref_level
-                                   + self.facsink.y_per_div)
-
-    def on_decr_ref_level(self, evt):
-        # print "on_decr_ref_level"
-        self.facsink.set_ref_level(self.facsink.ref_level
-                                   - self.facsink.y_per_div)
-
-    def on_incr_y_per_div(self, evt):
-        # print "on_incr_y_per_div"
-        self.facsink.set_y_per_div(next_up(self.facsink.y_per_div, (1,2,5,10,20)))
-
-    def on_decr_y_per_div(self, evt):
-        # print "on_decr_y_per_div"
-        self.facsink.set_y_per_div(next_down(self.facsink.y_per_div, (1,2,5,10,20)))
-
-    def on_y_per_div(self, evt):
-        # print "on_y_per_div"
-        Id = evt.GetId()
-        if Id == self.id_y_per_div_1:
-            self.facsink.set_y_per_div(1)
-        elif Id == self.id_y_per_div_2:
-            self.facsink.set_y_per_div(2)
-        elif Id == self.id_y_per_div_5:
-            self.facsink.set_y_per_div(5)
-        elif Id == self.id_y_per_div_10:
-            self.facsink.set_y_per_div(10)
-        elif Id == self.id_y_per_div_20:
-            self.facsink.set_y_per_div(20)
-
-        
     def on_right_click(self, event):
         menu = self.popup_menu
         for id, pred in self.checkmarks.items():
@@ -2574,29 +2397,11 @@ class fac_window (plot.PlotCanvas):
 
 
     def build_popup_menu(self):
-        self.id_incr_ref_level = wx.NewId()
-        self.id_decr_ref_level = wx.NewId()
-        self.id_incr_y_per_div = wx.NewId()
-        self.id_decr_y_per_div = wx.NewId()
-        self.id_y_per_div_1 = wx.NewId()
-        self.id_y_per_div_2 = wx.NewId()
-        self.id_y_per_div_5 = wx.NewId()
-        self.id_y_per_div_10 = wx.NewId()
-        self.id_y_per_div_20 = wx.NewId()
         self.id_average = wx.NewId()
         self.id_peak_hold = wx.NewId()
 
         self.Bind(wx.EVT_MENU, self.on_average, id=self.id_average)
         self.Bind(wx.EVT_MENU, self.on_peak_hold, id=self.id_peak_hold)
-        self.Bind(wx.EVT_MENU, self.on_incr_ref_level, id=self.id_incr_ref_level)
-        self.Bind(wx.EVT_MENU, self.on_decr_ref_level, id=self.id_decr_ref_level)
-        self.Bind(wx.EVT_MENU, self.on_incr_y_per_div, id=self.id_incr_y_per_div)
-        self.Bind(wx.EVT_MENU, self.on_decr_y_per_div, id=self.id_decr_y_per_div)
-        self.Bind(wx.EVT_MENU, self.on_y_per_div, id=self.id_y_per_div_1)
-        self.Bind(wx.EVT_MENU, self.on_y_per_div, id=self.id_y_per_div_2)
-        self.Bind(wx.EVT_MENU, self.on_y_per_div, id=self.id_y_per_div_5)
-        self.Bind(wx.EVT_MENU, self.on_y_per_div, id=self.id_y_per_div_10)
-        self.Bind(wx.EVT_MENU, self.on_y_per_div, id=self.id_y_per_div_20)
 
 
         # make a menu
@@ -2604,78 +2409,74 @@ class fac_window (plot.PlotCanvas):
         self.popup_menu = menu
         menu.AppendCheckItem(self.id_average, "Average")
         menu.AppendCheckItem(self.id_peak_hold, "Peak Hold")
-        menu.Append(self.id_incr_ref_level, "Incr Ref Level")
-        menu.Append(self.id_decr_ref_level, "Decr Ref Level")
-        # menu.Append(self.id_incr_y_per_div, "Incr dB/div")
-        # menu.Append(self.id_decr_y_per_div, "Decr dB/div")
-        menu.AppendSeparator()
-        # we'd use RadioItems for these, but they're not supported on Mac
-        menu.AppendCheckItem(self.id_y_per_div_1, "1 dB/div")
-        menu.AppendCheckItem(self.id_y_per_div_2, "2 dB/div")
-        menu.AppendCheckItem(self.id_y_per_div_5, "5 dB/div")
-        menu.AppendCheckItem(self.id_y_per_div_10, "10 dB/div")
-        menu.AppendCheckItem(self.id_y_per_div_20, "20 dB/div")
 
         self.checkmarks = {
             self.id_average : lambda : self.facsink.average,
             self.id_peak_hold : lambda : self.facsink.peak_hold,
-            self.id_y_per_div_1 : lambda : self.facsink.y_per_div == 1,
-            self.id_y_per_div_2 : lambda : self.facsink.y_per_div == 2,
-            self.id_y_per_div_5 : lambda : self.facsink.y_per_div == 5,
-            self.id_y_per_div_10 : lambda : self.facsink.y_per_div == 10,
-            self.id_y_per_div_20 : lambda : self.facsink.y_per_div == 20,
             }
 
 
-def next_up(v, seq):
-    """
-    Return the first item in seq that is > v.
-    """
-    for s in seq:
-        if s > v:
-            return s
-    return v
-
-def next_down(v, seq):
-    """
-    Return the last item in seq that is < v.
-    """
-    rseq = list(seq[:])
-    rseq.reverse()
-
-    for s in rseq:
-        if s < v:
-            return s
-    return v
-
-
-# ----------------------------------------------------------------
-#          	      Deprecated interfaces
-# ----------------------------------------------------------------
+# ------------------------------------------------------------------------
 
-# returns (block, win).
-#   block requires a single input stream of float
-#   win is a subclass of wxWindow
+classifier_myDATA_EVENT = wx.NewEventType()
+classifier_EVT_DATA_EVENT = wx.PyEventBinder (classifier_myDATA_EVENT, 0)
 
-def make_fac_sink_f(fg, parent, title, fac_size, input_rate, ymin = 0, ymax=50):
-    
-    block = fac_sink_f(fg, parent, title=title, fac_size=fac_size, sample_rate=input_rate,
-                       y_per_div=(ymax - ymin)/8, ref_level=ymax)
-    return (block, block.win)
 
-# returns (block, win).
-#   block requires a single input stream of gr_complex
-#   win is a subclass of wxWindow
+class classifier_DataEvent(wx.PyEvent):
+    def __init__(self, data):
+        wx.PyEvent.__init__(self)
+        self.SetEventType (classifier_myDATA_EVENT)
+        self.data = data
 
-def make_fac_sink_c(fg, parent, title, fac_size, input_rate, ymin=0, ymax=50):
-    block = fac_sink_c(fg, parent, title=title, fac_size=fac_size, sample_rate=input_rate,
-                       y_per_div=(ymax - ymin)/8, ref_level=ymax)
-    return (block, block.win)
+    def Clone (self): 
+        self.__class__ (self.GetId())
 
 
-# ----------------------------------------------------------------
-# Standalone test app - deleted
-# ----------------------------------------------------------------
+class classifier_sink(gr.hier_block2):
+    """
+    classify each window of samples (see classifier.py) and post the
+    result to event_receiver
+    """
+    def __init__(self, event_receiver, sample_rate, input_is_real=False, window=classifier.WINDOW):
+        if input_is_real:
+            itemsize = gr.sizeof_float
+            self.dtype = numpy.float32
+        else:
+            itemsize = gr.sizeof_gr_complex
+            self.dtype = numpy.complex64
+        gr.hier_block2.__init__(self, "classifier_sink",
+            gr.io_signature(1, 1, itemsize),
+            gr.io_signature(0, 0, 0))
+        self.event_receiver = event_receiver
+        self.sample_rate = sample_rate
+        self.window = int(window * sample_rate)
+        self.msgq = gr.msg_queue(2)
+        s2p = repeater.s2v(itemsize, self.window)
+        sink = gr.message_sink(itemsize * self.window, self.msgq, True)
+        self.connect(self, s2p, sink)
+        msg_dispatcher.add_queue(self.msgq, self)
+        self.counters = msg_dispatcher.subscribe(self, self.add, depth=1)
+
+    def add(self, s):
+        x = numpy.frombuffer(s, dtype=self.dtype)[-self.window:]
+        if len(x) < self.window:
+            return
+        de = classifier_DataEvent (classifier.classify(x, self.sample_rate))
+        wx.PostEvent (self.event_receiver, de)
+        del de
+
+def classifier_message(result):
+    mode = result['mode']
+    if mode is None:
+        return "Detect: no signal"
+    msg = "Detect: %s" % mode.upper()
+    if result['symbol_rate']:
+        msg += ", %.0f symbols/sec" % result['symbol_rate']
+    if result['deviation']:
+        msg += ", deviation %.0f Hz" % result['deviation']
+    if result['offset'] is not None:
+        msg += ", offset %.0f Hz" % result['offset']
+    return msg
 
 
 ############################################################################
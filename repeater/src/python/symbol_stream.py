@@ -0,0 +1,335 @@
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Symbol stream files, as written by --raw-symbols
+
+The file starts with a 32-byte header, all fields big endian:
+
+    0-3     magic, 'P25S'
+    4-5     header length (32)
+    6       version (1)
+    7       modulation: 0 unknown, 1 c4fm, 2 cqpsk, 3 tdma
+    8       polarity, +1 or -1
+    9       flags: 1 if symbol records carry soft values
+    10-13   symbols/sec
+    14-21   RF frequency in Hz, 0 if not known
+    22-29   time of the first symbol, seconds since the epoch
+    30-31   zero
+
+It is followed by records, each an 8-byte header of type (1 byte),
+flags (1), zero (2) and count (4), then the payload:
+
+    'S' symbols: count dibits packed four to a byte, the first in the
+        top two bits, and with flag 1, count soft values as int8 of
+        SOFT_SCALE to a symbol level (-3, -1, +1, +3)
+    'R' retune: count (16) bytes of RF frequency in Hz (8), symbols/sec
+        (4), modulation (1) and zero (3), from the next symbol on
+    'T' timestamp: count (8) bytes of the time of the next symbol, in
+        seconds since the epoch (a double)
+
+Readers skip records of other types.  A file without the magic is taken
+to be the older format, one dibit per byte with no header.
+
+Dibits are packed and unpacked through 32-bit words: four dibit bytes
+are one little endian word, and a table maps each packed byte to the
+word it came from.  Records are large, so a file streams at the speed
+of these array operations.
+"""
+
+import os
+import sys
+import time
+import struct
+import numpy as np
+
+MAGIC = 'P25S'
+VERSION = 1
+HEADER = struct.Struct('>4sHBBbBIQdxx')
+RECORD = struct.Struct('>cBxxI')
+RETUNE = struct.Struct('>QIBxxx')
+TIMESTAMP = struct.Struct('>d')
+
+SYMBOLS_RECORD = 'S'
+RETUNE_RECORD = 'R'
+TIMESTAMP_RECORD = 'T'
+SOFT_FLAG = 0x01
+
+MODULATIONS = (None, 'c4fm', 'cqpsk', 'tdma')
+SOFT_SCALE = 32.0		# int8 soft value of a +1 symbol
+RECORD_LEN = 1 << 20		# most symbols in one record
+CHUNK_LEN = 1 << 22		# symbols read at a time
+
+# packed byte -> the four dibit bytes it came from, as one word
+_unpack_table = np.zeros(256, dtype='<u4')
+for _shift in range(4):
+    _unpack_table |= ((np.arange(256, dtype='<u4') >> (6 - 2 * _shift)) & 3) << (8 * _shift)
+
+def pack(dibits):
+    """
+    dibits, one per byte (only the low two bits are used), packed four
+    to a byte as a uint8 array, the last byte padded with zeros
+    """
+    dibits = np.asarray(dibits, dtype=np.uint8)
+    n = len(dibits)
+    if n % 4:
+        dibits = np.concatenate((dibits, np.zeros(4 - n % 4, dtype=np.uint8)))
+    w = np.ascontiguousarray(dibits).view('<u4') & 0x03030303
+    out = w << 6
+    out |= w >> 4
+    out |= w >> 14
+    out |= w >> 24
+    return out.astype(np.uint8)
+
+def unpack(packed, count=None):
+    """
+    the first count (by default all) dibits in packed, one per byte
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    dibits = _unpack_table[packed].view(np.uint8)
+    if count is not None:
+        dibits = dibits[:count]
+    return dibits
+
+def quantize_soft(soft):
+    """
+    soft values in symbol levels as int8, SOFT_SCALE to a level
+    """
+    if np.asarray(soft).dtype == np.int8:
+        return np.asarray(soft)
+    return np.clip(np.round(np.asarray(soft) * SOFT_SCALE), -127, 127).astype(np.int8)
+
+def modulation_code(modulation):
+    if modulation not in MODULATIONS:
+        raise ValueError('unknown modulation %r' % (modulation,))
+    return MODULATIONS.index(modulation)
+
+class writer(object):
+    """
+    write a symbol stream to the file object f.  With soft, each symbol
+    carries its soft value.  With stamp_interval, a timestamp record
+    is added when that many seconds have passed since the last one.
+    With append, f is at the end of a stream written with the same
+    soft setting, which is continued with retune and timestamp records
+    in place of a header.
+    """
+    def __init__(self, f, symbol_rate=4800, modulation='c4fm', polarity=1, frequency=0,
+                 soft=False, start_time=None, stamp_interval=None, record=RECORD_LEN, append=False):
+        self.f = f
+        self.symbol_rate = symbol_rate
+        self.modulation = modulation
+        self.frequency = frequency
+        self.soft = soft
+        self.stamp_interval = stamp_interval
+        self.record = record
+        self.count = 0		# symbols written
+        self.dibits = []	# pending arrays
+        self.softs = []
+        self.pending = 0	# pending dibits
+        self.pending_soft = 0	# and soft values
+        if start_time is None:
+            start_time = time.time()
+        self.last_stamp = start_time
+        if append:
+            self.retune()
+            self.timestamp(start_time)
+        else:
+            f.write(HEADER.pack(MAGIC, HEADER.size, VERSION, modulation_code(modulation), polarity,
+                                SOFT_FLAG if soft else 0, symbol_rate, int(frequency), start_time))
+
+    def write(self, dibits=None, soft=None):
+        """
+        add dibits (one per byte) and, for a soft stream, their soft
+        values (floats in symbol levels, or already int8).  The two may
+        arrive in separate calls; symbols are written once both are in.
+        """
+        if dibits is not None and len(dibits):
+            self.dibits.append(np.asarray(dibits, dtype=np.uint8))
+            self.pending += len(dibits)
+        if self.soft and soft is not None and len(soft):
+            self.softs.append(quantize_soft(soft))
+            self.pending_soft += len(soft)
+        if self.stamp_interval is not None and time.time() - self.last_stamp >= self.stamp_interval:
+            self.timestamp()
+        elif self.ready() >= self.record:
+            self.flush()
+
+    def ready(self):
+        if self.soft:
+            return min(self.pending, self.pending_soft)
+        return self.pending
+
+    def flush(self):
+        """
+        write out all the symbols that are complete
+        """
+        n = self.ready()
+        if not n:
+            return
+        dibits = np.concatenate(self.dibits)
+        self.dibits = [dibits[n:]]
+        self.pending -= n
+        if self.soft:
+            soft = np.concatenate(self.softs)
+            self.softs = [soft[n:]]
+            self.pending_soft -= n
+        for i in xrange(0, n, self.record):
+            count = min(self.record, n - i)
+            if self.soft:
+                self.f.write(RECORD.pack(SYMBOLS_RECORD, SOFT_FLAG, count))
+                self.f.write(pack(dibits[i:i + count]).tostring())
+                self.f.write(soft[i:i + count].tostring())
+            else:
+                self.f.write(RECORD.pack(SYMBOLS_RECORD, 0, count))
+                self.f.write(pack(dibits[i:i + count]).tostring())
+        self.count += n
+
+    def retune(self, frequency=None, symbol_rate=None, modulation=None):
+        """
+        the symbols from here on are from another frequency, or rate, or
+        modulation
+        """
+        self.flush()
+        if frequency is not None:
+            self.frequency = frequency
+        if symbol_rate is not None:
+            self.symbol_rate = symbol_rate
+        if modulation is not None:
+            self.modulation = modulation
+        self.f.write(RECORD.pack(RETUNE_RECORD, 0, RETUNE.size))
+        self.f.write(RETUNE.pack(int(self.frequency), self.symbol_rate, modulation_code(self.modulation)))
+
+    def timestamp(self, t=None):
+        """
+        the wall time, by default now, of the next symbol
+        """
+        self.flush()
+        if t is None:
+            t = time.time()
+        self.last_stamp = t
+        self.f.write(RECORD.pack(TIMESTAMP_RECORD, 0, TIMESTAMP.size))
+        self.f.write(TIMESTAMP.pack(t))
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+class reader(object):
+    """
+    read a symbol stream file, or the older one dibit per byte format.
+    filename '-' reads stdin.  The header fields are attributes, kept
+    up to date by the retune records; packed is False for the older
+    format.  read() returns the next dibits; events lists the retune
+    and timestamp records passed, as (symbol index, 'retune' or 'time',
+    value), value being (frequency, symbol rate, modulation) or a time.
+    """
+    def __init__(self, filename, chunk=CHUNK_LEN):
+        if filename == '-':
+            self.f = os.fdopen(sys.stdin.fileno(), 'rb', 0)
+        else:
+            self.f = open(filename, 'rb')
+        self.chunk = chunk
+        self.count = 0		# symbols read
+        self.events = []
+        self.soft_values = None	# soft values of the last read(), if any
+        self.record_left = 0	# symbols in the current record
+        self.record_soft = False
+        self.symbol_rate = None
+        self.modulation = None
+        self.polarity = 1
+        self.frequency = 0
+        self.start_time = None
+        self.soft = False
+        head = self.read_exactly(HEADER.size)
+        if len(head) == HEADER.size and head[:4] == MAGIC:
+            self.packed = True
+            magic, length, version, modulation, self.polarity, flags, self.symbol_rate, \
+                self.frequency, self.start_time = HEADER.unpack(head)
+            if version != VERSION:
+                raise ValueError('symbol stream version %d not supported' % version)
+            self.read_exactly(length - HEADER.size)
+            self.modulation = MODULATIONS[modulation] if modulation < len(MODULATIONS) else None
+            self.soft = bool(flags & SOFT_FLAG)
+            self.head = ''
+        else:
+            self.packed = False
+            self.head = head	# symbols already read
+
+    def read_exactly(self, n):
+        data = self.f.read(n)
+        while len(data) < n:
+            more = self.f.read(n - len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    def next_record(self):
+        """
+        read record headers up to the next symbols.  returns False at
+        the end of the file
+        """
+        while True:
+            head = self.read_exactly(RECORD.size)
+            if len(head) < RECORD.size:
+                return False
+            kind, flags, count = RECORD.unpack(head)
+            if kind == SYMBOLS_RECORD:
+                self.record_left = count
+                self.record_soft = bool(flags & SOFT_FLAG)
+                return True
+            payload = self.read_exactly(count)
+            if kind == RETUNE_RECORD:
+                frequency, symbol_rate, modulation = RETUNE.unpack(payload[:RETUNE.size])
+                self.frequency = frequency
+                self.symbol_rate = symbol_rate
+                self.modulation = MODULATIONS[modulation] if modulation < len(MODULATIONS) else None
+                self.events.append((self.count, 'retune', (frequency, symbol_rate, self.modulation)))
+            elif kind == TIMESTAMP_RECORD:
+                self.events.append((self.count, 'time', TIMESTAMP.unpack(payload[:TIMESTAMP.size])[0]))
+
+    def read(self):
+        """
+        the next dibits, one per byte as a uint8 array, empty at the end
+        of the file: a whole symbol record, or for the older format at
+        most chunk symbols.  soft_values holds their soft values in
+        symbol levels, or None.
+        """
+        if not self.packed:
+            data = self.head + self.read_exactly(self.chunk - len(self.head))
+            self.head = ''
+            dibits = np.fromstring(data, dtype=np.uint8) & 3
+            self.count += len(dibits)
+            return dibits
+        self.soft_values = None
+        if not self.next_record():
+            return np.zeros(0, dtype=np.uint8)
+        n = self.record_left
+        packed = np.fromstring(self.read_exactly((n + 3) // 4), dtype=np.uint8)
+        dibits = unpack(packed, min(n, 4 * len(packed)))
+        if self.record_soft:
+            soft = np.fromstring(self.read_exactly(n), dtype=np.int8)
+            self.soft_values = soft[:len(dibits)] / SOFT_SCALE
+        self.record_left = 0
+        self.count += len(dibits)
+        return dibits
+
+    def close(self):
+        self.f.close()
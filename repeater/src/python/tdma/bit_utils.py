@@ -29,30 +29,35 @@ def rev_int(n,l):
 	return j
 
 def bits_to_dibits(bits):
-	d = []
-	for i in xrange(len(bits)>>1):
-		d.append((bits[i*2]<<1) + bits[i*2+1])
-	return d
+	b = np.asarray(bits)
+	n = b.shape[-1] & ~1
+	return (b[..., 0:n:2] << 1) + b[..., 1:n:2]
 
 def dibits_to_bits(dibits):
-	b = []
-	for d in dibits:
-		b.append((d>>1)&1)
-		b.append(d&1)
+	d = np.asarray(dibits)
+	b = np.empty(d.shape[:-1] + (d.shape[-1] * 2,), dtype=d.dtype)
+	b[..., 0::2] = (d >> 1) & 1
+	b[..., 1::2] = d & 1
 	return b
 
 def mk_array(n, l):
-	a = []
-	for i in xrange(0,l):
-		a.insert(0, n & 1)
-		n = n >> 1
-	return np.array(a)
+	if l > 62:
+		a = []
+		for i in xrange(0,l):
+			a.insert(0, n & 1)
+			n = n >> 1
+		return np.array(a)
+	return (np.int64(n) >> np.arange(l-1, -1, -1, dtype=np.int64)) & 1
+
+def mk_weights(l):
+	return np.int64(1) << np.arange(l-1, -1, -1, dtype=np.int64)
 
 def mk_int(a):
+	a = np.asarray(a, dtype=np.int64) & 1
 	res= 0L
-	for i in xrange(0, len(a)):
-		res = res * 2
-		res = res + (a[i] & 1)
+	for i in xrange(0, len(a), 62):
+		chunk = a[i : i + 62]
+		res = (res << len(chunk)) + long(np.dot(chunk, mk_weights(len(chunk))))
 	return res
 
 def mk_str(a):
@@ -76,9 +81,15 @@ def fixup(a):
 
 	return res
 
-def find_sym(pattern, symbols):
-	for i in xrange(0, len(symbols)-len(pattern)):
-		chunk = symbols[i : i + len(pattern)]
-		if chunk == pattern:
-			return i
+def find_sym(pattern, symbols, window=1<<20):
+	pattern = np.asarray(pattern)
+	symbols = np.asarray(symbols)
+	l = len(pattern)
+	end = len(symbols) - l
+	for w in xrange(0, max(end, 0), window):
+		cand = np.flatnonzero(symbols[w : min(w + window, end)] == pattern[0]) + w
+		for k in xrange(1, l):
+			cand = cand[symbols[cand + k] == pattern[k]]
+		if len(cand):
+			return int(cand[0])
 	return -1
@@ -30,11 +30,38 @@ duid_str[12] = "sacch w/o"
 duid_str[15] = "facch w/o"
 
 duid_map = {}
+duid_names = []		# burst type name for each of the 256 received codewords
+duid_values = np.zeros(256, dtype=np.int64) - 1		# nearest codeword value, -1 if none
+duid_confidence = np.zeros(256)
+duid_bits = np.zeros((16, 8))
+
+DUID_DMIN = 4
+DUID_T = (DUID_DMIN - 1) // 2
+
 def mk_duid_lookup():
+	if duid_map:
+		return
 	g = np.array(np.mat('1 0 0 0 1 1 0 1; 0 1 0 0 1 0 1 1; 0 0 1 0 1 1 1 0; 0 0 0 1 0 1 1 1'))
 	for i in xrange(16):
 		codeword = mk_str(np.dot(mk_array(i, 4), g))
 		duid_map[codeword] = i
+		duid_bits[i] = np.dot(mk_array(i, 4), g) & 1
+	# nearest codeword for every possible received word
+	r = np.array([mk_array(v, 8) for v in xrange(256)])
+	d = np.dot(r, 1 - duid_bits.T) + np.dot(1 - r, duid_bits.T)
+	nearest = np.argmin(d, axis=1)
+	d = np.sort(d, axis=1)
+	ok = (d[:, 0] <= DUID_T) & (d[:, 0] < d[:, 1])
+	duid_values[:] = np.where(ok, nearest, -1)
+	duid_confidence[:] = np.where(ok, np.clip((d[:, 1] - d[:, 0]) / DUID_DMIN, 0, 1), 0)
+	del duid_names[:]
+	for v in xrange(256):
+		duid_names.append(duid_name(duid_values[v], v))
+
+def duid_name(value, codeword):
+	if value in duid_str:
+		return duid_str[value]
+	return 'unknown' + mk_str(mk_array(codeword, 8))
 
 def extract_duid(b):
 	duid0 = b[10]	# duid 3,2
@@ -46,8 +73,47 @@ def extract_duid(b):
 	return mk_str(va)
 
 def decode_duid(burst):
-	try:
-		b = duid_str[duid_map[extract_duid(burst)]]
-	except:	# FIXME: find closest matching codeword
-		b = 'unknown' + extract_duid(burst)
-	return b
+	return duid_names[int(extract_duid(burst), 2)]
+
+def extract_duid_array(bursts):
+	"""
+	return the 8-bit DUID codeword of each 180-symbol burst in an
+	array of shape (..., 180); index duid_names or duid_values with it
+	"""
+	b = np.asarray(bursts)
+	v = b[..., 10].astype(np.int64) << 6
+	v += b[..., 47].astype(np.int64) << 4
+	v += b[..., 132].astype(np.int64) << 2
+	v += b[..., 169]
+	return v & 0xff
+
+def nearest_duid(bursts, reliability=None):
+	"""
+	nearest-codeword decode of the DUID in each burst of an array of
+	shape (..., 180)
+
+	reliability, if given, holds the soft-decision reliability of each
+	burst symbol in an array of the same shape; otherwise the lookup is
+	a straight index into duid_values.
+
+	returns arrays value, confidence of shape (...), value -1 where no
+	codeword lies within DUID_T (weighted) bit errors
+	"""
+	v = extract_duid_array(bursts)
+	if reliability is None:
+		return duid_values[v], duid_confidence[v]
+	rel = np.asarray(reliability, dtype=np.float64)
+	w = np.repeat(np.concatenate([rel[..., p, np.newaxis] for p in (10, 47, 132, 169)], axis=-1), 2, axis=-1)
+	r = dibits_to_bits(np.concatenate([(v[..., np.newaxis] >> s) & 3 for s in (6, 4, 2, 0)], axis=-1))
+	d = (w * r).sum(axis=-1)[..., np.newaxis] + np.dot(w - 2 * w * r, duid_bits.T)
+	best = np.argmin(d, axis=-1)
+	d = np.sort(d, axis=-1)
+	d1 = d[..., 0]
+	d2 = d[..., 1]
+	scale = np.maximum(w.mean(axis=-1), 1e-9)
+	ok = (d1 <= DUID_T * scale) & (d1 < d2)
+	value = np.where(ok, best, -1)
+	conf = np.where(ok, np.clip((d2 - d1) / (DUID_DMIN * scale), 0, 1), 0)
+	return value, conf
+
+mk_duid_lookup()
@@ -22,13 +22,30 @@ import numpy as np
 from bit_utils import *
 
 isch_map = {}
+isch_codewords = np.zeros(0, dtype=np.int64)	# sorted, for decode_isch_array
+isch_values = np.zeros(0, dtype=np.int64)
+isch_bits = np.zeros((0, 40))			# codeword bits, sync sequence last
+isch_info = np.zeros(0, dtype=np.int64)		# isch_bits row -> value, -2 for sync
+
+ISCH_SYNC = 0x575d57f7ff
+ISCH_WEIGHTS = np.int64(1) << np.arange(38, -1, -2, dtype=np.int64)
+ISCH_DMIN = 14	# minimum distance over the codewords and the sync sequence
+ISCH_T = (ISCH_DMIN - 1) // 2
 
 def mk_isch_lookup():
+	if isch_map:
+		return
 	g = np.array(np.mat('1 0 0 0 1 0 0 0 0 0 0 1 0 1 1 0 1 1 0 0 1 1 1 0 0 0 1 1 0 1 1 0 1 1 0 1 0 1 1 1; 0 0 1 0 0 0 0 0 0 0 0 1 1 1 0 1 1 1 1 1 1 1 0 1 0 1 0 0 1 1 1 1 0 1 1 0 0 1 0 0; 0 0 0 1 0 0 0 0 0 0 0 0 1 1 1 1 0 1 0 0 1 0 1 1 0 0 0 1 0 1 1 1 0 1 0 1 1 0 0 0; 0 0 0 0 1 1 0 0 0 0 0 0 0 0 0 0 1 1 0 1 1 1 1 0 1 1 0 1 0 0 0 1 1 0 0 0 1 1 1 0; 0 0 0 0 0 0 1 0 0 0 0 0 1 0 0 0 0 0 0 0 0 1 1 1 1 1 1 1 0 1 1 1 1 1 1 1 1 1 1 1; 0 0 0 0 1 0 0 1 0 0 0 0 0 1 0 0 1 0 0 0 1 1 0 1 1 0 0 1 1 0 1 1 0 1 1 1 0 0 1 0; 0 0 0 0 0 0 0 0 1 0 0 1 1 1 0 1 1 0 1 0 0 0 1 1 1 0 1 0 0 0 0 1 0 1 1 1 0 0 0 1; 0 0 0 0 0 0 0 0 0 1 0 1 1 0 0 0 1 1 0 0 1 0 1 1 1 0 1 0 1 0 1 0 0 1 0 0 1 1 1 0; 0 0 0 0 0 0 0 0 0 0 1 1 0 1 0 0 0 0 1 1 1 1 0 1 1 0 0 0 0 1 0 1 1 0 0 1 0 1 1 1'))
 	c0 = 0x184229d461L
 	for i in xrange(0, 2**7):
 		codeword = mk_int(np.dot(mk_array(i, 9), g)) ^ c0
 		isch_map['%x' % codeword] = i
+	global isch_codewords, isch_values, isch_bits, isch_info
+	cw = sorted([(int(k, 16), isch_map[k]) for k in isch_map])
+	isch_codewords = np.array([c for c, i in cw], dtype=np.int64)
+	isch_values = np.array([i for c, i in cw], dtype=np.int64)
+	isch_bits = np.array([mk_array(c, 40) for c, i in cw] + [mk_array(ISCH_SYNC, 40)], dtype=np.float64)
+	isch_info = np.append(isch_values, -2)
 
 def mk_isch(v):
 	v1 = v & 3
@@ -42,15 +59,81 @@ def mk_isch(v):
 	v5 = v & 3
 	return v4, v3, v2, v1
 
-def decode_isch(syms):
-	sync0 = 0x575d57f7ff
-	v = mk_int(dibits_to_bits(syms))
-	vp = '%x' % v
-	isch = 'unknown'
-	if v == sync0:
+def decode_isch(syms, reliability=None):
+	i, conf = nearest_isch(syms, reliability)
+	if i == -2:
 		return -2, -2, -2, -2
-	if vp in isch_map:
-		chn,loc,fr,cnt = mk_isch(isch_map[vp])
-		return chn, loc, fr, cnt
-	# FIXME: if bit error(s), locate closest matching codeword
-	return -1, -1, -1, -1
+	if i == -1:
+		return -1, -1, -1, -1
+	chn,loc,fr,cnt = mk_isch(int(i))
+	return chn, loc, fr, cnt
+
+def nearest_isch(syms, reliability=None):
+	"""
+	nearest-codeword decode of an array of shape (..., 20) symbols
+
+	reliability, if given, is an array of the same shape holding the
+	soft-decision reliability of each symbol (both bits of a symbol get
+	its weight); without it every bit counts equally.  The closest of
+	the 128 codewords and the sync sequence is accepted when it lies
+	within ISCH_T (weighted) bit errors.
+
+	returns arrays value, confidence of shape (...).  value is the
+	7-bit ISCH information, -1 if no codeword is close enough or -2 for
+	the sync sequence; confidence runs from 0 (undecodable) to 1 (the
+	runner-up lies at least ISCH_DMIN further away than the winner).
+	"""
+	syms = np.asarray(syms, dtype=np.int64) & 3
+	shape = syms.shape[:-1]
+	syms = syms.reshape(-1, 20)
+	v = np.dot(syms, ISCH_WEIGHTS)
+	pos = np.minimum(np.searchsorted(isch_codewords, v), len(isch_codewords) - 1)
+	value = isch_values[pos]
+	value[v == ISCH_SYNC] = -2
+	conf = np.ones(len(v))
+	if reliability is None:
+		# exact matches need no search
+		todo = np.flatnonzero((isch_codewords[pos] != v) & (v != ISCH_SYNC))
+		w = np.ones((len(todo), 40))
+	else:
+		todo = np.arange(len(v))
+		w = np.repeat(np.asarray(reliability, dtype=np.float64).reshape(-1, 20), 2, axis=1)
+	if len(todo) == 0:
+		return value.reshape(shape), conf.reshape(shape)
+	r = dibits_to_bits(syms[todo]).astype(np.float64)
+	# weighted Hamming distance to every codeword: sum of w over bits where r != c
+	d = (w * r).sum(axis=1)[:, np.newaxis] + np.dot(w - 2 * w * r, isch_bits.T)
+	best = np.argsort(d, axis=1)[:, :2]
+	rows = np.arange(len(todo))
+	d1 = d[rows, best[:, 0]]
+	d2 = d[rows, best[:, 1]]
+	scale = np.maximum(w.mean(axis=1), 1e-9)
+	ok = (d1 <= ISCH_T * scale) & (d1 < d2)
+	value[todo] = np.where(ok, isch_info[best[:, 0]], -1)
+	conf[todo] = np.where(ok, np.clip((d2 - d1) / (ISCH_DMIN * scale), 0, 1), 0)
+	return value.reshape(shape), conf.reshape(shape)
+
+def split_isch(i):
+	"""
+	split an array of ISCH values from nearest_isch() into arrays
+	chn, loc, fr, cnt, carrying -1 and -2 through as decode_isch()
+	"""
+	i = np.asarray(i)
+	chn = (i >> 5) & 3
+	loc = (i >> 3) & 3
+	fr = (i >> 2) & 1
+	cnt = i & 3
+	for a in chn, loc, fr, cnt:
+		a[i < 0] = i[i < 0]
+	return chn, loc, fr, cnt
+
+def decode_isch_array(syms, reliability=None):
+	"""
+	decode_isch() over an array of shape (..., 20) symbols at once
+
+	returns arrays chn, loc, fr, cnt of shape (...), set to -1 for
+	undecodable codewords and -2 for the sync sequence, as decode_isch()
+	"""
+	return split_isch(nearest_isch(syms, reliability)[0])
+
+mk_isch_lookup()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+# P25 TDMA Decoder (C) Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+import os
+import sys
+import tempfile
+import resource
+import subprocess
+import unittest
+import numpy as np
+
+from bit_utils import *
+from isch import mk_isch_lookup, decode_isch, decode_isch_array, nearest_isch, ISCH_T
+from duid import mk_duid_lookup, decode_duid, duid_names, extract_duid_array, nearest_duid, DUID_T
+import lfsr
+from vf import decode_vcw, decode_vcw_array
+from reader import symbol_reader
+import symbol_stream
+from synth import mk_superframes, mk_isch_table, mk_duid_table
+
+class qa_tdma (unittest.TestCase):
+
+    def setUp (self):
+        mk_isch_lookup()
+        mk_duid_lookup()
+        self.rng = np.random.RandomState(1)
+
+    def test_001_bits (self):
+        d = self.rng.randint(0, 4, 100)
+        self.assertEqual(list(bits_to_dibits(dibits_to_bits(d))), list(d))
+        for n, l in ((0x575d57f7ff, 40), (0xabcdef0123456789abcdL, 80), (5, 4)):
+            self.assertEqual(mk_int(mk_array(n, l)), n)
+
+    def test_002_find_sym (self):
+        pattern = bits_to_dibits(mk_array(0x575d57f7ff, 40))
+        symbols = np.zeros(5000, dtype=np.uint8)
+        self.assertEqual(find_sym(pattern, symbols), -1)
+        symbols[1020:1040] = pattern
+        self.assertEqual(find_sym(pattern, symbols, window=1024), 1020)
+
+    def test_003_isch_array (self):
+        syms = self.rng.randint(0, 4, (50, 20))
+        cw = mk_isch_table()
+        for i in xrange(0, 50, 2):
+            syms[i] = bits_to_dibits(mk_array(cw[i], 40))
+        syms[7] = bits_to_dibits(mk_array(0x575d57f7ff, 40))
+        result = zip(*decode_isch_array(syms))
+        for i in xrange(50):
+            self.assertEqual(tuple(result[i]), decode_isch(list(syms[i])))
+
+    def test_004_duid_array (self):
+        syms = mk_superframes(2, seed=3)
+        bursts = [syms[i : i + 180] for i in xrange(110, 110 + 24 * 180, 180)]
+        duids = extract_duid_array(np.array(bursts))
+        self.assertEqual([duid_names[d] for d in duids], [decode_duid(b) for b in bursts])
+
+    def test_005_vcw_array (self):
+        vf = self.rng.randint(0, 2, (200, 72))
+        b = decode_vcw_array(vf)
+        for i in xrange(len(vf)):
+            self.assertEqual(list(b[i]), decode_vcw(list(vf[i])))
+
+    def test_006_isch_errors (self):
+        cw = mk_isch_table()
+        cw[-2] = 0x575d57f7ff
+        values = sorted(cw)
+        for t in xrange(1, ISCH_T + 1):
+            syms = []
+            for v in values:
+                for k in xrange(4):
+                    e = np.zeros(40, dtype=np.int64)
+                    e[self.rng.permutation(40)[:t]] = 1
+                    syms.append(bits_to_dibits(mk_array(cw[v], 40) ^ e))
+            value, conf = nearest_isch(np.array(syms))
+            self.assertEqual(list(value), [v for v in values for k in xrange(4)])
+            self.assertTrue((conf > 0).all())
+        value, conf = nearest_isch(bits_to_dibits(mk_array(cw[5], 40)))
+        self.assertEqual((value, conf), (5, 1.0))
+        self.assertEqual(decode_isch(bits_to_dibits(mk_array(cw[5] ^ 0x13, 40))), (0, 0, 1, 1))
+
+    def test_007_duid_errors (self):
+        cw = mk_duid_table()
+        bursts = np.zeros((16, 9, 180), dtype=np.uint8)
+        for v in xrange(16):
+            for b in xrange(9):
+                d = cw[v] ^ ((1 << b) >> 1)
+                bursts[v, b, [10, 47, 132, 169]] = [(d >> 6) & 3, (d >> 4) & 3, (d >> 2) & 3, d & 3]
+        value, conf = nearest_duid(bursts)
+        self.assertEqual(DUID_T, 1)
+        self.assertTrue((value == np.arange(16)[:, np.newaxis]).all())
+        self.assertTrue((conf[:, 0] == 1).all() and (conf[:, 1:] == 0.5).all())
+        self.assertEqual(decode_duid(list(bursts[6, 3])), '2v')
+        # two bit errors are detected but not corrected
+        bursts[:, :, 169] ^= 3
+        self.assertTrue((nearest_duid(bursts[:, 0])[0] == -1).all())
+
+    def test_008_soft (self):
+        cw = mk_isch_table()
+        rel = np.ones((128, 20))
+        syms = []
+        for v in xrange(128):
+            # eight bit errors, beyond hard decision capability, in unreliable symbols
+            pos = self.rng.permutation(20)[:8]
+            s = bits_to_dibits(mk_array(cw[v], 40))
+            s[pos] ^= 1
+            rel[v, pos] = 0.1
+            syms.append(s)
+        syms = np.array(syms)
+        self.assertTrue((nearest_isch(syms)[0] != np.arange(128)).all())
+        self.assertEqual(list(nearest_isch(syms, rel)[0]), range(128))
+        bursts = mk_superframes(1, seed=4)[110 : 110 + 180].reshape(1, 180).copy()
+        value = nearest_duid(bursts)[0]
+        rel = np.ones((1, 180))
+        bursts[0, 169] ^= 3
+        rel[0, 169] = 0.1
+        self.assertEqual(nearest_duid(bursts)[0], -1)
+        self.assertEqual(nearest_duid(bursts, rel)[0], value)
+
+    def test_009_xor (self):
+        systems = [(0, 0, 0), (0xfff, 0xfff, 0xfffff)]
+        for i in xrange(8):
+            systems.append((self.rng.randint(0, 4096), self.rng.randint(0, 4096), self.rng.randint(0, 1 << 20)))
+        for nac, sysid, wacn in systems:
+            b = lfsr.mk_xor_bits(nac, sysid, wacn)
+            self.assertEqual(lfsr.mk_xor(nac, sysid, wacn), bits_to_dibits(np.array(b)).tolist())
+        self.assertTrue(len(lfsr.xor_cache) <= lfsr.XOR_CACHE_SIZE)
+        self.assertTrue(lfsr.xor_key(*systems[-1]) in lfsr.xor_cache)
+
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            lfsr.write_xor_cache(filename, systems[2:])
+            f = lfsr.xor_cache_file(filename)
+            self.assertEqual(len(f.keys), len(systems) - 2)
+            for nac, sysid, wacn in systems:
+                mask = f.lookup(lfsr.xor_key(nac, sysid, wacn))
+                if (nac, sysid, wacn) in systems[2:]:
+                    self.assertEqual(list(mask), list(lfsr.mk_xor_masks([lfsr.xor_key(nac, sysid, wacn)])[0]))
+                else:
+                    self.assertEqual(mask, None)
+            del f
+        finally:
+            os.remove(filename)
+
+    def decode (self, *args):
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tdma-decode.py')] + list(args)
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        out = p.communicate()[0]
+        self.assertEqual(p.returncode, 0)
+        return out
+
+    def test_010_stream (self):
+        noise = self.rng.randint(0, 4, 3 * 2160 + 77).astype(np.uint8)
+        syms = np.concatenate([mk_superframes(10, seed=6), noise, mk_superframes(10, seed=7)])
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            syms.tofile(filename)
+            r = symbol_reader(filename, chunk=7001)
+            chunks = []
+            while True:
+                c = r.read()
+                if len(c) == 0:
+                    break
+                chunks.append(c)
+            r.close()
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual(np.concatenate(chunks).tostring(), syms.tostring())
+
+            out = self.decode('-v', '-i', filename)
+            # both runs of superframes (less the first of each, before sync) are decoded
+            self.assertEqual(out.count('resyncing'), 1)
+            self.assertEqual(out.count('channel 0 loc 0'), 18)
+            for chunk in (1000, 2200, 5000):
+                self.assertEqual(self.decode('-v', '-c', str(chunk), '-i', filename), out)
+        finally:
+            os.remove(filename)
+
+    def test_011_packed_stream (self):
+        syms = np.concatenate([mk_superframes(10, seed=6), self.rng.randint(0, 4, 77).astype(np.uint8)])
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            syms.tofile(filename)
+            legacy = self.decode('-v', '-i', filename)
+            w = symbol_stream.writer(open(filename, 'wb'), symbol_rate=6000, modulation='tdma', record=5000)
+            w.write(syms)
+            w.close()
+            r = symbol_reader(filename)
+            self.assertTrue(r.stream is not None)
+            self.assertEqual(r.stream.symbol_rate, 6000)
+            chunks = []
+            while True:
+                c = r.read()
+                if len(c) == 0:
+                    break
+                chunks.append(c)
+            r.close()
+            self.assertEqual(np.concatenate(chunks).tostring(), syms.tostring())
+            self.assertEqual(self.decode('-v', '-i', filename), legacy)
+        finally:
+            os.remove(filename)
+
+    def test_012_bounded_memory (self):
+        # superframes either side of a 256 MB hole: the file is sparse,
+        # so it costs no disk, but it reads back as 256M symbols
+        chunk = 1 << 16
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            f = open(filename, 'wb')
+            mk_superframes(10, seed=6).tofile(f)
+            f.seek(256 << 20)
+            mk_superframes(10, seed=7).tofile(f)
+            f.close()
+            size = os.path.getsize(filename)
+            r = symbol_reader(filename, chunk=chunk)
+            total = 0
+            while True:
+                c = r.read()
+                if len(c) == 0:
+                    break
+                self.assertTrue(len(c) <= chunk)
+                total += len(c)
+            r.close()
+            self.assertEqual(total, size)
+
+            out = self.decode('-v', '-c', str(chunk), '-i', filename)
+            self.assertEqual(out.count('resyncing'), 1)
+            self.assertEqual(out.count('channel 0 loc 0'), 18)
+            # peak RSS of the largest child so far (KB on Linux): the
+            # interpreter and numpy, never the file
+            peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+            self.assertTrue(peak < size / 4, peak)
+        finally:
+            os.remove(filename)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,93 @@
+
+# P25 TDMA Decoder (C) Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Read a symbol stream (one symbol per byte) in bounded chunks
+
+Regular files are read through a memory map that slides along the
+file, so only one chunk is ever mapped.  Pipes, FIFOs and stdin are
+read with os.read(), returning whatever the writer has produced so far.
+
+A regular file that starts with the symbol stream header of
+--raw-symbols (four dibits to a byte) is read by symbol_stream instead.
+"""
+
+import os
+import sys
+import stat
+import time
+import mmap
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import symbol_stream
+
+CHUNK_LEN = 1 << 22	# symbols per read()
+
+class symbol_reader (object):
+	"""
+	filename '-' reads stdin.  With follow, a regular file is treated
+	as growing: at its end read() waits for more data instead of
+	returning an empty array.  stream is the symbol_stream.reader of
+	a packed file, or None; follow does not apply to those.
+	"""
+	def __init__(self, filename, chunk=CHUNK_LEN, follow=False, poll=0.5):
+		if filename == '-':
+			self.fd = sys.stdin.fileno()
+		else:
+			self.fd = os.open(filename, os.O_RDONLY)
+		self.regular = stat.S_ISREG(os.fstat(self.fd).st_mode)
+		self.chunk = chunk
+		self.follow = follow
+		self.poll = poll
+		self.pos = 0
+		self.stream = None
+		if self.regular and os.read(self.fd, len(symbol_stream.MAGIC)) == symbol_stream.MAGIC:
+			self.stream = symbol_stream.reader(filename, chunk=chunk)
+		if self.regular:
+			os.lseek(self.fd, 0, os.SEEK_SET)
+
+	def read(self):
+		"""
+		return the next symbols as a uint8 array, empty at end of input
+		"""
+		if self.stream is not None:
+			return self.stream.read()
+		if not self.regular:
+			return np.fromstring(os.read(self.fd, self.chunk), dtype=np.uint8)
+		size = os.fstat(self.fd).st_size
+		while self.follow and size <= self.pos:
+			time.sleep(self.poll)
+			size = os.fstat(self.fd).st_size
+		if size <= self.pos:
+			return np.zeros(0, dtype=np.uint8)
+		start = self.pos - self.pos % mmap.ALLOCATIONGRANULARITY
+		length = min(self.pos + self.chunk, size) - start
+		m = mmap.mmap(self.fd, length, access=mmap.ACCESS_READ, offset=start)
+		syms = np.frombuffer(m, dtype=np.uint8, offset=self.pos - start).copy()
+		m.close()
+		self.pos = start + length
+		return syms
+
+	def close(self):
+		if self.stream is not None:
+			self.stream.close()
+		if self.fd != sys.stdin.fileno():
+			os.close(self.fd)
@@ -1,4 +1,6 @@
 
+import numpy as np
+
 gly23127DecTbl = [
 	0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 147459, 
 	1, 2, 2, 3, 2, 3, 3, 4268035, 2, 3, 3, 1574915, 3, 2097155, 294915, 4099, 
@@ -152,3 +154,20 @@ def gly24128Dec (n) :
   correction = gly23127DecTbl[gly23127GetSyn(CW)]
   CW = (CW ^ correction) >> 11
   return CW, correction
+
+gly23127DecArr = np.array(gly23127DecTbl, dtype=np.int64)
+
+def gly23127GetSynArray (pattern) :
+  # gly23127GetSyn over an array of 23-bit patterns
+  pattern = np.array(pattern, dtype=np.int64)
+  for bit in xrange(22, 10, -1):
+    pattern ^= ((pattern >> bit) & 1) * (0xC75 << (bit - 11))
+  return pattern
+
+def gly23127DecArray (CW) :
+  correction = gly23127DecArr[gly23127GetSynArray(CW)]
+  CW = (CW ^ correction) >> 11
+  return CW, correction
+
+def gly24128DecArray (n) :
+  return gly23127DecArray(np.asarray(n, dtype=np.int64) >> 1)
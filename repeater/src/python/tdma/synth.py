@@ -0,0 +1,89 @@
+
+# P25 TDMA Decoder (C) Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Synthesize a stream of P25 TDMA symbols for testing and benchmarking
+
+Each superframe carries valid ISCH codewords (with the sync sequence in
+the last timeslot), valid DUIDs and random burst payloads.
+"""
+
+import numpy as np
+
+from bit_utils import *
+from isch import isch_map, mk_isch_lookup
+from duid import duid_map, mk_duid_lookup
+
+SUPERFRAME_LEN = 2160
+SYNC0 = 0x575d57f7ff
+
+def mk_isch_table():
+	if not isch_map:
+		mk_isch_lookup()
+	cw = {}
+	for k in isch_map:
+		cw[isch_map[k]] = int(k, 16)
+	return cw
+
+def mk_duid_table():
+	if not duid_map:
+		mk_duid_lookup()
+	cw = {}
+	for k in duid_map:
+		cw[duid_map[k]] = int(k, 2)
+	return cw
+
+def mk_superframes(count, isch_errors=0, seed=0):
+	"""
+	return an array of symbols holding count superframes, preceded by
+	a short run of noise.  isch_errors is the probability that any
+	given ISCH codeword carries a single bit error.
+	"""
+	rng = np.random.RandomState(seed)
+	icw = mk_isch_table()
+	dcw = mk_duid_table()
+	duids = [0, 3, 6, 9, 12, 15]
+	sync = bits_to_dibits(mk_array(SYNC0, 40))
+
+	lead = 100
+	syms = rng.randint(0, 4, lead + (count + 1) * SUPERFRAME_LEN).astype(np.uint8)
+	for sf in xrange(count):
+		base = lead + sf * SUPERFRAME_LEN
+		for j in xrange(12):
+			pos = base + j * 180
+			if j == 11:
+				syms[pos : pos + 20] = sync
+			else:
+				chn = j & 1
+				loc = 0
+				if j:
+					loc = 1 + ((j >> 1) % 3)
+				v = (chn << 5) + (loc << 3) + (sf & 3)
+				cw = icw[v]
+				if isch_errors and rng.random_sample() < isch_errors:
+					cw ^= 1L << rng.randint(0, 40)
+				syms[pos : pos + 20] = bits_to_dibits(mk_array(cw, 40))
+			d = dcw[duids[rng.randint(0, len(duids))]]
+			b = pos + 10
+			syms[b + 10] = (d >> 6) & 3
+			syms[b + 47] = (d >> 4) & 3
+			syms[b + 132] = (d >> 2) & 3
+			syms[b + 169] = d & 3
+	return syms
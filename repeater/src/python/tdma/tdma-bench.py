@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+# P25 TDMA Decoder (C) Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Measure tdma-decode.py throughput on a synthetic symbol file
+
+The file holds the requested number of hours of superframes at the
+6000 symbol/s TDMA rate (-H 200 is about 4 GB).  Output of the decoder
+is discarded.  The peak RSS of the decoder is reported as well; it
+should not depend on the length of the file.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import numpy as np
+from optparse import OptionParser
+
+from synth import mk_superframes, SUPERFRAME_LEN
+
+SYMBOL_RATE = 6000
+
+def mk_file(filename, hours, block=1000):
+	syms = mk_superframes(block, isch_errors=0.01)
+	lead = len(syms) - (block + 1) * SUPERFRAME_LEN
+	body = syms[lead : lead + block * SUPERFRAME_LEN]
+	total = int(hours * 3600 * SYMBOL_RATE) // SUPERFRAME_LEN
+	f = open(filename, 'wb')
+	syms[:lead].tofile(f)
+	for i in xrange(0, total, block):
+		body[: min(block, total - i) * SUPERFRAME_LEN].tofile(f)
+	syms[-SUPERFRAME_LEN:].tofile(f)
+	f.close()
+	return total
+
+def run(cmd):
+	"""
+	run cmd with its output discarded, returning its exit status and
+	peak RSS in kB
+	"""
+	devnull = open(os.devnull, 'w')
+	p = subprocess.Popen(cmd, stdout=devnull)
+	pid, status, rusage = os.wait4(p.pid, 0)
+	devnull.close()
+	return os.WEXITSTATUS(status), rusage.ru_maxrss
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-H", "--hours", type="float", default=2.0, help="length of the synthetic capture")
+	parser.add_option("-i", "--input-file", type="string", default=None, help="reuse or keep this symbol file")
+	parser.add_option("-v", "--verbose", action="store_true", default=False, help="benchmark the verbose output path")
+	(options, args) = parser.parse_args()
+
+	filename = options.input_file
+	if filename is None:
+		fd, filename = tempfile.mkstemp(suffix='.sym')
+		os.close(fd)
+	if options.input_file is None or not os.path.exists(filename):
+		t0 = time.time()
+		mk_file(filename, options.hours)
+		print 'generated %s in %.1f s' % (filename, time.time() - t0)
+	nsyms = os.path.getsize(filename)
+
+	cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tdma-decode.py'), '-i', filename]
+	if options.verbose:
+		cmd.append('-v')
+	t0 = time.time()
+	rc, rss = run(cmd)
+	elapsed = time.time() - t0
+	if options.input_file is None:
+		os.remove(filename)
+	assert rc == 0
+
+	print 'decoded %d symbols (%d superframes, %.2f hours) in %.2f s' % (nsyms, nsyms // SUPERFRAME_LEN, float(nsyms) / SYMBOL_RATE / 3600, elapsed)
+	print '%.0f symbols/s, %.0fx real time' % (nsyms / elapsed, nsyms / elapsed / SYMBOL_RATE)
+	print 'peak RSS %.1f MB' % (rss / 1024.0)
+
+if __name__ == "__main__":
+	main()
@@ -27,28 +27,165 @@ After FEC decoding, print the resulting "B" vectors (49 bits per CW).
 Optionally, dump the timeslot info (type, position, type of content)
 
 The input file must contain the demodulated symbols, one per character
-using the low-order two bits of each byte
+using the low-order two bits of each byte.  It is read in bounded chunks,
+so it may be arbitrarily large, a FIFO or stdin ("-"), or (with --follow)
+a file still being written by a demodulator.  After too many successive
+ISCH errors the decoder searches for sync again.
 """
 
 import sys
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from optparse import OptionParser
 
 from bit_utils import *
-from isch import mk_isch_lookup, decode_isch
-from duid import mk_duid_lookup, decode_duid
-from lfsr import mk_xor
-from vf import process_v
+from isch import mk_isch_lookup, decode_isch, nearest_isch, split_isch
+from duid import mk_duid_lookup, duid_names, extract_duid_array, nearest_duid
+from lfsr import mk_xor_array, load_xor_cache
+from reader import symbol_reader, CHUNK_LEN
+from vf import decode_vcw_array, format_vcw_array
 
 SUPERFRAME_LEN = 2160
+BLOCK_LEN = 1024	# superframes decoded per array operation
+
+def decode_superframes(symbols, start, count, xorsyms, errors, verbose, offset=0):
+	"""
+	decode count superframes beginning at symbols[start] and write
+	out the results
+
+	errors carries the count of successive ISCH errors across calls.
+	returns the updated count, above 6 if sync was lost, and the number
+	of superframes consumed.  offset is the stream position
+	of symbols[0], used in the verbose output.
+	"""
+	isch_syms = as_strided(symbols[start:], shape=(count, 12, 20), strides=(SUPERFRAME_LEN, 180, 1))
+	bursts = as_strided(symbols[start + 10:], shape=(count, 12, 180), strides=(SUPERFRAME_LEN, 180, 1))
+	isch, isch_conf = nearest_isch(isch_syms)
+	chn, loc, fr, cnt = split_isch(isch)
+
+	# length of the run of unknown ISCH codewords ending in each timeslot
+	slot = np.arange(count * 12)
+	last_ok = np.maximum.accumulate(np.where(chn.ravel() == -1, -1 - errors, slot))
+	run = (slot - last_ok)[11::12]
+	stop = np.flatnonzero(run > 6)
+	if len(stop):
+		count = stop[0] + 1
+		chn, loc, fr, cnt = chn[:count], loc[:count], fr[:count], cnt[:count]
+		isch_conf = isch_conf[:count]
+		bursts = bursts[:count]
+
+	duids = extract_duid_array(bursts)
+	types, duid_conf = nearest_duid(bursts)
+	# a burst is only as trustworthy as the less certain of its two codewords
+	conf = np.minimum(isch_conf, duid_conf)
+	voice = np.flatnonzero((types == 0) | (types == 6))
+	is_4v = types.ravel()[voice] == 0
+	burst_d = bursts.reshape(count * 12, 180)[voice] ^ xorsyms.reshape(12, 180)[voice % 12]
+	cws = np.concatenate([burst_d[:, 11:47], burst_d[:, 48:84], burst_d[:, 96:132], burst_d[:, 133:169]], axis=1)
+	cws = cws.reshape(len(voice), 4, 36)
+	have_cw = np.ones((len(voice), 4), dtype=bool)
+	have_cw[:, 2:] = is_4v[:, np.newaxis]
+	vcw = decode_vcw_array(dibits_to_bits(cws[have_cw]))
+
+	if not verbose:
+		sys.stdout.write(format_vcw_array(vcw))
+		return run[count - 1], count
+
+	n = 0
+	for k in xrange(count):
+		i = offset + start + k * SUPERFRAME_LEN
+		for j in xrange(12):
+			print '%s superframe %d timeslot %d %s' % ('=' * 20, i, j, '=' * 20)
+			if chn[k, j] == -1:
+				print 'unknown isch codeword at %d' % (i + (j*180))
+			elif chn[k, j] == -2:
+				print 'sync isch codeword found at %d' % (i + (j*180))
+			else:
+				print "channel %d loc %d fr %d count %d" % (chn[k, j], loc[k, j], fr[k, j], cnt[k, j])
+			print 'burst at %d type %s confidence %.2f' % (i + (j*180), duid_names[duids[k, j]], conf[k, j])
+			if types[k, j] == 0:
+				sys.stdout.write(format_vcw_array(vcw[n : n + 4]))
+				n += 4
+			elif types[k, j] == 6:
+				sys.stdout.write(format_vcw_array(vcw[n : n + 2]))
+				n += 2
+		if run[k] > 6:
+			print "too many successive errors, resyncing at i=%d" % (i)
+	return run[count - 1], count
+
+def find_superframe(symbols, eof):
+	"""
+	return the position of the first superframe start (an ISCH with
+	channel 0 location 0 following a sync sequence) in symbols, or -1
+	with the number of leading symbols that can be discarded
+	"""
+	sync0 = bits_to_dibits(mk_array(0x575d57f7ff,40))
+	pos = 0
+	while True:
+		sync_start = find_sym(sync0, symbols[pos:])
+		if sync_start < 0:
+			return -1, max(pos, len(symbols) - len(sync0))
+		sync_start += pos
+		if not eof and len(symbols) < sync_start + (180*31) + 20:
+			return -1, sync_start	# wait for the following timeslots
+		for i in xrange(sync_start, min(sync_start + (180*32), len(symbols) - 19), 180):
+			chn, loc, fr, cnt = decode_isch ( symbols [ i : i + 20 ])
+			if chn == 0 and loc == 0:
+				return i, i
+		pos = sync_start + 1
+
+def decode_stream(reader, xorsyms, verbose):
+	"""
+	decode the symbols from reader, holding at most one chunk plus a
+	few superframes in memory
+	"""
+	symbols = np.zeros(0, dtype=np.uint8)
+	offset = 0		# stream position of symbols[0]
+	superframe = -1		# start of the next superframe in symbols, -1 if not in sync
+	errors = 0
+	eof = False
+	while not eof:
+		chunk = reader.read()
+		eof = len(chunk) == 0
+		symbols = np.concatenate([symbols, chunk])
+		while True:
+			if superframe < 0:
+				superframe, drop = find_superframe(symbols, eof)
+				symbols = symbols[drop:]
+				offset += drop
+				if superframe < 0:
+					break
+				superframe = 0
+				errors = 0
+			# every superframe needs its 10 trailing symbols as well
+			nsf = (len(symbols) - superframe - 10) // SUPERFRAME_LEN
+			done = 0
+			for k in xrange(0, nsf, BLOCK_LEN):
+				count = min(BLOCK_LEN, nsf - k)
+				errors, n = decode_superframes(symbols, superframe + k * SUPERFRAME_LEN, count, xorsyms, errors, verbose, offset)
+				done += n
+				if errors > 6:
+					break
+			drop = superframe + done * SUPERFRAME_LEN
+			symbols = symbols[drop:]
+			offset += drop
+			if errors <= 6:
+				superframe = 0
+				break
+			superframe = -1		# lost sync, search again
+		symbols = symbols.copy()	# release the chunk it was sliced from
+		sys.stdout.flush()
 
 def main():
         parser = OptionParser()
         parser.add_option("-v", "--verbose", action="store_true", default=False)
-        parser.add_option("-i", "--input-file", type="string", default=None, help="input file name")
+        parser.add_option("-i", "--input-file", type="string", default=None, help="input file name, - for stdin")
+        parser.add_option("-f", "--follow", action="store_true", default=False, help="keep reading as the input file grows")
+        parser.add_option("-c", "--chunk", type="int", default=CHUNK_LEN, help="symbols read at a time")
         parser.add_option("-n", "--nac", type="int", default=0, help="NAC")
         parser.add_option("-s", "--sysid", type="int", default=0, help="sysid")
         parser.add_option("-w", "--wacn", type="int", default=0, help="WACN")
+        parser.add_option("-x", "--xor-cache", type="string", default=None, help="precomputed descrambling mask file (see lfsr.py)")
         (options, args) = parser.parse_args()
         if len(args) != 0:
             parser.print_help()
@@ -58,57 +195,13 @@ def main():
 	mk_isch_lookup()
 	mk_duid_lookup()
 	#print 'nac: %d' % options.nac
-	xorsyms = mk_xor(options.nac, options.sysid, options.wacn)
-
-	d = open(file).read()
-
-	symbols = []
-	for c in d:
-		symbols.append(ord(c))
-
-	sync0= bits_to_dibits(mk_array(0x575d57f7ff,40))
-	sync_start = find_sym(sync0, symbols)
-	assert sync_start > 0	# unable to locate any sync sequence
-	superframe = -1
-	for i in xrange(sync_start, sync_start + (180*32), 180):
-		chn, loc, fr, cnt = decode_isch ( symbols [ i : i + 20 ])
-		if chn == 0 and loc == 0:
-			superframe = i
-			break
-	assert superframe > 0	# unable to locate start of superframe
-
-	errors = 0
-	for i in xrange(superframe,len(symbols)-SUPERFRAME_LEN,SUPERFRAME_LEN):
-		syms1 = symbols[i + 10: i + SUPERFRAME_LEN + 10]
-		syms2 = np.array(syms1) ^ xorsyms
-		for j in xrange(12):
-			if options.verbose:
-				print '%s superframe %d timeslot %d %s' % ('=' * 20, i, j, '=' * 20)
-			chn, loc, fr, cnt = decode_isch ( symbols [ i + (j*180) : i + (j*180) + 20 ])
-			if chn == -1:
-				if options.verbose:
-					print 'unknown isch codeword at %d' % (i + (j*180))
-				errors += 1
-			elif chn == -2:
-				if options.verbose:
-					print 'sync isch codeword found at %d' % (i + (j*180))
-				errors = 0
-			else:
-				if options.verbose:
-					print "channel %d loc %d fr %d count %d" % (chn, loc, fr, cnt)
-				errors = 0
+	if options.xor_cache:
+		load_xor_cache(options.xor_cache)
+	xorsyms = mk_xor_array(options.nac, options.sysid, options.wacn)
 
-			burst = syms1 [ (j*180) : (j*180) + 180 ]
-			burst_d= syms2 [ (j*180) : (j*180) + 180 ]
-			b = decode_duid(burst)
-			if options.verbose:
-				print 'burst at %d type %s' % (i + (j*180), b)
-			if b == '2v' or b == '4v':
-				process_v(burst_d, b)
-		if errors > 6:
-			if options.verbose:
-				print "too many successive errors, exiting at i=%d" % (i)
-			break
+	reader = symbol_reader(file, chunk=options.chunk, follow=options.follow)
+	decode_stream(reader, xorsyms, options.verbose)
+	reader.close()
 
 if __name__ == "__main__":
 	main()
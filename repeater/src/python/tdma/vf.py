@@ -22,9 +22,18 @@ import sys
 import numpy as np
 
 from bit_utils import *
-from rs import gly23127Dec, gly24128Dec
+from rs import gly23127Dec, gly24128Dec, gly23127DecArray, gly24128DecArray
 
-def process_vcw(vf):
+def mk_pn(u0):
+	pr = [0] * 24
+	m1 = [0] * 23
+	pr[0] = 16 * u0
+	for n in xrange(1,24):
+		pr[n] = (173*pr[n-1] + 13849) - 65536 * int((173*pr[n-1]+13849)/65536)
+		m1[n-1] = int(pr[n] / 32768) & 1
+	return mk_int(m1)
+
+def decode_vcw(vf):
 	c0, c1, c2, c3 = extract_vcw(vf)
 	c0 = mk_int(c0)
 	c0 = rev_int(c0, 24)
@@ -35,14 +44,8 @@ def process_vcw(vf):
 	c3 = mk_int(c3)
 	c3 = rev_int(c3, 14)
 	u0, correction0 = gly24128Dec(c0)
-	pr = [0] * 24
-	m1 = [0] * 23
-	pr[0] = 16 * u0
-	for n in xrange(1,24):
-		pr[n] = (173*pr[n-1] + 13849) - 65536 * int((173*pr[n-1]+13849)/65536)
-		m1[n-1] = int(pr[n] / 32768) & 1
-	m1 = mk_int(m1)
-	
+	m1 = mk_pn(u0)
+
 	u1, correction1 = gly23127Dec(c1 ^ m1)
 	u2 = c2
 	u3 = c3
@@ -56,6 +59,10 @@ def process_vcw(vf):
 	b[6] = ((u2 >> 3) & 0x0e) + ((u3 >> 3) & 0x1)
 	b[7] = ( u2       & 0x0e) + ((u3 >> 2) & 0x1)
 	b[8] = ((u2 << 2) & 0x04) + ( u3       & 0x3)
+	return b
+
+def process_vcw(vf):
+	b = decode_vcw(vf)
 	s = "\t".join(['%s' % x for x in b])
 	print "%s" % s
 
@@ -151,3 +158,36 @@ def extract_vcw(vf):
 	c3[0] = vf[71]
 
 	return c0, c1, c2, c3
+
+# bit positions of c0..c3 within a 72-bit voice codeword, LSB first
+# (the order left after mk_int() and rev_int() in decode_vcw)
+vcw_bits = [np.array(c) for c in extract_vcw(range(72))]
+vcw_weights = [np.int64(1) << np.arange(len(c), dtype=np.int64) for c in vcw_bits]
+pn_table = np.array([mk_pn(u0) for u0 in xrange(4096)], dtype=np.int64)
+
+def decode_vcw_array(vf):
+	"""
+	decode_vcw() over an array of shape (n, 72) codeword bits
+
+	returns an (n, 9) array holding the B vectors
+	"""
+	vf = np.asarray(vf, dtype=np.int64) & 1
+	c0, c1, c2, c3 = [np.dot(vf[:, bits], w) for bits, w in zip(vcw_bits, vcw_weights)]
+	u0, correction0 = gly24128DecArray(c0)
+	u1, correction1 = gly23127DecArray(c1 ^ pn_table[u0])
+	u2 = c2
+	u3 = c3
+	b = np.empty((len(vf), 9), dtype=np.int64)
+	b[:, 0] = ((u0 >> 5) & 0x78) + ((u3 >> 9) & 0x7)
+	b[:, 1] = ((u0 >> 3) & 0x1e) + ((u3 >> 13) & 0x1)
+	b[:, 2] = ((u0 << 1) & 0x1e) + ((u3 >> 12) & 0x1)
+	b[:, 3] = ((u1 >> 3) & 0x1fe) + ((u3 >> 8) & 0x1)
+	b[:, 4] = ((u1 << 3) & 0x78) + ((u3 >> 5) & 0x7)
+	b[:, 5] = ((u2 >> 6) & 0x1e) + ((u3 >> 4) & 0x1)
+	b[:, 6] = ((u2 >> 3) & 0x0e) + ((u3 >> 3) & 0x1)
+	b[:, 7] = ( u2       & 0x0e) + ((u3 >> 2) & 0x1)
+	b[:, 8] = ((u2 << 2) & 0x04) + ( u3       & 0x3)
+	return b
+
+def format_vcw_array(b):
+	return ''.join(['%s\n' % "\t".join(['%s' % x for x in row]) for row in b.tolist()])
@@ -1,5 +1,12 @@
 
-def crc16(dat,len):	# slow version
+import time
+import struct
+import threading
+import numpy as np
+
+TSBK_CACHE_SIZE = 1024	# distinct TSBKs whose decoded fields are kept
+
+def crc16_slow(dat,len):	# slow version
         poly = (1<<12) + (1<<5) + (1<<0)
         crc = 0
         for i in range(len):
@@ -12,14 +19,116 @@ def crc16(dat,len):	# slow version
         crc = crc ^ 0xffff
         return crc
 
+def mk_crc16_table():
+	# remainder of (h << 16) for each possible top byte h of the register
+	table = []
+	for h in range(256):
+		table.append(crc16_slow(h << 16, 3) ^ 0xffff)
+	return table
+
+crc16_table = mk_crc16_table()
+
+def crc16(dat,len):	# same result as crc16_slow, a byte at a time
+	crc = 0
+	for i in range(len):
+		crc = crc16_table[crc >> 8] ^ (((crc & 0xff) << 8) | ((dat >> (((len-1)-i)*8)) & 0xff))
+	return crc ^ 0xffff
+
+def crc16_array(tsbks):
+	"""
+	crc16() of each row of an array of bytes, shape (n, len)
+	"""
+	table = np.array(crc16_table, dtype=np.uint32)
+	crc = np.zeros(len(tsbks), dtype=np.uint32)
+	for i in range(tsbks.shape[1]):
+		crc = table[crc >> 8] ^ (((crc & 0xff) << 8) | tsbks[:, i])
+	return crc ^ 0xffff
+
+# fields of each decoded TSBK opcode: (name, shift, mask), with the
+# shift counted from the LSB of the 96-bit TSBK including its crc
+tsbk_fields = {
+	0x00: [('opts', 72, 0xff), ('ch1', 56, 0xffff), ('ga1', 40, 0xffff), ('sa', 16, 0xffffff)],
+	0x02: [('ch1', 64, 0xffff), ('ga1', 48, 0xffff), ('ch2', 32, 0xffff), ('ga2', 16, 0xffff)],
+	0x16: [('ch1', 48, 0xffff), ('ch2', 32, 0xffff)],
+	0x34: [('iden', 76, 0xf), ('bw', 72, 0xf), ('toff', 58, 0x3fff), ('spac', 48, 0x3ff), ('freq', 16, 0xffffffff)],
+	0x39: [('rfid', 72, 0xff), ('stid', 64, 0xff), ('ch1', 48, 0xffff), ('ch2', 24, 0xffff)],
+	0x3a: [('syid', 56, 0xfff), ('rfid', 48, 0xff), ('stid', 40, 0xff), ('ch1', 24, 0xffff)],
+	0x3b: [('wacn', 52, 0xfffff), ('syid', 40, 0xfff), ('ch1', 24, 0xffff)],
+	0x3c: [('rfid', 48, 0xff), ('stid', 40, 0xff), ('ch1', 24, 0xffff)],
+	0x3d: [('iden', 76, 0xf), ('bw', 67, 0x1ff), ('toff', 58, 0x1ff), ('spac', 48, 0x3ff), ('freq', 16, 0xffffffff)],
+}
+
+def mk_crc32_table():
+	table = []
+	for i in range(256):
+		crc = i << 24
+		for j in range(8):
+			crc <<= 1
+			if crc & 0x100000000:
+				crc ^= 0x104c11db7
+		table.append(crc)
+	return table
+
+crc32_table = mk_crc32_table()
+
+def crc32(s):	# packet crc over a string of bytes
+	crc = 0
+	for c in s:
+		crc = ((crc << 8) & 0xffffffff) ^ crc32_table[(crc >> 24) ^ ord(c)]
+	return crc ^ 0xffffffff
+
+tsbk_field_names = ['ch1', 'ch2', 'ga1', 'ga2', 'iden', 'bw', 'toff', 'spac', 'freq', 'syid', 'rfid', 'stid', 'wacn', 'opts', 'sa']
+tsbk_dtype = np.dtype([('opcode', np.uint8), ('crc_ok', np.bool_)] + [(name, np.int64) for name in tsbk_field_names])
+
+def decode_tsbk_array(tsbks):
+	"""
+	decode an array of TSBKs, shape (n, 12) bytes including the crc,
+	into a record array of tsbk_dtype
+
+	fields not carried by a record's opcode are left zero, as are all
+	fields of opcodes not in tsbk_fields
+	"""
+	tsbks = np.asarray(tsbks, dtype=np.uint8).reshape(-1, 12)
+	recs = np.zeros(len(tsbks), dtype=tsbk_dtype)
+	recs['opcode'] = tsbks[:, 0] & 0x3f
+	recs['crc_ok'] = crc16_array(tsbks) == 0
+	# the top 32 and bottom 64 bits of each tsbk
+	w = tsbks.astype(np.uint64)
+	hi = (w[:, 0] << 24) | (w[:, 1] << 16) | (w[:, 2] << 8) | w[:, 3]
+	lo = np.zeros(len(tsbks), dtype=np.uint64)
+	for i in range(4, 12):
+		lo = (lo << np.uint64(8)) | w[:, i]
+	for opcode in tsbk_fields:
+		sel = recs['opcode'] == opcode
+		if not sel.any():
+			continue
+		h = hi[sel]
+		l = lo[sel]
+		for name, shift, mask in tsbk_fields[opcode]:
+			if shift >= 64:
+				v = h >> np.uint64(shift - 64)
+			elif mask >> (64 - shift):
+				v = (l >> np.uint64(shift)) | (h << np.uint64(64 - shift))
+			else:
+				v = l >> np.uint64(shift)
+			recs[name][sel] = (v & np.uint64(mask)).astype(np.int64)
+	return recs
+
 class trunked_system (object):
-    def __init__(self, debug=0, frequency_set=None):
+    def __init__(self, debug=0, frequency_set=None, grant_set=None):
+	"""
+	frequency_set(frequency) is called with the channel of each voice
+	grant, grant_set(frequency, tgid, update) with every talkgroup
+	granted or (update True) confirmed by a grant update
+	"""
 	self.debug = debug
 	self.frequency_set = frequency_set
+	self.grant_set = grant_set
 	self.freq_table = {}
 	self.stats = {}
 	self.stats['tsbks'] = 0
 	self.stats['crc'] = 0
+	self.stats['mbts'] = 0
 	self.tsbk_cache = {}
 	self.secondary = {}
 	self.adjacent = {}
@@ -31,6 +140,17 @@ class trunked_system (object):
 	self.ns_syid = 0
 	self.ns_wacn = 0
 	self.ns_chan = 0
+	self.tsbk_handlers = {
+		0x00: self.tsbk_grant,
+		0x02: self.tsbk_grant_update,
+		0x16: self.tsbk_sndcp,
+		0x34: self.tsbk_iden_up_vu,
+		0x39: self.tsbk_secondary_cc,
+		0x3a: self.tsbk_rfss_status,
+		0x3b: self.tsbk_net_status,
+		0x3c: self.tsbk_adjacent,
+		0x3d: self.tsbk_iden_up,
+	}
 
     def to_string(self):
         s = []
@@ -40,7 +160,7 @@ class trunked_system (object):
             c = self.freq_table[table]['offset'] / 1000000.0
             s.append('tbl-id: %x frequency: %f step %f offset %f' % ( table, a,b,c))
             #self.freq_table[table]['frequency'] / 1000000.0, self.freq_table[table]['step'] / 1000000.0, self.freq_table[table]['offset']) / 1000000.0)
-        s.append('stats: tsbks %d crc %d' % (self.stats['tsbks'], self.stats['crc']))
+        s.append('stats: tsbks %d mbts %d crc %d' % (self.stats['tsbks'], self.stats['mbts'], self.stats['crc']))
         s.append('secondary control channel(s): %s' % ','.join(['%f' % (float(k) / 1000000.0) for k in self.secondary.keys()]))
         for f in self.adjacent:
             s.append('adjacent %f: %s' % (float(f) / 1000000.0, self.adjacent[f]))
@@ -61,39 +181,111 @@ class trunked_system (object):
 	channel = id & 0xfff
 	if table not in self.freq_table:
 		return "%x-%d" % (table, channel)
-	return "%f" % (self.freq_table[table]['frequency'] + self.freq_table[table]['step'] * channel) / 1000000.0
+	return "%f" % ((self.freq_table[table]['frequency'] + self.freq_table[table]['step'] * channel) / 1000000.0)
 
     def decode_mbt_data(self, opcode, header, mbt_data):
+	"""
+	header is the 96-bit MBT header (crc in the low 16 bits, which are
+	not used), mbt_data the 64 bits of the first data block less the
+	packet crc
+	"""
 	# print "decode_mbt_data: %x %x" %(opcode, mbt_data)
+	self.stats['mbts'] += 1
+	syid = (header >> 48) & 0xfff
 	if opcode == 0x0:  # grp voice channel grant
+		opts = (header >> 24) & 0xff
 		ch1  = (mbt_data >> 32) & 0xffff
 		ch2  = (mbt_data >> 16) & 0xffff
 		ga   = (mbt_data      ) & 0xffff
+		if self.frequency_set:
+			frequency = self.channel_id_to_frequency(ch1)
+			if frequency:
+				self.frequency_set(frequency)
+		self.grant(ch1, ga, False)
 		if self.debug > 10:
-			print "mbt00 voice grant ch1 %x ch2 %x addr 0x%x" %(ch1, ch2, ga)
+			print "mbt00 voice grant opts %x ch1 %x(%s) ch2 %x(%s) addr 0x%x" %(opts, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2), ga)
 	elif opcode == 0x3c:  # adjacent status
 		rfid = (header >> 24) & 0xff
 		stid = (header >> 16) & 0xff
 		ch1  = (mbt_data >> 48) & 0xffff
 		ch2  = (mbt_data >> 32) & 0xffff
+		f1 = self.channel_id_to_frequency(ch1)
+		if f1:
+			self.adjacent[f1] = 'rfid: %x stid:%x' % (rfid, stid)
 		if self.debug > 10:
-			print "mbt3c adjacent rfid %x stid %x ch1 %x ch2 %x" %(rfid, stid, ch1, ch2)
+			print "mbt3c adjacent sysid %x rfid %x stid %x ch1 %x(%s) ch2 %x(%s)" %(syid, rfid, stid, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2))
 	elif opcode == 0x3b:  # network status
 		wacn = (mbt_data >> 44) & 0xfffff
 		ch1  = (mbt_data >> 24) & 0xffff
 		ch2  = (mbt_data >> 8) & 0xffff
+		f1 = self.channel_id_to_frequency(ch1)
+		if f1:
+			self.ns_syid = syid
+			self.ns_wacn = wacn
+			self.ns_chan = f1
 		if self.debug > 10:
-			print "mbt3b net stat wacn %x ch1 %x ch2 %x" %(wacn, ch1, ch2)
+			print "mbt3b net stat sysid %x wacn %x ch1 %x(%s) ch2 %x(%s)" %(syid, wacn, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2))
 	elif opcode == 0x3a:  # rfss status
 		rfid = (mbt_data >> 56) & 0xff
 		stid = (mbt_data >> 48) & 0xff
 		ch1  = (mbt_data >> 32) & 0xffff
 		ch2  = (mbt_data >> 16) & 0xffff
+		f1 = self.channel_id_to_frequency(ch1)
+		f2 = self.channel_id_to_frequency(ch2)
+		if f1 and f2:
+			self.rfss_syid = syid
+			self.rfss_rfid = rfid
+			self.rfss_stid = stid
+			self.rfss_chan = f1
+			self.rfss_txchan = f2
 		if self.debug > 10:
-			print "mbt3a rfss stat rfid %x stid %x ch1 %x ch2 %x" %(rfid, stid, ch1, ch2)
+			print "mbt3a rfss stat sysid %x rfid %x stid %x ch1 %x(%s) ch2 %x(%s)" %(syid, rfid, stid, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2))
+	elif opcode == 0x34 or opcode == 0x3d:  # identifier updates
+		# the data block carries the same fields as the TSBK arguments
+		tsbk = (opcode << 88) | ((mbt_data & 0xffffffffffffffffL) << 16)
+		f = {}
+		for name, shift, mask in tsbk_fields[opcode]:
+			f[name] = (tsbk >> shift) & mask
+		self.tsbk_handlers[opcode](f)
 	#else:
 	#	print "mbt other %x" % opcode
 
+    def decode_pdu(self, pdu):
+	"""
+	decode a PDU message from the frame assembler: the 10-byte header
+	(less crc) followed by its 12-byte data blocks, as a string.
+	Alternate MBTs are passed to decode_mbt_data(); returns False for
+	any other PDU or a packet crc error.
+	"""
+	header = int(pdu[:10].encode('hex'), 16) << 16
+	fmt    = (header >> 88) & 0x1f
+	sap    = (header >> 80) & 0x3f
+	blocks = (header >> 40) & 0x7f
+	opcode = (header >> 32) & 0x3f
+	data = pdu[10:]
+	if fmt != 0x17 or (sap != 0x3d and sap != 0x3f) or blocks == 0 or len(data) != blocks * 12:
+		return False
+	if crc32(data[:-4]) != int(data[-4:].encode('hex'), 16):
+		self.stats['crc'] += 1
+		return False
+	self.decode_mbt_data(opcode, header, int(data[:8].encode('hex'), 16))
+	return True
+
+    def decode_data_unit(self, duid, body):
+	"""
+	decode the body of a TSBK (duid 7) or PDU (duid 12) message from
+	the frame assembler, without the NAC; returns False for the other
+	data units
+	"""
+	if duid == 7:
+		hi, lo = struct.unpack('>HQ', body[:10])
+		self.decode_tsbk((hi << 64) | lo)
+	elif duid == 12:	# header and data blocks of a PDU
+		self.decode_pdu(body)
+	else:
+		return False
+	return True
+
     def decode_tsbk(self, tsbk):
 	self.stats['tsbks'] += 1
 #	if crc16(tsbk, 12) != 0:
@@ -103,104 +295,330 @@ class trunked_system (object):
 	opcode = (tsbk >> 88) & 0x3f
 	if self.debug > 10:
 		print "TSBK: 0x%02x 0x%024x" % (opcode, tsbk)
-	if opcode == 0x02:   # group voice chan grant update
-		ch1  = (tsbk >> 64) & 0xffff
-		ga1  = (tsbk >> 48) & 0xffff
-		ch2  = (tsbk >> 32) & 0xffff
-		ga2  = (tsbk >> 16) & 0xffff
-		if self.frequency_set:
-			frequency = self.channel_id_to_frequency(ch1)
-			if frequency:
-				self.frequency_set(frequency)
-		if self.debug > 10:
-			print "tsbk02 grant update: chan %s %d %s %d" %(self.channel_id_to_string(ch1), ga1, self.channel_id_to_string(ch2), ga2)
-	elif opcode == 0x16:   # sndcp data ch
-		ch1  = (tsbk >> 48) & 0xffff
-		ch2  = (tsbk >> 32) & 0xffff
-		if self.debug > 10:
-			print "tsbk16 sndcp data ch: chan %x %x" %(ch1, ch2)
-	elif opcode == 0x34:   # iden_up vhf uhf
-		iden = (tsbk >> 76) & 0xf
-		bwvu = (tsbk >> 72) & 0xf
-		toff0 = (tsbk >> 58) & 0x3fff
-		spac = (tsbk >> 48) & 0x3ff
-		freq = (tsbk >> 16) & 0xffffffff
-		toff_sign = (toff0 >> 13) & 1
-		toff = toff0 & 0x1fff
-		if toff_sign == 0:
-			toff = 0 - toff
-		txt = ["mob Tx-", "mob Tx+"]
-		self.freq_table[iden] = {}
-		self.freq_table[iden]['offset'] = toff * spac * 125
-		self.freq_table[iden]['step'] = spac * 125
-		self.freq_table[iden]['frequency'] = freq * 5
-		if self.debug > 10:
-			print "tsbk34 iden vhf/uhf id %d toff %f spac %f freq %f [%s]" % (iden, toff * spac * 0.125 * 1e-3, spac * 0.125, freq * 0.000005, txt[toff_sign])
-	elif opcode == 0x3d:   # iden_up
-		iden = (tsbk >> 76) & 0xf
-		bw   = (tsbk >> 67) & 0x1ff
-		toff0 = (tsbk >> 58) & 0x1ff
-		spac = (tsbk >> 48) & 0x3ff
-		freq = (tsbk >> 16) & 0xffffffff
-		toff_sign = (toff0 >> 8) & 1
-		toff = toff0 & 0xff
-		if toff_sign == 0:
-			toff = 0 - toff
-		txt = ["mob xmit < recv", "mob xmit > recv"]
-		self.freq_table[iden] = {}
-		self.freq_table[iden]['offset'] = toff * 250000
-		self.freq_table[iden]['step'] = spac * 125
-		self.freq_table[iden]['frequency'] = freq * 5
-		if self.debug > 10:
-			print "tsbk3d iden id %d toff %f spac %f freq %f" % (iden, toff * 0.25, spac * 0.125, freq * 0.000005)
-	elif opcode == 0x3a:   # rfss status
-		syid = (tsbk >> 56) & 0xfff
-		rfid = (tsbk >> 48) & 0xff
-		stid = (tsbk >> 40) & 0xff
-		chan = (tsbk >> 24) & 0xffff
-		f1 = self.channel_id_to_frequency(chan)
-		if f1:
-			self.rfss_syid = syid
-			self.rfss_rfid = rfid
-			self.rfss_stid = stid
-			self.rfss_chan = f1
-			self.rfss_txchan = f1 + self.freq_table[chan >> 12]['offset']
-		if self.debug > 10:
-			print "tsbk3a rfss status: syid: %x rfid %x stid %d ch1 %x(%s)" %(syid, rfid, stid, chan, self.channel_id_to_string(chan))
-	elif opcode == 0x39:   # secondary cc
-		rfid = (tsbk >> 72) & 0xff
-		stid = (tsbk >> 64) & 0xff
-		ch1  = (tsbk >> 48) & 0xffff
-		ch2  = (tsbk >> 24) & 0xffff
-		f1 = self.channel_id_to_frequency(ch1)
-		f2 = self.channel_id_to_frequency(ch2)
-		if f1 and f2:
-			self.secondary[ f1 ] = 1
-			self.secondary[ f2 ] = 1
-		if self.debug > 10:
-			print "tsbk39 secondary cc: rfid %x stid %d ch1 %x(%s) ch2 %x(%s)" %(rfid, stid, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2))
-	elif opcode == 0x3b:   # network status
-		wacn = (tsbk >> 52) & 0xfffff
-		syid = (tsbk >> 40) & 0xfff
-		ch1  = (tsbk >> 24) & 0xffff
-		f1 = self.channel_id_to_frequency(ch1)
-		if f1:
-			self.ns_syid = syid
-			self.ns_wacn = wacn
-			self.ns_chan = f1
-		if self.debug > 10:
-			print "tsbk3b net stat: wacn %x syid %x ch1 %x(%s)" %(wacn, syid, ch1, self.channel_id_to_string(ch1))
-	elif opcode == 0x3c:   # adjacent status
-		rfid = (tsbk >> 48) & 0xff
-		stid = (tsbk >> 40) & 0xff
-		ch1  = (tsbk >> 24) & 0xffff
-		f1 = self.channel_id_to_frequency(ch1)
-		if f1:
-			self.adjacent[f1] = 'rfid: %x stid:%x' % (rfid, stid)
+	if opcode not in tsbk_fields:
+		#print "tsbk other %x" % opcode
+		return
+	# a control channel repeats the same few TSBKs over and over
+	f = self.tsbk_cache.get(tsbk)
+	if f is None:
+		if len(self.tsbk_cache) >= TSBK_CACHE_SIZE:
+			self.tsbk_cache = {}
+		f = {}
+		for name, shift, mask in tsbk_fields[opcode]:
+			f[name] = (tsbk >> shift) & mask
+		self.tsbk_cache[tsbk] = f
+	self.tsbk_handlers[opcode](f)
+
+    def decode_tsbks(self, tsbks):
+	"""
+	decode an array of TSBKs, shape (n, 12) bytes including the crc,
+	updating the system state as decode_tsbk() would for each one that
+	passes its crc check.  returns the decode_tsbk_array() records.
+	"""
+	recs = decode_tsbk_array(tsbks)
+	self.stats['tsbks'] += len(recs)
+	self.stats['crc'] += int((~recs['crc_ok']).sum())
+	known = np.zeros(len(recs), dtype=bool)
+	for opcode in tsbk_fields:
+		known |= recs['opcode'] == opcode
+	names = ['opcode'] + tsbk_field_names
+	for r in recs[names][recs['crc_ok'] & known].tolist():
+		f = dict(zip(tsbk_field_names, r[1:]))
 		if self.debug > 10:
-			print "tsbk3c adjacent: rfid %x stid %d ch1 %x(%s)" %(rfid, stid, ch1, self.channel_id_to_string(ch1))
-	#else:
-	#	print "tsbk other %x" % opcode
+			print "TSBK: 0x%02x" % r[0]
+		self.tsbk_handlers[r[0]](f)
+	return recs
+
+    def grant(self, ch, tgid, update):
+	if not self.grant_set:
+		return
+	frequency = self.channel_id_to_frequency(ch)
+	if frequency:
+		self.grant_set(frequency, tgid, update)
+
+    def tsbk_grant(self, f):   # 0x00 group voice chan grant
+	ch1, ga1 = f['ch1'], f['ga1']
+	if self.frequency_set:
+		frequency = self.channel_id_to_frequency(ch1)
+		if frequency:
+			self.frequency_set(frequency)
+	self.grant(ch1, ga1, False)
+	if self.debug > 10:
+		print "tsbk00 grant: opts %x chan %s ga %d sa %d" %(f['opts'], self.channel_id_to_string(ch1), ga1, f['sa'])
+
+    def tsbk_grant_update(self, f):   # 0x02 group voice chan grant update
+	ch1, ga1, ch2, ga2 = f['ch1'], f['ga1'], f['ch2'], f['ga2']
+	if self.frequency_set:
+		frequency = self.channel_id_to_frequency(ch1)
+		if frequency:
+			self.frequency_set(frequency)
+	self.grant(ch1, ga1, True)
+	if ch2 != ch1 or ga2 != ga1:
+		self.grant(ch2, ga2, True)
+	if self.debug > 10:
+		print "tsbk02 grant update: chan %s %d %s %d" %(self.channel_id_to_string(ch1), ga1, self.channel_id_to_string(ch2), ga2)
+
+    def tsbk_sndcp(self, f):   # 0x16 sndcp data ch
+	if self.debug > 10:
+		print "tsbk16 sndcp data ch: chan %x %x" %(f['ch1'], f['ch2'])
+
+    def tsbk_iden_up_vu(self, f):   # 0x34 iden_up vhf uhf
+	iden, toff0, spac, freq = f['iden'], f['toff'], f['spac'], f['freq']
+	toff_sign = (toff0 >> 13) & 1
+	toff = toff0 & 0x1fff
+	if toff_sign == 0:
+		toff = 0 - toff
+	txt = ["mob Tx-", "mob Tx+"]
+	self.freq_table[iden] = {}
+	self.freq_table[iden]['offset'] = toff * spac * 125
+	self.freq_table[iden]['step'] = spac * 125
+	self.freq_table[iden]['frequency'] = freq * 5
+	if self.debug > 10:
+		print "tsbk34 iden vhf/uhf id %d toff %f spac %f freq %f [%s]" % (iden, toff * spac * 0.125 * 1e-3, spac * 0.125, freq * 0.000005, txt[toff_sign])
+
+    def tsbk_iden_up(self, f):   # 0x3d iden_up
+	iden, toff0, spac, freq = f['iden'], f['toff'], f['spac'], f['freq']
+	toff_sign = (toff0 >> 8) & 1
+	toff = toff0 & 0xff
+	if toff_sign == 0:
+		toff = 0 - toff
+	txt = ["mob xmit < recv", "mob xmit > recv"]
+	self.freq_table[iden] = {}
+	self.freq_table[iden]['offset'] = toff * 250000
+	self.freq_table[iden]['step'] = spac * 125
+	self.freq_table[iden]['frequency'] = freq * 5
+	if self.debug > 10:
+		print "tsbk3d iden id %d toff %f spac %f freq %f" % (iden, toff * 0.25, spac * 0.125, freq * 0.000005)
+
+    def tsbk_rfss_status(self, f):   # 0x3a rfss status
+	syid, rfid, stid, chan = f['syid'], f['rfid'], f['stid'], f['ch1']
+	f1 = self.channel_id_to_frequency(chan)
+	if f1:
+		self.rfss_syid = syid
+		self.rfss_rfid = rfid
+		self.rfss_stid = stid
+		self.rfss_chan = f1
+		self.rfss_txchan = f1 + self.freq_table[chan >> 12]['offset']
+	if self.debug > 10:
+		print "tsbk3a rfss status: syid: %x rfid %x stid %d ch1 %x(%s)" %(syid, rfid, stid, chan, self.channel_id_to_string(chan))
+
+    def tsbk_secondary_cc(self, f):   # 0x39 secondary cc
+	rfid, stid, ch1, ch2 = f['rfid'], f['stid'], f['ch1'], f['ch2']
+	f1 = self.channel_id_to_frequency(ch1)
+	f2 = self.channel_id_to_frequency(ch2)
+	if f1 and f2:
+		self.secondary[ f1 ] = 1
+		self.secondary[ f2 ] = 1
+	if self.debug > 10:
+		print "tsbk39 secondary cc: rfid %x stid %d ch1 %x(%s) ch2 %x(%s)" %(rfid, stid, ch1, self.channel_id_to_string(ch1), ch2, self.channel_id_to_string(ch2))
+
+    def tsbk_net_status(self, f):   # 0x3b network status
+	wacn, syid, ch1 = f['wacn'], f['syid'], f['ch1']
+	f1 = self.channel_id_to_frequency(ch1)
+	if f1:
+		self.ns_syid = syid
+		self.ns_wacn = wacn
+		self.ns_chan = f1
+	if self.debug > 10:
+		print "tsbk3b net stat: wacn %x syid %x ch1 %x(%s)" %(wacn, syid, ch1, self.channel_id_to_string(ch1))
+
+    def tsbk_adjacent(self, f):   # 0x3c adjacent status
+	rfid, stid, ch1 = f['rfid'], f['stid'], f['ch1']
+	f1 = self.channel_id_to_frequency(ch1)
+	if f1:
+		self.adjacent[f1] = 'rfid: %x stid:%x' % (rfid, stid)
+	if self.debug > 10:
+		print "tsbk3c adjacent: rfid %x stid %d ch1 %x(%s)" %(rfid, stid, ch1, self.channel_id_to_string(ch1))
+
+class trunked_states (object):
+    ACQ = 0
+    CC = 1
+    TO_VC = 2
+    VC = 3
+    TO_CC = 4
+
+class trunk_follower (object):
+    """
+    follow voice grants from a control channel.  tune(frequency) is
+    called to move to a granted voice channel, and back to cc_freq when
+    the call ends with a terminator; process_data_unit() is given each
+    message of the frame assembler, or process_data_units() the
+    dispatch.data_unit events for them.
+    """
+    def __init__(self, cc_freq, tune, debug=0):
+	self.cc_freq = cc_freq
+	self.tune = tune
+	self.trunk_ctl = trunked_system(debug=debug, frequency_set=self.change_freq)
+	# acquire trunk CC based on list of primary and alternates
+	self.state = trunked_states.CC
+
+    def change_freq(self, freq):
+	if self.state == trunked_states.CC:
+		print "%d: change frequency to: %f" % (self.state, float(freq) / 1000000.0)
+		self.state = trunked_states.TO_VC
+		self.tune(freq)
+
+    def process_data_unit(self, type, s):
+	"""
+	type is the duid of the data unit, s the message body: any TSBK
+	or PDU header and blocks, followed by the NAC
+	"""
+	self.data_unit(type, s[:-2])
+
+    def process_data_units(self, units):
+	"""
+	process a list of dispatch.data_unit events
+	"""
+	for u in units:
+		self.data_unit(u.duid, u.body)
+
+    def data_unit(self, type, body):
+	if self.trunk_ctl.decode_data_unit(type, body):
+		if self.state == trunked_states.TO_CC:
+			self.state = trunked_states.CC
+	else:
+		if self.state == trunked_states.TO_VC:
+			self.state = trunked_states.VC
+		if self.state == trunked_states.VC and (type == 3 or type == 15):
+			self.state = trunked_states.TO_CC
+			if self.cc_freq:
+				print "%d: change frequency to: %f" % (self.state, float(self.cc_freq) / 1000000.0)
+				self.tune(int(self.cc_freq))
+
+class grant_table (object):
+    """
+    the calls in progress on a system, by talkgroup: the channel
+    frequency and the times of the first and the latest grant.  A call
+    neither granted nor updated for timeout seconds is over.
+    """
+    def __init__(self, timeout=3.0):
+	self.timeout = timeout
+	self.calls = {}
+
+    def update(self, frequency, tgid, now):
+	"""
+	record a grant or grant update.  Returns the talkgroups whose calls
+	it ends (another talkgroup granted the same channel), and whether
+	it starts a call or moves one to another channel.
+	"""
+	ended = [t for t, call in self.calls.items() if call['frequency'] == frequency and t != tgid]
+	for t in ended:
+		del self.calls[t]
+	call = self.calls.get(tgid)
+	if call and call['frequency'] == frequency:
+		call['last'] = now
+		return ended, False
+	self.calls[tgid] = {'frequency': frequency, 'first': now, 'last': now}
+	return ended, True
+
+    def expire(self, now):
+	"""
+	remove and return the talkgroups not heard of for timeout seconds
+	"""
+	ended = [t for t, call in self.calls.items() if now - call['last'] > self.timeout]
+	for t in ended:
+		del self.calls[t]
+	return ended
+
+class voice_scheduler (object):
+    """
+    share ndecoders voice decoders among the calls granted on a control
+    channel.  tune(slot, frequency, tgid) points decoder slot at a call
+    and release(slot) frees it.  Talkgroups in lockout are never
+    followed.  When every decoder is busy, a grant takes the decoder of
+    the lowest priority call if that is below its own; priority maps
+    talkgroups to numbers, 0 for those not listed.  grant() is the
+    trunked_system grant_set callback; data_unit() is given the data
+    units received by each decoder, so that a terminator frees it.
+    expire() frees the decoders of calls no longer granted; grant()
+    calls it, and so must a timer, for when the grants stop coming.
+    """
+    def __init__(self, ndecoders, tune, release=None, priority=None, lockout=(), timeout=3.0, clock=time.time):
+	self.tune = tune
+	self.release = release
+	self.priority = priority or {}
+	self.clock = clock
+	self.lockout = set(lockout)
+	self.grants = grant_table(timeout)
+	self.slots = [None] * ndecoders		# talkgroup on each decoder
+	self.ended = set()	# calls that sent a terminator but are still updated
+	self.stats = dict(grants=0, calls=0, preempted=0, blocked=0, locked_out=0)
+	self.lock = threading.RLock()	# the timer calls expire() from its own thread
+
+    def grant(self, frequency, tgid, update=False, now=None):
+	self.lock.acquire()
+	try:
+		self.grant_call(frequency, tgid, update, now)
+	finally:
+		self.lock.release()
+
+    def grant_call(self, frequency, tgid, update, now):
+	if now is None:
+		now = self.clock()
+	self.stats['grants'] += 1
+	if tgid in self.lockout:
+		self.stats['locked_out'] += 1
+		return
+	self.expire(now)
+	ended, started = self.grants.update(frequency, tgid, now)
+	for t in ended:
+		self.end_call(t)
+	if started or not update:
+		# a new call, even of a talkgroup just heard ending
+		self.ended.discard(tgid)
+	elif tgid in self.ended:
+		return
+	if tgid in self.slots:
+		if started:	# moved to another channel
+			self.tune(self.slots.index(tgid), frequency, tgid)
+		return
+	slot = self.free_slot(tgid)
+	if slot is None:
+		self.stats['blocked'] += 1
+		return
+	self.slots[slot] = tgid
+	self.stats['calls'] += 1
+	self.tune(slot, frequency, tgid)
+
+    def free_slot(self, tgid):
+	if None in self.slots:
+		return self.slots.index(None)
+	victim = min(range(len(self.slots)), key=lambda i: self.priority.get(self.slots[i], 0))
+	if self.priority.get(self.slots[victim], 0) >= self.priority.get(tgid, 0):
+		return None
+	self.stats['preempted'] += 1
+	self.free(victim)
+	return victim
+
+    def free(self, slot):
+	self.slots[slot] = None
+	if self.release:
+		self.release(slot)
+
+    def end_call(self, tgid):
+	if tgid in self.slots:
+		self.free(self.slots.index(tgid))
+
+    def expire(self, now=None):
+	self.lock.acquire()
+	try:
+		if now is None:
+			now = self.clock()
+		for tgid in self.grants.expire(now):
+			self.ended.discard(tgid)
+			self.end_call(tgid)
+	finally:
+		self.lock.release()
+
+    def data_unit(self, slot, duid):
+	self.lock.acquire()
+	try:
+		tgid = self.slots[slot]
+		if tgid is not None and (duid == 3 or duid == 15):
+			self.ended.add(tgid)
+			self.free(slot)
+	finally:
+		self.lock.release()
 
 def main():
 	q = 0x3a000012ae01013348704a54
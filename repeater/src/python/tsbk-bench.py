@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Compare TSBK crc checking and decoding rates: the bitwise crc16_slow,
+the byte table crc16, both with decode_tsbk() one TSBK at a time, and
+the batch decode_tsbks()
+"""
+
+import time
+from optparse import OptionParser
+
+import trunking
+from tsbk_synth import mk_tsbks, to_array
+
+def rate(n, f):
+	t0 = time.time()
+	f()
+	return n / (time.time() - t0)
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-n", "--count", type="int", default=20000, help="number of TSBKs")
+	(options, args) = parser.parse_args()
+
+	tsbks = mk_tsbks(options.count)
+	a = to_array(tsbks)
+
+	def scalar(crc):
+		ts = trunking.trunked_system()
+		for t in tsbks:
+			if crc(t, 12) == 0:
+				ts.decode_tsbk(t >> 16)
+
+	r0 = rate(len(tsbks), lambda: scalar(trunking.crc16_slow))
+	r1 = rate(len(tsbks), lambda: scalar(trunking.crc16))
+	r2 = rate(len(tsbks), lambda: trunking.trunked_system().decode_tsbks(a))
+	r3 = rate(len(tsbks), lambda: trunking.decode_tsbk_array(a))
+	print 'crc16_slow + decode_tsbk:   %10.0f tsbk/s' % r0
+	print 'crc16 + decode_tsbk:        %10.0f tsbk/s (%.1fx)' % (r1, r1 / r0)
+	print 'decode_tsbks:               %10.0f tsbk/s (%.1fx)' % (r2, r2 / r0)
+	print 'decode_tsbk_array only:     %10.0f tsbk/s (%.1fx)' % (r3, r3 / r0)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,61 @@
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+Synthesize TSBKs, and the frame assembler messages that carry them, for
+testing and benchmarking
+"""
+
+import random
+import numpy as np
+
+import trunking
+
+def mk_tsbk(opcode, payload):
+	"""
+	return a 96-bit TSBK (as a long) with the given opcode, 72-bit
+	payload and a valid crc
+	"""
+	t = (opcode << 72) | payload
+	return (t << 16) | trunking.crc16(t << 16, 12)
+
+def mk_tsbks(n, seed=0):
+	"""
+	random valid TSBKs, identifier updates for all tables first so that
+	the channel ids in the rest resolve
+	"""
+	rng = random.Random(seed)
+	tsbks = []
+	for iden in xrange(16):
+		opcode = rng.choice([0x34, 0x3d])
+		tsbks.append(mk_tsbk(opcode, (iden << 68) | rng.getrandbits(68)))
+	for i in xrange(n):
+		opcode = rng.choice(trunking.tsbk_fields.keys() + [0x00, 0x28])
+		tsbks.append(mk_tsbk(opcode, rng.getrandbits(72)))
+	return tsbks
+
+def tsbk_message(tsbk, nac=0x293):
+	"""
+	the frame assembler's message body for a TSBK: the TSBK without its
+	crc, then the NAC
+	"""
+	t = ((tsbk >> 16) << 16) | nac
+	return ''.join([chr((t >> (88 - 8 * i)) & 0xff) for i in xrange(12)])
+
+def to_array(tsbks):
+	return np.array([[(t >> (88 - 8 * i)) & 0xff for i in xrange(12)] for t in tsbks], dtype=np.uint8)
@@ -29,6 +29,7 @@ from gnuradio import blks2
 from gnuradio.eng_option import eng_option
 from optparse import OptionParser
 from usrpm import usrp_dbid
+from channelizer import pfb_channelizer, read_channel_plan
 import sys
 import os
 import math
@@ -40,6 +41,9 @@ USRP multichannel RX app
 Simultaneously receives multiple p25 stations,
 decoded audio is written over multiple parallel channels to asterisk app_rpt,
 or optionally to wireshark
+
+The channels below are used unless a channel plan file is given with
+--channel-plan (see channelizer.py for its format).
 """
 
 channels = [
@@ -183,6 +187,8 @@ class usrp_rx_block (gr.top_block):
         parser.add_option("-p", "--port", type="int", default=32001,
                           help="starting port number for chan_usrp")
         parser.add_option("-w", "--wireshark", action="store_true", default=False, help="write data to wireshark")
+        parser.add_option("-P", "--channel-plan", type="string", default=None, help="read channel plan from file")
+        parser.add_option("-X", "--xlating", action="store_true", default=False, help="filter each channel from the full rate input, without the channelizer")
 
         (options, args) = parser.parse_args()
         if len(args) != 0:
@@ -212,6 +218,23 @@ class usrp_rx_block (gr.top_block):
         low_pass_nfm = 7.5e3
         channel_taps_nfm = gr.firdes.low_pass(1.0, usrp_rate, low_pass_nfm, low_pass_nfm * 0.1, gr.firdes.WIN_HANN)
 
+        plan_center_freq = center_freq
+        plan_channels = channels
+        if options.channel_plan:
+            plan_center_freq, plan_channels = read_channel_plan(options.channel_plan)
+
+        if not options.xlating:
+            # split the input once; each channel is then filtered from
+            # its bin at a fraction of the input rate
+            lo_freqs = [plan_center_freq - chan['freq'] for chan in plan_channels]
+            chz = pfb_channelizer(usrp_rate, channel_decim, lo_freqs, low_pass * 1.1)
+            self.connect (self.u, chz)
+            bin_rate = chz.output_rate
+            bin_decim = chz.oversample
+            bin_taps = chz.channel_taps(low_pass)
+            bin_taps_nfm = chz.channel_taps(low_pass_nfm)
+            print "channelizer: %d channels in %d bins, bin rate %f" % (len(lo_freqs), max(chz.ports) + 1, bin_rate)
+
         if options.rx_subdev_spec is None:
             options.rx_subdev_spec = pick_subdevice(self.u)
 
@@ -219,25 +242,33 @@ class usrp_rx_block (gr.top_block):
         self.subdev = usrp.selected_subdev(self.u, options.rx_subdev_spec)
         print "Using RX d'board %s" % (self.subdev.side_and_name(),)
 
-        for i in xrange(len(channels)):
-            freq = channels[i]['freq']
-            mode = channels[i]['mode']
-            port = channels[i]['port']
+        for i in xrange(len(plan_channels)):
+            freq = plan_channels[i]['freq']
+            mode = plan_channels[i]['mode']
+            port = plan_channels[i]['port']
             ctcss = 0.0
-            if 'ctcss' in channels[i]:
-                ctcss = channels[i]['ctcss']
+            if 'ctcss' in plan_channels[i]:
+                ctcss = plan_channels[i]['ctcss']
             wireshark = False
-            if 'wireshark' in channels[i]:
+            if 'wireshark' in plan_channels[i]:
                 wireshark = True
-            lo_freq = center_freq - freq
+            lo_freq = plan_center_freq - freq
+            if options.xlating:
+                src = self.u
+                decim, rate, offset = channel_decim, usrp_rate, lo_freq
+                taps, taps_nfm = channel_taps, channel_taps_nfm
+            else:
+                src = (chz, chz.ports[i])
+                decim, rate, offset = bin_decim, bin_rate, chz.residuals[i]
+                taps, taps_nfm = bin_taps, bin_taps_nfm
             if mode == 'c4fm':
-                channel = rx_channel_c4fm(sps, channel_decim, channel_taps, options, usrp_rate, channel_rate, lo_freq)
+                channel = rx_channel_c4fm(sps, decim, taps, options, rate, channel_rate, offset)
             elif mode == 'cqpsk':
-                channel = rx_channel_cqpsk(sps, channel_decim, channel_taps, options, usrp_rate, channel_rate, lo_freq)
+                channel = rx_channel_cqpsk(sps, decim, taps, options, rate, channel_rate, offset)
             elif mode == 'fm':
-                channel = rx_channel_nfm(sps, channel_decim, channel_taps, options, usrp_rate, channel_rate, lo_freq, low_pass, ctcss)
+                channel = rx_channel_nfm(sps, decim, taps, options, rate, channel_rate, offset, low_pass, ctcss)
             elif mode == 'nfm':
-                channel = rx_channel_nfm(sps, channel_decim, channel_taps_nfm, options, usrp_rate, channel_rate, lo_freq, low_pass_nfm, ctcss)
+                channel = rx_channel_nfm(sps, decim, taps_nfm, options, rate, channel_rate, offset, low_pass_nfm, ctcss)
             # reduce float symbols to binary dibits
             levels = [ -2.0, 0.0, 2.0, 4.0 ]
             slicer = repeater.fsk4_slicer_fb(levels)
@@ -246,21 +277,21 @@ class usrp_rx_block (gr.top_block):
                 # build p25 frames from raw dibits and write to wireshark
                 msgq = gr.msg_queue(2)
                 decoder = repeater.p25_frame_assembler(options.hostname, WIRESHARK_PORT, options.debug, False, False, False, msgq)
-                self.connect (self.u, channel, slicer, decoder)
+                self.connect (src, channel, slicer, decoder)
                 sinks = gr.file_sink(gr.sizeof_char, "sym-%d.dat" % i)
                 self.connect (slicer, sinks)
             else:
                 # build p25 frames from raw dibits and extract IMBE speech codewords
                 msgq = gr.msg_queue(2)
-                decoder = repeater.p25_frame_assembler('', 0, options.debug, True, True, False, msgq)
+                decoder = repeater.p25_frame_assembler('', 0, options.debug, True, True, False, msgq, repeater.VOCODER_FORMAT_BINARY)
 
                 # decode the IMBE codewords - outputs speech at 8k rate
-                imbe = repeater.vocoder(False, False, 0, "", 0, False)
+                imbe = repeater.vocoder(False, False, 0, "", 0, False, repeater.VOCODER_FORMAT_BINARY)
 
                 # write the audio (8k, signed int16) to asterisk app_rpt via UDP
                 chan_rpt = repeater.chan_usrp_rx(options.hostname, port, options.debug)
 
-                self.connect (self.u, channel, slicer, decoder, imbe, chan_rpt)
+                self.connect (src, channel, slicer, decoder, imbe, chan_rpt)
                 fsink = gr.file_sink(gr.sizeof_float, 'fm-sink-%d.dat' % port)
                 self.connect (channel, fsink)
 
@@ -274,7 +305,7 @@ class usrp_rx_block (gr.top_block):
             g = self.subdev.gain_range()
             options.gain = float(g[0]+g[1])/2
 
-        usrp_freq = center_freq + options.calibration
+        usrp_freq = plan_center_freq + options.calibration
 
         # set initial values
 
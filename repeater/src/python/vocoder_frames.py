@@ -0,0 +1,236 @@
+#
+# Copyright 2013 KA1RBI
+#
+# This file is part of OP25
+#
+# OP25 is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# OP25 is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OP25; see the file COPYING. If not, write to the Free
+# Software Foundation, Inc., 51 Franklin Street, Boston, MA
+# 02110-1301, USA.
+
+"""
+IMBE codeword frames, as exchanged with repeater.vocoder
+
+The frame assembler and the vocoder pass each 88-bit voice codeword
+(u0-u7) either as a 32-byte line of hex text or, with
+VOCODER_FORMAT_BINARY, as a 20-byte frame (see vocoder_frame.h):
+
+    0       sync byte, 0xa5
+    1       flags: VOICE, START, END and bit 0 of u7
+    2-3     sequence number, big endian
+    4-7     timestamp in 8 KHz sample ticks, big endian
+    8-18    u0-u3 (12 bits each), u4-u6 (11 bits) and u7 >> 1 (7 bits)
+    19      CRC-8 (x^8 + x^2 + x + 1) of bytes 1-18
+
+u7 is shifted left one bit, as imbe_header_decode() leaves it.  This
+module packs and unpacks frames one at a time or, with numpy, a whole
+buffer at once, and reads a byte stream of frames as the vocoder does,
+skipping to the next sync byte after a bad CRC.
+"""
+
+import struct
+import numpy as np
+
+FRAME_LEN = 20
+TEXT_LEN = 32
+FRAME_SYNC = 0xa5
+
+VOICE = 0x01	# the frame holds a codeword
+START = 0x02	# first codeword of a call
+END = 0x04	# the call has ended
+U7_LSB = 0x08	# bit 0 of u7
+
+FRAME_SAMPLES = 160	# 8 KHz ticks per codeword
+
+WIDTHS = (12, 12, 12, 12, 11, 11, 11, 7)
+
+def _crc8_table():
+    table = []
+    for b in range(256):
+        crc = b
+        for i in range(8):
+            crc = ((crc << 1) ^ 0x07) if crc & 0x80 else crc << 1
+        table.append(crc & 0xff)
+    return table
+
+crc8_table = _crc8_table()
+crc8_array_table = np.array(crc8_table, dtype=np.uint8)
+
+def crc8(s):
+    crc = 0
+    for c in s:
+        crc = crc8_table[crc ^ ord(c)]
+    return crc
+
+def pack(u, seq=0, timestamp=0, flags=VOICE):
+    """
+    one frame, as a string
+    """
+    flags = (flags & ~U7_LSB) | (U7_LSB if u[7] & 1 else 0)
+    acc = 0
+    for i, w in enumerate(WIDTHS):
+        v = u[7] >> 1 if i == 7 else u[i]
+        acc = (acc << w) | (v & ((1 << w) - 1))
+    # the 88 bits of the codeword, less the leading zero byte of 96
+    body = struct.pack('>BHIIQ', flags, seq & 0xffff, timestamp & 0xffffffff,
+                       acc >> 64, acc & 0xffffffffffffffff)
+    body = body[:7] + body[8:]
+    return chr(FRAME_SYNC) + body + chr(crc8(body))
+
+def unpack(frame):
+    """
+    returns (u, seq, timestamp, flags), or None if frame is not valid
+    """
+    if len(frame) != FRAME_LEN or ord(frame[0]) != FRAME_SYNC or ord(frame[19]) != crc8(frame[1:19]):
+        return None
+    flags, seq, timestamp = struct.unpack('>BHI', frame[1:8])
+    hi, lo = struct.unpack('>IQ', '\0' + frame[8:19])
+    acc = (hi << 64) | lo
+    u = []
+    shift = 88
+    for w in WIDTHS:
+        shift -= w
+        u.append((acc >> shift) & ((1 << w) - 1))
+    u[7] = (u[7] << 1) | (1 if flags & U7_LSB else 0)
+    return u, seq, timestamp, flags
+
+def format_text(u):
+    return '%03x %03x %03x %03x %03x %03x %03x %03x\n' % tuple(u)
+
+def parse_text(line):
+    """
+    returns u, or None if line is not a codeword
+    """
+    fields = line.split()
+    if len(fields) != 8:
+        return None
+    try:
+        return [int(f, 16) for f in fields]
+    except ValueError:
+        return None
+
+def pack_array(u, seq, timestamp, flags):
+    """
+    u is an array of shape (count, 8); seq, timestamp and flags are
+    scalars or arrays of count.  returns the frames as a string
+    """
+    u = np.asarray(u, dtype=np.uint64)
+    count = u.shape[0]
+    frames = np.zeros((count, FRAME_LEN), dtype=np.uint8)
+    frames[:, 0] = FRAME_SYNC
+    flags = np.asarray(flags, dtype=np.uint8) & ~np.uint8(U7_LSB)
+    frames[:, 1] = flags | np.where(u[:, 7] & np.uint64(1), U7_LSB, 0).astype(np.uint8)
+    seq = np.asarray(seq, dtype=np.uint32) & 0xffff
+    frames[:, 2] = seq >> 8
+    frames[:, 3] = seq & 0xff
+    timestamp = np.asarray(timestamp, dtype=np.uint64) & np.uint64(0xffffffff)
+    for i in range(4):
+        frames[:, 4 + i] = (timestamp >> np.uint64(24 - 8 * i)) & np.uint64(0xff)
+    # 48 bits of u0-u3 in bytes 8-13, 40 bits of u4-u7 in bytes 14-18
+    mask = np.uint64(0xfff)
+    hi = (u[:, 0] & mask) << np.uint64(36) | (u[:, 1] & mask) << np.uint64(24) | \
+         (u[:, 2] & mask) << np.uint64(12) | (u[:, 3] & mask)
+    mask = np.uint64(0x7ff)
+    lo = (u[:, 4] & mask) << np.uint64(29) | (u[:, 5] & mask) << np.uint64(18) | \
+         (u[:, 6] & mask) << np.uint64(7) | (u[:, 7] >> np.uint64(1)) & np.uint64(0x7f)
+    for i in range(6):
+        frames[:, 8 + i] = (hi >> np.uint64(40 - 8 * i)) & np.uint64(0xff)
+    for i in range(5):
+        frames[:, 14 + i] = (lo >> np.uint64(32 - 8 * i)) & np.uint64(0xff)
+    frames[:, 19] = crc8_array(frames[:, 1:19])
+    return frames.tostring()
+
+def crc8_array(rows):
+    crc = np.zeros(rows.shape[0], dtype=np.uint8)
+    for i in range(rows.shape[1]):
+        crc = crc8_array_table[crc ^ rows[:, i]]
+    return crc
+
+def unpack_array(data):
+    """
+    data is a string of whole frames, with no gaps between them.
+    returns arrays of u (count, 8), seq, timestamp and flags, and an
+    array of which frames are valid
+    """
+    frames = np.frombuffer(data, dtype=np.uint8).reshape(-1, FRAME_LEN)
+    valid = (frames[:, 0] == FRAME_SYNC) & (frames[:, 19] == crc8_array(frames[:, 1:19]))
+    flags = frames[:, 1].copy()
+    seq = frames[:, 2].astype(np.uint32) << 8 | frames[:, 3]
+    words = frames.astype(np.uint64)
+    timestamp = np.zeros(len(frames), dtype=np.uint64)
+    for i in range(4, 8):
+        timestamp = timestamp << np.uint64(8) | words[:, i]
+    hi = np.zeros(len(frames), dtype=np.uint64)
+    for i in range(8, 14):
+        hi = hi << np.uint64(8) | words[:, i]
+    lo = np.zeros(len(frames), dtype=np.uint64)
+    for i in range(14, 19):
+        lo = lo << np.uint64(8) | words[:, i]
+    u = np.empty((len(frames), 8), dtype=np.uint32)
+    for i, shift in enumerate((36, 24, 12, 0)):
+        u[:, i] = (hi >> np.uint64(shift)) & np.uint64(0xfff)
+    for i, shift in enumerate((29, 18, 7)):
+        u[:, 4 + i] = (lo >> np.uint64(shift)) & np.uint64(0x7ff)
+    u[:, 7] = ((lo & np.uint64(0x7f)) << np.uint64(1)).astype(np.uint32) | (flags & U7_LSB != 0)
+    return u, seq, timestamp.astype(np.uint32), flags, valid
+
+class frame_reader(object):
+    """
+    split a byte stream into frames, as repeater.vocoder does: hunt for
+    the sync byte, and after a bad CRC start again from the next one.
+    frames, lost and skipped count the frames read, the gaps in their
+    sequence numbers (except across calls) and the bytes thrown away
+    """
+    def __init__(self):
+        self.buf = ''
+        self.frames = 0
+        self.lost = 0
+        self.skipped = 0
+        self.started = False
+        self.seq = 0
+
+    def feed(self, data):
+        """
+        returns the (u, seq, timestamp, flags) of each frame completed
+        """
+        buf = self.buf + data
+        out = []
+        p = 0
+        while True:
+            sync = buf.find(chr(FRAME_SYNC), p)
+            if sync < 0:
+                self.skipped += len(buf) - p
+                p = len(buf)
+                break
+            self.skipped += sync - p
+            p = sync
+            if len(buf) - p < FRAME_LEN:
+                break
+            frame = unpack(buf[p:p + FRAME_LEN])
+            if frame is None:
+                self.skipped += 1
+                p += 1
+                continue
+            p += FRAME_LEN
+            self.count(frame)
+            out.append(frame)
+        self.buf = buf[p:]
+        return out
+
+    def count(self, frame):
+        u, seq, timestamp, flags = frame
+        if self.started and not flags & START:
+            self.lost += (seq - self.seq) & 0xffff
+        self.started = not flags & END
+        self.seq = (seq + 1) & 0xffff
+        self.frames += 1